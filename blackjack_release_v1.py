@@ -3,13 +3,31 @@
 # Licensed to others under BSD3
 
 
-import random
+import time
+# When the program was started, for --startup-timing.
+START_TIME = time.perf_counter()
+
+import os
 import sys
 import pickle
-import tkinter as tk
-from tkinter import messagebox
-from tkinter import filedialog
-from math import floor
+from math import sqrt, nan, isnan, inf
+from array import array
+from collections import namedtuple
+from itertools import islice
+
+try:
+    import numpy as np
+except ImportError:
+    # NumPy is optional. Without it, shuffled shoes are shuffled lazily in
+    # pure Python.
+    np = None
+
+try:
+    import resource
+except ImportError:
+    # The resource module is Unix only. Elsewhere the peak memory of a
+    # build isn't reported.
+    resource = None
 
 
 # DEBUG STUFF
@@ -22,6 +40,40 @@ DEBUG = 0
 
 # Simulator constants used for pair hand EV calculation.
 SIM_MAX = 10 ** 7
+# Number of cards generated per block by a shuffled shoe, and the number of
+# rounds used for the whole game EV check.
+SHOE_BLOCK_CARDS = 2 ** 20
+SIM_TOTAL_HANDS = 10 ** 6
+# With common random numbers, a pair simulation stops once the split vs
+# non-split difference is CRN_Z standard errors from zero. The test is made
+# every CRN_CHECK_HANDS hands after the first CRN_MIN_HANDS.
+CRN_MIN_HANDS = 10000
+CRN_CHECK_HANDS = 1000
+CRN_Z = 3
+# A pair cell whose split vs non-split margin is within REFINE_Z standard
+# errors of zero is shaky. refine_pairs simulates shaky cells again, by
+# default with REFINE_HANDS more hands each.
+REFINE_Z = 3
+REFINE_HANDS = 10 ** 6
+# Default seed for the simulation RNG. Builds with the same rules, deck and
+# seed produce the same pair plays.
+SIM_SEED = 2020
+# A build with a checkpoint file saves its progress there every
+# CHECKPOINT_SECONDS. Pair simulations check the time every
+# CHECKPOINT_CHECK_HANDS hands.
+CHECKPOINT_FILE = 'bookmaker.checkpoint'
+CHECKPOINT_SECONDS = 60
+CHECKPOINT_CHECK_HANDS = 1000
+CHECKPOINT_FORMAT = 'build checkpoint 1'
+# Once the memoized tables of a build hold more than MAX_TABLE_ENTRIES
+# results between them, the oldest half of the largest is dropped, which
+# bounds the memory of builds on large custom decks.
+MAX_TABLE_ENTRIES = 10 ** 6
+# The recursion outside the explicit stack makes one or two Python calls for
+# each card drawn to the player hand and then to the dealer's. No hand holds
+# more than 21 cards, the smallest counting 1, so whatever the deck it goes
+# at most this many levels deep, well inside the Python recursion limit.
+MAX_RECURSION_LEVELS = 2 * 21
 
 # Useful global constants
 BLACKJACK_PAY = {True: 3/2, False: 6/5}
@@ -79,14 +131,15 @@ COLORS = {'H':'pale green',
           'D':'lime green',
           'S':'red',
           'P':'deep sky blue',
+          'R':'orange',
           '?':'gray'
           }
 
 DEVIATION_COLOR = 'hot pink'
 
-EV_INDEX = {'S':0, 'H':1, 'D':2, 'P':3}
+EV_INDEX = {'S':0, 'H':1, 'D':2, 'P':3, 'R':4}
 
-REV_EV_INDEX = {0:'S', 1:'H', 2:'D', 3:'P'}
+REV_EV_INDEX = {0:'S', 1:'H', 2:'D', 3:'P', 4:'R'}
 
 NUM_TO_TEXT = {1:'A', 2:'2', 3:'3', 4:'4', 5:'5', 6:'6',
               7:'7', 8:'8', 9:'9', 10:'T', 11:'A'}
@@ -103,1832 +156,1012 @@ NUM_TO_TEXT = {1:'A', 2:'2', 3:'3', 4:'4', 5:'5', 6:'6',
 #   EV, is expected value. The average return, from a one unit base bet,
 #   over time.
 
-#   Book contains the best play for a given player hand and dealer up card.
-#   The book keys for plays and EVs are in the format: (fpc, spc, duc), with
-#   the constraint that the fpc, if not equal to the spc, always has a lower
-#   value than the spc. The book values are in the format:
-#   [play, stand EV, hit EV, double EV, split EV (for pairs only)], with
-#   plays being one of 'S' for stand, 'H' for hit, 'D' for double, and
-#   'P' for split.
-
-book = {}
-
-# The application class
-class Book(tk.Frame):
-    """GUI application for custom deck play book and EV creation."""
-    button_states = {True:'sunken', False:'raised'}
-
-    
-    def __init__(self, parent):
-        """Initialize the frame."""
-        super(Book, self).__init__(parent)
-        self.parent = parent
-        # self.deck_choice is one of 'infinite', 'finite', or 'custom
-        self.deck_choice = 'infinite'
-        # self.got_book is one of 'waiting', 'building', or 'finished'
-        self.got_book = "waiting"
-        self.num_decks = 1
-        self.deck = ONE_DECK.copy()
-        self.play_deviations = {}
-        self.create_menus()
-        
-        self.show_frame = tk.Frame(self.parent, bd=0)
-        self.show_frame.pack(expand=True, fill='both')
-        
-        self.playlist_stringvars = []
-        self.playlist_labels = []
-        for label_index in range(0, 280):
-            play_var = tk.StringVar()
-            self.playlist_stringvars.append(play_var)
-            play_label = tk.Label(self.show_frame, textvariable = play_var, 
-                                  font = (None, 15))
-            play_label.bind(
-                    "<Button-1>",
-                    lambda e, label_index= \
-                        label_index:self.set_play_deviation(label_index))
-            self.playlist_labels.append(play_label)
-
-        self.game_rules_Text = tk.Text(self.show_frame, height=17, width=30)
-        self.game_rules_Text.place(x=0, y=0)
-
-        self.game_stats_Text = tk.Text(self.show_frame, height=3, width=30)
-        self.game_stats_Text.place(x=0, y=240)
-
-        self.game_status_Text = tk.Text(self.show_frame, height=4, width=30)
-        self.game_status_Text.place(x=0, y=290)
-        
-        self.initialize_show_frame()
-        self.show_game_info()
-        self.update_book_build_status()
-    
-    def create_menus(self):
-        """create main window menus."""
-        self.menu = tk.Menu(self.parent)
-        self.parent.config(menu=self.menu)
-
-        self.menu_book = tk.Menu(self.menu, tearoff=0)
-        self.menu_book.add_command(label="Load book", command=self.load)
-        self.menu_book.add_command(label="Save book", command=self.save)
-        self.menu_book.add_command(label="Build book", command=self.build)
-        self.menu_book.add_command(label="Build pairs",
-                                   command=self.all_pair_redo)        
-        self.menu_book.entryconfig("Save book", state="disabled")
-        self.menu_book.entryconfig("Build pairs", state="disabled")  
-        
-        self.menu.add_cascade(label="Book", menu=self.menu_book)
-
-        self.menu_rules = tk.Menu(self.menu, tearoff=0)
-        
-
-        self.deck_choice_stringvar = tk.StringVar(None, 'infinite')
-                   
-        self.menu_rules.add_radiobutton(
-                label="Infinite Deck",
-                variable=self.deck_choice_stringvar,
-                value='infinite',
-                command=self.set_deck_infinite
-                )
-        self.menu_rules.add_radiobutton(
-                label="Finite Deck",
-                variable=self.deck_choice_stringvar,
-                value='finite',
-                command=self.set_deck_finite
-                )
-        self.menu_rules.add_radiobutton(
-                label="Custom Deck",
-                variable=self.deck_choice_stringvar,
-                value='custom',
-                command=self.set_deck_custom
-                )
-        self.menu_rules.add_separator()
-        
-        self.double_var = tk.StringVar(None, "first two")
-        self.menu_rules.add_radiobutton(
-                label="Double Anytime",
-                variable=self.double_var,
-                value='any hand',
-                command=lambda: self.toggle('any hand')
-                )
-        self.menu_rules.add_radiobutton(
-                label="Double First Two Cards",
-                variable=self.double_var,
-                value='first two',
-                command=lambda: self.toggle('first two')
-                )
-        self.menu_rules.add_radiobutton(
-                label="Double Hard 9, 10, 11 Only",
-                variable=self.double_var,
-                value='9 10 11',
-                command=lambda: self.toggle('9 10 11')
-                )
-        self.menu_rules.add_radiobutton(
-                label="Double Hard 10, 11 Only",
-                variable=self.double_var,
-                value='10 11',
-                command=lambda: self.toggle('10 11')
-                )
-        self.menu_rules.add_separator()
-        
-        self.fullpay_var = tk.BooleanVar(None, True)
-        self.menu_rules.add_radiobutton(
-                label="BJ Pays 3:2",
-                variable=self.fullpay_var,
-                value=True,
-                command=lambda: self.toggle('PAY full')
-                )
-        self.menu_rules.add_radiobutton(
-                label="BJ Pays 6:5",
-                variable=self.fullpay_var,
-                value=False,
-                command=lambda: self.toggle('PAY less')
-                )
-        self.menu_rules.add_separator()
-        
-        self.msh_var = tk.IntVar(None, 4)
-        self.menu_rules.add_radiobutton(
-                label="Max Split Hands = 4",
-                variable=self.msh_var,
-                value=4,
-                command=lambda: self.toggle('msh4')
-                )
-        self.menu_rules.add_radiobutton(
-                label="Max Split Hands = 3",
-                variable=self.msh_var,
-                value=3,
-                command=lambda: self.toggle('msh3')
-                )
-        self.menu_rules.add_radiobutton(
-                label="Max Split Hands = 2",
-                variable=self.msh_var,
-                value=2,
-                command=lambda: self.toggle('msh2')
-                )
-        self.menu_rules.add_separator()
-        self.dhs17_var = tk.BooleanVar(None, True)
-        self.menu_rules.add_checkbutton(
-                label="DHS17",
-                variable=self.dhs17_var,
-                command=lambda: self.toggle('DHS17')
-                )
-        self.das_var = tk.BooleanVar(None, True)
-        self.menu_rules.add_checkbutton(
-                label="DAS",
-                variable=self.das_var,
-                command=lambda: self.toggle('DAS')
-                )
-        self.hsa_var = tk.BooleanVar(None, False)
-        self.menu_rules.add_checkbutton(
-                label="HSA",
-                variable=self.hsa_var,
-                command=lambda: self.toggle('HSA')
-                )
-        self.rsa_var = tk.BooleanVar(None, True)
-        self.menu_rules.add_checkbutton(
-                label="RSA",
-                variable=self.rsa_var,
-                command=lambda: self.toggle('RSA')
-                )
-        self.menu.add_cascade(label="Rules", menu=self.menu_rules)
-        self.menu_player = tk.Menu(self.menu, tearoff=0)
-        self.tem_var = tk.BooleanVar(None, False)
-        self.menu_player.add_checkbutton(
-                label="Take Even Money",
-                variable=self.tem_var,
-                command=lambda: self.toggle('TEM')
-                )
-        self.ti_var = tk.BooleanVar(None, False)
-        self.menu_player.add_checkbutton(
-                label="Take Insurance",
-                variable=self.ti_var,
-                command=lambda: self.toggle('TI')
-                )
-        self.menu.add_cascade(label="Player", menu=self.menu_player)
-        self.menu_detail = tk.Menu(self.menu, tearoff=0)
-        self.menu_detail.add_command(
-                label="Show all play EVs", 
-                command=self.print_ev
-                )
-        self.menu_detail.add_command(
-                label="Show hard hand deviations",
-                command=self.show_play_deviations
-                )
-        self.menu.add_cascade(label="Details", menu=self.menu_detail)
-        self.menu.entryconfig("Details", state="disabled")
-        self.menu_help = tk.Menu(self.menu, tearoff=0)
-        self.menu_help.add_command(label="Instructions", command=self.help)
-        self.menu.add_cascade(label="Help", menu=self.menu_help)
-            
-    def help(self):
-        help_message_lines = [
-             'Welcome! To create a play book, first select your desired deck.',
-             'Decks can be infinite, finite with a specified number of decks,',
-             'or custom allowing you to specify deck composition by number of',
-             'cards. Then select your desired game rules: DHS17 for dealer ',
-             'hits soft 17, DAS for double after split, HSA for player may ',
-             'hit split aces, and RSA for player may resplit aces up to the ',
-             'max ace split amount. Once your desired rules are set, click ',
-             'the book menu and select "build book."']
-        messagebox.showinfo('Instructions', " ".join(help_message_lines)) 
-                        
-    def save(self):
-        """Save a 'book' after one has been built."""
-        book_filename = filedialog.asksaveasfilename(
-                title="Save File",
-                filetypes=(("Book Files", "*.book"),
-                ("All files", "*.*"))
-                )
-        if book_filename is None or book_filename == '':
-            return
-        f = open(book_filename, "wb")
-        pickle.dump(book, f)
-
-    def load(self):
-        """Load a book after one has been saved."""
-        global book
-        book = {}
-        book_filename = filedialog.askopenfilename(
-                title="Open File",
-                filetypes=(("Book Files", "*.book"),
-                ("All files", "*.*"))
-                )
-        if book_filename is None or book_filename == '':
-            return
-        
-        f = open(book_filename, "rb")
-        book = pickle.load(f)
-
-        self.reset_plays()
-
-        self.deck = book['book_deck']
-        loaded_rules = book['rules']
-
-        assert loaded_rules[0] in ['infinite', 'finite', 'custom']
-        self.deck_choice = loaded_rules[0]
-        self.deck_choice_stringvar.set(loaded_rules[0])
-        
-        if self.dhs17_var.get() != loaded_rules[1]:
-            self.toggle('DHS17')
-            self.dhs17_var.set(loaded_rules[1])
-
-        if self.das_var.get() != loaded_rules[2]:
-            self.toggle('DAS')
-            self.das_var.set(loaded_rules[2])
-
-        if self.hsa_var.get() != loaded_rules[3]:
-            self.toggle('HSA')
-            self.hsa_var.set(loaded_rules[3])
-
-        if self.rsa_var.get() != loaded_rules[4]:
-            self.toggle('RSA')
-            self.rsa_var.set(loaded_rules[4])
-
-        if self.fullpay_var.get() != loaded_rules[5]:
-            if loaded_rules[5] == True:
-                self.toggle('PAY full')
-                self.fullpay_var.set(1)
-            else:
-                self.toggle('PAY less')
-                self.fullpay_var.set(0)
-            
-        if self.msh_var.get() != loaded_rules[6]:
-            if loaded_rules[6] == 2:
-                self.toggle('msh2')
-                self.msh_var.set(2)
-            elif loaded_rules[6] == 3:
-                self.toggle('msh3')
-                self.msh_var.set(3)
-            else:
-                self.toggle('msh4')
-                self.msh_var.set(4)
-
-        if self.double_var.get() != loaded_rules[7]:
-            self.toggle(loaded_rules[7])
-            self.double_var.set(loaded_rules[7])
-
-        assert type(loaded_rules[8]) == int
-        self.num_decks = loaded_rules[8]
-        self.menu.entryconfig("Details", state="normal")
-        self.menu_book.entryconfig("Save book", state="normal")
-        self.menu_book.entryconfig("Build pairs", state="normal")
-
-        for index in range(0, len(self.playlist_stringvars)):
-            self.playlist_stringvars[index].set('?')
-            self.playlist_labels[index].config(bg='gray')
-        self.show_frame.update()
-
-        for index in range(0, len(self.playlist_stringvars)):
-            book_tuple = self.get_book_tuple_from_playlist_index(index)
-            if book_tuple[1] == 'hard':
-                play, _ = self.hard_hand_book_lookup(
-                        book_tuple[0], book_tuple[2])
-            elif book_tuple[1] == 'soft':
-                play, _ = self.book_lookup(
-                        [1, book_tuple[0] - 11], book_tuple[2])
-            else:
-                play, _ = self.book_lookup(
-                        [book_tuple[0], book_tuple[0]],
-                        book_tuple[2])
-
-            assert play in ['S', 'H', 'D', 'P']
-            self.playlist_stringvars[index].set(play)
-            self.playlist_labels[index].config(bg=COLORS[play])
-            self.show_frame.update()
-        self.got_book = "finished"
-        self.update_book_build_status()
-        self.show_game_info()
-           
-    def update_book_build_status(self, card_list=None, hand_type=None):
-        """Update the game status info shown in the main window."""
-        self.game_status_text = "BOOK STATUS:\n"
-        if self.got_book == "building":
-            self.game_status_text += 'Book is being built. \nWorking on '
-            self.game_status_text += hand_type + ' hand: \n'
-            self.game_status_text += '(' + NUM_TO_TEXT[card_list[0]] + ', ' + \
-                                        NUM_TO_TEXT[card_list[1]] + ', ' + \
-                                        NUM_TO_TEXT[card_list[2]] + ')'
-        elif self.got_book == "waiting":
-            self.game_status_text += 'Load or build a book under ' + \
-                                     '\nthe book menu to get started.'
-        elif self.got_book == "finished":
-            self.game_status_text += \
-                'Built. Left click a play to\nset a play deviation.'
-
-        self.game_status_Text.delete('1.0', tk.END)
-        self.game_status_Text.insert('1.0', self.game_status_text)
-        self.game_status_Text.update()
-
-    def reset_plays(self, type='all'):
-        """Reset either all plays or just pair plays in the main window."""
-        if type == 'all':
-            start_index = 0
-            self.menu_book.entryconfig("Build pairs", state="disabled")
-        elif type == 'pair':
-            start_index = 180
-        end_index = len(self.playlist_stringvars)
-        self.got_book = "waiting"
-        self.menu.entryconfig("Details", state="disabled")
-        self.menu_book.entryconfig("Save book", state="disabled")
-            
-        for index in range(start_index, end_index):
-            self.playlist_stringvars[index].set('?')
-            self.playlist_labels[index].config(bg='gray')
-        self.update_book_build_status()
-        self.show_frame.update()
-
-    def set_play_deviation(self, label_index):
-        """Sets a play deviation."""
-        hand_total, hand_type, duc = \
-            self.get_book_tuple_from_playlist_index(label_index)
-        assert hand_type in ['hard', 'soft', 'pair']
-        if hand_type == 'hard':
-            book_play, _ = self.hard_hand_book_lookup(hand_total, duc)
-        elif hand_type == 'soft':
-            book_play, _ = self.book_lookup([1, hand_total - 11], duc)
-        else:
-            book_play, _ = self.book_lookup([int(hand_total / 2),
-                                     int(hand_total / 2)],
-                                    duc)
-        if hand_type == 'pair':
-            plays = ['S', 'H', 'D', 'P']
-        else:
-            plays = ['S', 'H', 'D']
-
-        display_play = self.playlist_stringvars[label_index].get()
-        play_index = plays.index(display_play)
-        play_index += 1
-        if play_index == len(plays):
-            play_index -= len(plays)
-        new_play = plays[play_index]
-        self.playlist_stringvars[label_index].set(new_play)
-        if new_play == book_play:
-            self.playlist_labels[label_index].config(bg=COLORS[new_play])
-        else:
-            self.playlist_labels[label_index].config(bg=DEVIATION_COLOR)
-        self.show_game_info()
-                   
-    def build(self):
-        """Builds the book for the current rule set."""
-        self.reset_plays()
-        self.got_book = "building"
-        current_rules = [
-                self.deck_choice, 
-                self.dhs17_var.get(), 
-                self.das_var.get(),
-                self.hsa_var.get(), 
-                self.rsa_var.get(), 
-                self.fullpay_var.get(),
-                self.msh_var.get(), 
-                self.double_var.get(), 
-                self.num_decks
-                ]
-        self.show_game_info()
-        global book
-        book = {}
-        book['book_deck'] = self.deck 
-        book['rules'] = current_rules
-
-        for pht in range(21, 10, -1):
-            for duc_11 in range(2, 12):
-                for cards in HARD_HAND_COMP[pht]:
-                    if duc_11 == 11:
-                        duc = 1
-                    else:
-                        duc = duc_11
-                    self.update_book_build_status(
-                            [cards[0], cards[1], duc], 
-                            'hard'
-                            )
-                    self.hand_builder(cards[0], cards[1], duc, self.deck)
-                if pht >= 8 and pht <= 17:
-                    play, _ = self.hard_hand_book_lookup(pht, duc)
-                    play = self.double_check(play, cards, duc)
-                    label_index = self.get_playlist_index_from_book_tuple(
-                            pht, 'hard', duc)
-                    self.playlist_stringvars[label_index].set(play)
-                    self.playlist_labels[label_index].config(bg=COLORS[play])
-                    self.show_frame.update()
-    
-        for phs in range(21, 11, -1):
-            for duc_11 in range(2, 12):
-                if duc_11 == 11:
-                    duc = 1
-                else:
-                    duc = duc_11
-                self.update_book_build_status([1, phs - 11, duc], 'soft')
-                self.hand_builder(1, phs - 11, duc, self.deck)
-                if phs >= 13 and phs <= 20:
-                    play, _ = self.book_lookup([1, phs - 11], duc)
-                    play = self.double_check(play, [1, phs - 11], duc)
-                    label_index = self.get_playlist_index_from_book_tuple(
-                            phs, 'soft', duc)
-                    self.playlist_stringvars[label_index].set(play)
-                    self.playlist_labels[label_index].config(bg=COLORS[play])
-                    self.show_frame.update()
-    
-        for pht in range(10, 3, -1):
-            for duc_11 in range(2, 12):
-                if duc_11 == 11:
-                    duc = 1
-                else:
-                    duc = duc_11
-                for cards in HARD_HAND_COMP[pht]:
-                    self.update_book_build_status(
-                            [cards[0], cards[1], duc], 
-                            'hard'
-                            )
-                    self.hand_builder(cards[0], cards[1], duc, self.deck)
-                if pht >= 8 and pht <= 20:
-                    play, _ = self.hard_hand_book_lookup(pht, duc)
-                    play = self.double_check(play, cards, duc)
-                    label_index = self.get_playlist_index_from_book_tuple(
-                            pht, 'hard', duc)
-                    self.playlist_stringvars[label_index].set(play)
-                    self.playlist_labels[label_index].config(bg=COLORS[play])
-                    self.show_frame.update()
-                    
-        for pair_of_11 in range(11, 1, -1):
-            if pair_of_11 == 11:
-                pair_of = 1
-            else:
-                pair_of = pair_of_11
-            for duc_11 in range(2, 12):
-                if duc_11 == 11:
-                    duc = 1
-                else:
-                    duc = duc_11
-                self.update_book_build_status(
-                        [pair_of, pair_of, duc], 
-                        'pair'
-                        )
-                self.pair_hand_builder(pair_of, duc, self.deck)
-                play, _ = self.book_lookup([pair_of, pair_of], duc)
-                label_index = self.get_playlist_index_from_book_tuple(
-                        pair_of, 'pair', duc)
-                self.playlist_stringvars[label_index].set(play)
-                self.playlist_labels[label_index].config(bg=COLORS[play])
-                self.show_frame.update()
-        
-        self.menu.entryconfig("Details", state="normal")
-        self.menu_book.entryconfig("Save book", state="normal")
-        self.menu_book.entryconfig("Build pairs", state="normal")
-        self.got_book = "finished"
-        self.update_book_build_status()
-        self.show_game_info()
-
-    def all_pair_redo(self):
-        """Re-builds all pair hands."""
-        self.reset_plays('pair')
-        self.got_book = "building"
-        self.show_game_info()
-        for pair_of_11 in range(11, 1, -1):
-            if pair_of_11 == 11:
-                pair_of = 1
-            else:
-                pair_of = pair_of_11
-            for duc_11 in range(2, 12):
-                if duc_11 == 11:
-                    duc = 1
-                else:
-                    duc = duc_11
-                self.update_book_build_status([pair_of, pair_of, duc], 'pair')
-                self.pair_hand_builder(pair_of, duc, self.deck)
-                play, _ = self.book_lookup([pair_of, pair_of], duc)
-                label_index = self.get_playlist_index_from_book_tuple(
-                        pair_of, 'pair', duc)
-                self.playlist_stringvars[label_index].set(play)
-                self.playlist_labels[label_index].config(bg=COLORS[play])
-                self.show_frame.update()
-        self.menu.entryconfig("Details", state="normal")
-        self.menu_book.entryconfig("Save book", state="normal")
-        self.got_book = "finished"
-        self.update_book_build_status()
-        self.show_game_info()
-
-    def show_game_info(self):
-        """Creates the game info text for the main window."""
-        self.game_rules_text = "GAME RULES/ PLAYER CHOICES:"
-        if self.fullpay_var.get():
-            self.game_rules_text += "\nBlackjack pays 3:2"
-        else:
-            self.game_rules_text += "\nBlackjack pays 6:5"
-        self.game_rules_text += "\nDeck choice: " + str(self.deck_choice)
-        if self.deck_choice == 'finite':
-            self.game_rules_text += "\nNumber of decks = " + \
-                    str(self.num_decks)
-        elif self.deck_choice == 'custom':
-            self.game_rules_text += "\nDeck composition: \n"
-            for card in CARD_VALUES:
-                card_text = NUM_TO_TEXT[card]
-                self.game_rules_text += card_text + ":" + \
-                    str(self.deck.count(card)) + ", "
-        self.game_rules_text += "\nDouble on: " + self.double_var.get()
-        self.game_rules_text += "\nDHS17: " + str(self.dhs17_var.get())
-        self.game_rules_text += "\nMax Split Hands: " + str(self.msh_var.get())
-        self.game_rules_text += "\nDAS: " + str(self.das_var.get())
-        self.game_rules_text += "\nRSA: " + str(self.rsa_var.get())
-        self.game_rules_text += "\nHSA: " + str(self.hsa_var.get())
-        self.game_rules_text += "\nTake even money: " + str(self.tem_var.get())
-        self.game_rules_text += "\nTake insurance: " + str(self.ti_var.get())
+#   The book holds the best play for a given player hand and dealer up card,
+#   along with the EV of each play, in a BookTable. Cells are addressed by
+#   (fpc, spc, duc), with the constraint that the fpc, if not equal to the
+#   spc, always has a lower value than the spc. Plays are one of 'S' for
+#   stand, 'H' for hit, 'D' for double, 'P' for split and 'R' for surrender,
+#   or 'X' for hands the deck can't deal.
 
-        
-        try:
-            self.game_rules_Text.delete('1.0', tk.END)
-        except:
-            pass
-        
-        self.game_rules_Text.insert('1.0', self.game_rules_text)
-        #self.game_rules_Text['state']='disabled'
-        self.game_rules_Text.update()
-        
-        # Stats
-        self.game_stats_text = "GAME EXPECTED VALUE:"
-        if self.got_book == "finished":
-            ev, cost = self.get_total_ev()
-            self.ev = ev
-            self.game_stats_text += "\nTotal EV: " + format(ev, "^-14.9f")
-            self.game_stats_text += "\nDeviation Cost: " + \
-                format(cost, "^-12.7f")
-            
-        else:
-            self.game_stats_text += "\nPending..."
-        try:
-            self.game_stats_Text.delete('1.0', tk.END)
-        except:
-            pass
-        self.game_stats_Text.insert('1.0', self.game_stats_text)
-        self.game_stats_Text.update()
-        
-              
-    def toggle(self, button):
-        """Handles overhead for some menu selections."""
-        if button == 'any hand' or button == 'first two' or \
-           button == '9 10 11' or button == '10 11':
-            self.double_var.set(button)
-        if button in ['any hand','first two','9 10 11','10 11','DHS17']:
-            self.reset_plays()
-        if button in ['msh2','msh3','msh4','DAS','HSA','RSA']:
-            self.reset_plays(type='pair')
-        self.show_game_info()
-
-    def set_deck_infinite(self):
-        """Sets the deck choice to infinite."""
-        if self.deck_choice != 'infinite':
-            self.got_book = "waiting"
-            self.reset_plays()
-                        
-        try:
-            self.ev_canvas.delete("all")
-        except Exception:
-            pass
+# Simulation random numbers
 
-        try:
-            self.deck_finite_window.destroy()         
-        except Exception:
-            pass
-
-        try:    
-            self.deck_custom_window.destroy()
-        except Exception:
-            pass
-
-        self.deck = ONE_DECK.copy()
-        self.deck_choice = 'infinite'
-        self.show_game_info()
-       
+_MASK64 = (1 << 64) - 1
+_GOLDEN_GAMMA = 0x9e3779b97f4a7c15
 
-    def set_deck_finite(self):
-        """Sets the deck choice to finite."""
-        if self.deck_choice != 'finite':
-            self.got_book = "waiting"
-            self.reset_plays()
 
-        try:
-            self.deck_custom_window.destroy()
-        except Exception:
-            pass
+def _mix64(z):
+    """SplitMix64 finalizer. Maps a 64 bit integer to a well mixed 64 bit
+    integer."""
+    z = ((z ^ (z >> 30)) * 0xbf58476d1ce4e5b9) & _MASK64
+    z = ((z ^ (z >> 27)) * 0x94d049bb133111eb) & _MASK64
+    return z ^ (z >> 31)
 
-        try:
-            self.deck_finite_window.destroy()
-        except Exception:
-            pass
 
-        self.deck_finite_window = tk.Toplevel(self)
-        self.deck_finite_window.title("Finite Deck")
-        self.deck_finite_window.geometry("120x210")
+class CounterRNG:
+    """Counter-based random number generator used by the simulator.
 
-        self.deck_choice = 'finite'
-            
-        self.finite_deck_frame = tk.Frame(
-                self.deck_finite_window, 
-                bd=2, 
-                relief='raised',
-                width=100, 
-                height=190
-                )
-        self.finite_deck_frame.place(x=10, y=10)
-        self.finite_deck_add_deck_button = tk.Button(
-                self.finite_deck_frame,
-                text = "Add Deck",
-                command=self.add_deck
-                )
-        self.finite_deck_add_deck_button.place(x=10, y=10, width=80, height=30)
-        self.finite_deck_label = tk.Label(
-                self.finite_deck_frame, 
-                text = "Deck Count"
-                )
-        self.finite_deck_label.place(x=10, y=45)
-        self.finite_deck_canvas = tk.Canvas(
-                self.finite_deck_frame, 
-                background = 'white',
-                width=60, 
-                height=40
-                )
-        self.finite_deck_canvas.place(x=20,y=70)
-        self.finite_deck_update()
-        self.finite_deck_remove_deck_button = tk.Button(
-                self.finite_deck_frame,
-                text = "Remove Deck",
-                wraplength=80,
-                command=self.remove_deck
-                )
-        self.finite_deck_remove_deck_button.place(
-                x=10, 
-                y=120, 
-                width=80, 
-                height=50
-                )
-        self.show_game_info()
+    The n-th number of a stream is a pure function of the stream key and n,
+    so a stream can be saved and restored with just (key, counter), and
+    independent sub streams for each pair cell or worker are derived with
+    spawn() instead of sharing one global generator."""
+    __slots__ = ('key', 'counter')
 
-    def set_deck_custom(self):
-        """Sets the deck choice to custom."""
+    def __init__(self, seed=SIM_SEED, counter=0, key=None):
+        if key is None:
+            key = _mix64(seed & _MASK64)
+        self.key = key
+        self.counter = counter
 
-        try:
-            self.deck_finite_window.destroy() 
-        except Exception:
-            pass
+    def spawn(self, *stream_ids):
+        """Returns a new, independent generator for the passed stream ids,
+        e.g. spawn(pair_of, duc) or spawn(worker_id)."""
+        key = self.key
+        for stream_id in stream_ids:
+            key = _mix64(key ^ _mix64(((stream_id + 1) * _GOLDEN_GAMMA)
+                                      & _MASK64))
+        return CounterRNG(key=key)
 
-        self.got_book = "waiting"
-        self.update_book_build_status()
-        
-        try:
-            self.ev_canvas.delete("all")
-        except Exception:
-            pass
+    def next64(self):
+        """Returns the next 64 bit integer of the stream."""
+        self.counter += 1
+        return _mix64((self.key + self.counter * _GOLDEN_GAMMA) & _MASK64)
 
-        if self.deck_choice != 'custom':
-            self.deck_choice = 'custom'
-            self.reset_plays()
+    def random(self):
+        """Returns a float in [0, 1)."""
+        return (self.next64() >> 11) * (1.0 / (1 << 53))
+
+    def randbelow(self, n):
+        """Returns an int in [0, n). Uses a multiply and shift, whose bias
+        is below 2**-50 for the deck sizes used here."""
+        return (self.next64() * n) >> 64
+
+    def choice(self, seq):
+        """Returns a random element from a non-empty sequence."""
+        return seq[self.randbelow(len(seq))]
+
+    def getstate(self):
+        return (self.key, self.counter)
+
+    def setstate(self, state):
+        self.key, self.counter = state
+
+
+# Draw the most common card value first.
+DRAW_ORDER = (10, 1, 2, 3, 4, 5, 6, 7, 8, 9)
 
 
-        self.deck_custom_window = tk.Toplevel(self)
-        self.deck_custom_window.title("Custom Deck")
-        self.deck_custom_window.geometry("560x250")
-        
-        self.custom_deck_frame = tk.Frame(
-                self.deck_custom_window, 
-                bd=2, 
-                relief='raised',
-                width=540, 
-                height=230
-                )
-        self.custom_deck_frame.place(x=10, y=10)
-        self.custom_deck_card_values_label = tk.Label(
-                self.custom_deck_frame, 
-                text = "Card values"
-                )
-        self.custom_deck_card_values_label.place(x=230, y=10)
-        self.custom_deck_card_counts_label = tk.Label(
-                self.custom_deck_frame, 
-                text = "Card counts"
-                )
-        self.custom_deck_card_counts_label.place(x=230, y=190)
-
-        self.custom_deck_value_labels = []
-        self.custom_deck_plus_buttons = []
-        self.custom_deck_minus_buttons = []
-        self.custom_deck_canvases = []
-        self.custom_deck_canvas_texts = []
-
-        for index, card in enumerate(CARD_VALUES):
-            value_label = tk.Label(
-                    self.custom_deck_frame, 
-                    text = NUM_TO_TEXT[card]
-                    )
-            value_label.place(x=30 + index*50, y=30)
-            self.custom_deck_value_labels.append(value_label)
-            plus_button = tk.Button(
-                    self.custom_deck_frame,
-                    text = "+",
-                    command=lambda card=card: 
-                    self.custom_deck_add_card(card)
-                    )
-            plus_button.place(x=10 + index*50, y=50, width=35, height=35)
-            self.custom_deck_plus_buttons.append(plus_button)
-            minus_button = tk.Button(
-                    self.custom_deck_frame,
-                    text = "-",
-                    command=lambda card=card: 
-                    self.custom_deck_subtract_card(card)
-                    )
-            minus_button.place(x=10 + index*50, y=90, width=35, height=35)
-            self.custom_deck_minus_buttons.append(minus_button)
-            count_canvas = tk.Canvas(
-                    self.custom_deck_frame, 
-                    background = 'white',
-                    width=35, 
-                    height=35
-                    )
-            count_canvas.place(x=10 + index*50,y=135)
-            self.custom_deck_canvases.append(count_canvas)
-            canvas_text = count_canvas.create_text(
-                    20, 
-                    20,
-                    text=str(self.deck.count(card)),
-                    font=('Helvetica', 18, 'bold'),
-                    justify='center'
-                    )
-            self.custom_deck_canvas_texts.append(canvas_text)
-        reset_button = tk.Button(
-                self.custom_deck_frame,
-                text = "Reset to one deck",
-                command=self.custom_deck_reset
-                )
-        reset_button.place(x=360, y=185, width=135, height=35)
-        self.show_game_info()
-                            
-    def custom_deck_reset(self):
-        """Resets the current deck to be one regular deck."""
-        self.deck = ONE_DECK.copy()
-        self.custom_deck_update_canvas()
-        self.show_game_info()
-
-    def custom_deck_add_card(self, card):
-        """Adds a card to the current deck."""
-        self.deck.append(card)
-        self.custom_deck_update_canvas()
-        self.show_game_info()
-                
-    def custom_deck_subtract_card(self, card):
-        """Subtracts a card from the current deck."""
-        if self.deck.count(card) >= 4:
-            self.deck.remove(card)
-            self.custom_deck_update_canvas()
+def deck_counts(deck):
+    """Returns a count vector for the passed deck list. Index 0 is unused
+    and counts[card] is the number of cards of that value."""
+    counts = [0] * 11
+    for card in deck:
+        counts[card] += 1
+    return counts
+
+
+# The faces of a suit aware deck are ranks 1 to 13, ace to king, in suits 0
+# to 3, spades, clubs, hearts and diamonds. A face is kept at index
+# (rank - 1) * 4 + suit.
+RANK_TEXT = 'A23456789TJQK'
+SUIT_TEXT = 'SCHD'
+FACE_COUNT = 52
+
+
+def face_value(rank):
+    """Returns the card value of a rank."""
+    return min(rank, 10)
+
+
+def face_index(rank, suit):
+    """Returns the index of a face in a SuitedDeck."""
+    return (rank - 1) * 4 + suit
+
+
+def parse_face(text):
+    """Returns the (rank, suit) of a face written as rank and suit letters,
+    such as 'KH' or 'TS'. Raises ValueError for anything else."""
+    text = text.strip().upper()
+    if len(text) != 2 or text[0] not in RANK_TEXT or \
+       text[1] not in SUIT_TEXT:
+        raise ValueError(f'{text!r} is not a face such as KH or 5S.')
+    return RANK_TEXT.index(text[0]) + 1, SUIT_TEXT.index(text[1])
+
+
+class SuitedDeck:
+    """A deck that keeps the suit and face of its cards, as a count of each
+    of the 52 faces in one array.
+
+    The count vector of card values that books are built and simulated from
+    is kept alongside as counts, and changed with the faces, so reading it
+    costs nothing. Iterating and counting the deck gives its card values
+    like a deck list, so it can be passed wherever a deck list is read. It
+    is not a list, and its remove() takes a face."""
+    __slots__ = ('faces', 'counts')
+
+    def __init__(self, faces=None):
+        if faces is None:
+            faces = bytes(2 * FACE_COUNT)
+        self.faces = array('H', faces)
+        self.counts = [0] * 11
+        for index, count in enumerate(self.faces):
+            self.counts[face_value(index // 4 + 1)] += count
+
+    @classmethod
+    def full(cls, decks=1):
+        """Returns a deck of the passed number of full decks."""
+        return cls([decks] * FACE_COUNT)
+
+    def __len__(self):
+        return sum(self.counts)
+
+    def __iter__(self):
+        for card in range(1, 11):
+            for _ in range(self.counts[card]):
+                yield card
+
+    def count(self, card):
+        """Returns the number of cards of a card value."""
+        return self.counts[card]
+
+    def copy(self):
+        """Returns a copy of the deck."""
+        return SuitedDeck(self.faces)
+
+    def face_count(self, rank, suit):
+        """Returns the number of cards of a face."""
+        return self.faces[face_index(rank, suit)]
+
+    def add(self, rank, suit, number=1):
+        """Puts cards of a face into the deck."""
+        self.faces[face_index(rank, suit)] += number
+        self.counts[face_value(rank)] += number
+
+    def remove(self, rank, suit, number=1):
+        """Takes cards of a face out of the deck. Raises ValueError if there
+        aren't that many."""
+        index = face_index(rank, suit)
+        if self.faces[index] < number:
+            raise ValueError(f'The deck has {self.faces[index]} of '
+                             f'{RANK_TEXT[rank - 1]}{SUIT_TEXT[suit]}.')
+        self.faces[index] -= number
+        self.counts[face_value(rank)] -= number
+
+
+class RankShoe:
+    """Deals cards for the simulator from a count vector of card values.
+
+    A draw picks a random position in the remaining cards and walks the ten
+    counts to find its value, then decrements that count in place, so it
+    costs the same for one deck or eight. For an infinite deck the counts
+    are never decremented.
+
+    Dealer cards are drawn with their own random stream, so two plays of a
+    hand replayed with rewind() mostly see the same dealer cards even when
+    the player draws a different number of cards."""
+    __slots__ = ('base_counts', 'base_total', 'counts', 'total', 'rng',
+                 'dealer_rng', 'infinite', 'hand_state', 'used_state')
+
+    def __init__(self, counts, rng, infinite=False):
+        self.base_counts = list(counts)
+        self.base_total = sum(counts)
+        self.rng = rng
+        self.dealer_rng = rng.spawn(0)
+        self.infinite = infinite
+        self.used_state = None
+        self.new_hand()
+
+    def new_hand(self):
+        """Restores the counts the shoe was created with."""
+        self.counts = self.base_counts.copy()
+        self.total = self.base_total
+        if self.used_state is not None:
+            # Skip past every number used by the replays of the last hand.
+            self.rng.counter = max(self.rng.counter, self.used_state[0])
+            self.dealer_rng.counter = max(self.dealer_rng.counter,
+                                          self.used_state[1])
+            self.used_state = None
+        self.hand_state = (self.rng.getstate(), self.dealer_rng.getstate())
+
+    def rewind(self):
+        """Restarts the current hand so it deals the same cards again."""
+        self.counts = self.base_counts.copy()
+        self.total = self.base_total
+        if self.used_state is None:
+            self.used_state = (0, 0)
+        self.used_state = (max(self.used_state[0], self.rng.counter),
+                           max(self.used_state[1], self.dealer_rng.counter))
+        self.rng.setstate(self.hand_state[0])
+        self.dealer_rng.setstate(self.hand_state[1])
+
+    def getstate(self):
+        """Returns the state of the shoe between hands."""
+        return (self.rng.getstate(), self.dealer_rng.getstate(),
+                self.used_state)
+
+    def setstate(self, state):
+        """Restores a state from getstate(). The next new_hand() deals as it
+        would have on the shoe that was saved."""
+        rng_state, dealer_rng_state, self.used_state = state
+        self.rng.setstate(rng_state)
+        self.dealer_rng.setstate(dealer_rng_state)
+
+    def draw(self, exclude=None, dealer=False):
+        """Draws a card. If exclude is passed, the draw is made as if all
+        cards of that value were masked out, which is how the dealer down
+        card is dealt when a dealer blackjack has been ruled out."""
+        counts = self.counts
+        total = self.total
+        if exclude is not None:
+            total -= counts[exclude]
+        if dealer:
+            position = self.dealer_rng.randbelow(total)
         else:
-            messagebox.showinfo(
-                    'Custom deck message', 
-                    "Minimum of three of each card required."
-                    )
-        self.show_game_info()
-
-    def custom_deck_update_canvas(self):
-        """Updates the displayed number of each card in the custom deck 
-        window."""
-        for index, card in enumerate(CARD_VALUES):
-            self.custom_deck_canvases[index].delete("all")
-            canvas_text = self.custom_deck_canvases[index].create_text(
-                    20, 
-                    20,
-                    text=str(self.deck.count(card)),
-                    font=('Helvetica', 18, 'bold'),
-                    justify='center'
-                    )
-            self.custom_deck_canvas_texts[index] = canvas_text
-            self.custom_deck_canvases[index].update()       
-        
-    def add_deck(self):
-        """Adds a deck for the finite deck choice."""
-        self.num_decks += 1
-        self.finite_deck_update()
-
-    def remove_deck(self):
-        """Removes a deck for the finite deck choice."""
-        if self.num_decks > 1:
-            self.num_decks -= 1
-            self.finite_deck_update()
-
-    def finite_deck_update(self):
-        """Updates self.deck to accommodate add and remove deck choices."""
-        self.show_game_info()
-        self.finite_deck_canvas.delete("all")
-        self.finite_deck_canvas.create_text(
-                30, 
-                20,
-                text=str(self.num_decks),
-                font=('Helvetica', 18, 'bold'),
-                justify='center'
-                )
-        self.finite_deck_canvas.update()
-        self.deck = self.num_decks * ONE_DECK
-
-    def initialize_show_frame(self):
-        """Initializes the plays shown in the main window."""
-        play = '?'
-        # Hard Hands
-
-        start_row = 0
-        start_col = 280
-        
-        label = tk.Label(
-                self.show_frame, 
-                text='Hard Hands', 
-                background='gold', 
-                font = (None,15)
-                )
-        label.place(x=start_col + 110, y=start_row)
-
-        col = 30
-        for up_card in range(2, 12):
-            duc = NUM_TO_TEXT[up_card]
-            label = tk.Label(self.show_frame, text = duc, font = (None, 15))
-            label.place(x=start_col + col, y=start_row + 30)
-            col += 30
-
-        row = 60
-        for hard_hand in range(8, 18):
-            label = tk.Label(self.show_frame, text = str(hard_hand),
-                  font = (None, 15))
-            label.place(x=start_col, y = start_row + row)
-
-            col = 30
-            for up_card in range(2, 12):
-                if up_card == 11:
-                    duc = 1
-                else:
-                    duc = up_card
-                label_index = self.get_playlist_index_from_book_tuple(
-                        hard_hand, 
-                        'hard', 
-                        duc
-                        )
-                self.playlist_stringvars[label_index].set(play)
-                self.playlist_labels[label_index].place(
-                        x = start_col + col,
-                        y = start_row + row
-                        )
-                self.playlist_labels[label_index].config(bg = COLORS[play])
-
-                col += 30
-            row += 30
-
-        # Soft Hands
-
-        start_row = 0
-        start_col = 620
-          
-        label = tk.Label(
-                self.show_frame, 
-                text = 'Soft Hands', 
-                font = (None, 15),
-                background = 'gold'
+            position = self.rng.randbelow(total)
+        for card in DRAW_ORDER:
+            if card == exclude:
+                continue
+            position -= counts[card]
+            if position < 0:
+                break
+        if not self.infinite:
+            counts[card] -= 1
+            self.total -= 1
+        return card
+
+
+class ShuffledShoe:
+    """Deals cards for the simulator from pre-shuffled copies of a finite
+    shoe.
+
+    With NumPy, permutations are generated in blocks of many rows at once
+    and each hand is dealt by advancing an index along one row: player
+    cards from the front and dealer cards from the back. new_hand() moves on
+    to the next row. Without NumPy, a single row is shuffled lazily, one
+    Fisher-Yates step per card dealt, which needs no copies either.
+
+    A draw with exclude deals the card at its position unless it is of the
+    excluded value, in which case it swaps in a card picked uniformly from
+    those not dealt yet that aren't of that value. Given a uniformly
+    shuffled row this deals the down card, and leaves the rest of the row,
+    exactly as if the excluded value had been masked out of the shoe.
+    Taking the next card along instead would bunch the excluded cards
+    behind the down card and bias the draws after it.
+
+    Dealt cards are moved to the ends of the row, so rewind() can replay a
+    hand on the same cards."""
+    __slots__ = ('cards', 'rng', 'block_hands', 'block', 'block_index',
+                 'block_state', 'row', 'position', 'back', 'dealt',
+                 'dealt_back')
+
+    def __init__(self, counts, rng, block_cards=SHOE_BLOCK_CARDS):
+        self.cards = [card for card in range(1, 11)
+                      for _ in range(counts[card])]
+        self.rng = rng
+        self.block_hands = max(1, block_cards // len(self.cards))
+        self.block = []
+        self.block_index = 0
+        self.block_state = None
+        self.row = self.cards.copy()
+        self.new_hand()
+
+    def fill_block(self):
+        """Generates the next block of shuffled rows."""
+        self.block_state = self.rng.getstate()
+        generator = np.random.Generator(np.random.Philox(
+                key=self.rng.next64()))
+        block = generator.permuted(
+                np.tile(np.array(self.cards, dtype=np.uint8),
+                        (self.block_hands, 1)),
+                axis=1
                 )
-        label.place(x=start_col + 110, y=start_row)
-
-        row = 30
-        col = 30
-
-        for up_card in range(2, 12):
-            duc=NUM_TO_TEXT[up_card]
-            label = tk.Label(self.show_frame, text = duc, font = (None, 15))
-            label.place(x=start_col + col, y=start_row + row)
-            col += 30
-
-        row += 30
-
-        for soft_hand in range(13, 21):
-            label = tk.Label(self.show_frame, text = str(soft_hand),
-                  font = (None, 15))
-            label.place(x=start_col, y = start_row + row)
-
-            col = 30
-        
-            for up_card in range(2, 12):
-                if up_card == 11:
-                    duc = 1
+        self.block = block.tolist()
+        self.block_index = 0
+
+    def new_hand(self):
+        """Moves on to a freshly shuffled shoe."""
+        self.position = 0
+        self.back = len(self.cards) - 1
+        self.dealt = self.position
+        self.dealt_back = self.back
+        if np is None:
+            return
+        if self.block_index >= len(self.block):
+            self.fill_block()
+        self.row = self.block[self.block_index]
+        self.block_index += 1
+
+    def draw(self, exclude=None, dealer=False):
+        """Deals the next card, skipping cards of the excluded value."""
+        row = self.row
+        if dealer:
+            position = self.back
+            replay = position > self.dealt_back
+        else:
+            position = self.position
+            replay = position < self.dealt
+        if (np is None and not replay) or row[position] == exclude:
+            # Pick the card for this position from the cards not dealt yet,
+            # as a lazy Fisher-Yates step or in place of a masked card.
+            while True:
+                pick = self.position + self.rng.randbelow(
+                        self.back - self.position + 1)
+                if row[pick] != exclude:
+                    break
+            if np is None:
+                if dealer:
+                    self.dealt_back = position - 1
                 else:
-                    duc = up_card
-                label_index = self.get_playlist_index_from_book_tuple(
-                        soft_hand, 'soft', duc)
-                self.playlist_stringvars[label_index].set(play)
-                self.playlist_labels[label_index].place(
-                        x = start_col + col,
-                        y = start_row + row
-                        )
-                self.playlist_labels[label_index].config(bg = COLORS[play])
-
-                col += 30
-            row += 30
-
-        # Pairs
-        start_col = 960
-        start_row = 0
-
-        label = tk.Label(self.show_frame, text = 'Pairs', font = (None, 15),
-                  background = 'gold')
-        label.place(x=start_col + 140, y=start_row)
-        
-        row = 30
-        col = 50
-
-        for up_card in range(2, 12):
-            duc=NUM_TO_TEXT[up_card]
-            label = tk.Label(self.show_frame, text = duc, font = (None, 15))
-            label.place(x=start_col + col, y=start_row + row)
-            col += 30
-
-        row += 30
-        col = 0
-
-        for pair in range(2, 12):
-            col = 0
-            pair_txt = NUM_TO_TEXT[pair]
-            label = tk.Label(self.show_frame,
-                             text = pair_txt + ', ' + pair_txt,
-                             font = (None, 15))
-            label.place(x=start_col, y = start_row + row)
-            col += 50
-
-            if pair == 11:
-                pair_of = 1
+                    self.dealt = position + 1
+        else:
+            pick = position
+        card = row[pick]
+        row[pick] = row[position]
+        row[position] = card
+        if dealer:
+            self.back = position - 1
+        else:
+            self.position = position + 1
+        return card
+
+    def rewind(self):
+        """Restarts the current hand so it deals the same cards again."""
+        self.position = 0
+        self.back = len(self.cards) - 1
+
+    def getstate(self):
+        """Returns the state of the shoe between hands. A block of rows is
+        saved as the generator state it was made from, while a lazily
+        shuffled row is saved as it is."""
+        if np is None:
+            return (self.rng.getstate(), None, 0, list(self.row))
+        return (self.rng.getstate(), self.block_state, self.block_index,
+                None)
+
+    def setstate(self, state):
+        """Restores a state from getstate()."""
+        rng_state, block_state, block_index, row = state
+        if block_state is not None:
+            self.rng.setstate(block_state)
+            self.fill_block()
+            self.block_index = block_index
+        if row is not None:
+            self.row = list(row)
+        self.rng.setstate(rng_state)
+
+# The book
+
+# Rules a book was built with. surrender is one of SURRENDER_CHOICES and
+# peek one of PEEK_CHOICES. They default to 'none' and 'peek' for the rules
+# of books saved before they were offered.
+Rules = namedtuple('Rules', ['deck_choice', 'dhs17', 'das', 'hsa', 'rsa',
+                             'fullpay', 'msh', 'double', 'num_decks',
+                             'surrender', 'peek'],
+                   defaults=['none', 'peek'])
+
+DOUBLE_CHOICES = ('any hand', 'first two', '9 10 11', '10 11')
+
+SURRENDER_CHOICES = ('none', 'late', 'early')
+
+# 'peek': the dealer checks for a blackjack before the player acts.
+# 'enhc': European no hole card, a dealer blackjack takes every bet.
+# 'enhc obo': no hole card, but a dealer blackjack takes the original bet
+# only, which plays the same as 'peek'.
+PEEK_CHOICES = ('peek', 'enhc', 'enhc obo')
+
+# The rules the application starts with.
+DEFAULT_RULES = Rules('infinite', True, True, False, True, True, 4,
+                      'first two', 1)
+
+# Codes for the plays stored in a BookTable. Code 0 marks an empty cell.
+PLAY_CODES = {'?':0, 'S':1, 'H':2, 'D':3, 'P':4, 'X':5, 'R':6}
+
+REV_PLAY_CODES = {code: play for play, code in PLAY_CODES.items()}
+
+BOOK_FORMAT = 'book table 2'
+
+# Book formats from_state() still reads. Books in 'book table 1' have no
+# surrender EVs.
+READ_BOOK_FORMATS = ('book table 1', BOOK_FORMAT)
+
+# Cells are stored for fpc <= spc only. PAIR_OFFSET[fpc] is the position of
+# (fpc, fpc) among the 55 (fpc, spc) pairs.
+PAIR_OFFSET = [0, 0, 10, 19, 27, 34, 40, 45, 49, 52, 54]
+
+CELL_COUNT = 550
+
+# Each cell keeps the effects of removal of its stand, hit and double EVs as
+# three runs of 11, indexed by card like a count vector.
+EOR_STRIDE = 33
+
+
+def cell_index(fpc, spc, duc):
+    """Returns the index of a book cell in the BookTable arrays."""
+    if fpc > spc:
+        fpc, spc = spc, fpc
+    return (PAIR_OFFSET[fpc] + spc - fpc) * 10 + duc - 1
+
+
+def best_total(hs, ac):
+    """Returns the best total from the provided hard sum and ace count,
+    and whether the total is hard or soft."""
+    if ac >= 1 and hs + ac < 12:
+        best = hs + ac + 10
+        hard_or_soft = 'soft'
+    else:
+        best = hs + ac
+        hard_or_soft = 'hard'
+    return best, hard_or_soft
+
+
+def best_hand_from_card_list(card_list):
+    """Returns the best total from a card list, along with whether or not
+    the total is hard or soft."""
+    hard_sum = 0
+    ace_count = 0
+    for card in card_list:
+        if card == 1:
+            ace_count += 1
+        else:
+            hard_sum += card
+    return best_total(hard_sum, ace_count)
+
+
+# Every hand state made so far, by (hard sum, aces, cards, first card,
+# doubled). It is shared by every builder and thread, and bounded: only
+# hands whose cards count at most MAX_INTERNED_COUNT are interned, which
+# takes in every hand that can be dealt, as no card is drawn to a total
+# over 21. That is a few thousand states.
+HAND_STATES = {}
+MAX_INTERNED_COUNT = 31
+
+
+class HandState:
+    """The state of a player or dealer hand: the hard sum of its cards other
+    than aces, its ace count and card count, whether it was doubled and,
+    while it holds at most two cards, its first card, so a two card hand
+    still names its book cell and whether it is a pair.
+
+    States are interned. hand_state() and add() return one shared object
+    for each state, so a hand is followed a card at a time without summing
+    its cards again, and states can be used as memo keys as they are. They
+    must not be changed. A hand that couldn't be dealt, drawn to past a
+    bust, gets a state of its own that isn't interned."""
+    __slots__ = ('hard_sum', 'aces', 'cards', 'first', 'doubled', 'total',
+                 'hard_or_soft', 'pair', 'next_states')
+
+    def __init__(self, hard_sum, aces, cards, first, doubled):
+        self.hard_sum = hard_sum
+        self.aces = aces
+        self.cards = cards
+        self.first = first
+        self.doubled = doubled
+        self.total, self.hard_or_soft = best_total(hard_sum, aces)
+        self.pair = cards == 2 and hard_sum + aces == 2 * first
+        # The state after each card, filled in as they are drawn.
+        self.next_states = [None] * 11
+
+    def __repr__(self):
+        return (f'HandState({self.hard_sum}, {self.aces}, {self.cards}, '
+                f'{self.first}, {self.doubled})')
+
+    @property
+    def second(self):
+        """The second card of a two card hand."""
+        return self.hard_sum + self.aces - self.first
+
+    def add(self, card):
+        """Returns the state of the hand after drawing a card."""
+        state = self.next_states[card]
+        if state is None:
+            if self.cards == 0:
+                first = card
+            elif self.cards == 1:
+                first = self.first
             else:
-                pair_of = pair
-            
-            for up_card in range(2, 12):
-                if up_card == 11:
-                    duc = 1
-                else:
-                    duc = up_card
-                label_index = self.get_playlist_index_from_book_tuple(
-                        pair_of, 'pair', duc)
-                self.playlist_stringvars[label_index].set(play)
-                self.playlist_labels[label_index].place(
-                       x = start_col + col,
-                       y = start_row + row
-                       )
-                self.playlist_labels[label_index].config(bg = COLORS[play])
-
-                col += 30
-
-            row += 30
-
-        # Legend
-        legend_frame = tk.Frame(
-                self.show_frame, 
-                bd=2, 
-                relief='raised',
-                width=320, 
-                height=65
-                )
-        legend_frame.place(x=620, y=310)
-        legend_stand = tk.Label(
-                legend_frame, 
-                text='S',
-                font=(None, 15), 
-                background=COLORS['S']
-                )
-        legend_stand.place(x=0, y=0)
-        legend_stand_a = tk.Label(
-                legend_frame, 
-                text=': Stand',
-                font=(None, 15)
-                )
-        legend_stand_a.place(x=20, y=0)
-        legend_hit = tk.Label(
-                legend_frame, 
-                text='H',
-                font=(None, 15), 
-                background=COLORS['H']
-                )
-        legend_hit.place(x=115, y=0)
-        legend_hit_a = tk.Label(
-                legend_frame, 
-                text=': Hit',
-                font=(None, 15)
-                )
-        legend_hit_a.place(x=135, y=0)
-        legend_double = tk.Label(
-                legend_frame, 
-                text='D',
-                font=(None, 15), 
-                background=COLORS['D']
-                )
-        legend_double.place(x=200, y=0)
-        legend_double_a = tk.Label(
-                legend_frame, 
-                text=': Double',
-                font=(None, 15)
-                )
-        legend_double_a.place(x=220, y=0)
-        legend_double = tk.Label(
-                legend_frame, 
-                text='P',
-                font=(None, 15), 
-                background=COLORS['P']
-                )
-        legend_double.place(x=0, y=30)
-        legend_double_a = tk.Label(
-                legend_frame, 
-                text=': Split',
-                font=(None, 15)
-                )
-        legend_double_a.place(x=20, y=30)
-        legend_deviation = tk.Label(
-                legend_frame, 
-                text='  ',
-                font=(None, 15), 
-                background=DEVIATION_COLOR
-                )
-        legend_deviation.place(x=115, y=30)
-        legend_deviation_a = tk.Label(
-                legend_frame, 
-                text=': Play Deviation',
-                font=(None, 15)
-                )
-        legend_deviation_a.place(x=135, y=30)
-        self.show_frame.update()
-        
-    # Helper Functions
-    def get_valid_hand_and_hand_prob(self, fpc, spc, duc):
-        """Returns a boolean indicating whether the specified hand is legit 
-        based on the self.deck, along with the probability for that hand."""
-        valid_hand = True
-        if self.deck_choice == 'infinite':
-            hand_prob = ONE_DECK_DIST[fpc] * \
-                        ONE_DECK_DIST[spc] * \
-                        ONE_DECK_DIST[duc]
+                first = 0
+            if card == 1:
+                state = hand_state(self.hard_sum, self.aces + 1,
+                                   self.cards + 1, first, self.doubled)
+            else:
+                state = hand_state(self.hard_sum + card, self.aces,
+                                   self.cards + 1, first, self.doubled)
+            self.next_states[card] = state
+        return state
+
+    def double(self, card):
+        """Returns the state of the hand after doubling down on a card."""
+        state = self.add(card)
+        return hand_state(state.hard_sum, state.aces, state.cards,
+                          state.first, True)
+
+
+def hand_state(hard_sum=0, aces=0, cards=0, first=0, doubled=False):
+    """Returns the interned hand state with the passed fields, by default
+    the empty hand. Threads racing to make a state all get the one
+    setdefault() keeps."""
+    key = (hard_sum, aces, cards, first, doubled)
+    state = HAND_STATES.get(key)
+    if state is None:
+        if hard_sum + aces > MAX_INTERNED_COUNT:
+            return HandState(*key)
+        state = HAND_STATES.setdefault(key, HandState(*key))
+    return state
+
+
+def hand_state_of(hand):
+    """Returns the hand state of a card list, or the passed hand if it
+    already is a hand state."""
+    if isinstance(hand, HandState):
+        return hand
+    state = hand_state()
+    for card in hand:
+        state = state.add(card)
+    return state
+
+
+def double_offered(double, pht, hard_or_soft):
+    """Returns whether the passed double rule lets the player double an
+    unsplit two card hand with the passed best total."""
+    if double in ('any hand', 'first two'):
+        return True
+    if hard_or_soft != 'hard':
+        return False
+    if double == '9 10 11':
+        return pht in (9, 10, 11)
+    return double == '10 11' and pht in (10, 11)
+
+
+def best_play_of(ev_list, plays):
+    """Returns which of the passed plays has the highest EV in a book EV
+    list, the first on a tie. Plays whose EV is NaN are passed over."""
+    best_play = None
+    best_ev = nan
+    for play in plays:
+        ev = ev_list[EV_INDEX[play]]
+        if not isnan(ev) and (best_play is None or ev > best_ev):
+            best_play = play
+            best_ev = ev
+    return best_play
+
+
+def get_card_dist(deck):
+    """Returns a dictionary whose keys represent the cards in the passed
+    deck and whose values indicate the corresponding percentage that those
+    cards are of the deck."""
+
+    deck_size = len(deck)
+    dist = {1:0, 2:0, 3:0, 4:0, 5:0,
+            6:0, 7:0, 8:0, 9:0, 10:0}
+    for card in dist.keys():
+        dist[card] = deck.count(card) / deck_size
+    return dist
+
+
+class BookTable:
+    """A play book for one deck and rule set.
+
+    The best play of every (fpc, spc, duc) cell is kept as a PLAY_CODES
+    byte, and the stand, hit, double, split and surrender EVs in one float
+    array per play, NaN where an EV isn't known or the play isn't offered.
+    The EVs are given the dealer has no blackjack, under every peek mode:
+    under ENHC what a dealer blackjack takes beyond the original bet is
+    charged to the double and split EVs, see BookBuilder.extra_bet_cost.
+    The deck, rules and simulation seed are kept apart from the cells. Hard
+    and soft total plays, which average the cells of every composition of a
+    total, are computed the first time they are looked up and kept until
+    one of those cells changes."""
+
+    def __init__(self, deck, rules, seed=SIM_SEED):
+        self.deck = list(deck)
+        self.rules = rules
+        self.seed = seed
+        self.counts = deck_counts(self.deck)
+        self.plays = array('B', bytes(CELL_COUNT))
+        self.evs = [array('d', [nan]) * CELL_COUNT for _ in EV_INDEX]
+        self.eors = None
+        self.split_dists = {}
+        self.pair_diagnostics = {}
+        self.total_views = {}
+
+    # Cells
+
+    def set_cell(self, fpc, spc, duc, play, ev_list):
+        """Sets the play and the stand, hit, double (and split and surrender)
+        EVs of a cell."""
+        index = cell_index(fpc, spc, duc)
+        self.plays[index] = PLAY_CODES[play]
+        for ev_index, ev in enumerate(ev_list):
+            self.evs[ev_index][index] = ev
+        self.drop_views(fpc, spc, duc)
+        # The effects of removal of every cell rest on the plays of the
+        # others.
+        self.eors = None
+
+    def set_play(self, fpc, spc, duc, play):
+        """Sets the play of a cell."""
+        self.plays[cell_index(fpc, spc, duc)] = PLAY_CODES[play]
+        self.drop_views(fpc, spc, duc)
+
+    def set_split_ev(self, pair_of, duc, split_ev):
+        """Sets the split EV of a pair cell."""
+        self.evs[EV_INDEX['P']][cell_index(pair_of, pair_of, duc)] = split_ev
+
+    def set_split_dist(self, pair_of, duc, dist, bets, covariance):
+        """Sets the outcome distribution of splitting a pair cell given no
+        dealer blackjack, with the distribution of its total bet and the
+        covariance of the results of its first two hands, as simulated."""
+        self.split_dists[cell_index(pair_of, pair_of, duc)] = \
+                (dist, bets, covariance)
+
+    def split_dist(self, pair_of, duc):
+        """Returns the split outcome distribution, total bet distribution and
+        hand covariance of a pair cell, or None if they weren't
+        recorded."""
+        return self.split_dists.get(cell_index(pair_of, pair_of, duc))
+
+    def set_cell_diagnostics(self, pair_of, duc, diagnostics):
+        """Sets the PairDiagnostics of the simulation of a pair cell."""
+        self.pair_diagnostics[cell_index(pair_of, pair_of, duc)] = diagnostics
+
+    def cell_diagnostics(self, pair_of, duc):
+        """Returns the PairDiagnostics of a pair cell, or None if they
+        weren't recorded."""
+        return self.pair_diagnostics.get(cell_index(pair_of, pair_of, duc))
+
+    def shaky_pairs(self, k=REFINE_Z):
+        """Returns a list of (pair_of, duc, diagnostics) for the pair cells
+        whose split vs non-split margin is within k standard errors of
+        zero."""
+        shaky = []
+        for pair_of in CARD_VALUES:
+            for duc in CARD_VALUES:
+                diagnostics = self.cell_diagnostics(pair_of, duc)
+                if diagnostics is not None and diagnostics.shaky(k):
+                    shaky.append((pair_of, duc, diagnostics))
+        return shaky
+
+    def has_cell(self, fpc, spc, duc):
+        """Returns whether a cell has been built."""
+        return self.plays[cell_index(fpc, spc, duc)] != PLAY_CODES['?']
+
+    def cell(self, fpc, spc, duc):
+        """Returns the play and EV list of a cell. The EV list holds the
+        stand, hit, double, split and surrender EVs in EV_INDEX order, the
+        last two NaN until the split is simulated or where surrender isn't
+        offered."""
+        index = cell_index(fpc, spc, duc)
+        code = self.plays[index]
+        if code == PLAY_CODES['?']:
+            raise KeyError((fpc, spc, duc))
+        return REV_PLAY_CODES[code], [evs[index] for evs in self.evs]
+
+    def set_cell_eor(self, fpc, spc, duc, eor_lists):
+        """Sets the effects of removal of the stand, hit and double EVs of a
+        cell, given as three lists indexed by card."""
+        if self.eors is None:
+            self.eors = array('d', bytes(8 * EOR_STRIDE * CELL_COUNT))
+        start = cell_index(fpc, spc, duc) * EOR_STRIDE
+        self.eors[start:start + EOR_STRIDE] = array('d', sum(eor_lists, []))
+
+    def cell_eor(self, fpc, spc, duc):
+        """Returns the effects of removal of the stand, hit and double EVs of
+        a cell as three lists indexed by card. Each is the change in EV from
+        taking one card of that value out of the deck."""
+        start = cell_index(fpc, spc, duc) * EOR_STRIDE
+        return [list(self.eors[start + offset:start + offset + 11])
+                for offset in range(0, EOR_STRIDE, 11)]
+
+    def drop_views(self, fpc, spc, duc):
+        """Forgets the total views that depend on a cell."""
+        pht, hard_or_soft = best_hand_from_card_list([fpc, spc])
+        self.total_views.pop(('hard', fpc + spc, duc), None)
+        self.total_views.pop((hard_or_soft, pht, duc), None)
+
+    # Lookups
+
+    def hand_prob(self, fpc, spc, duc):
+        """Returns a boolean indicating whether the specified hand can be
+        dealt from the book deck, along with the probability for that
+        hand."""
+        if self.rules.deck_choice == 'infinite':
+            return True, ONE_DECK_DIST[fpc] * \
+                         ONE_DECK_DIST[spc] * \
+                         ONE_DECK_DIST[duc]
+        counts = self.counts
+        size = len(self.deck)
+        hand_prob = counts[fpc] / size
+        if fpc == spc:
+            hand_prob *= (counts[spc] - 1) / (size - 1)
         else:
-            temp_deck = self.deck.copy()
-            hand_prob = 1
-            cards = [fpc, spc, duc]
-            for card in cards:
-                if temp_deck.count(card) > 0:
-                    hand_prob *= (temp_deck.count(card) / len(temp_deck))
-                    temp_deck.remove(card)
-                else:
-                    valid_hand = False
-        return valid_hand, hand_prob
-            
-    def hard_hand_book_lookup(self, pht, duc):
+            hand_prob *= counts[spc] / (size - 1)
+        hand_prob *= (counts[duc] - (fpc == duc) - (spc == duc)) / (size - 2)
+        return hand_prob > 0, hand_prob
+
+    def hard_total(self, pht, duc):
         """Returns the best play based on the average EVs for a hard player 
         hand total, along with a list of those average EVs.""" 
-            
-        total_ev = [0, 0, 0] # S, H, D
+        view = self.total_views.get(('hard', pht, duc))
+        if view is not None:
+            return view[0], view[1].copy()
+
+        total_ev = [0, 0, 0, nan, 0] # S, H, D, P, R
         total_prob = 0
         
         for cards in HARD_HAND_COMP[pht]:
-            valid_hand, hand_prob = self.get_valid_hand_and_hand_prob(
-                    cards[0],
-                    cards[1],
-                    duc)
+            valid_hand, hand_prob = self.hand_prob(cards[0], cards[1], duc)
             if valid_hand:
                 if cards[0] != cards[1]:
                     hand_prob *= 2
 
+                _, ev_list = self.cell(cards[0], cards[1], duc)
                 total_prob += hand_prob
-                total_ev[0] += hand_prob * \
-                        book[(cards[0], cards[1], duc)][1] # stand EV
-                total_ev[1] += hand_prob * \
-                        book[(cards[0], cards[1], duc)][2] # hit EV
-                total_ev[2] += hand_prob * \
-                        book[(cards[0], cards[1], duc)][3] # double EV
+                for ev_index in (0, 1, 2, 4):
+                    total_ev[ev_index] += hand_prob * ev_list[ev_index]
 
         if total_prob == 0:
-            return 'X' , [0, 0, 0]
-        
-        total_ev = [ev / total_prob for ev in total_ev]
-        max_ev = max(total_ev)
-        index_max_ev = total_ev.index(max_ev)
-        best_play = REV_EV_INDEX[index_max_ev]
-        return best_play, total_ev
-
-    def book_lookup(self, player_card_list, duc, hard_hand_deviations_ok=True):
+            best_play = 'X'
+        else:
+            total_ev = [ev / total_prob for ev in total_ev]
+            # The play is made on two cards, so a double is only picked
+            # where the rules offer it.
+            if double_offered(self.rules.double, pht, 'hard'):
+                best_play = best_play_of(total_ev, 'SHDR')
+            else:
+                best_play = best_play_of(total_ev, 'SHR')
+        self.total_views[('hard', pht, duc)] = (best_play, total_ev)
+        return best_play, total_ev.copy()
+
+    def soft_total(self, pht, duc):
+        """Returns the best play and EV list for a soft player hand total,
+        which are those of the equivalent two card soft hand."""
+        view = self.total_views.get(('soft', pht, duc))
+        if view is None:
+            view = self.cell(1, pht - 11, duc)
+            self.total_views[('soft', pht, duc)] = view
+        return view[0], view[1].copy()
+
+    def lookup(self, player_card_list, duc, hard_hand_deviations_ok=True):
         """If player card list contains just two cards, the best play and EV 
         list for those cards and duc combination are returned. If the best 
         hand of the player card list is soft, the equivalent two card soft 
         hand best play and EV list is returned from the book. Otherwise, 
         player card list amounts to a hard hand and the average hard hand play 
-        and EV list is returned."""
+        and EV list is returned. A HandState can be passed in place of the
+        card list."""
+        hand = hand_state_of(player_card_list)
 
-        if len(player_card_list) == 2 and \
-               player_card_list[0] == player_card_list[1]:
+        if hand.pair:
             hard_hand_deviations_ok = True
 
-        if len(player_card_list) == 2 and hard_hand_deviations_ok:
-            card1, card2 = player_card_list[0], player_card_list[1]
-            # Book doesn't contain duplicate entries.
-            # Card1 and card2 must be in numerical order.
-            if card1 > card2:
-                card1, card2 = card2, card1
-            return book[(card1, card2, duc)][0], book[(card1, card2, duc)][1:] 
+        if hand.cards == 2 and hard_hand_deviations_ok:
+            return self.cell(hand.first, hand.second, duc)
 
-        pht, hard_or_soft = self.best_hand_from_card_list(player_card_list)
+        pht, hard_or_soft = hand.total, hand.hard_or_soft
         assert pht >= 4
         if pht > 21:
-            return 'S', [-1, -1, -1]
+            return 'S', [-1, -1, -1, nan, nan]
         if hard_or_soft == 'soft':
-            return book[(1, pht - 11, duc)][0], book[(1, pht - 11, duc)][1:]
-        return self.hard_hand_book_lookup(pht, duc)                            
-
-    def no_split_book_lookup(self, player_card_list, duc):
-        """This function, in conjunction with convert_best_total_to_two_cards,
-        is used to get the equivalent book play for a 3+ card hand, excluding
-        a best play of split."""
-        play, ev_list = self.book_lookup(player_card_list, duc)
+            return self.soft_total(pht, duc)
+        return self.hard_total(pht, duc)
+
+    def book_play(self, fpc, spc, duc):
+        """Returns the play made for a dealt two card hand when no other is
+        shown: that of its hard or soft total, or of the pair. It is one
+        the rules offer on the first two cards."""
+        play, _ = self.lookup([fpc, spc], duc, False)
+        return play
+
+    def no_split_lookup(self, player_card_list, duc):
+        """Returns the book play for a hand like lookup(), but with a best
+        play of split replaced by the best of stand, hit, double and
+        surrender."""
+        play, ev_list = self.lookup(player_card_list, duc)
         if play != 'P':
             return play, ev_list
         else:
-            best_index = ev_list.index(max(ev_list[0:3]))
-            return REV_EV_INDEX[best_index], ev_list
-            
-    def best_total(self, hs, ac):
-        """Returns the best total from the provided hard sum and ace count,
-        and whether the total is hard or soft."""
-        if ac >= 1 and hs + ac < 12:
-            best = hs + ac + 10
-            hard_or_soft = 'soft'
-        else:
-            best = hs + ac
-            hard_or_soft = 'hard'
-        return best, hard_or_soft
-
-    def best_hand_from_card_list(self, card_list):
-        """Returns the best total from a card list, along with whether or not
-        the total is hard or soft."""
-        hard_sum = 0
-        ace_count = 0
-        for card in card_list:
-            if card == 1:
-                ace_count += 1
-            else:
-                hard_sum += card
-        return self.best_total(hard_sum, ace_count)
-        
-    def get_card_dist(self, deck):
-        """Returns a dictionary whose keys represent the cards in the passed
-        deck and whose values indicate the corresponding percentage that those
-        cards are of the deck."""
-
-        deck_size = len(deck)
-        dist = {1:0, 2:0, 3:0, 4:0, 5:0,
-                6:0, 7:0, 8:0, 9:0, 10:0}
-        for card in dist.keys():
-            dist[card] = deck.count(card) / deck_size
-        return dist
-
-
-    def blackjack_chance(self, deck=None):
-        """Returns the chance of getting a blackjack from the passed deck."""
-        if self.deck_choice == 'infinite':
-            return 2 * ONE_DECK_DIST[1] * ONE_DECK_DIST[10]
-        else:
-            deck_dist = self.get_card_dist(deck)
-            return 2 * deck_dist[1] * deck_dist[10]
-        
-    def get_playlist_index_from_book_tuple(self, total, hand_type, duc):
-        """Returns the index of the play labels shown on the main screen
-        for a passed total, hand_type and duc combination."""
-
-        assert hand_type in ['hard', 'soft', 'pair']
-        type_offset = {'hard':0, 'soft':100, 'pair':180}
-        duc_offset = {2:0, 3:1, 4:2, 5:3, 6:4, 7:5, 8:6, 9:7, 10:8, 1:9}
-        if hand_type == 'hard':
-            assert total >= 8 and total <= 17
-            row_offset = (total - 8) * 10
-            return type_offset[hand_type] + row_offset + duc_offset[duc]
-        elif hand_type == 'soft':
-            assert total >= 13 and total <= 20
-            row_offset = (total - 13) * 10
-            return type_offset[hand_type] + row_offset + duc_offset[duc]
-        else:
-            assert total >= 1 and total <= 10
-            if total != 1:
-                row_offset = (total - 2) * 10
-            else:
-                row_offset = 90
-            return type_offset[hand_type] + row_offset + duc_offset[duc]
-
-    def get_book_tuple_from_playlist_index(self, index):
-        """Returns a book tuple of total, hand_type, and duc for a passed
-        play label index."""
-        
-        assert index >=0 and index < 280
-        duc_offset = {0:2, 1:3, 2:4, 3:5, 4:6, 5:7, 6:8, 7:9, 8:10, 9:1}
-        if index < 100:
-            hand_type = 'hard'
-            total = floor(index / 10) + 8
-            duc = duc_offset[index % 10]
-        elif index >= 100 and index < 180:
-            hand_type = 'soft'
-            total = floor((index - 100) / 10) + 13
-            duc = duc_offset[index % 10]
-        else:
-            hand_type = 'pair'
-            total = floor((index - 180) / 10) + 2
-            if total == 11:
-                total = 1
-            duc = duc_offset[index % 10]
-        return (total, hand_type, duc)
-
-    def double_check(self, play, player_card_list, duc, split=False):
-        """Checks whether the rules allow a double. If the passed play is not 
-        a double, it is just returned. If it is a double, a double is returned 
-        if the rules allow double, otherwise the best play between 'S' and 'H' 
-        is returned. The passed split argument indicates whether the current 
-        player_card_list is part of a split hand. This is important to know in 
-        case double after split is disallowed."""
-        
-        if play == 'D':
-            pht, hard_or_soft = self.best_hand_from_card_list(player_card_list)             
-            if ((len(player_card_list) >= 2 and \
-                 self.double_var.get() == "any hand") or \
-               len(player_card_list) == 2 and \
-                (self.double_var.get() == "first two" or \
-               (self.double_var.get() == "9 10 11" and \
-                hard_or_soft == 'hard' and pht in [9, 10, 11]) or \
-               (self.double_var.get() == "10 11" and \
-                hard_or_soft == 'hard' and pht in [10, 11]))) and \
-               (split == False or (split == True and self.das_var.get())):
-                best_play = 'D'
-            else:
-                # Double not ok, so return the best play between 'S' and 'H'
-                _, ev_list = self.book_lookup(player_card_list, duc)
-                if ev_list[0] > ev_list[1]:
-                    best_play = 'S'
-                else:
-                    best_play = 'H'
-            return best_play
-        else:
-            return play
-                
-    # High Level Functions
+            return best_play_of(ev_list, 'SHDR'), ev_list
 
-    def show_play_deviations(self):
-        """Outputs hard hand play deviations to standard out."""
-        are_there_deviations = False
-        for pht in range(20, 5, -1):
-            for duc in range(10, 0, -1):
-                if len(HARD_HAND_COMP[pht]) > 1:
-                    book_play, _ = self.hard_hand_book_lookup(pht, duc)
-                    for cards in HARD_HAND_COMP[pht]:
-                        deviation_play, _ = self.no_split_book_lookup(
-                                [cards[0],
-                                cards[1]],
-                                duc
-                                )
-                        if book_play != deviation_play:
-                            print(f'Book Play for {cards}, duc: {duc} is '
-                                  f'{book_play}. '
-                                  f'Deviation play is: {deviation_play}.')
-                            are_there_deviations = True
-        if not are_there_deviations:
-            print('No hard hand play deviations detected.')
-        else:
-            print('Finished hard hand comp play deviations check.')
+    # Totals
 
-    def sim_play(self, fpc, spc, duc, play, allow_bj, deck=None):
-        """plays the given hand and returns its ev."""
-        
-        if self.deck_choice == 'infinite':
-            play_deck = ONE_DECK
+    def get_total_ev(self, display_play=None, take_even_money=False,
+                     take_insurance=False):
+        """Returns the total EV for the book rules and deck, including
+        the effect of any play deviations. display_play(fpc, spc, duc) gives
+        the play actually made for a hand, the book play if it isn't passed.
+        The cost of play deviations is also returned."""
+        total_ev = 0
+        total_deviation_cost = 0
+        for fpc in range(1, 11):
+            for spc in range(1, 11):
+                for duc in range(1, 11):
+                    valid_hand, player_hand_chance = \
+                            self.hand_prob(fpc, spc, duc)
+                    if not valid_hand:
+                        continue
+                    if display_play is None:
+                        play = None
+                    else:
+                        play = display_play(fpc, spc, duc)
+                    hand_ev, deviation_cost = self.hand_ev(
+                            fpc, spc, duc, play, take_even_money,
+                            take_insurance)
+                    if deviation_cost is not None:
+                        total_deviation_cost += \
+                                player_hand_chance * deviation_cost
+                    total_ev += player_hand_chance * hand_ev
+       
+        return total_ev, total_deviation_cost
 
+    def hand_ev(self, fpc, spc, duc, play=None, take_even_money=False,
+                take_insurance=False):
+        """Returns the EV of a dealt hand as it counts towards get_total_ev,
+        made with the passed play or, if it is None, the book play. The EV
+        lost to the play over the book play is also returned, None where the
+        play is the book play. A blackjack is paid whatever the play. Raises
+        ValueError if the play isn't one of 'SHDPR'."""
+        if self.rules.deck_choice == 'infinite':
+            chance_ten = ONE_DECK_DIST[10]
+            chance_ace = ONE_DECK_DIST[1]
         else:
-            play_deck = deck.copy()
-            play_deck.remove(fpc)
-            play_deck.remove(spc)
-            play_deck.remove(duc)
-
-        pht, hard_or_soft = self.best_hand_from_card_list([fpc, spc])
+            chance_ten = self.counts[10] / len(self.deck)
+            chance_ace = self.counts[1] / len(self.deck)
+        blackjack_pay = BLACKJACK_PAY[self.rules.fullpay]
 
+        pht, hard_or_soft = best_hand_from_card_list([fpc, spc])
         if pht == 21:
-            player_bj = True
-        else:
-            player_bj = False
-
-
-        total_ev = 0
-
-        if allow_bj == False:
-            # We don't want to allow a dealer blackjack here because we are
-            # simulating play assuming the dealer didn't already get one.        
             if duc == 1:
-                dealer_down_card_deck = \
-                    [card for card in play_deck if card != 10]
+                if take_even_money:
+                    return 1, None
+                # if dealer down card is 10, we just push, so the ev here
+                # should be the chance that the dealer has some card other
+                # than ten, times the blackjack pay.
+                return (1 - chance_ten) * blackjack_pay, None
             elif duc == 10:
-                dealer_down_card_deck = \
-                    [card for card in play_deck if card != 1]
-            else:
-                dealer_down_card_deck = play_deck.copy()          
+                # we win if ddc is not ace, otherwise we push
+                return (1 - chance_ace) * blackjack_pay, None
+            return blackjack_pay, None
+
+        # now we just have to worry about dealer blackjacks
+        # For now, use the play displayed on the main frame, and not the
+        # individual hard hand play which may be different.
+        book_play = self.book_play(fpc, spc, duc)
+        _, ev_list = self.lookup([fpc, spc], duc, True)
+
+        # Ensure we use any user-set play deviations.
+        if play is None:
+            play = book_play
+
+        if play not in ['S', 'H', 'D', 'P', 'R']:
+            raise ValueError(f'{play!r} is not a play for the hand '
+                             f'({fpc}, {spc}) against {duc}.')
+        interim_ev = ev_list[EV_INDEX[play]]
+        deviation_cost = None
+        if play != book_play:
+            deviation_cost = interim_ev - ev_list[EV_INDEX[book_play]]
+        if play == 'R' and self.rules.surrender == 'early':
+            # Early surrender comes before the dealer peeks, so half the
+            # bet is lost whatever the hole card.
+            hand_ev = -0.5
+        elif duc == 1:
+            hand_ev = 0
+            # offer insurance 
+            # (ins. bet is 0.5 main bet, and pays 2:1)
+            if take_insurance:      
+                hand_ev += chance_ten  
+                hand_ev -= (1 - chance_ten) * 0.5   
+            hand_ev -= chance_ten
+            hand_ev += (1 - chance_ten) * interim_ev
+        elif duc == 10:
+            hand_ev = 0
+            hand_ev += (-1) * chance_ace
+            hand_ev += (1 - chance_ace) * interim_ev
         else:
-            dealer_down_card_deck = play_deck.copy()            
-
-        ddc = random.choice(dealer_down_card_deck)
-
-        if self.deck_choice != 'infinite':
-            play_deck.remove(ddc)
-
-        dealer_cards = [duc, ddc]
-        dht, hard_or_soft = self.best_hand_from_card_list(dealer_cards)
-
+            hand_ev = interim_ev
+        return hand_ev, deviation_cost
+
+    def get_total_ev_eor(self, display_play=None, take_even_money=False,
+                         take_insurance=False):
+        """Returns the effects of removal of get_total_ev as a list indexed by
+        card. A split or surrender play is given no effect of removal of its
+        own: a split EV is simulated, so this leaves out how removal changes
+        it, while a surrender EV is fixed. Such hands still count through
+        the chance of being dealt and of a dealer blackjack. Raises
+        ValueError for an infinite deck book, or one whose effects of
+        removal weren't found with BookBuilder.build_eors."""
+        if self.rules.deck_choice == 'infinite':
+            raise ValueError('Taking a card out of an infinite deck has no '
+                             'effect. Effects of removal need a finite or '
+                             'custom deck.')
+        if self.eors is None:
+            raise ValueError('The effects of removal of the book cells '
+                             'have not been found.')
+        size = len(self.deck)
+        chance_ten = self.counts[10] / size
+        chance_ace = self.counts[1] / size
+        blackjack_pay = BLACKJACK_PAY[self.rules.fullpay]
+        total_eor = [0] * 11
+
+        for card in range(1, 11):
+            # Effects of removing one of card on the peek chances.
+            ten_eor = -((card == 10) - chance_ten) / size
+            ace_eor = -((card == 1) - chance_ace) / size
+            for fpc in range(1, 11):
+                for spc in range(1, 11):
+                    for duc in range(1, 11):
+                        valid_hand, player_hand_chance = \
+                                self.hand_prob(fpc, spc, duc)
+                        if not valid_hand:
+                            continue
+
+                        # The hand chance is a product of three draws.
+                        hand_chance_eor = 0
+                        taken = [0] * 11
+                        for draw, dealt_card in enumerate([fpc, spc, duc]):
+                            left = self.counts[dealt_card] - taken[dealt_card]
+                            hand_chance_eor -= (dealt_card == card) / left - \
+                                               1 / (size - draw)
+                            taken[dealt_card] += 1
+                        hand_chance_eor *= player_hand_chance
+
+                        pht, _ = best_hand_from_card_list([fpc, spc])
+                        if pht == 21:
+                            if duc == 1 and not take_even_money:
+                                hand_ev = (1 - chance_ten) * blackjack_pay
+                                hand_ev_eor = -ten_eor * blackjack_pay
+                            elif duc == 1:
+                                hand_ev = 1
+                                hand_ev_eor = 0
+                            elif duc == 10:
+                                hand_ev = (1 - chance_ace) * blackjack_pay
+                                hand_ev_eor = -ace_eor * blackjack_pay
+                            else:
+                                hand_ev = blackjack_pay
+                                hand_ev_eor = 0
+                        else:
+                            book_play = self.book_play(fpc, spc, duc)
+                            _, ev_list = self.lookup([fpc, spc], duc, True)
+                            if display_play is None:
+                                play = book_play
+                            else:
+                                play = display_play(fpc, spc, duc)
+                            interim_ev = ev_list[EV_INDEX[play]]
+                            if play in ('P', 'R'):
+                                interim_eor = 0
+                            else:
+                                interim_eor = self.cell_eor(
+                                        fpc, spc, duc)[EV_INDEX[play]][card]
+                            if play == 'R' and \
+                                   self.rules.surrender == 'early':
+                                hand_ev = -0.5
+                                hand_ev_eor = 0
+                            elif duc == 1:
+                                hand_ev = -chance_ten + \
+                                          (1 - chance_ten) * interim_ev
+                                hand_ev_eor = -ten_eor - \
+                                              ten_eor * interim_ev + \
+                                              (1 - chance_ten) * interim_eor
+                                if take_insurance:
+                                    hand_ev += 1.5 * chance_ten - 0.5
+                                    hand_ev_eor += 1.5 * ten_eor
+                            elif duc == 10:
+                                hand_ev = -chance_ace + \
+                                          (1 - chance_ace) * interim_ev
+                                hand_ev_eor = -ace_eor - \
+                                              ace_eor * interim_ev + \
+                                              (1 - chance_ace) * interim_eor
+                            else:
+                                hand_ev = interim_ev
+                                hand_ev_eor = interim_eor
 
-        # Deal with BJs
-        if dht == 21:
-            dealer_bj = True
-        else:
-            dealer_bj = False
+                        total_eor[card] += hand_chance_eor * hand_ev + \
+                                           player_hand_chance * hand_ev_eor
+        return total_eor
 
-        assert not (dealer_bj and not allow_bj)
+    # Output
 
-        if allow_bj == True:
-            if player_bj:
-                if duc == 1:
-                    if self.tem_var.get():
-                        return 1
-                    else:
-                        if dealer_bj:
-                            return 0
-                        else:
-                            return BLACKJACK_PAY[self.fullpay_var.get()]
-                elif dealer_bj:
-                    return 0
-                else:
-                    return BLACKJACK_PAY[self.fullpay_var.get()]
-            else:
-                if duc == 1:
-                    if self.ti_var.get():
-                        if dealer_bj:
-                            return 0
-                        else:
-                            total_ev -= 0.5
-                if dealer_bj:
-                    return -1
-                
-        # No dealer or player BJ past here
-        if play == 'S':
-            hands_result = [pht]
-            bet_multiplier = [1]
-
-        # No need to check if double is allowed here, since play was 
-        # explicitly called with it.
-        elif play == 'D':
-            player_hands =[[fpc, spc]]
-            double_card = random.choice(play_deck)
-            if self.deck_choice != 'infinite':
-                play_deck.remove(double_card)
-
-            player_hands[0].append(double_card)
-            pht, hard_or_soft = self.best_hand_from_card_list(player_hands[0])
-            bet_multiplier = [2]
-            if pht >= 22:
-                return -2
-
-            hands_result = [pht]
-                     
-        elif play == 'H':
-            player_hands =[[fpc, spc]]
-            book_play = 'H'
-            bet_multiplier = [1]
-            while book_play != 'S':
-                hit_card = random.choice(play_deck)
-                if self.deck_choice != 'infinite':
-                    play_deck.remove(hit_card)
-
-                player_hands[0].append(hit_card)
-                pht, hard_or_soft = self.best_hand_from_card_list(
-                        player_hands[0]
-                        )
-                
-                if pht >= 22:
-                    return -1
-                book_play, _ = self.no_split_book_lookup(player_hands[0], duc)
-                book_play = self.double_check(book_play, player_hands[0], duc)
-                if book_play == 'D':
-                    double_card = random.choice(play_deck)
-                    if self.deck_choice != 'infinite':
-                        play_deck.remove(double_card)
-                    player_hands[0].append(double_card)
-                    pht, hard_or_soft = self.best_hand_from_card_list(
-                            player_hands[0]
-                            )
-                    bet_multiplier[0] += 1
-                    book_play = 'S'
-            hands_result = [pht]
-            
-            
-        elif play == 'P':
-        
-            assert fpc == spc
-            max_split_hands = self.msh_var.get()
-            if fpc == 1 and not self.rsa_var.get():
-                max_split_hands = 2
-
-            player_hands = [[fpc],[spc]]
-            hands_result = []
-            bet_multiplier = []
-            current_hand = 0
-            player_turn_done = False
-            event = ''
-            
-            while not player_turn_done:
-                draw_card = random.choice(play_deck)
-          
-                if self.deck_choice != 'infinite':
-                    play_deck.remove(draw_card)
-                # Add additional split cards to a new hand if we get an
-                # additional split card and are not already at max split hands.
-                while draw_card == fpc and len(player_hands) < max_split_hands:
-                    event += 'p'
-                    player_hands.append([draw_card])
-                    draw_card = random.choice(play_deck)
-
-                    if self.deck_choice != 'infinite':
-                        play_deck.remove(draw_card)
-                # This draw_card is ALWAYS the second card to the current
-                # split hand.           
-                    
-                if len(event) < 4 and event.count('p') < 2 and \
-                   (max_split_hands != 3 or event.count('p') == 0):
-                    event += 'm'
-
-                player_hands[current_hand].append(draw_card)
-                pht, hard_or_soft = self.best_hand_from_card_list(
-                        player_hands[current_hand])
-                # We assume a normal non-double hand. 
-                # If we get to double later on, we add 1 to this.
-                bet_multiplier.append(1)
-                            
-                if fpc == 1 and not self.hsa_var.get():
-                    pass     
-                else:       
-                    book_play, _ = self.no_split_book_lookup(
-                            player_hands[current_hand], duc)
-                    assert book_play in ['S', 'H', 'D']
-                    # Deal with double opportunity
-                    book_play = self.double_check(
-                            book_play,
-                            player_hands[current_hand],
-                            duc,
-                            True)
-                    if book_play == 'D':
-                        bet_multiplier[current_hand] += 1
-                        double_card = random.choice(play_deck)
-                        
-                        if self.deck_choice != 'infinite':
-                            play_deck.remove(double_card)
-                        player_hands[current_hand].append(double_card)
-                        pht, _ = self.best_hand_from_card_list(
-                                player_hands[current_hand]
-                                )
-                    else:
-                        # Either hit or stand
-                        while book_play != 'S':                      
-                            draw_card = random.choice(play_deck)
-                            
-                            if self.deck_choice != 'infinite':
-                                play_deck.remove(draw_card)
-                            player_hands[current_hand].append(draw_card)
-                            pht, hard_or_soft = self.best_hand_from_card_list(
-                                    player_hands[current_hand]
-                                    )
-                            if pht > 21:
-                                book_play = 'S'
-                            else:
-                                book_play, _ = self.no_split_book_lookup(
-                                        player_hands[current_hand], duc)
-                                book_play = self.double_check(
-                                        book_play,
-                                        player_hands[current_hand],
-                                        duc,
-                                        True
-                                        )
-                                if book_play == 'D':
-                                    bet_multiplier[current_hand] += 1
-                                    double_card = random.choice(play_deck)
-                                    
-                                    if self.deck_choice != 'infinite':
-                                        play_deck.remove(double_card)
-                                    player_hands[current_hand].append(
-                                            double_card
-                                            )
-                                    pht, _ = self.best_hand_from_card_list(
-                                            player_hands[current_hand])
-                                    book_play = 'S'
-                            
-                
-                hands_result.append(pht)
-                current_hand += 1   
-                if current_hand >= len(player_hands):
-                    player_turn_done = True
-
-        #Pair stats
-        global two_hand_count
-        global three_hand_count
-        global four_hand_count
-        global two_hand_ev_summation_list
-        global three_hand_ev_summation_list
-        global four_hand_ev_summation_list
-        global mm_ev_summation_list
-        global p_ev_summation_list
-        global mp_ev_summation_list
-        global pp_ev_summation_list
-        global pmp_ev_summation_list
-        global mpp_ev_summation_list
-        global pmmp_ev_summation_list
-        global mpmp_ev_summation_list
-        global pmmm_ev_summation_list
-        global mpmm_ev_summation_list
-        global event_hand_counts
-        global ddc_is_pc_count
-      
-        if DEBUG >= 2:
-            if play == 'P':
-                if max_split_hands == 2:
-                    assert event in ['mm']
-                elif max_split_hands == 3:
-                    assert event in ['mm', 'p', 'mp']
-                elif max_split_hands == 4:
-                    assert event in  ['mm', 'pmmm', 'mpmm', 'pp', 
-                                     'pmp', 'mpp', 'mpmp', 'pmmp']
-
-                if len(hands_result) == 2:
-                    two_hand_count += 1
-                        
-                if len(hands_result) == 3:
-                    three_hand_count += 1
-                
-                if len(hands_result) == 4:
-                    four_hand_count += 1
-               
-                if ddc == fpc:
-                    ddc_is_pc_count[event] += 1
-        
-        # Now dealer turn
-        dht, hard_or_soft = self.best_hand_from_card_list(dealer_cards)
-        while (dht == 17 and hard_or_soft == 'soft' and \
-               self.dhs17_var.get()) or (dht < 17):
-            dealer_draw_card = random.choice(play_deck)
-            if self.deck_choice != 'infinite':
-                play_deck.remove(dealer_draw_card)
-            
-            dealer_cards.append(dealer_draw_card)
-            dht, hard_or_soft = self.best_hand_from_card_list(dealer_cards)
-
-        total_ev_list = []
-        for index, pht in enumerate(hands_result):
-            assert bet_multiplier[index] == 1 or bet_multiplier[index] == 2
-            # Player busts first
-            if pht > 21:
-                total_ev_list.append(bet_multiplier[index] * (-1))
-            elif dht > 21:
-                total_ev_list.append(bet_multiplier[index])
-            elif pht > dht:
-                total_ev_list.append(bet_multiplier[index])
-            elif dht > pht:
-                total_ev_list.append(bet_multiplier[index] * (-1))
-            else:
-                total_ev_list.append(0)    
-  
-        # Process pair stats if Debug >= 2
-
-        
-        if play == 'P' and DEBUG >= 2:
-
-            event_hand_counts[event] += 1
-            hands = len(player_hands)
-            assert hands in [2, 3, 4]
-            
-            if hands == 2:
-                for i in range(0, 2):
-                    two_hand_ev_summation_list[i] +=  total_ev_list[i]
-                    mm_ev_summation_list = two_hand_ev_summation_list   
-                       
-            elif hands == 3:
-                for i in range(0, 3):
-                    three_hand_ev_summation_list[i] += total_ev_list[i]
-                    if max_split_hands == 3:
-                        if event == 'p':
-                            p_ev_summation_list[i] += total_ev_list[i]
-                        elif event == 'mp':
-                            mp_ev_summation_list[i] += total_ev_list[i]
-                        else:
-                            print(f'(sim_play) unexpected event {event} '
-                                  f'expected either p or mp '
-                                  f'\nmsh: {max_split_hands}')
-                    if max_split_hands == 4:
-                        if event == 'pmmm':
-                            pmmm_ev_summation_list[i] += total_ev_list[i]
-                        elif event == 'mpmm':
-                            mpmm_ev_summation_list[i] += total_ev_list[i]
-                        else:
-                            print(f'(sim_play) unexpected event {event} '
-                                  f'expected either pmmm or mpmm '
-                                  f'\nmsh: {max_split_hands}')
-
-            elif hands == 4:
-                for i in range(0, 4):
-                    four_hand_ev_summation_list[i] += total_ev_list[i]
-                    if event == 'pp':
-                        pp_ev_summation_list[i] += total_ev_list[i]
-                    if event == 'mpp':
-                        mpp_ev_summation_list[i] += total_ev_list[i]
-                    if event == 'pmp':
-                        pmp_ev_summation_list[i] += total_ev_list[i]
-                    if event == 'pmmp':
-                        pmmp_ev_summation_list[i] += total_ev_list[i]
-                    if event == 'mpmp':
-                        mpmp_ev_summation_list[i] += total_ev_list[i]
-
-        return sum(total_ev_list)
-
-    def get_total_ev(self):
-        """Returns the total EV for the selected rules and deck, including
-        the effect of any play deviations. The cost of play deviations is
-        also returned."""
-        total_ev = 0
-        total_deviation_cost = 0
-        player_hand_chance_cumm_sum = 0
-        total_player_bj_chance = 0
-        total_dealer_bj_chance = 0
-        total_both_bj_chance = 0
-
-        for fpc in range(1, 11):
-            for spc in range(1, 11):
-                for duc in range(1, 11):
-                    valid_hand, player_hand_chance = \
-                            self.get_valid_hand_and_hand_prob(
-                                    fpc, 
-                                    spc, 
-                                    duc
-                                    )
-                    if not valid_hand:
-                        continue
-
-                    pht, hard_or_soft = self.best_hand_from_card_list(
-                            [fpc, spc]
-                            )
-                    if pht == 21:
-                        total_player_bj_chance += player_hand_chance
-                        if duc == 1:
-                            if self.tem_var.get():
-                                hand_ev = 1                            
-                            else:
-                                # if dealer down card is 10, we just push, 
-                                # so the ev here should be the chance that 
-                                # the dealer has some card other than ten, 
-                                # times the blackjack pay.
-                                if self.deck_choice == 'infinite':
-                                    chance_ddc_not_ten = 1 - ONE_DECK_DIST[10]
-                                else:
-                                    chance_ddc_not_ten = 1 - \
-                                        (self.deck.count(10) / \
-                                        len(self.deck))
-                                hand_ev =  chance_ddc_not_ten * \
-                                          BLACKJACK_PAY[self.fullpay_var.get()]
-                                total_both_bj_chance += player_hand_chance * \
-                                        (1 - chance_ddc_not_ten)
-                                total_dealer_bj_chance += \
-                                        player_hand_chance * \
-                                        (1 - chance_ddc_not_ten)
-                        elif duc == 10:
-                            # we win if ddc is not ace, otherwise we push
-                            if self.deck_choice == 'infinite':
-                                chance_ddc_not_ace = 1 - ONE_DECK_DIST[1]
-                            else:
-                                chance_ddc_not_ace = 1 - \
-                                        (self.deck.count(1) / \
-                                        len(self.deck))
-                            hand_ev = chance_ddc_not_ace * \
-                                      BLACKJACK_PAY[self.fullpay_var.get()]
-                            total_both_bj_chance += player_hand_chance * \
-                                                    (1 - chance_ddc_not_ace)
-                            total_dealer_bj_chance += player_hand_chance * \
-                                                      (1 - chance_ddc_not_ace)
-                        else:
-                            hand_ev = BLACKJACK_PAY[self.fullpay_var.get()]
-                    else:
-                        # now we just have to worry about dealer blackjacks
-                        # For now, use the play displayed on the main frame,
-                        # and not the individual hard hand play which may be
-                        # different.
-
-
-                        book_play, _ = self.book_lookup([fpc, spc], duc, False)
-                        _, ev_list = self.book_lookup([fpc, spc], duc, True)
-
-                        # Ensure we use any user-set play deviations. These
-                        # only apply to hands displayed in the main frame.
-                        
-                        if (pht >= 8 and pht <= 17 and \
-                                hard_or_soft == 'hard') or \
-                           (pht >= 13 and pht <= 20 and \
-                                hard_or_soft == 'soft') or \
-                           fpc == spc:
-                            if fpc == spc:
-                                hand_type = 'pair'
-                                total = fpc
-                            else:
-                                hand_type = hard_or_soft
-                                total = pht
-                            label_index = \
-                                self.get_playlist_index_from_book_tuple(
-                                    total,
-                                    hand_type,
-                                    duc
-                                    )
-                            display_play = \
-                                self.playlist_stringvars[label_index].get()
-                        else:
-                            display_play = book_play
-
-                        if display_play not in ['S', 'H', 'D', 'P']:
-                            print(f'Error in get_total_ev. '
-                                  f'\nfpc: {fpc} spc: {spc} duc: {duc} '
-                                  f'label_index: {label_index}'
-                                  f'display_play: {display_play}')
-                            raise Exception
-                        if book_play == display_play:
-                            interim_ev = ev_list[EV_INDEX[book_play]]
-                        else:
-                            interim_ev = ev_list[EV_INDEX[display_play]]
-                            total_deviation_cost += \
-                                    player_hand_chance * \
-                                    (interim_ev - \
-                                    ev_list[EV_INDEX[book_play]])
-                        if duc == 1:
-                            hand_ev = 0
-                            if self.deck_choice == 'infinite':
-                                chance_ddc_is_ten = ONE_DECK_DIST[10]
-                            else:
-                                chance_ddc_is_ten = (self.deck.count(10) / \
-                                                     len(self.deck))
-                            # offer insurance 
-                            # (ins. bet is 0.5 main bet, and pays 2:1)
-                            if self.ti_var.get():      
-                                hand_ev += chance_ddc_is_ten  
-                                hand_ev -= (1 - chance_ddc_is_ten) * 0.5   
-                            hand_ev -= chance_ddc_is_ten
-                            hand_ev += (1 - chance_ddc_is_ten) * interim_ev
-                            total_dealer_bj_chance += player_hand_chance * \
-                                    chance_ddc_is_ten
-                        elif duc == 10:
-                            hand_ev = 0
-                            if self.deck_choice == 'infinite':
-                                chance_ddc_is_ace = ONE_DECK_DIST[1]
-                            else:
-                                chance_ddc_is_ace = (self.deck.count(1) / \
-                                                     len(self.deck))    
-                            hand_ev += (-1) * chance_ddc_is_ace
-                            hand_ev += (1 - chance_ddc_is_ace) * interim_ev
-                            total_dealer_bj_chance += player_hand_chance * \
-                                    chance_ddc_is_ace
-                        else:
-                            hand_ev = interim_ev
-                        
-                    total_ev += player_hand_chance * hand_ev
-                    player_hand_chance_cumm_sum += player_hand_chance
-       
-        return total_ev, total_deviation_cost
-                    
-
-    def print_ev(self, deck=None):
+    def print_ev(self):
+        """Outputs the EV of every play to standard out, with the best play
+        EVs on standard error."""
         eleven_to_one = {1:1,
                          2:2,
                          3:3,
@@ -1959,7 +1192,7 @@ class Book(tk.Frame):
             print(f'{pht:>7} ', end="")
             for duc in range(2, 12):
                 duc_it = eleven_to_one[duc]
-                play, ev_list = self.hard_hand_book_lookup(pht, duc_it)
+                play, ev_list = self.hard_total(pht, duc_it)
                 
                 if play == 'S':
                     use_file = sys.stderr
@@ -1989,7 +1222,7 @@ class Book(tk.Frame):
             print(f'{pht:>8} ', end="")
             for duc in range(2, 12):
                 duc_it = eleven_to_one[duc]
-                play, ev_list = self.hard_hand_book_lookup(pht, duc_it)
+                play, ev_list = self.hard_total(pht, duc_it)
                 if play == 'H':
                     use_file = sys.stderr
                 else:
@@ -2005,8 +1238,9 @@ class Book(tk.Frame):
             print(f'{soft_txt:>8} ', end="")
             for duc in range(2, 12):
                 duc_it = eleven_to_one[duc]
-                ev = book[(1, pht - 11, duc_it)][2]
-                if book[(1, pht - 11, duc_it)][0] == 'H':
+                play, ev_list = self.cell(1, pht - 11, duc_it)
+                ev = ev_list[1]
+                if play == 'H':
                     use_file = sys.stderr
                 else:
                     use_file = sys.stdout
@@ -2033,7 +1267,7 @@ class Book(tk.Frame):
             print(f'{pht:>8} ', end="")
             for duc in range(2, 12):
                 duc_it = eleven_to_one[duc]
-                play, ev_list = self.hard_hand_book_lookup(pht, duc_it)
+                play, ev_list = self.hard_total(pht, duc_it)
                 if play == 'D':
                     use_file = sys.stderr
                 else:
@@ -2049,8 +1283,9 @@ class Book(tk.Frame):
             print(f'{soft_txt:>8} ', end="")
             for duc in range(2, 12):
                 duc_it = eleven_to_one[duc]
-                ev = book[(1, pht - 11, duc_it)][3]
-                if book[(1, pht - 11, duc_it)][0] == 'D':
+                play, ev_list = self.cell(1, pht - 11, duc_it)
+                ev = ev_list[2]
+                if play == 'D':
                     use_file = sys.stderr
                 else:
                     use_file = sys.stdout
@@ -2079,9 +1314,9 @@ class Book(tk.Frame):
             print(f'{pair_txt:>3}, {pair_txt:<3}', end="")
             for duc in range(2, 12):
                 duc_it = eleven_to_one[duc]
-                play, ev_list = self.book_lookup([eleven_to_one[pair_of],
-                                             eleven_to_one[pair_of]],
-                                             duc_it)
+                play, ev_list = self.lookup([eleven_to_one[pair_of],
+                                        eleven_to_one[pair_of]],
+                                        duc_it)
                 ev = ev_list[3]
                 if play == 'P':
                     use_file = sys.stderr
@@ -2093,15 +1328,1089 @@ class Book(tk.Frame):
                     print(f'{ev:9.5}', file=use_file)
                 sys.stdout.flush()
                 sys.stderr.flush()
+        if self.rules.surrender != 'none':
+            # Surrender
+            print(f'\nEV from surrendering ({self.rules.surrender})')
+            print('\n                                      Dealer\'s up card')
+            for duc in range(1, 12):
+                label = NUM_TO_TEXT[duc]
+                if duc == 1:
+                    print(f'        ', end="")
+                else:
+                    if duc == 11:
+                        print(f'{label:>9}')
+                    else:
+                        print(f'{label:>9}', end="")
+
+            for pht in range(4, 21):
+                print(f'{pht:>8} ', end="")
+                for duc in range(2, 12):
+                    duc_it = eleven_to_one[duc]
+                    play, ev_list = self.hard_total(pht, duc_it)
+                    if play == 'R':
+                        use_file = sys.stderr
+                    else:
+                        use_file = sys.stdout
+                    if duc_it != 1:
+                        print(f'{ev_list[4]:9.5}', file=use_file, end="")
+                    else:
+                        print(f'{ev_list[4]:9.5}', file=use_file)
+                    sys.stdout.flush()
+                    sys.stderr.flush()
         print('\n\n')
 
+    def print_eor(self, total_eor):
+        """Outputs the passed effects of removal of the total EV, followed by
+        those of the best play EV of every two card hand."""
+        print('\nEffects of removal: the change in EV from taking one card of '
+              'each value out of the deck.')
+        print(f'{"":>16}', end="")
+        for card in CARD_VALUES:
+            print(f'{NUM_TO_TEXT[card]:>9}', end="")
+        print(f'\n{"Total EV":>16}', end="")
+        for card in CARD_VALUES:
+            print(f'{total_eor[card]:9.5f}', end="")
+        print('\n\nBest play EV of each hand. Split EVs are simulated, so '
+              'pairs show the best of stand, hit, double and surrender. A '
+              'surrender EV is fixed and has no effects of removal.')
+        for fpc in range(1, 11):
+            for spc in range(fpc, 11):
+                for duc in CARD_VALUES:
+                    valid_hand, _ = self.hand_prob(fpc, spc, duc)
+                    if not valid_hand:
+                        continue
+                    play, ev_list = self.no_split_lookup([fpc, spc], duc)
+                    if play == 'R':
+                        eor_list = [0] * 11
+                    else:
+                        eor_list = self.cell_eor(fpc, spc, duc)[EV_INDEX[play]]
+                    hand_txt = f'{NUM_TO_TEXT[fpc]},{NUM_TO_TEXT[spc]} ' + \
+                               f'v {NUM_TO_TEXT[duc]}: {play}'
+                    print(f'{hand_txt:>16}', end="")
+                    for card in CARD_VALUES:
+                        print(f'{eor_list[card]:9.5f}', end="")
+                    print()
+        print('\n')
+
+    def print_pair_diagnostics(self, k=REFINE_Z):
+        """Outputs how well the simulation of each pair cell converged,
+        marking the cells whose margin is within k standard errors of
+        zero."""
+        if not self.pair_diagnostics:
+            print('No pair diagnostics were recorded for this book.')
+            return
+        print(f'\nPair simulations, * where the split vs non-split margin is '
+              f'within {k} standard errors')
+        for pair_of in CARD_VALUES:
+            for duc in CARD_VALUES:
+                diagnostics = self.cell_diagnostics(pair_of, duc)
+                if diagnostics is None:
+                    continue
+                events = ' '.join(f'{event}:{chance:.4f}' for event, chance
+                                  in diagnostics.events.items())
+                mark = '*' if diagnostics.shaky(k) else ' '
+                print(f'{mark}{NUM_TO_TEXT[pair_of]},{NUM_TO_TEXT[pair_of]} '
+                      f'v {NUM_TO_TEXT[duc]}: {diagnostics.hands:>8} hands  '
+                      f'split {diagnostics.split_ev:9.5f}  '
+                      f'{diagnostics.nonsplit_play} '
+                      f'{diagnostics.nonsplit_ev:9.5f}  margin '
+                      f'{diagnostics.margin:8.5f} +/- '
+                      f'{diagnostics.std_error:.5f}  {events}')
+        print()
+
+    # Files
+
+    def state(self):
+        """Returns the book as a dict of plain values, as it is saved."""
+        state = {'format': BOOK_FORMAT,
+                 'deck': self.deck,
+                 'rules': list(self.rules),
+                 'seed': self.seed,
+                 'plays': self.plays.tobytes(),
+                 'evs': [evs.tobytes() for evs in self.evs]}
+        if self.eors is not None:
+            state['eors'] = self.eors.tobytes()
+        if self.split_dists:
+            state['split_dists'] = self.split_dists
+        if self.pair_diagnostics:
+            state['pair_diagnostics'] = {
+                    index: tuple(diagnostics)
+                    for index, diagnostics in self.pair_diagnostics.items()}
+        return state
+
+    def save(self, filename):
+        """Saves the book to the passed file."""
+        with open(filename, "wb") as f:
+            pickle.dump(self.state(), f)
+
+    @classmethod
+    def from_state(cls, state):
+        """Returns the book held in a dict made by state()."""
+        if state.get('format') not in READ_BOOK_FORMATS:
+            raise ValueError(f'Unknown book format: {state.get("format")}')
+        table = cls(state['deck'], Rules(*state['rules']), state['seed'])
+        table.plays = array('B', state['plays'])
+        for evs, data in zip(table.evs, state['evs']):
+            evs[:] = array('d', data)
+        if 'eors' in state:
+            table.eors = array('d', state['eors'])
+        table.split_dists = dict(state.get('split_dists', {}))
+        table.pair_diagnostics = {
+                index: PairDiagnostics(*diagnostics)
+                for index, diagnostics
+                in state.get('pair_diagnostics', {}).items()}
+        return table
+
+    @classmethod
+    def load(cls, filename):
+        """Returns the book saved in the passed file. Books saved as a dict
+        of cells by older versions are converted."""
+        with open(filename, "rb") as f:
+            state = pickle.load(f)
+
+        if 'book_deck' in state:
+            # Books saved before the seed was recorded used the random
+            # module.
+            table = cls(state['book_deck'], Rules(*state['rules']),
+                        state.get('seed', SIM_SEED))
+            for key, value in state.items():
+                if isinstance(key, tuple):
+                    table.set_cell(*key, value[0], value[1:])
+            return table
+        return cls.from_state(state)
+
+
+class TotalEVLedger:
+    """The total EV of a book and the cost of play deviations from it, as
+    get_total_ev gives them, kept up to date as the play of one hand
+    changes. The chance and book play EV of every dealt hand are held, with
+    the EV and cost of each hand played otherwise, so changing a play only
+    sums the deviations again, not the whole game. The book must not change
+    while the ledger is used."""
+
+    def __init__(self, book, display_play=None, take_even_money=False,
+                 take_insurance=False):
+        self.book = book
+        self.take_even_money = take_even_money
+        self.take_insurance = take_insurance
+        # The chance and book play EV of each dealt hand, by (fpc, spc,
+        # duc), and the EV and deviation cost of those played otherwise.
+        self.hands = {}
+        self.deviations = {}
+        self.book_ev = 0
+        for fpc in range(1, 11):
+            for spc in range(1, 11):
+                for duc in range(1, 11):
+                    valid_hand, chance = book.hand_prob(fpc, spc, duc)
+                    if not valid_hand:
+                        continue
+                    hand_ev, _ = book.hand_ev(fpc, spc, duc, None,
+                                              take_even_money, take_insurance)
+                    self.hands[(fpc, spc, duc)] = (chance, hand_ev)
+                    self.book_ev += chance * hand_ev
+                    if display_play is not None:
+                        self.set_play(fpc, spc, duc,
+                                      display_play(fpc, spc, duc), False)
+        self.total()
+
+    def set_play(self, fpc, spc, duc, play, update=True):
+        """Sets the play made for a dealt hand, None for the book play, and
+        unless update is False brings the totals up to date."""
+        if (fpc, spc, duc) not in self.hands:
+            return
+        hand_ev, deviation_cost = self.book.hand_ev(
+                fpc, spc, duc, play, self.take_even_money,
+                self.take_insurance)
+        if deviation_cost is None:
+            self.deviations.pop((fpc, spc, duc), None)
+        else:
+            self.deviations[(fpc, spc, duc)] = (hand_ev, deviation_cost)
+        if update:
+            self.total()
+
+    def total(self):
+        """Sums the book play total EV and the deviations into total_ev and
+        deviation_cost."""
+        self.total_ev = self.book_ev
+        self.deviation_cost = 0
+        for hand, (hand_ev, deviation_cost) in self.deviations.items():
+            chance, book_hand_ev = self.hands[hand]
+            self.total_ev += chance * (hand_ev - book_hand_ev)
+            self.deviation_cost += chance * deviation_cost
+
+
+# Count based play
+
+#   The finite deck recursion works on count vectors, tuples of card counts
+#   indexed by card as made by deck_counts, so that hands which reach the same
+#   totals from the same remaining cards share their results. A count vector
+#   of None stands for the infinite deck.
+
+# Dealer outcome distributions hold the chances of the dealer ending on 17,
+# 18, 19, 20 and 21, and of busting, in that order.
+DEALER_BUST = 5
+
+DEALER_STAND_DISTS = {17:(1, 0, 0, 0, 0, 0),
+                      18:(0, 1, 0, 0, 0, 0),
+                      19:(0, 0, 1, 0, 0, 0),
+                      20:(0, 0, 0, 1, 0, 0),
+                      21:(0, 0, 0, 0, 1, 0),
+                      22:(0, 0, 0, 0, 0, 1)}
+
+ZERO_DIST = (0, 0, 0, 0, 0, 0)
+
+ZERO_GRAD = (0,) * 11
+
+# The derivatives of a dealer outcome distribution are kept in one flat
+# list, card by card, with the six outcomes of a card at card * 6.
+ZERO_DIST_GRAD = ZERO_DIST * 11
+
+# Draw exclusions for the dealer down card, which can't make a dealer
+# blackjack after the peek.
+DDC_EXCLUDE = {1:10, 10:1}
+
+# The dealer up card at which EOR approximated hands are checked against
+# their exact EVs.
+EOR_CHECK_DUC = 10
+
+# Composition dependent EV gains smaller than this aren't listed.
+CD_GAIN_MIN = 5e-6
+
+
+def add_card(total, hard_or_soft, card):
+    """Returns the best total, and whether it is hard or soft, after adding a
+    card to a hand with the passed best total."""
+    if hard_or_soft == 'soft':
+        total += card
+        if total > 21:
+            return total - 10, 'hard'
+        return total, 'soft'
+    if card == 1 and total <= 10:
+        return total + 11, 'soft'
+    return total + card, 'hard'
+
+
+def load_kernel():
+    """Returns the bookmaker_kernel module if Numba is installed to compile
+    it, otherwise None. It is only imported when a build first wants it, as
+    Numba is slow to load."""
+    try:
+        import bookmaker_kernel
+    except ImportError:
+        return None
+    if not bookmaker_kernel.AVAILABLE:
+        return None
+    return bookmaker_kernel
+
+
+def remove_card(counts, card):
+    """Returns the count vector left after drawing a card."""
+    if counts is None:
+        return None
+    return counts[:card] + (counts[card] - 1,) + counts[card + 1:]
+
+
+def draw_probs(counts):
+    """Returns a list of (card, probability, count vector after the draw)
+    for each card that can be drawn from the count vector."""
+    if counts is None:
+        return [(card, prob, None) for card, prob in ONE_DECK_DIST.items()]
+    size = sum(counts)
+    draws = []
+    for card in range(1, 11):
+        if counts[card] > 0:
+            draws.append((card, counts[card] / size,
+                          remove_card(counts, card)))
+    return draws
+
+
+def dealer_bj_chance(duc, counts):
+    """Returns the chance that the ddc drawn from the count vector gives
+    the dealer a blackjack."""
+    if duc not in DDC_EXCLUDE:
+        return 0
+    if counts is None:
+        return ONE_DECK_DIST[DDC_EXCLUDE[duc]]
+    return counts[DDC_EXCLUDE[duc]] / sum(counts)
+
+
+def stand_ev(pht, dealer_dist):
+    """Returns the EV of standing on a player hand total against a dealer
+    outcome distribution. Also turns the derivatives of a distribution into
+    those of the stand EV."""
+    ev = dealer_dist[DEALER_BUST]
+    for outcome, dht in enumerate(range(17, 22)):
+        if pht > dht:
+            ev += dealer_dist[outcome]
+        elif pht < dht:
+            ev -= dealer_dist[outcome]
+    return ev
+
+
+# Outcome distributions
+
+#   The chances of the net results of a hand or round are kept as a dict of
+#   chances keyed by the units won, such as {-1: 0.5, 0: 0.1, 1: 0.4} for a
+#   stand. Split hands can win or lose up to two units a hand.
+
+def stand_dist(pht, dealer_dist):
+    """Returns the outcome distribution of standing on a player hand total
+    against a dealer outcome distribution."""
+    win = dealer_dist[DEALER_BUST]
+    lose = 0
+    for outcome, dht in enumerate(range(17, 22)):
+        if pht > dht:
+            win += dealer_dist[outcome]
+        elif pht < dht:
+            lose += dealer_dist[outcome]
+    return {-1: lose, 0: 1 - win - lose, 1: win}
+
+
+def add_dist(dist, other, weight=1, scale=1, shift=0):
+    """Adds the chances of another outcome distribution to a distribution,
+    times weight, with the units of the other scaled by scale and moved by
+    shift."""
+    for units, chance in other.items():
+        units = units * scale + shift
+        dist[units] = dist.get(units, 0) + weight * chance
+
+
+def dist_moments(dist):
+    """Returns the mean, variance and skewness of an outcome distribution.
+    The skewness of a distribution with no spread is 0."""
+    mean = sum(units * chance for units, chance in dist.items())
+    variance = sum(chance * (units - mean) ** 2
+                   for units, chance in dist.items())
+    third_moment = sum(chance * (units - mean) ** 3
+                       for units, chance in dist.items())
+    if variance <= 0:
+        return mean, 0, 0
+    return mean, variance, third_moment / variance ** 1.5
+
+
+def new_split_outcomes():
+    """Returns empty sums for the outcomes of simulated splits: the number
+    of runs, counts of each round result and each total bet, and the sums
+    of the results of the first two hands, of their product and of their
+    squares."""
+    return {'runs': 0, 'results': {}, 'bets': {}, 'sums': [0, 0, 0, 0, 0]}
+
+
+def add_split_outcome(outcomes, hand_results):
+    """Adds the (bet, result) of each hand of a simulated split to the
+    split outcome sums."""
+    result = sum(hand_result for _, hand_result in hand_results)
+    bet = sum(hand_bet for hand_bet, _ in hand_results)
+    first, second = hand_results[0][1], hand_results[1][1]
+    outcomes['runs'] += 1
+    outcomes['results'][result] = outcomes['results'].get(result, 0) + 1
+    outcomes['bets'][bet] = outcomes['bets'].get(bet, 0) + 1
+    sums = outcomes['sums']
+    sums[0] += first
+    sums[1] += second
+    sums[2] += first * second
+    sums[3] += first * first
+    sums[4] += second * second
+
+
+def split_dist_of(outcomes):
+    """Returns the outcome distribution of the simulated splits, the
+    distribution of their total bet, and the covariance of the results of
+    the first two hands."""
+    runs = outcomes['runs']
+    dist = {result: count / runs
+            for result, count in sorted(outcomes['results'].items())}
+    bets = {bet: count / runs
+            for bet, count in sorted(outcomes['bets'].items())}
+    first_sum, second_sum, product_sum, _, _ = outcomes['sums']
+    covariance = product_sum / runs - first_sum * second_sum / runs ** 2
+    return dist, bets, covariance
+
+
+def crn_difference(count, split_mean, nonsplit_mean, split_m2, nonsplit_m2,
+                   co_m2, nonsplit_ev, control=True):
+    """Returns the split minus non-split EV difference of a common random
+    numbers pair simulation, with the simulated non-split result as a
+    control variate, and its standard error. The control variate needs
+    nonsplit_ev to be the expectation of the simulated non-split result;
+    where it isn't, control is passed False and the difference is taken
+    from the split result alone."""
+    if control and nonsplit_m2 > 0:
+        beta = co_m2 / nonsplit_m2
+    else:
+        beta = 0
+    diff_mean = split_mean - nonsplit_ev - \
+            beta * (nonsplit_mean - nonsplit_ev)
+    diff_variance = (split_m2 - beta * co_m2) / (count - 1)
+    return diff_mean, sqrt(max(diff_variance, 0) / count)
+
+
+class PairDiagnostics(namedtuple('PairDiagnostics',
+                                 ['hands', 'split_ev', 'std_error',
+                                  'nonsplit_play', 'nonsplit_ev', 'events'])):
+    """How well the simulation of a pair cell converged: the hands
+    simulated, the split EV and the standard error of its margin over the
+    best non-split play, that play and its exact EV, and the chance of each
+    split event. An event spells the second cards of the split hands in
+    the order drawn, 'p' for a pair card that starts a new hand and 'm' for
+    any other."""
+
+    __slots__ = ()
+
+    @property
+    def margin(self):
+        """The split EV less the best non-split EV."""
+        return self.split_ev - self.nonsplit_ev
+
+    @property
+    def z(self):
+        """The margin in standard errors."""
+        if self.std_error == 0:
+            return inf if self.margin else 0
+        return self.margin / self.std_error
+
+    def shaky(self, k=REFINE_Z):
+        """Returns whether the margin is within k standard errors of zero,
+        so that the simulation may have picked the wrong play."""
+        return abs(self.z) < k
+
+
+class SplitStats:
+    """Counts of the events of the simulated splits of a pair cell, see
+    PairDiagnostics, with how often the ddc was a pair card and, for the
+    splits settled after the dealer's turn, the sums of the results of each
+    hand. Every pair simulation keeps its own, so builds in other threads
+    don't share them."""
+
+    def __init__(self):
+        self.events = {}
+        self.ddc_is_pair_card = {}
+        self.settled = {}
+        self.result_sums = {}
+
+    def add_split(self, event, ddc_is_pair_card):
+        """Counts the event of a split once the player's turn is over."""
+        self.events[event] = self.events.get(event, 0) + 1
+        if ddc_is_pair_card:
+            self.ddc_is_pair_card[event] = \
+                    self.ddc_is_pair_card.get(event, 0) + 1
+
+    def add_results(self, event, results):
+        """Adds the results of the hands of a split settled after the
+        dealer's turn."""
+        self.settled[event] = self.settled.get(event, 0) + 1
+        sums = self.result_sums.setdefault(event, [0] * len(results))
+        for index, result in enumerate(results):
+            sums[index] += result
+
+    def print_stats(self, hands):
+        """Outputs the chance of each event in the passed number of
+        simulated hands, the mean result of each of its hands and the chance
+        the ddc was a pair card."""
+        for event, count in sorted(self.events.items()):
+            print(f'Event: {event} prob: {count / hands}')
+        for event, sums in sorted(self.result_sums.items()):
+            print(f'{event}_ev_list: '
+                  f'{[summ / self.settled[event] for summ in sums]}')
+        ddc_is_pc_chance = {event: self.ddc_is_pair_card.get(event, 0) / count
+                            for event, count in sorted(self.events.items())}
+        print(f'ddc_is_pc_chance: {ddc_is_pc_chance}')
+
+
+# The book builder
+class BookBuilder:
+    """Builds a BookTable for a rule set and deck without any GUI, so that
+    books can be made by the application, a script or the job server. Build
+    progress is passed to the optional progress callable as
+    (event, card_list, hand_type), with event one of 'start' or 'done'.
+
+    With a checkpoint file, the finished steps of a build, the book and the
+    partial sums of the pair simulation under way are saved as it goes, so
+    that resume() can carry on a build that was stopped."""
+
+    def __init__(self, rules, deck, seed=SIM_SEED, book=None, progress=None,
+                 checkpoint_file=None, **options):
+        """Initialize the builder. If no book is passed an empty one is made
+        for the rules and deck. The options are those of set_options."""
+        self.rules = Rules(*rules)
+        self.deck = list(deck)
+        self.seed = seed
+        self.rng = CounterRNG(self.seed)
+        if book is None:
+            book = BookTable(self.deck, self.rules, self.seed)
+        self.book = book
+        self.progress = progress
+        self.checkpoint_file = checkpoint_file
+        self.checkpoint_time = time.monotonic()
+        # Steps are (hand_type, total, duc) tuples, the unit of progress.
+        self.done_steps = set()
+        # The partial pair simulation a resumed build starts from.
+        self.pair_sim = None
+        self.eor_errors = {}
+        self.set_options(**options)
+        self.reset_tables()
+
+    def set_options(self, shuffled_shoe=False, crn=False, eor_approx=False,
+                    composition_dependent=False, take_even_money=False,
+                    take_insurance=False, native_kernel=True):
+        """Sets the build and simulation choices that aren't rules of the
+        game. native_kernel uses the compiled kernel of bookmaker_kernel.py
+        for finite decks when Numba is installed."""
+        self.shuffled_shoe = shuffled_shoe
+        self.crn = crn
+        self.eor_approx = eor_approx
+        self.composition_dependent = composition_dependent
+        self.take_even_money = take_even_money
+        self.take_insurance = take_insurance
+        self.native_kernel = native_kernel
+
+    def get_options(self):
+        """Returns the choices made by set_options as keyword arguments."""
+        return {'shuffled_shoe': self.shuffled_shoe,
+                'crn': self.crn,
+                'eor_approx': self.eor_approx,
+                'composition_dependent': self.composition_dependent,
+                'take_even_money': self.take_even_money,
+                'take_insurance': self.take_insurance,
+                'native_kernel': self.native_kernel}
+
+    def report_progress(self, event, card_list, hand_type):
+        """Passes a build progress event to the progress callable."""
+        if self.progress is not None:
+            self.progress(event, card_list, hand_type)
+
+    def build(self):
+        """Builds every cell of the book, non-pair hands first as the pair
+        hands are played from them. Steps a resumed build has already done
+        are only reported. The checkpoint file is removed once the book is
+        finished."""
+        self.build_hands()
+        self.build_pairs()
+
+    def build_hands(self):
+        """Builds the hard and soft total cells of the book, every cell but
+        the pairs."""
+        self.reset_tables()
+        self.eor_errors = {}
+        for pht in range(21, 10, -1):
+            for duc in CARD_VALUES:
+                self.build_step('hard', pht, duc)
+        for phs in range(21, 11, -1):
+            for duc in CARD_VALUES:
+                self.build_step('soft', phs, duc)
+        for pht in range(10, 3, -1):
+            for duc in CARD_VALUES:
+                self.build_step('hard', pht, duc)
+
+    def build_pairs(self):
+        """Builds, or re-builds, the pair hands of the book with the
+        builder's seed."""
+        self.book.seed = self.seed
+        self.rng = CounterRNG(self.seed)
+        for pair_of_11 in range(11, 1, -1):
+            if pair_of_11 == 11:
+                pair_of = 1
+            else:
+                pair_of = pair_of_11
+            for duc in CARD_VALUES:
+                self.build_step('pair', pair_of, duc)
+        self.done_steps = set()
+        if self.checkpoint_file is not None and \
+           os.path.exists(self.checkpoint_file):
+            os.remove(self.checkpoint_file)
+
+    def refine_pairs(self, k=REFINE_Z, extra_hands=REFINE_HANDS):
+        """Simulates again the pair cells of the book whose split vs
+        non-split margin is within k standard errors of zero, each with
+        extra_hands more hands than it had. A cell draws from its own stream
+        of the book seed, so it starts with the hands of its last run and
+        ends as one longer run would. No checkpoint is kept. Returns the
+        refined cells as a list of (pair_of, duc)."""
+        shaky = self.book.shaky_pairs(k)
+        checkpoint_file = self.checkpoint_file
+        self.checkpoint_file = None
+        try:
+            for pair_of, duc, diagnostics in shaky:
+                card_list = [pair_of, pair_of, duc]
+                self.report_progress('start', card_list, 'pair')
+                rng = CounterRNG(self.book.seed).spawn(pair_of, duc)
+                self.pair_hand_builder(
+                        pair_of, duc, self.deck, rng,
+                        min(diagnostics.hands + extra_hands, SIM_MAX))
+                self.report_progress('done', card_list, 'pair')
+        finally:
+            self.checkpoint_file = checkpoint_file
+        return [(pair_of, duc) for pair_of, duc, _ in shaky]
+
+    def build_step(self, hand_type, total, duc):
+        """Builds the cells of a hard or soft total, or a pair, against a
+        dealer up card."""
+        if hand_type == 'hard':
+            card_list = [*HARD_HAND_COMP[total][0], duc]
+        elif hand_type == 'soft':
+            card_list = [1, total - 11, duc]
+        else:
+            card_list = [total, total, duc]
+        step = (hand_type, total, duc)
+        if step not in self.done_steps:
+            if hand_type == 'hard':
+                self.hard_total_builder(total, duc, self.deck)
+            elif hand_type == 'soft':
+                self.report_progress('start', card_list, hand_type)
+                self.hand_builder(1, total - 11, duc, self.deck)
+            else:
+                self.report_progress('start', card_list, hand_type)
+                self.pair_hand_builder(total, duc, self.deck)
+            self.done_steps.add(step)
+            self.checkpoint()
+        self.report_progress('done', card_list, hand_type)
+
+    def checkpoint(self, pair_sim=None):
+        """Saves the build to the checkpoint file, if there is one and
+        CHECKPOINT_SECONDS have passed since the last save. pair_sim holds
+        the partial sums and shoe state of a pair simulation under way. The
+        file is replaced in one step, so a build stopped while saving keeps
+        the previous checkpoint."""
+        if self.checkpoint_file is None or \
+           time.monotonic() - self.checkpoint_time < CHECKPOINT_SECONDS:
+            return
+        state = {'format': CHECKPOINT_FORMAT,
+                 'book': self.book.state(),
+                 'options': self.get_options(),
+                 'done_steps': sorted(self.done_steps),
+                 'pair_sim': pair_sim}
+        temp_file = self.checkpoint_file + '.tmp'
+        with open(temp_file, "wb") as f:
+            pickle.dump(state, f)
+        os.replace(temp_file, self.checkpoint_file)
+        self.checkpoint_time = time.monotonic()
+
+    @classmethod
+    def resume(cls, filename, rules, deck, progress=None):
+        """Returns a builder that carries on the build saved in a checkpoint
+        file, checkpointing to the same file. Raises ValueError if the
+        checkpoint wasn't made for the passed rules and deck. The seed and
+        options are those of the checkpoint."""
+        with open(filename, "rb") as f:
+            state = pickle.load(f)
+        if state.get('format') != CHECKPOINT_FORMAT:
+            raise ValueError(f'{filename} is not a build checkpoint.')
+        book = BookTable.from_state(state['book'])
+        if book.rules != Rules(*rules):
+            raise ValueError(f'The checkpoint was made with the rules '
+                             f'{book.rules}, not {Rules(*rules)}.')
+        if sorted(book.deck) != sorted(deck):
+            raise ValueError('The checkpoint was made with a different '
+                             'deck.')
+        builder = cls(book.rules, book.deck, book.seed, book=book,
+                      progress=progress, checkpoint_file=filename,
+                      **state['options'])
+        builder.done_steps = set(state['done_steps'])
+        builder.pair_sim = state['pair_sim']
+        return builder
+
+    def blackjack_chance(self, deck=None):
+        """Returns the chance of getting a blackjack from the passed deck."""
+        if self.rules.deck_choice == 'infinite':
+            return 2 * ONE_DECK_DIST[1] * ONE_DECK_DIST[10]
+        else:
+            deck_dist = get_card_dist(deck)
+            return 2 * deck_dist[1] * deck_dist[10]
+        
+    def double_check(self, play, player_card_list, duc, split=False):
+        """Checks whether the rules allow a double. If the passed play is not 
+        a double, it is just returned. If it is a double, a double is returned 
+        if the rules allow double, otherwise the best play between 'S' and 'H' 
+        is returned. The passed split argument indicates whether the current 
+        player_card_list is part of a split hand. This is important to know in 
+        case double after split is disallowed. A surrender, which is only
+        offered on the first two cards of an unsplit hand, is likewise
+        replaced by the best of 'S', 'H' and 'D' on any other hand. As with
+        lookup(), player_card_list can be a HandState."""
+        
+        hand = hand_state_of(player_card_list)
+        if play == 'R' and (hand.cards > 2 or split):
+            _, ev_list = self.book.lookup(hand, duc)
+            play = best_play_of(ev_list, 'SHD')
+        if play == 'D':
+            pht, hard_or_soft = hand.total, hand.hard_or_soft
+            if ((hand.cards >= 2 and \
+                 self.rules.double == "any hand") or \
+               hand.cards == 2 and \
+                double_offered(self.rules.double, pht, hard_or_soft)) and \
+               (split == False or (split == True and self.rules.das)):
+                best_play = 'D'
+            else:
+                # Double not ok, so return the best play between 'S' and 'H'
+                _, ev_list = self.book.lookup(hand, duc)
+                if ev_list[0] > ev_list[1]:
+                    best_play = 'S'
+                else:
+                    best_play = 'H'
+            return best_play
+        else:
+            return play
+                
+    # High Level Functions
+
+    def make_shoe(self, deck, dealt_cards, rng):
+        """Returns a shoe for the passed deck with the dealt cards removed.
+        Finite decks use a ShuffledShoe when that option is set, otherwise a
+        RankShoe."""
+        if self.rules.deck_choice == 'infinite':
+            return RankShoe(deck_counts(ONE_DECK), rng, infinite=True)
+        counts = deck_counts(deck)
+        for card in dealt_cards:
+            counts[card] -= 1
+        if self.shuffled_shoe:
+            return ShuffledShoe(counts, rng)
+        return RankShoe(counts, rng)
+
+    def sim_play(self, fpc, spc, duc, play, allow_bj, deck=None, rng=None,
+                 shoe=None, hand_results=None, split_stats=None):
+        """plays the given hand and returns its ev. Cards are drawn from the
+        passed shoe, which must already have fpc, spc and duc removed. If no
+        shoe is passed, one is made from deck and rng (or self.rng). Under
+        ENHC a dealer blackjack is settled after the player's turn, and a
+        hand played given no dealer blackjack (allow_bj False) is charged
+        extra_bet_cost for each bet beyond the first, like the book EVs.
+        The (bet, result) of each hand that is settled after the player's
+        turn, as every split hand is, is appended to any hand_results
+        list passed, without insurance or extra_bet_cost. A split is
+        counted in any SplitStats passed."""
+        
+        if shoe is None:
+            if rng is None:
+                rng = self.rng
+            shoe = self.make_shoe(deck, [fpc, spc, duc], rng)
+
+        # Hands are followed by their interned states, with the card lists
+        # kept for composition dependent play.
+        empty_hand = hand_state()
+        hand = empty_hand.add(fpc).add(spc)
+        pht = hand.total
+
+        if pht == 21:
+            player_bj = True
+        else:
+            player_bj = False
+
+
+        total_ev = 0
+        if allow_bj == False:
+            extra_bet_cost = self.extra_bet_cost(
+                    duc, self.deal_counts(fpc, spc, duc))
+        else:
+            extra_bet_cost = 0
+
+        if allow_bj == False and duc == 1:
+            # We don't want to allow a dealer blackjack here because we are
+            # simulating play assuming the dealer didn't already get one.        
+            ddc = shoe.draw(exclude=10, dealer=True)
+        elif allow_bj == False and duc == 10:
+            ddc = shoe.draw(exclude=1, dealer=True)
+        else:
+            ddc = shoe.draw(dealer=True)
+
+        dealer_hand = empty_hand.add(duc).add(ddc)
+        dht = dealer_hand.total
+
+
+        # Deal with BJs
+        if dht == 21:
+            dealer_bj = True
+        else:
+            dealer_bj = False
+
+        assert not (dealer_bj and not allow_bj)
+
+        if allow_bj == True and play == 'R' and \
+               self.rules.surrender == 'early':
+            # Early surrender comes before the dealer peeks.
+            return -0.5
+
+        if allow_bj == True:
+            if player_bj:
+                if duc == 1:
+                    if self.take_even_money:
+                        return 1
+                    else:
+                        if dealer_bj:
+                            return 0
+                        else:
+                            return BLACKJACK_PAY[self.rules.fullpay]
+                elif dealer_bj:
+                    return 0
+                else:
+                    return BLACKJACK_PAY[self.rules.fullpay]
+            else:
+                if duc == 1:
+                    if self.take_insurance:
+                        if dealer_bj:
+                            total_ev += 1
+                        else:
+                            total_ev -= 0.5
+                if dealer_bj and self.rules.peek != 'enhc':
+                    # The dealer peeks, or takes the original bet only.
+                    return total_ev - 1
+                
+        # No dealer or player BJ past here, but for a dealer BJ under ENHC,
+        # which takes the bets once the player's turn is done.
+        if play == 'R':
+            if dealer_bj:
+                return total_ev - 1
+            return total_ev + self.surrender_ev(fpc, spc, duc)
+
+        if play == 'S':
+            hands_result = [pht]
+            bet_multiplier = [1]
+
+        # No need to check if double is allowed here, since play was 
+        # explicitly called with it.
+        elif play == 'D':
+            player_hands =[[fpc, spc]]
+            double_card = shoe.draw()
+
+            player_hands[0].append(double_card)
+            pht = hand.double(double_card).total
+            bet_multiplier = [2]
+            if pht >= 22:
+                return total_ev - 2 - extra_bet_cost
+
+            hands_result = [pht]
+                     
+        elif play == 'H':
+            player_hands =[[fpc, spc]]
+            book_play = 'H'
+            bet_multiplier = [1]
+            while book_play != 'S':
+                hit_card = shoe.draw()
+
+                player_hands[0].append(hit_card)
+                hand = hand.add(hit_card)
+                pht = hand.total
+                
+                if pht >= 22:
+                    return total_ev - 1
+                book_play = self.sim_hand_play(player_hands[0], duc, [],
+                                               hand=hand)
+                if book_play == 'D':
+                    double_card = shoe.draw()
+                    player_hands[0].append(double_card)
+                    hand = hand.double(double_card)
+                    pht = hand.total
+                    bet_multiplier[0] += 1
+                    book_play = 'S'
+            hands_result = [pht]
+            
+            
+        elif play == 'P':
+        
+            assert fpc == spc
+            max_split_hands = self.rules.msh
+            if fpc == 1 and not self.rules.rsa:
+                max_split_hands = 2
+
+            player_hands = [[fpc],[spc]]
+            hands_result = []
+            bet_multiplier = []
+            current_hand = 0
+            player_turn_done = False
+            event = ''
+            
+            while not player_turn_done:
+                draw_card = shoe.draw()
+                # Add additional split cards to a new hand if we get an
+                # additional split card and are not already at max split hands.
+                while draw_card == fpc and len(player_hands) < max_split_hands:
+                    event += 'p'
+                    player_hands.append([draw_card])
+                    draw_card = shoe.draw()
+                # This draw_card is ALWAYS the second card to the current
+                # split hand.           
+                    
+                if len(event) < 4 and event.count('p') < 2 and \
+                   (max_split_hands != 3 or event.count('p') == 0):
+                    event += 'm'
+
+                player_hands[current_hand].append(draw_card)
+                hand = empty_hand.add(fpc).add(draw_card)
+                pht = hand.total
+                # We assume a normal non-double hand. 
+                # If we get to double later on, we add 1 to this.
+                bet_multiplier.append(1)
+                            
+                if fpc == 1 and not self.rules.hsa:
+                    pass     
+                else:       
+                    book_play, _ = self.book.no_split_lookup(hand, duc)
+                    # Deal with double opportunity, and with a surrender,
+                    # which isn't offered after a split.
+                    book_play = self.double_check(book_play, hand, duc, True)
+                    assert book_play in ['S', 'H', 'D']
+                    if book_play == 'D':
+                        bet_multiplier[current_hand] += 1
+                        double_card = shoe.draw()
+                        player_hands[current_hand].append(double_card)
+                        pht = hand.double(double_card).total
+                    else:
+                        # Either hit or stand
+                        while book_play != 'S':                      
+                            draw_card = shoe.draw()
+                            player_hands[current_hand].append(draw_card)
+                            hand = hand.add(draw_card)
+                            pht = hand.total
+                            if pht > 21:
+                                book_play = 'S'
+                            else:
+                                seen_cards = [
+                                        card 
+                                        for index, hand in 
+                                        enumerate(player_hands)
+                                        if index != current_hand
+                                        for card in hand]
+                                book_play = self.sim_hand_play(
+                                        player_hands[current_hand],
+                                        duc,
+                                        seen_cards,
+                                        True,
+                                        hand
+                                        )
+                                if book_play == 'D':
+                                    bet_multiplier[current_hand] += 1
+                                    double_card = shoe.draw()
+                                    player_hands[current_hand].append(
+                                            double_card
+                                            )
+                                    pht = hand.double(double_card).total
+                                    book_play = 'S'
+                            
+                
+                hands_result.append(pht)
+                current_hand += 1   
+                if current_hand >= len(player_hands):
+                    player_turn_done = True
+
+        if play == 'P':
+            if DEBUG >= 2:
+                if max_split_hands == 2:
+                    assert event in ['mm']
+                elif max_split_hands == 3:
+                    assert event in ['mm', 'p', 'mp']
+                elif max_split_hands == 4:
+                    assert event in  ['mm', 'pmmm', 'mpmm', 'pp', 
+                                     'pmp', 'mpp', 'mpmp', 'pmmp']
+            if split_stats is not None:
+                split_stats.add_split(event, ddc == fpc)
+        
+        if dealer_bj:
+            if hand_results is not None:
+                hand_results.extend((bet, -bet) for bet in bet_multiplier)
+            return total_ev - sum(bet_multiplier)
+
+        # Now dealer turn
+        while (dealer_hand.total == 17 and \
+               dealer_hand.hard_or_soft == 'soft' and \
+               self.rules.dhs17) or (dealer_hand.total < 17):
+            dealer_hand = dealer_hand.add(shoe.draw(dealer=True))
+        dht = dealer_hand.total
+
+        total_ev_list = []
+        for index, pht in enumerate(hands_result):
+            assert bet_multiplier[index] == 1 or bet_multiplier[index] == 2
+            # Player busts first
+            if pht > 21:
+                total_ev_list.append(bet_multiplier[index] * (-1))
+            elif dht > 21:
+                total_ev_list.append(bet_multiplier[index])
+            elif pht > dht:
+                total_ev_list.append(bet_multiplier[index])
+            elif dht > pht:
+                total_ev_list.append(bet_multiplier[index] * (-1))
+            else:
+                total_ev_list.append(0)    
+  
+        if play == 'P' and split_stats is not None:
+            split_stats.add_results(event, total_ev_list)
+
+        if hand_results is not None:
+            hand_results.extend(zip(bet_multiplier, total_ev_list))
+        # total_ev holds the cost of any insurance bet.
+        return total_ev + sum(total_ev_list) - \
+               extra_bet_cost * (sum(bet_multiplier) - 1)
+
+    def sim_hand_play(self, player_card_list, duc, seen_cards, split=False,
+                      hand=None):
+        """Returns the play for a simulated hand after its first decision.
+        With composition dependent play set, hands of three or more cards
+        from a finite deck are played on the exact cards left, otherwise the
+        book play is used. The HandState of the cards is passed as hand when
+        the caller has it."""
+        if hand is None:
+            hand = hand_state_of(player_card_list)
+        if hand.cards >= 3 and self.composition_dependent and \
+           self.book.rules.deck_choice != 'infinite':
+            return self.cd_play(player_card_list, duc, seen_cards, split,
+                                hand)
+        book_play, _ = self.book.no_split_lookup(hand, duc)
+        return self.double_check(book_play, hand, duc, split)
+
+    def sim_total_ev(self, display_play=None, hands=SIM_TOTAL_HANDS):
+        """Simulates whole rounds, playing the displayed plays, and returns
+        the average result with its standard error. Used as a check on
+        get_total_ev."""
+        # Stream 0 is not used by any pair cell.
+        shoe = self.make_shoe(self.deck, [], 
+                              CounterRNG(self.seed).spawn(0))
+        result_sum = 0
+        result_square_sum = 0
+        for _ in range(hands):
+            shoe.new_hand()
+            fpc = shoe.draw()
+            spc = shoe.draw()
+            duc = shoe.draw(dealer=True)
+            if display_play:
+                play = display_play(fpc, spc, duc)
+            else:
+                play = self.book.book_play(fpc, spc, duc)
+            result = self.sim_play(fpc, spc, duc, play, True, shoe=shoe)
+            result_sum += result
+            result_square_sum += result * result
+        mean = result_sum / hands
+        variance = result_square_sum / hands - mean * mean
+        return mean, sqrt(variance / hands)
+
+    def build_eors(self):
+        """Finds the effects of removal of the stand, hit and double EVs of
+        every book cell. They come from the derivatives carried through the
+        memoized count based recursion, so all ten cards cost about as much
+        as a few builds rather than ten. Raises ValueError for an infinite
+        deck."""
+        if self.rules.deck_choice == 'infinite':
+            raise ValueError('Taking a card out of an infinite deck has no '
+                             'effect. Effects of removal need a finite or '
+                             'custom deck.')
+        for fpc in range(1, 11):
+            for spc in range(fpc, 11):
+                for duc in range(1, 11):
+                    valid_hand, _ = self.book.hand_prob(fpc, spc, duc)
+                    if not valid_hand:
+                        self.book.set_cell_eor(fpc, spc, duc, [[0] * 11] * 3)
+                        continue
+                    counts = list(self.book.counts)
+                    for card in [fpc, spc, duc]:
+                        counts[card] -= 1
+                    _, grads = self.cell_ev_grad(fpc, spc, duc, tuple(counts))
+                    self.book.set_cell_eor(fpc, spc, duc,
+                                      [[-dev for dev in grad] 
+                                       for grad in grads])
+
     def hand_builder(self, fpc, spc, duc, deck=None):
         """Creates book entries for the passed hand. If there isn't a duc
         card in the deck, or a duc card after the fpc and spc cards have
         been removed from the deck, then the play is set to 'X'."""
         
         assert deck
-        global book
 
         stand_ev_per_ddc = {}
         hit_ev_per_ddc = {}
@@ -2109,8 +2418,9 @@ class Book(tk.Frame):
 
         # We want to exclude natural dealer BJ from book because we use book
         # to determine the EV and best play in the absence of a dealer BJ.
+        # The ddc chances come from hole_card_probs, which leaves it out.
         
-        if self.deck_choice == 'infinite':
+        if self.rules.deck_choice == 'infinite':
             play_deck = ONE_DECK
         else:
             # Ensure the player cards and duc are in the deck.
@@ -2129,79 +2439,37 @@ class Book(tk.Frame):
             else:
                 hand_ok = False
             if hand_ok == False:
-                book[(fpc, spc, duc)] = ['X',0, 0, 0]
+                self.book.set_cell(fpc, spc, duc, 'X', [0, 0, 0])
                 print(f'(hand_builder) Deck can"t accomodate hand: ({fpc}, '
                       f'{spc}, {duc})')
                 return
         
-        ddcs = set(play_deck)
-        if duc == 1:
-            try:
-                ddcs.remove(10)
-            except Exception:
-                pass
-            ddc_deck = [card for card in play_deck if card != 10]
-            ddc_dist = self.get_card_dist(ddc_deck)
-        elif duc == 10:
-            try:
-                ddcs.remove(1)
-            except Exception:
-                pass
-            ddc_deck = [card for card in play_deck if card != 1]
-            ddc_dist = self.get_card_dist(ddc_deck)
-        else:
-            if self.deck_choice == 'infinite':
-                ddc_dist = ONE_DECK_DIST
-            else:
-                ddc_dist = self.get_card_dist(play_deck)
+        counts = self.deck_key(play_deck)
+        ddc_probs = self.hole_card_probs(duc, counts)
 
         if DEBUG == 1:
-            print(f'ddcs: {ddcs}')
-            print(f'ddc_dist for ({fpc}, {spc}, {duc}): ddc_dist: {ddc_dist}')
+            print(f'ddc_probs for ({fpc}, {spc}, {duc}): '
+                  f'{[(ddc, prob) for ddc, prob, _ in ddc_probs]}')
 
         ev_list = [0, 0, 0]
-        pht, _ = self.best_hand_from_card_list([fpc, spc])
-        ddcs_len = len(ddcs)
-        for ddc in ddcs:
-            dealer_card_list = [duc, ddc]
-            dht, _ = self.best_hand_from_card_list(dealer_card_list)
-            if dht == 21:
-                print(f'dealer_card_list: {dealer_card_list}')
-                raise Exception
-            if self.deck_choice == 'infinite':
-                continue_deck = play_deck
-            else:
-                continue_deck = play_deck.copy()
-                continue_deck.remove(ddc)
-
-            stand_ev = self.dealer_turn(
-                    [fpc, spc],
-                    dealer_card_list,
-                    continue_deck
+        pht, hard_or_soft = best_hand_from_card_list([fpc, spc])
+        for ddc, prob, continue_counts in ddc_probs:
+            dht, dealer_hard_or_soft = best_hand_from_card_list([duc, ddc])
+            stand_ev_per_ddc[ddc] = stand_ev(
+                    pht,
+                    self.dealer_dist(dht, dealer_hard_or_soft,
+                                     continue_counts)
                     )
-            
-            stand_ev_per_ddc[ddc] = stand_ev
-            ev_list[0] += ddc_dist[ddc] * stand_ev
+            ev_list[0] += prob * stand_ev_per_ddc[ddc]
 
-            
             if pht != 21:
-                hit_ev = self.player_hit(
-                        [fpc, spc],
-                        dealer_card_list,
-                        continue_deck
-                        )
+                hit_ev_per_ddc[ddc] = self.hit_ev(pht, hard_or_soft, duc,
+                                                  ddc, continue_counts)
+                ev_list[1] += prob * hit_ev_per_ddc[ddc]
 
-                hit_ev_per_ddc[ddc] = hit_ev
-                ev_list[1] += ddc_dist[ddc] * hit_ev
-
-                double_ev = self.player_double(
-                        [fpc, spc],
-                        dealer_card_list,
-                        continue_deck
-                        )
-
-                double_ev_per_ddc[ddc] = double_ev
-                ev_list[2] += ddc_dist[ddc] * double_ev
+                double_ev_per_ddc[ddc] = self.double_ev(
+                        pht, hard_or_soft, duc, ddc, continue_counts)
+                ev_list[2] += prob * double_ev_per_ddc[ddc]
             else:
                 hit_ev_per_ddc[ddc] = -1
                 double_ev_per_ddc[ddc] = -2
@@ -2213,258 +2481,1229 @@ class Book(tk.Frame):
             total_stand_ev = 0
             total_hit_ev = 0
             total_double_ev = 0
-            for card in ddcs:
-                total_stand_ev += ddc_dist[card] * stand_ev_per_ddc[card]
-                total_hit_ev += ddc_dist[card] * hit_ev_per_ddc[card]
-                total_double_ev += ddc_dist[card] * double_ev_per_ddc[card]
+            for card, prob, _ in ddc_probs:
+                total_stand_ev += prob * stand_ev_per_ddc[card]
+                total_hit_ev += prob * hit_ev_per_ddc[card]
+                total_double_ev += prob * double_ev_per_ddc[card]
                 
             print(f'(hand_builder) total_stand_ev: {total_stand_ev}'
                   f'ev_list[0]: {ev_list[0]}')
             print(f'ev_list: {ev_list} max(ev_list): {max(ev_list)}')
             
-        best_play = REV_EV_INDEX[ev_list.index(max(ev_list))]
         if pht != 21:
-            book[(fpc, spc, duc)] = \
-                    [best_play, ev_list[0], ev_list[1], ev_list[2]]
+            self.store_cell(fpc, spc, duc, ev_list)
         else:
-            book[(fpc, spc, duc)] = [best_play, ev_list[0], -1, -1]
+            self.store_cell(fpc, spc, duc, [ev_list[0], -1, -1])
+
+    def store_cell(self, fpc, spc, duc, ev_list):
+        """Sets the book entry for a hand to the best play allowed for its
+        stand, hit and double EVs, or to surrender where the rules offer it
+        and it does better. The surrender EV is stored with the others."""
+        counts = self.deal_counts(fpc, spc, duc)
+        ev_list = [ev_list[0], ev_list[1],
+                   ev_list[2] - self.extra_bet_cost(duc, counts)]
+        best_play = REV_EV_INDEX[ev_list.index(max(ev_list))]
+        surrender_ev = self.surrender_ev(fpc, spc, duc)
+        self.book.set_cell(fpc, spc, duc, best_play,
+                           ev_list + [nan, surrender_ev])
         if best_play == 'D':
-            next_best_play = self.double_check(best_play, [fpc, spc], duc)
-            if next_best_play != 'D':
-                book[(fpc, spc, duc)][0] = next_best_play
-
-    def player_hit(self, player_card_list, dealer_card_list, deck):
-        """Returns the ev of the passed player and dealer hands. The decision 
-        to hit or stand is made by consulting the book."""
-        total_ev = 0
-        duc = dealer_card_list[0]
-
-        if self.deck_choice == 'infinite':
-            hit_card_dist = ONE_DECK_DIST
+            best_play = self.double_check(best_play, [fpc, spc], duc)
+            if best_play != 'D':
+                self.book.set_play(fpc, spc, duc, best_play)
+        if surrender_ev > ev_list[EV_INDEX[best_play]]:
+            self.book.set_play(fpc, spc, duc, 'R')
+
+    def surrender_ev(self, fpc, spc, duc):
+        """Returns the EV of surrendering a two card hand, or NaN if the rules
+        don't offer surrender. Like the other book EVs it is given the dealer
+        has no blackjack. A late surrender loses half the bet. An early
+        surrender loses half the bet before the dealer peeks, so it is
+        returned as the EV that gives the same -0.5 once the hands the dealer
+        would have won with a blackjack, at -1, are put back."""
+        if self.rules.surrender == 'none':
+            return nan
+        if self.rules.surrender == 'late':
+            return -0.5
+        bj_chance = dealer_bj_chance(duc, self.deal_counts(fpc, spc, duc))
+        return (bj_chance - 0.5) / (1 - bj_chance)
+
+    def extra_bet_cost(self, duc, counts):
+        """Returns what a dealer blackjack costs each bet beyond the first,
+        doubled or split, as an EV given no dealer blackjack like the book
+        EVs, drawing the ddc from the count vector. Under ENHC the dealer
+        only checks for a blackjack after the player's turn and takes every
+        bet, so a bet lost to a blackjack with chance q counts as
+        q / (1 - q) given none. Under peek and ENHC-OBO it is 0."""
+        if self.rules.peek != 'enhc':
+            return 0
+        bj_chance = dealer_bj_chance(duc, counts)
+        return bj_chance / (1 - bj_chance)
+
+    def deal_counts(self, fpc, spc, duc):
+        """Returns the count vector of the deck less the player cards and the
+        duc, or None for the infinite deck."""
+        if self.rules.deck_choice == 'infinite':
+            return None
+        counts = list(self.book.counts)
+        for card in [fpc, spc, duc]:
+            counts[card] -= 1
+        return tuple(counts)
+
+    def hard_total_builder(self, pht, duc, deck):
+        """Creates book entries for every composition of a hard total. The
+        compositions of a total share their EVs under the infinite deck, so
+        only the first is built. Under a finite deck with the EOR
+        approximation option set, only the middle composition is built
+        exactly, and the EVs of the others are estimated from its effects of
+        removal."""
+        hands = []
+        for cards in HARD_HAND_COMP[pht]:
+            valid_hand, _ = self.book.hand_prob(cards[0], cards[1], duc)
+            if valid_hand:
+                hands.append(cards)
+            else:
+                self.hand_builder(cards[0], cards[1], duc, deck)
+
+        if self.rules.deck_choice == 'infinite':
+            fpc, spc = hands[0]
+            self.report_progress('start', [fpc, spc, duc], 'hard')
+            self.hand_builder(fpc, spc, duc, deck)
+            play, ev_list = self.book.cell(fpc, spc, duc)
+            for cards in hands[1:]:
+                self.book.set_cell(cards[0], cards[1], duc, play, ev_list)
+        elif self.eor_approx and len(hands) > 1:
+            fpc, spc = hands[len(hands) // 2]
+            self.report_progress('start', [fpc, spc, duc], 'hard')
+            counts = deck_counts(deck)
+            for card in [fpc, spc, duc]:
+                counts[card] -= 1
+            ev_list, grads = self.cell_ev_grad(fpc, spc, duc, tuple(counts))
+            self.store_cell(fpc, spc, duc, ev_list)
+            for cards in hands:
+                if cards == (fpc, spc):
+                    continue
+                # The deck left for this hand has the representative cards
+                # back in it and its own cards taken out.
+                removal = [0] * 11
+                removal[fpc] += 1
+                removal[spc] += 1
+                removal[cards[0]] -= 1
+                removal[cards[1]] -= 1
+                approx_ev_list = [ev + sum(grad[card] * removal[card] 
+                                           for card in range(1, 11))
+                                  for ev, grad in zip(ev_list, grads)]
+                self.store_cell(cards[0], cards[1], duc, approx_ev_list)
+                if duc == EOR_CHECK_DUC:
+                    self.check_eor_approx(pht, cards, duc, deck, 
+                                          approx_ev_list)
         else:
-            hit_card_dist = self.get_card_dist(deck)
-
-        hit_cards = set(deck)
-        
-        for hit_card in hit_cards:
-            new_player_card_list = player_card_list.copy()
-            new_player_card_list.append(hit_card)
-            pht, hard_or_soft = self.best_hand_from_card_list(
-                    new_player_card_list
-                    )
-
-            if pht > 21:
-                continue_ev = -1
+            for cards in hands:
+                self.report_progress('start', [cards[0], cards[1], duc],
+                                     'hard')
+                self.hand_builder(cards[0], cards[1], duc, deck)
+
+    def check_eor_approx(self, pht, cards, duc, deck, approx_ev_list):
+        """Compares the EOR approximated EVs of a hand with its exact EVs, and
+        records the largest EV error and any changed play for its total."""
+        counts = deck_counts(deck)
+        for card in [cards[0], cards[1], duc]:
+            counts[card] -= 1
+        ev_list, _ = self.cell_ev_grad(cards[0], cards[1], duc, tuple(counts))
+        error = max(abs(approx_ev - ev) 
+                    for approx_ev, ev in zip(approx_ev_list, ev_list))
+        play_changed = ev_list.index(max(ev_list)) != \
+                       approx_ev_list.index(max(approx_ev_list))
+        max_error, changed_plays, hand_count = \
+                self.eor_errors.get(pht, (0, 0, 0))
+        self.eor_errors[pht] = (max(max_error, error), 
+                                changed_plays + play_changed,
+                                hand_count + 1)
+
+    def show_eor_errors(self):
+        """Outputs the errors of the EOR approximated hard hands, found
+        against the exact EVs for a dealer up card of EOR_CHECK_DUC."""
+        if not self.eor_errors:
+            return
+        print(f'\nEOR approximation errors checked against exact EVs for '
+              f'dealer up card {NUM_TO_TEXT[EOR_CHECK_DUC]}:')
+        for pht in sorted(self.eor_errors, reverse=True):
+            max_error, changed_plays, hand_count = self.eor_errors[pht]
+            print(f'Hard {pht:>2}: max EV error: {max_error:.6f} '
+                  f'best play changed: {changed_plays} of {hand_count}')
+
+    def show_engine_metrics(self):
+        """Outputs the work done by the recursion of the last build."""
+        metrics = self.engine_metrics()
+        print(f'Recursion: {metrics["nodes"]} nodes, stack depth '
+              f'{metrics["max_depth"]}, at most {metrics["peak_entries"]} '
+              f'results held, tables trimmed {metrics["table_trims"]} '
+              f'times', end='')
+        if metrics['peak_memory_kb'] is not None:
+            print(f', peak memory {metrics["peak_memory_kb"] / 1024:.0f} MB',
+                  end='')
+        print()
+
+    def reset_tables(self):
+        """Forgets the memoized dealer and player tables. Their entries
+        depend on the rules and on the book plays, so they are reset for
+        each build."""
+        self.dealer_table = {}
+        self.hole_table = {}
+        self.hit_table = {}
+        self.double_table = {}
+        self.hit_dist_table = {}
+        self.double_dist_table = {}
+        self.dealer_grad_table = {}
+        self.hit_grad_table = {}
+        self.double_grad_table = {}
+        self.cd_table = {}
+        self.memo_tables = (self.dealer_table, self.hole_table,
+                            self.hit_table, self.double_table,
+                            self.hit_dist_table, self.double_dist_table,
+                            self.dealer_grad_table, self.hit_grad_table,
+                            self.double_grad_table, self.cd_table)
+        self.frame_pool = []
+        self.metrics = {'nodes': 0, 'max_depth': 0, 'entries': 0,
+                        'peak_entries': 0, 'table_trims': 0}
+        self.dealer_hits_soft_17 = self.rules.dhs17
+        self.double_any_hand = self.rules.double == "any hand"
+        self.dealer_step_table = self.dealer_steps()
+        self.kernel = self.make_kernel()
+
+    def make_kernel(self):
+        """Returns the native kernel for the recursion, or None to use pure
+        Python: when native_kernel is off, Numba isn't installed, or the
+        deck is infinite or too large for the kernel tables."""
+        if not self.native_kernel or self.rules.deck_choice == 'infinite':
+            return None
+        kernel_module = load_kernel()
+        if kernel_module is None:
+            return None
+        try:
+            return kernel_module.Kernel(self.book.counts, self.rules.dhs17,
+                                        self.rules.peek == 'enhc',
+                                        MAX_TABLE_ENTRIES)
+        except ValueError:
+            return None
+
+    def kernel_play(self, pht, hard_or_soft, duc):
+        """Returns the multi_card_play() play of a hand for the kernel, or
+        None if it isn't built yet."""
+        try:
+            play, _ = self.multi_card_play(pht, hard_or_soft, duc)
+        except KeyError:
+            return None
+        return play
+
+    def deck_key(self, deck):
+        """Returns the count vector for a deck list, or None for the
+        infinite deck."""
+        if self.rules.deck_choice == 'infinite':
+            return None
+        return tuple(deck_counts(deck))
+
+    def multi_card_play(self, pht, hard_or_soft, duc):
+        """Returns the book play and EV list for a hand of three or more
+        cards. It is the play of no_split_lookup passed through
+        double_check."""
+        if hard_or_soft == 'soft':
+            play, ev_list = self.book.soft_total(pht, duc)
+        else:
+            play, ev_list = self.book.hard_total(pht, duc)
+        if play in ('P', 'R'):
+            play = best_play_of(ev_list, 'SHD')
+        if play == 'D' and not self.double_any_hand:
+            if ev_list[0] > ev_list[1]:
+                play = 'S'
             else:
-                # we don't have to check for the existance of this book_play 
-                # here because the pht is higher than what was called from 
-                # hard or soft hand builder, thus gauranteeing that the play 
-                # (and hence EV) for the new pht is already in book since we 
-                # create book plays from top to bottom.
-                book_play, ev_list = self.no_split_book_lookup(
-                        new_player_card_list, duc)
-                book_play = self.double_check(
-                        book_play, new_player_card_list, duc)
-                
-                if self.deck_choice == 'infinite':
-                    # If we are using infinite deck, there is no reason to 
-                    # call player_hit or dealer_turn because the deck 
-                    # distribution is constant. So, we just use our already 
-                    # calculated EV values, vastly speeding up the program.
-                    continue_ev = ev_list[EV_INDEX[book_play]]
-                else:
-                    new_deck = deck.copy()
-                    new_deck.remove(hit_card)
-                    if book_play == 'S':
-                        continue_ev = self.dealer_turn(
-                                new_player_card_list,
-                                dealer_card_list,
-                                new_deck
-                                )
-                    elif book_play == 'H':
-                        continue_ev = self.player_hit(
-                                new_player_card_list,
-                                dealer_card_list,
-                                new_deck
-                                )
-                    elif book_play == 'D':
-                        continue_ev = self.player_double(
-                                new_player_card_list,
-                                dealer_card_list,
-                                new_deck
-                                )
-                    else:
-                        print(f'book_play: {book_play} '
-                              f'new_player_card_list: {new_player_card_list}')
-                        raise Exception
-                                                          
-            total_ev += hit_card_dist[hit_card] * continue_ev
-        return total_ev
-    
-    def player_double(self, player_card_list, dealer_card_list, deck):
-        """Returns the ev of the passed player and dealer hands when the player
-        gets to draw only one card."""
-        total_ev = 0
-        duc = dealer_card_list[0]
-              
-        if self.deck_choice == 'infinite':
-            double_card_dist = ONE_DECK_DIST
+                play = 'H'
+        return play, ev_list
+
+    def hole_card_probs(self, duc, counts):
+        """Returns a list of (ddc, probability, count vector after the draw)
+        for each ddc that can be drawn from the count vector, given that the
+        dealer has no blackjack."""
+        key = (duc, counts)
+        probs = self.hole_table.get(key)
+        if probs is not None:
+            return probs
+        exclude = DDC_EXCLUDE.get(duc)
+        no_bj_chance = 1 - dealer_bj_chance(duc, counts)
+        probs = [(ddc, prob / no_bj_chance, new_counts)
+                 for ddc, prob, new_counts in draw_probs(counts)
+                 if ddc != exclude]
+        self.remember(self.hole_table, key, probs)
+        return probs
+
+    # The memoized tables and the explicit stack
+
+    #   dealer_dist and hit_ev, the deepest and busiest parts of the
+    #   recursion, walk their trees with an explicit stack of frames rather
+    #   than Python calls, so a deck of many small cards can't run into the
+    #   recursion limit. A frame is a list of [key, draws, index of the next
+    #   draw, sum so far], taken from and given back to a pool. A node whose
+    #   result isn't in its table pushes a frame, and a finished frame is
+    #   stored and added into the frame below it.
+    #
+    #   The rest of the recursion, hit_dist, the gradients and composition
+    #   dependent play, still makes Python calls, whose depth is bounded by
+    #   the cards a hand can hold, see MAX_RECURSION_LEVELS.
+
+    def remember(self, table, key, value):
+        """Stores a result in a memoized table. Once the tables hold more
+        than MAX_TABLE_ENTRIES results, the oldest half of the largest of
+        them is dropped. That is safe as results under way are held in their
+        frames, and keeps the busy results of the other tables."""
+        table[key] = value
+        metrics = self.metrics
+        metrics['entries'] += 1
+        if metrics['entries'] > metrics['peak_entries']:
+            metrics['peak_entries'] = metrics['entries']
+        if metrics['entries'] > MAX_TABLE_ENTRIES:
+            largest = max(self.memo_tables, key=len)
+            for old_key in list(islice(largest, (len(largest) + 1) // 2)):
+                del largest[old_key]
+            metrics['entries'] = sum(len(memo_table)
+                                     for memo_table in self.memo_tables)
+            metrics['table_trims'] += 1
+
+    def push_frame(self, stack, key, draws):
+        """Pushes a pooled frame for a node onto an explicit stack."""
+        if self.frame_pool:
+            frame = self.frame_pool.pop()
+            frame[0] = key
+            frame[1] = draws
+            frame[2] = 0
         else:
-            double_card_dist = self.get_card_dist(deck)
-        double_cards = set(deck)
-
-        for double_card in double_cards:
-            new_player_card_list = player_card_list.copy()
-            new_player_card_list.append(double_card)
-            pht, hard_or_soft = self.best_hand_from_card_list(
-                    new_player_card_list
-                    )
-
-            if pht > 21:         
-                continue_ev = -1
+            frame = [key, draws, 0, None]
+        stack.append(frame)
+        metrics = self.metrics
+        metrics['nodes'] += 1
+        if len(stack) > metrics['max_depth']:
+            metrics['max_depth'] = len(stack)
+        return frame
+
+    def pop_frame(self, stack):
+        """Pops the top frame of an explicit stack back into the pool, and
+        returns its sum."""
+        frame = stack.pop()
+        total = frame[3]
+        frame[1] = frame[3] = None
+        self.frame_pool.append(frame)
+        return total
+
+    def engine_metrics(self):
+        """Returns a dict of the work done by the recursion since the tables
+        were last reset: the nodes evaluated, the deepest explicit stack,
+        the results held now and at the most, how often the tables were
+        trimmed, and the peak memory of the process in kilobytes where the
+        resource module has it."""
+        metrics = dict(self.metrics)
+        metrics['native_kernel'] = self.kernel is not None
+        metrics['peak_memory_kb'] = None
+        if resource is not None:
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            # macOS reports bytes, Linux kilobytes.
+            metrics['peak_memory_kb'] = \
+                    peak // 1024 if sys.platform == 'darwin' else peak
+        return metrics
+
+    def dealer_stand_dist(self, dht, hard_or_soft):
+        """Returns the outcome distribution of a dealer hand that stands with
+        the passed best total, or None if the dealer draws to it."""
+        if dht > 21:
+            return DEALER_STAND_DISTS[22]
+        if dht >= 18 or (dht == 17 and (hard_or_soft == 'hard' or \
+                                        not self.dealer_hits_soft_17)):
+            return DEALER_STAND_DISTS[dht]
+        return None
+
+    def dealer_steps(self):
+        """Returns the steps of a drawing dealer hand, indexed by hard or
+        soft, best total and card. Each is the (best total, hard or soft,
+        stand distribution) of the hand after drawing the card, the
+        distribution None if the dealer draws again."""
+        steps = {}
+        for hard_or_soft in ('hard', 'soft'):
+            rows = []
+            for dht in range(0, 22):
+                row = [None]
+                for card in range(1, 11):
+                    total, new_hard_or_soft = add_card(dht, hard_or_soft, card)
+                    row.append((total, new_hard_or_soft,
+                                self.dealer_stand_dist(total,
+                                                       new_hard_or_soft)))
+                rows.append(row)
+            steps[hard_or_soft] = rows
+        return steps
+
+    def dealer_dist(self, dht, hard_or_soft, counts):
+        """Returns the dealer outcome distribution for a dealer hand with
+        the passed best total, drawing from the count vector."""
+        dist = self.dealer_stand_dist(dht, hard_or_soft)
+        if dist is not None:
+            return dist
+        key = (dht, hard_or_soft, counts)
+        table = self.dealer_table
+        dist = table.get(key)
+        if dist is not None:
+            return dist
+        if self.kernel is not None and counts is not None:
+            dist = self.kernel.dealer_dist(dht, hard_or_soft, counts)
+            if dist is not None:
+                self.remember(table, key, dist)
+                return dist
+
+        steps = self.dealer_step_table
+        stack = []
+        frame = self.push_frame(stack, key, draw_probs(counts))
+        frame[3] = [0, 0, 0, 0, 0, 0]
+        while True:
+            frame = stack[-1]
+            key, draws, index, dist = frame
+            card_steps = steps[key[1]][key[0]]
+            # Add in the draws whose distributions are known, up to the
+            # first that needs a frame of its own.
+            while index < len(draws):
+                card, prob, new_counts = draws[index]
+                total, new_hard_or_soft, card_dist = card_steps[card]
+                if card_dist is None:
+                    card_key = (total, new_hard_or_soft, new_counts)
+                    card_dist = table.get(card_key)
+                    if card_dist is None:
+                        break
+                dist[0] += prob * card_dist[0]
+                dist[1] += prob * card_dist[1]
+                dist[2] += prob * card_dist[2]
+                dist[3] += prob * card_dist[3]
+                dist[4] += prob * card_dist[4]
+                dist[5] += prob * card_dist[5]
+                index += 1
+            frame[2] = index
+            if index < len(draws):
+                child = self.push_frame(stack, card_key,
+                                        draw_probs(new_counts))
+                child[3] = [0, 0, 0, 0, 0, 0]
+                continue
+
+            self.remember(table, key, dist)
+            self.pop_frame(stack)
+            if not stack:
+                return dist
+            frame = stack[-1]
+            prob = frame[1][frame[2]][1]
+            parent_dist = frame[3]
+            parent_dist[0] += prob * dist[0]
+            parent_dist[1] += prob * dist[1]
+            parent_dist[2] += prob * dist[2]
+            parent_dist[3] += prob * dist[3]
+            parent_dist[4] += prob * dist[4]
+            parent_dist[5] += prob * dist[5]
+            frame[2] += 1
+
+    def hit_ev(self, pht, hard_or_soft, duc, ddc, counts):
+        """Returns the EV of hitting a hand with the passed best total and
+        then playing the book, with the dealer holding duc and ddc and the
+        count vector left to draw from."""
+        key = (pht, hard_or_soft, duc, ddc, counts)
+        table = self.hit_table
+        ev = table.get(key)
+        if ev is not None:
+            return ev
+
+        dht, dealer_hard_or_soft = best_hand_from_card_list([duc, ddc])
+        if self.kernel is not None and counts is not None:
+            # A play the book doesn't have yet is left to the Python
+            # recursion to report.
+            plays = self.kernel.play_array(
+                    lambda total, hand_type: self.kernel_play(total,
+                                                              hand_type, duc))
+            ev = self.kernel.hit_ev(pht, hard_or_soft,
+                                    (dht, dealer_hard_or_soft), duc, ddc,
+                                    counts, plays)
+            if ev is not None:
+                self.remember(table, key, ev)
+                return ev
+        stack = []
+        frame = self.push_frame(stack, key, draw_probs(counts))
+        frame[3] = 0
+        while True:
+            frame = stack[-1]
+            key, draws, index, ev = frame
+            # Add in the draws whose EVs are known, up to the first hit that
+            # needs a frame of its own.
+            while index < len(draws):
+                card, prob, new_counts = draws[index]
+                total, new_hard_or_soft = add_card(key[0], key[1], card)
+                if total > 21:
+                    ev -= prob
+                    index += 1
+                    continue
+                play, ev_list = self.multi_card_play(total, new_hard_or_soft,
+                                                     duc)
+                if counts is None:
+                    # The infinite deck distribution is constant, so the 
+                    # book EVs already are the EVs of the new hand.
+                    continue_ev = ev_list[EV_INDEX[play]]
+                elif play == 'S':
+                    continue_ev = stand_ev(
+                            total, 
+                            self.dealer_dist(dht, dealer_hard_or_soft,
+                                             new_counts)
+                            )
+                elif play == 'H':
+                    card_key = (total, new_hard_or_soft, duc, ddc,
+                                new_counts)
+                    continue_ev = table.get(card_key)
+                    if continue_ev is None:
+                        break
+                elif play == 'D':
+                    continue_ev = self.double_ev(total, new_hard_or_soft, duc,
+                                                 ddc, new_counts) - \
+                                  self.extra_bet_cost(duc, new_counts)
+                else:
+                    print(f'book_play: {play} total: {total} '
+                          f'{new_hard_or_soft}')
+                    raise Exception
+                ev += prob * continue_ev
+                index += 1
+            frame[2] = index
+            frame[3] = ev
+            if index < len(draws):
+                child = self.push_frame(stack, card_key,
+                                        draw_probs(new_counts))
+                child[3] = 0
+                continue
+
+            self.remember(table, key, ev)
+            self.pop_frame(stack)
+            if not stack:
+                return ev
+            frame = stack[-1]
+            frame[3] += frame[1][frame[2]][1] * ev
+            frame[2] += 1
+
+    def double_ev(self, pht, hard_or_soft, duc, ddc, counts):
+        """Returns the EV of doubling a hand with the passed best total, with
+        the dealer holding duc and ddc and the count vector left to draw
+        from."""
+        key = (pht, hard_or_soft, duc, ddc, counts)
+        ev = self.double_table.get(key)
+        if ev is not None:
+            return ev
+
+        ev = 0
+        dht, dealer_hard_or_soft = best_hand_from_card_list([duc, ddc])
+        for card, prob, new_counts in draw_probs(counts):
+            total, new_hard_or_soft = add_card(pht, hard_or_soft, card)
+            if total > 21:
+                ev -= prob
+            elif counts is None:
+                # Since we are standing after we get our double card:
+                _, ev_list = self.multi_card_play(total, new_hard_or_soft, duc)
+                ev += prob * ev_list[0]
+            else:
+                ev += prob * stand_ev(
+                        total, 
+                        self.dealer_dist(dht, dealer_hard_or_soft, new_counts)
+                        )
+        ev *= 2
+        self.remember(self.double_table, key, ev)
+        return ev
+
+    # Outcome distributions of the count based recursion. They follow the
+    # same book plays through the same memoized states as the EVs, keeping
+    # the chance of each result in place of its mean. A two card dealer
+    # hand of 21 is a blackjack here, which takes every bet the player has
+    # put up, as under ENHC.
+
+    def hit_dist(self, pht, hard_or_soft, duc, ddc, counts):
+        """Returns the outcome distribution of hitting a hand with the passed
+        best total and then playing the book, with the dealer holding duc
+        and ddc and the count vector left to draw from."""
+        key = (pht, hard_or_soft, duc, ddc, counts)
+        dist = self.hit_dist_table.get(key)
+        if dist is not None:
+            return dist
+
+        dist = {}
+        dht, dealer_hard_or_soft = best_hand_from_card_list([duc, ddc])
+        for card, prob, new_counts in draw_probs(counts):
+            total, new_hard_or_soft = add_card(pht, hard_or_soft, card)
+            if total > 21:
+                continue_dist = {-1: 1}
             else:
-                if self.deck_choice == 'infinite':
-                    # Since we are standing after we get our double card:
-                    play, ev_list = self.book_lookup(new_player_card_list,
-                                                duc)
-                    continue_ev = ev_list[0]
+                play, _ = self.multi_card_play(total, new_hard_or_soft, duc)
+                if play == 'H':
+                    continue_dist = self.hit_dist(total, new_hard_or_soft,
+                                                  duc, ddc, new_counts)
+                elif play == 'D':
+                    continue_dist = self.double_dist(total, new_hard_or_soft,
+                                                     duc, ddc, new_counts)
+                elif dht == 21:
+                    continue_dist = {-1: 1}
                 else:
-                    new_deck = deck.copy()
-                    new_deck.remove(double_card)
-                    continue_ev = self.dealer_turn(
-                            new_player_card_list,
-                            dealer_card_list,
-                            new_deck
+                    continue_dist = stand_dist(
+                            total,
+                            self.dealer_dist(dht, dealer_hard_or_soft,
+                                             new_counts)
                             )
-                               
-            total_ev += double_card_dist[double_card] * continue_ev
-        return 2 * total_ev
-
-    def dealer_turn(self, player_card_list, dealer_card_list, deck):
-        """Returns the ev of the passed player hand total, dealer card list,
-        and deck (in list form). The dcc is already assigned."""
-
-        pht, _ = self.best_hand_from_card_list(player_card_list)
-        dht, hard_or_soft = self.best_hand_from_card_list(dealer_card_list)
-        
-        if dht == 21 and len(dealer_card_list) == 2:
-            print(f'Error in dealer_turn, dealer had blackjack. dht: {dht} '
-                  f'card list: {dealer_card_list}')
-            raise Exception
+            add_dist(dist, continue_dist, prob)
+        self.remember(self.hit_dist_table, key, dist)
+        return dist
 
-        if dht >= 22:
-            return 1
-        
-        if (dht == 17 and hard_or_soft == 'hard') or (dht >= 18) or \
-            (dht == 17 and hard_or_soft == 'soft' and not \
-                 self.dhs17_var.get()):
-            # Dealer is done drawing cards. Let's see who won.
-            if pht == dht:
-                return 0
-            elif pht > dht:
-                return 1
+    def double_dist(self, pht, hard_or_soft, duc, ddc, counts):
+        """Returns the outcome distribution of doubling a hand with the
+        passed best total, with the dealer holding duc and ddc and the count
+        vector left to draw from."""
+        key = (pht, hard_or_soft, duc, ddc, counts)
+        dist = self.double_dist_table.get(key)
+        if dist is not None:
+            return dist
+
+        dist = {}
+        dht, dealer_hard_or_soft = best_hand_from_card_list([duc, ddc])
+        for card, prob, new_counts in draw_probs(counts):
+            total, _ = add_card(pht, hard_or_soft, card)
+            if total > 21 or dht == 21:
+                add_dist(dist, {-2: 1}, prob)
             else:
-                return -1
-             
-        # At this point, dealer must draw a card. So we figure the % chance of
-        # dealer drawing each card value, multiply those %'s by the ev for that
-        # card value, and sum together to get the total ev.
-
-        dealer_card_set = set(deck)
-        interim_ev = 0
-        if self.deck_choice == 'infinite':
-            card_dist = ONE_DECK_DIST
+                add_dist(dist,
+                         stand_dist(total,
+                                    self.dealer_dist(dht, dealer_hard_or_soft,
+                                                     new_counts)),
+                         prob, 2)
+        self.remember(self.double_dist_table, key, dist)
+        return dist
+
+    def cell_dists(self, fpc, spc, duc):
+        """Returns a dict of the outcome distributions of the plays of a two
+        card hand, given the dealer has no blackjack like the book EVs. A
+        blackjack only has a stand, and the split of a pair is there if the
+        pair simulation recorded it. Unlike the book EVs they aren't charged
+        extra_bet_cost under ENHC, which dealer_bj_dist accounts for."""
+        counts = self.deal_counts(fpc, spc, duc)
+        pht, hard_or_soft = best_hand_from_card_list([fpc, spc])
+        dists = {'S': {}} if pht == 21 else {'S': {}, 'H': {}, 'D': {}}
+        for ddc, prob, continue_counts in self.hole_card_probs(duc, counts):
+            dht, dealer_hard_or_soft = best_hand_from_card_list([duc, ddc])
+            add_dist(dists['S'],
+                     stand_dist(pht,
+                                self.dealer_dist(dht, dealer_hard_or_soft,
+                                                 continue_counts)),
+                     prob)
+            if pht != 21:
+                add_dist(dists['H'],
+                         self.hit_dist(pht, hard_or_soft, duc, ddc,
+                                       continue_counts),
+                         prob)
+                add_dist(dists['D'],
+                         self.double_dist(pht, hard_or_soft, duc, ddc,
+                                          continue_counts),
+                         prob)
+        if self.rules.surrender != 'none':
+            dists['R'] = {-0.5: 1}
+        if fpc == spc and self.book.split_dist(fpc, duc) is not None:
+            dists['P'] = self.book.split_dist(fpc, duc)[0]
+        return dists
+
+    def dealer_bj_dist(self, fpc, spc, duc, play):
+        """Returns the outcome distribution of a two card hand played
+        against a dealer blackjack. The dealer peeks, or under ENHC-OBO
+        takes the original bet only, so only the first bet is lost but
+        under ENHC, where every bet the play puts up is lost."""
+        if self.rules.peek != 'enhc' or play in ('S', 'R'):
+            return {-1: 1}
+        if play == 'D':
+            return {-2: 1}
+        if play == 'P':
+            _, bets, _ = self.book.split_dist(fpc, duc)
+            return {-bet: chance for bet, chance in bets.items()}
+        # A hit hand loses a doubled bet if it goes on to double.
+        ddc = DDC_EXCLUDE[duc]
+        pht, hard_or_soft = best_hand_from_card_list([fpc, spc])
+        return self.hit_dist(pht, hard_or_soft, duc, ddc,
+                             remove_card(self.deal_counts(fpc, spc, duc), ddc))
+
+    def round_dist(self, display_play=None, take_even_money=False,
+                   take_insurance=False):
+        """Returns the outcome distribution of a whole round, playing the
+        displayed plays. It is taken like get_total_ev, whose total EV is its
+        mean. Raises ValueError if a split is played that the pair
+        simulation didn't record, as in books saved before it did."""
+        book = self.book
+        if self.rules.deck_choice == 'infinite':
+            chance_ten = ONE_DECK_DIST[10]
+            chance_ace = ONE_DECK_DIST[1]
         else:
-            card_dist = self.get_card_dist(deck)
-            
-        for dealer_card in dealer_card_set:
-            new_dealer_card_list = dealer_card_list.copy()
-            new_dealer_card_list.append(dealer_card)
+            chance_ten = book.counts[10] / len(book.deck)
+            chance_ace = book.counts[1] / len(book.deck)
+        blackjack_pay = BLACKJACK_PAY[self.rules.fullpay]
+
+        round_dist = {}
+        for fpc in range(1, 11):
+            for spc in range(1, 11):
+                for duc in range(1, 11):
+                    valid_hand, player_hand_chance = \
+                            book.hand_prob(fpc, spc, duc)
+                    if not valid_hand:
+                        continue
+
+                    pht, _ = best_hand_from_card_list([fpc, spc])
+                    if pht == 21:
+                        if duc == 1 and take_even_money:
+                            hand_dist = {1: 1}
+                        elif duc == 1:
+                            hand_dist = {0: chance_ten,
+                                         blackjack_pay: 1 - chance_ten}
+                        elif duc == 10:
+                            hand_dist = {0: chance_ace,
+                                         blackjack_pay: 1 - chance_ace}
+                        else:
+                            hand_dist = {blackjack_pay: 1}
+                        add_dist(round_dist, hand_dist, player_hand_chance)
+                        continue
 
-            if self.deck_choice == 'infinite':
-                new_deck = deck
+                    if display_play is None:
+                        play = book.book_play(fpc, spc, duc)
+                    else:
+                        play = display_play(fpc, spc, duc)
+                    dists = self.cell_dists(fpc, spc, duc)
+                    if play not in dists:
+                        raise ValueError(
+                                f'The book has no split outcomes for '
+                                f'{NUM_TO_TEXT[fpc]},{NUM_TO_TEXT[spc]} v '
+                                f'{NUM_TO_TEXT[duc]}. Rebuild its pairs.')
+                    if play == 'R' and self.rules.surrender == 'early':
+                        # Early surrender comes before the dealer peeks.
+                        add_dist(round_dist, dists['R'], player_hand_chance)
+                        continue
+                    if duc == 1:
+                        bj_chance = chance_ten
+                    elif duc == 10:
+                        bj_chance = chance_ace
+                    else:
+                        bj_chance = 0
+                    # An insurance bet of half the main bet pays 2:1.
+                    insured = duc == 1 and take_insurance
+                    if bj_chance:
+                        add_dist(round_dist,
+                                 self.dealer_bj_dist(fpc, spc, duc, play),
+                                 player_hand_chance * bj_chance,
+                                 shift=1 if insured else 0)
+                    add_dist(round_dist, dists[play],
+                             player_hand_chance * (1 - bj_chance),
+                             shift=-0.5 if insured else 0)
+        return dict(sorted(round_dist.items()))
+
+    def print_outcomes(self, display_play=None, take_even_money=False,
+                       take_insurance=False):
+        """Outputs the outcome distribution of a whole round with its moments,
+        then the mean, standard deviation and skewness of the displayed play
+        of every two card hand given no dealer blackjack, and the
+        covariance of the first two hands of each simulated split."""
+        dist = self.round_dist(display_play, take_even_money, take_insurance)
+        mean, variance, skewness = dist_moments(dist)
+        print('\nRound outcome distribution:')
+        for units, chance in dist.items():
+            if chance > 0:
+                print(f'{units:>+6g} {chance:.6f}')
+        print(f'Mean: {mean:.6f} Variance: {variance:.6f} '
+              f'SD: {sqrt(variance):.6f} Skewness: {skewness:.6f}')
+
+        print('\nTwo card hands, given no dealer blackjack:')
+        print(f'{"Hand":>16}{"Mean":>10}{"SD":>9}{"Skew":>9}')
+        for fpc in range(1, 11):
+            for spc in range(fpc, 11):
+                for duc in CARD_VALUES:
+                    valid_hand, _ = self.book.hand_prob(fpc, spc, duc)
+                    if not valid_hand or fpc + spc == 11 and 1 in (fpc, spc):
+                        continue
+                    if display_play is None:
+                        play = self.book.book_play(fpc, spc, duc)
+                    else:
+                        play = display_play(fpc, spc, duc)
+                    hand_dist = self.cell_dists(fpc, spc, duc).get(play)
+                    if hand_dist is None:
+                        continue
+                    mean, variance, skewness = dist_moments(hand_dist)
+                    hand_txt = f'{NUM_TO_TEXT[fpc]},{NUM_TO_TEXT[spc]} ' + \
+                               f'v {NUM_TO_TEXT[duc]}: {play}'
+                    print(f'{hand_txt:>16}{mean:10.5f}{sqrt(variance):9.4f}'
+                          f'{skewness:9.4f}')
+
+        print('\nSplit hands, covariance of the first two hands:')
+        print(f'{"Pair":>6}' + ''.join(f'{NUM_TO_TEXT[duc]:>9}'
+                                       for duc in CARD_VALUES))
+        for pair_of in CARD_VALUES:
+            row = ''
+            for duc in CARD_VALUES:
+                split = self.book.split_dist(pair_of, duc)
+                row += f'{split[2]:9.4f}' if split else f'{"-":>9}'
+            print(f'{NUM_TO_TEXT[pair_of] * 2:>6}{row}')
+
+    # Derivatives of the count based recursion. Each derivative is taken
+    # with respect to the count of a card, treating the EVs as smooth
+    # functions of the count vector. The effect of a card missing from the
+    # deck is found from the unchanged count vector.
+
+    def dealer_dist_grad(self, dht, hard_or_soft, counts):
+        """Returns the dealer outcome distribution of dealer_dist, along with
+        its derivatives, for a finite count vector."""
+        if dht > 21:
+            return DEALER_STAND_DISTS[22], ZERO_DIST_GRAD
+        if dht >= 18 or (dht == 17 and (hard_or_soft == 'hard' or \
+                                        not self.dealer_hits_soft_17)):
+            return DEALER_STAND_DISTS[dht], ZERO_DIST_GRAD
+        key = (dht, hard_or_soft, counts)
+        found = self.dealer_grad_table.get(key)
+        if found is not None:
+            return found
+
+        size = sum(counts)
+        if size == 0:
+            return ZERO_DIST, ZERO_DIST_GRAD
+        dist = ZERO_DIST
+        grad = ZERO_DIST_GRAD
+        card_dists = {}
+        for card in range(1, 11):
+            total, new_hard_or_soft = add_card(dht, hard_or_soft, card)
+            if counts[card] > 0:
+                new_counts = remove_card(counts, card)
             else:
-                new_deck = deck.copy()
-                new_deck.remove(dealer_card)
-                                                        
-            hand_ev = self.dealer_turn(
-                              player_card_list,
-                              new_dealer_card_list,
-                              new_deck
-                              )    
-            interim_ev += card_dist[dealer_card] * \
-                          hand_ev
-        
-        return interim_ev          
+                new_counts = counts
+            card_dist, card_grad = self.dealer_dist_grad(
+                    total, new_hard_or_soft, new_counts)
+            card_dists[card] = card_dist
+            prob = counts[card] / size
+            if prob == 0:
+                continue
+            dist = [odds + prob * card_odds 
+                    for odds, card_odds in zip(dist, card_dist)]
+            if card_grad is not ZERO_DIST_GRAD:
+                grad = [dev + prob * card_dev 
+                        for dev, card_dev in zip(grad, card_grad)]
+        grad = list(grad)
+        for card, card_dist in card_dists.items():
+            start = card * 6
+            grad[start:start + 6] = [
+                    dev + (card_odds - odds) / size 
+                    for dev, card_odds, odds in 
+                    zip(grad[start:start + 6], card_dist, dist)]
+        self.remember(self.dealer_grad_table, key, (dist, grad))
+        return dist, grad
+
+    def stand_ev_grad(self, pht, duc, ddc, counts):
+        """Returns the EV of standing on a player hand total, along with its
+        derivatives, with the dealer holding duc and ddc."""
+        dht, dealer_hard_or_soft = best_hand_from_card_list([duc, ddc])
+        dist, dist_grad = self.dealer_dist_grad(dht, dealer_hard_or_soft,
+                                                counts)
+        return stand_ev(pht, dist), [stand_ev(pht, dist_grad[start:start + 6])
+                                     for start in range(0, 66, 6)]
+
+    def hit_ev_grad(self, pht, hard_or_soft, duc, ddc, counts):
+        """Returns the EV of hit_ev, along with its derivatives, for a finite
+        count vector."""
+        key = (pht, hard_or_soft, duc, ddc, counts)
+        found = self.hit_grad_table.get(key)
+        if found is not None:
+            return found
+
+        size = sum(counts)
+        ev = 0
+        grad = [0] * 11
+        card_evs = {}
+        for card in range(1, 11):
+            total, new_hard_or_soft = add_card(pht, hard_or_soft, card)
+            if counts[card] > 0:
+                new_counts = remove_card(counts, card)
+            else:
+                new_counts = counts
+            if total > 21:
+                card_ev, card_grad = -1, ZERO_GRAD
+            else:
+                play, _ = self.multi_card_play(total, new_hard_or_soft, duc)
+                if play == 'S':
+                    card_ev, card_grad = self.stand_ev_grad(total, duc, ddc,
+                                                            new_counts)
+                elif play == 'H':
+                    card_ev, card_grad = self.hit_ev_grad(
+                            total, new_hard_or_soft, duc, ddc, new_counts)
+                else:
+                    card_ev, card_grad = self.double_ev_grad(
+                            total, new_hard_or_soft, duc, ddc, new_counts)
+                    card_ev -= self.extra_bet_cost(duc, new_counts)
+            card_evs[card] = card_ev
+            prob = counts[card] / size
+            if prob == 0:
+                continue
+            ev += prob * card_ev
+            for grad_card in range(1, 11):
+                grad[grad_card] += prob * card_grad[grad_card]
+        for card, card_ev in card_evs.items():
+            grad[card] += (card_ev - ev) / size
+        self.remember(self.hit_grad_table, key, (ev, grad))
+        return ev, grad
+
+    def double_ev_grad(self, pht, hard_or_soft, duc, ddc, counts):
+        """Returns the EV of double_ev, along with its derivatives, for a
+        finite count vector."""
+        key = (pht, hard_or_soft, duc, ddc, counts)
+        found = self.double_grad_table.get(key)
+        if found is not None:
+            return found
+
+        size = sum(counts)
+        ev = 0
+        grad = [0] * 11
+        card_evs = {}
+        for card in range(1, 11):
+            total, _ = add_card(pht, hard_or_soft, card)
+            if counts[card] > 0:
+                new_counts = remove_card(counts, card)
+            else:
+                new_counts = counts
+            if total > 21:
+                card_ev, card_grad = -2, ZERO_GRAD
+            else:
+                card_ev, card_grad = self.stand_ev_grad(total, duc, ddc,
+                                                        new_counts)
+                card_ev *= 2
+                card_grad = [2 * dev for dev in card_grad]
+            card_evs[card] = card_ev
+            prob = counts[card] / size
+            if prob == 0:
+                continue
+            ev += prob * card_ev
+            for grad_card in range(1, 11):
+                grad[grad_card] += prob * card_grad[grad_card]
+        for card, card_ev in card_evs.items():
+            grad[card] += (card_ev - ev) / size
+        self.remember(self.double_grad_table, key, (ev, grad))
+        return ev, grad
+
+    def cell_ev_grad(self, fpc, spc, duc, counts):
+        """Returns the stand, hit and double EVs of a two card hand, as
+        hand_builder finds them, along with a list of their derivatives. The
+        count vector is the deck less the player cards and the duc."""
+        pht, hard_or_soft = best_hand_from_card_list([fpc, spc])
+        exclude = DDC_EXCLUDE.get(duc)
+        size = sum(counts)
+        if exclude is not None:
+            size -= counts[exclude]
 
-    def pair_hand_builder(self, pair_of, duc, deck):
+        ev_list = [0, 0, 0]
+        grads = [[0] * 11, [0] * 11, [0] * 11]
+        ddc_ev_lists = {}
+        for ddc in range(1, 11):
+            if ddc == exclude:
+                continue
+            if counts[ddc] > 0:
+                new_counts = remove_card(counts, ddc)
+            else:
+                new_counts = counts
+            ddc_results = [self.stand_ev_grad(pht, duc, ddc, new_counts)]
+            if pht != 21:
+                ddc_results.append(self.hit_ev_grad(
+                        pht, hard_or_soft, duc, ddc, new_counts))
+                ddc_results.append(self.double_ev_grad(
+                        pht, hard_or_soft, duc, ddc, new_counts))
+            ddc_ev_lists[ddc] = [ev for ev, _ in ddc_results]
+            prob = counts[ddc] / size
+            if prob == 0:
+                continue
+            for ev_index, (ev, grad) in enumerate(ddc_results):
+                ev_list[ev_index] += prob * ev
+                for card in range(1, 11):
+                    grads[ev_index][card] += prob * grad[card]
+        for ddc, ddc_ev_list in ddc_ev_lists.items():
+            for ev_index, ev in enumerate(ddc_ev_list):
+                grads[ev_index][ddc] += (ev - ev_list[ev_index]) / size
+        if pht == 21:
+            ev_list[1:] = [-1, -1]
+        return ev_list, grads
+
+    # Composition dependent play. The player knows the cards dealt so far
+    # but not the ddc, so these work from the visible count vector, the deck
+    # less the player cards and the duc, and average over the ddc.
+
+    def cd_stand_ev(self, pht, duc, counts):
+        """Returns the EV of standing on a player hand total, averaged over
+        the ddcs the visible count vector allows."""
+        exclude = DDC_EXCLUDE.get(duc)
+        size = sum(counts)
+        if exclude is not None:
+            size -= counts[exclude]
+        ev = 0
+        for ddc in range(1, 11):
+            if counts[ddc] == 0 or ddc == exclude:
+                continue
+            dht, hard_or_soft = best_hand_from_card_list([duc, ddc])
+            ev += counts[ddc] / size * stand_ev(
+                    pht,
+                    self.dealer_dist(dht, hard_or_soft, 
+                                     remove_card(counts, ddc))
+                    )
+        return ev
+
+    def cd_draw_probs(self, duc, counts):
+        """Returns a list of (card, probability, visible count vector after
+        the draw) for the next player card, when the ddc is still hidden."""
+        exclude = DDC_EXCLUDE.get(duc)
+        size = sum(counts)
+        ddc_size = size
+        if exclude is not None:
+            ddc_size -= counts[exclude]
+        draws = []
+        for card in range(1, 11):
+            if counts[card] == 0:
+                continue
+            # One of this card may be the ddc.
+            if card == exclude:
+                ddc_chance = 0
+            else:
+                ddc_chance = counts[card] / ddc_size
+            prob = (counts[card] - ddc_chance) / (size - 1)
+            if prob > 0:
+                draws.append((card, prob, remove_card(counts, card)))
+        return draws
+
+    def cd_best_play(self, pht, hard_or_soft, duc, counts, double_ok):
+        """Returns the best play and its EV for a hand of three or more cards
+        with the passed best total, given the visible count vector. Doubling
+        is only considered if double_ok."""
+        key = (pht, hard_or_soft, duc, counts, double_ok)
+        found = self.cd_table.get(key)
+        if found is not None:
+            return found
+
+        best = ('S', self.cd_stand_ev(pht, duc, counts))
+        if pht < 21:
+            hit_ev = self.cd_hit_ev(pht, hard_or_soft, duc, counts, double_ok)
+            if hit_ev > best[1]:
+                best = ('H', hit_ev)
+            if double_ok:
+                double_ev = self.cd_double_ev(pht, hard_or_soft, duc, counts) \
+                            - self.extra_bet_cost(duc, counts)
+                if double_ev > best[1]:
+                    best = ('D', double_ev)
+        self.remember(self.cd_table, key, best)
+        return best
+
+    def cd_hit_ev(self, pht, hard_or_soft, duc, counts, double_ok):
+        """Returns the EV of hitting a hand and then playing composition
+        dependent, given the visible count vector. This is the composition
+        dependent counterpart of hit_ev."""
+        ev = 0
+        for card, prob, new_counts in self.cd_draw_probs(duc, counts):
+            total, new_hard_or_soft = add_card(pht, hard_or_soft, card)
+            if total > 21:
+                ev -= prob
+            else:
+                _, play_ev = self.cd_best_play(total, new_hard_or_soft, duc, 
+                                               new_counts, double_ok)
+                ev += prob * play_ev
+        return ev
+
+    def cd_double_ev(self, pht, hard_or_soft, duc, counts):
+        """Returns the EV of doubling a hand given the visible count
+        vector."""
+        ev = 0
+        for card, prob, new_counts in self.cd_draw_probs(duc, counts):
+            total, _ = add_card(pht, hard_or_soft, card)
+            if total > 21:
+                ev -= prob
+            else:
+                ev += prob * self.cd_stand_ev(total, duc, new_counts)
+        return 2 * ev
+
+    def cd_play(self, player_card_list, duc, seen_cards, split=False,
+                hand=None):
+        """Returns the composition dependent play for a hand of three or
+        more cards. seen_cards holds every card the player has seen, other
+        than the duc and those in player_card_list, whose HandState can be
+        passed as hand."""
+        counts = list(self.book.counts)
+        for card in player_card_list + seen_cards + [duc]:
+            counts[card] -= 1
+        if hand is None:
+            hand = hand_state_of(player_card_list)
+        pht, hard_or_soft = hand.total, hand.hard_or_soft
+        double_ok = self.double_any_hand and (not split or self.rules.das)
+        play, _ = self.cd_best_play(pht, hard_or_soft, duc, tuple(counts),
+                                    double_ok)
+        return play
+
+    def build_cd_gains(self):
+        """Finds the composition dependent hit EV of every two card hand,
+        and returns a dict of the book play EV and the best composition
+        dependent EV for each (fpc, spc, duc) hand where they differ."""
+        cd_gains = {}
+        for fpc in range(1, 11):
+            for spc in range(fpc, 11):
+                for duc in range(1, 11):
+                    valid_hand, _ = self.book.hand_prob(fpc, spc, duc)
+                    pht, hard_or_soft = best_hand_from_card_list([fpc, spc])
+                    if not valid_hand or pht == 21:
+                        continue
+                    play, ev_list = self.book.cell(fpc, spc, duc)
+                    counts = list(self.book.counts)
+                    for card in [fpc, spc, duc]:
+                        counts[card] -= 1
+                    hit_ev = self.cd_hit_ev(pht, hard_or_soft, duc, 
+                                            tuple(counts), 
+                                            self.double_any_hand)
+                    if hit_ev > ev_list[EV_INDEX[play]] + CD_GAIN_MIN:
+                        cd_gains[(fpc, spc, duc)] = \
+                                (ev_list[EV_INDEX[play]], hit_ev)
+        return cd_gains
+
+    def pair_hand_builder(self, pair_of, duc, deck, rng=None,
+                          sim_hands=None):
         """Calculates the ev of splitting a pair. Assumes a player will 
         continue to split if he draws another pair_of card up to the maximum 
         allowed by MAX_SPLIT HANDS, the RSA variable for aces, and of course 
-        assumming that there is another pair_of card to be drawn."""
-
-        old_best_play, ev_list = self.book_lookup([pair_of, pair_of], duc)
-        max_nonsplit_ev = max(ev_list)
+        assumming that there is another pair_of card to be drawn. Each pair
+        cell draws from its own stream of the book seed, so a cell's result
+        doesn't depend on which cells were simulated before it. If sim_hands
+        is passed, exactly that many hands are simulated, with no early
+        stop. The convergence of the simulation is recorded as the cell's
+        PairDiagnostics. With common random numbers, the simulated non-split
+        play is a control variate unless it is a hit played composition
+        dependent, whose expectation isn't the book EV."""
+
+        old_best_play, ev_list = self.book.lookup([pair_of, pair_of], duc)
         if old_best_play == 'X':
             return
+        # Only compare against the allowed stand, hit or double play, so that
+        # redoing a pair doesn't compare against the split EV of the previous
+        # run.
+        nonsplit_play, _ = self.book.no_split_lookup([pair_of, pair_of], duc)
+        nonsplit_play = self.double_check(nonsplit_play, [pair_of, pair_of],
+                                          duc)
+        max_nonsplit_ev = ev_list[EV_INDEX[nonsplit_play]]
         
-        # The p's and m's in the variables below represent the different
-        # ways that a split hand can stay at just two hands, or expand
-        # to three or four hands. A 'p' represents a second card draw
-        # that is a pair card and results in a new split hand. A 'm'
-        # represents a second card draw that is not a pair card, and that
-        # hand gets played out normally.
-        
-        #Pair stats
-        global two_hand_count
-        global three_hand_count
-        global four_hand_count
-        global two_hand_ev_summation_list
-        global three_hand_ev_summation_list
-        global four_hand_ev_summation_list
-        global mm_ev_summation_list
-        global p_ev_summation_list
-        global mp_ev_summation_list
-        global pmmm_ev_summation_list
-        global mpmm_ev_summation_list
-        global pp_ev_summation_list
-        global pmp_ev_summation_list
-        global mpp_ev_summation_list
-        global pmmp_ev_summation_list
-        global mpmp_ev_summation_list
-        global event_hand_counts
-        global ddc_is_pc_count
-        
+        if rng is None:
+            rng = CounterRNG(self.seed).spawn(pair_of, duc)
+        shoe = self.make_shoe(deck, [pair_of, pair_of, duc], rng)
+        if sim_hands is None:
+            last_count = SIM_MAX
+        else:
+            last_count = sim_hands
 
-        two_hand_count = 0
-        three_hand_count = 0
-        four_hand_count = 0
-        two_hand_ev_summation_list = [0, 0]
-        three_hand_ev_summation_list = [0, 0, 0]
-        four_hand_ev_summation_list = [0, 0, 0, 0]
-        mm_ev_summation_list = [0, 0]
-        p_ev_summation_list = [0, 0, 0]
-        mp_ev_summation_list = [0, 0, 0]
-        pmmm_ev_summation_list = [0, 0, 0]
-        mpmm_ev_summation_list = [0, 0, 0]        
-        pp_ev_summation_list = [0, 0, 0, 0]
-        pmp_ev_summation_list = [0, 0, 0, 0]
-        mpp_ev_summation_list = [0, 0, 0, 0]
-        pmmp_ev_summation_list = [0, 0, 0, 0]
-        mpmp_ev_summation_list = [0, 0, 0, 0]
-        event_hand_counts = {'mm':0, 'p':0, 'mp':0, 'pmmm':0, 'mpmm':0, 
-                             'pp':0, 'pmp':0, 'mpp':0, 'pmmp':0, 'mpmp':0}
-        ddc_is_pc_count = {'mm':0, 'p':0, 'mp':0, 'pmmm':0, 'mpmm':0, 
-                             'pp':0, 'pmp':0, 'mpp':0, 'pmmp':0, 'mpmp':0}
-        
         split_ev = 0
+        first_count = 0
+        # The outcomes and events of the split hands are gathered in the
+        # same runs as the split EV.
+        outcomes = new_split_outcomes()
+        split_stats = SplitStats()
+        # A resumed build carries on the checkpointed simulation of its
+        # cell.
+        pair_sim = self.pair_sim
+        self.pair_sim = None
+        if pair_sim is not None and pair_sim['cell'] != (pair_of, duc):
+            pair_sim = None
+        if pair_sim is not None:
+            shoe.setstate(pair_sim['shoe'])
+            first_count = pair_sim['count']
+            outcomes = pair_sim.get('outcomes', outcomes)
+            split_stats = pair_sim.get('split_stats', split_stats)
+        hands = first_count
         
-        for count in range(0, SIM_MAX):
-            run_ev = self.sim_play(pair_of, pair_of, duc, 'P', False, deck)
-            split_ev = (run_ev + split_ev * count) / (count + 1)
-            diff = abs(split_ev - max_nonsplit_ev)
-            if count > 10000 and diff * count > 200:
-                break
+        if self.crn:
+            # Common random numbers: play the non-split play on the same
+            # cards as the split. Its exact EV is known, so its simulated
+            # result is used as a control variate, and the split minus
+            # non-split difference is estimated directly along with its own
+            # standard error. A hit is played on from three cards, by the
+            # exact cards left with composition dependent play, and then the
+            # book EV isn't its expectation, so it can't be a control.
+            control = nonsplit_play != 'H' or \
+                    not self.composition_dependent or \
+                    self.book.rules.deck_choice == 'infinite'
+            split_mean = 0
+            nonsplit_mean = 0
+            split_m2 = 0
+            nonsplit_m2 = 0
+            co_m2 = 0
+            if pair_sim is not None:
+                split_mean, nonsplit_mean, split_m2, nonsplit_m2, co_m2 = \
+                        pair_sim['sums']
+            for count in range(first_count + 1, last_count + 1):
+                shoe.new_hand()
+                hand_results = []
+                split_run_ev = self.sim_play(pair_of, pair_of, duc, 'P',
+                                             False, shoe=shoe,
+                                             hand_results=hand_results,
+                                             split_stats=split_stats)
+                add_split_outcome(outcomes, hand_results)
+                shoe.rewind()
+                nonsplit_run_ev = self.sim_play(pair_of, pair_of, duc,
+                                                nonsplit_play, False,
+                                                shoe=shoe)
+                hands = count
+                split_delta = split_run_ev - split_mean
+                nonsplit_delta = nonsplit_run_ev - nonsplit_mean
+                split_mean += split_delta / count
+                nonsplit_mean += nonsplit_delta / count
+                split_m2 += split_delta * (split_run_ev - split_mean)
+                nonsplit_m2 += nonsplit_delta * \
+                        (nonsplit_run_ev - nonsplit_mean)
+                co_m2 += split_delta * (nonsplit_run_ev - nonsplit_mean)
+                if sim_hands is None and count >= CRN_MIN_HANDS and \
+                   count % CRN_CHECK_HANDS == 0:
+                    diff_mean, std_error = crn_difference(
+                            count, split_mean, nonsplit_mean, split_m2,
+                            nonsplit_m2, co_m2, max_nonsplit_ev, control)
+                    if abs(diff_mean) > CRN_Z * std_error:
+                        break
+                if count % CHECKPOINT_CHECK_HANDS == 0:
+                    self.checkpoint({'cell': (pair_of, duc),
+                                     'count': count,
+                                     'sums': (split_mean, nonsplit_mean,
+                                              split_m2, nonsplit_m2, co_m2),
+                                     'outcomes': outcomes,
+                                     'split_stats': split_stats,
+                                     'shoe': shoe.getstate()})
+            diff_mean, std_error = crn_difference(
+                    hands, split_mean, nonsplit_mean, split_m2, nonsplit_m2,
+                    co_m2, max_nonsplit_ev, control)
+            split_ev = max_nonsplit_ev + diff_mean
+        else:
+            # The non-split EV is exact, so the standard error of the margin
+            # is that of the split EV.
+            split_m2 = 0
+            if pair_sim is not None:
+                split_ev = pair_sim['sums'][0]
+                if len(pair_sim['sums']) > 1:
+                    split_m2 = pair_sim['sums'][1]
+            for count in range(first_count, last_count):
+                shoe.new_hand()
+                hand_results = []
+                run_ev = self.sim_play(pair_of, pair_of, duc, 'P', False,
+                                       shoe=shoe, hand_results=hand_results,
+                                       split_stats=split_stats)
+                add_split_outcome(outcomes, hand_results)
+                hands = count + 1
+                split_delta = run_ev - split_ev
+                split_ev = (run_ev + split_ev * count) / (count + 1)
+                split_m2 += split_delta * (run_ev - split_ev)
+                diff = abs(split_ev - max_nonsplit_ev)
+                if sim_hands is None and count > 10000 and \
+                   diff * count > 200:
+                    break
+                if count % CHECKPOINT_CHECK_HANDS == 0:
+                    self.checkpoint({'cell': (pair_of, duc),
+                                     'count': count + 1,
+                                     'sums': (split_ev, split_m2),
+                                     'outcomes': outcomes,
+                                     'split_stats': split_stats,
+                                     'shoe': shoe.getstate()})
+            if hands > 1:
+                std_error = sqrt(split_m2 / (hands - 1) / hands)
+            else:
+                std_error = inf
         
         # We need to compare the split EV (total_ev) with the previously 
         # determined EVs for standing, hitting and doubling to determine 
@@ -2472,96 +3711,55 @@ class Book(tk.Frame):
 
 
         if split_ev > max_nonsplit_ev:
-            book[(pair_of, pair_of, duc)][0] = 'P'
-        if len(book[(pair_of, pair_of, duc)]) == 4:
-            book[(pair_of, pair_of, duc)].append(split_ev)
-        elif len(book[(pair_of, pair_of, duc)]) == 5:
-            book[(pair_of, pair_of, duc)][4] = split_ev
+            self.book.set_play(pair_of, pair_of, duc, 'P')
+        else:
+            self.book.set_play(pair_of, pair_of, duc, nonsplit_play)
+        self.book.set_split_ev(pair_of, duc, split_ev)
+        self.book.set_split_dist(pair_of, duc, *split_dist_of(outcomes))
+        self.book.set_cell_diagnostics(
+                pair_of, duc,
+                PairDiagnostics(hands, split_ev, std_error, nonsplit_play,
+                                max_nonsplit_ev,
+                                {event: event_count / hands
+                                 for event, event_count
+                                 in sorted(split_stats.events.items())}))
 
         if DEBUG >= 2:
             print(f'\npair_hand_builder simulation statistics for pair of '
                   f' {pair_of} and duc {duc}')
-            print(f'Number of hand simulations: {count}')            
-            for event in event_hand_counts.keys():
-                print(f'Event: {event} prob: '
-                      f'{event_hand_counts[event] / count}') 
-
-            if event_hand_counts['mm'] != 0:
-                mm_ev_list = []
-                if event_hand_counts['mm'] != 0:
-                    for summ in mm_ev_summation_list:
-                        mm_ev_list.append(summ / event_hand_counts['mm'])
-                    print(f'mm_ev_list: {mm_ev_list}')
-                    
-            if event_hand_counts['p'] != 0:
-                p_ev_list = []
-                for summ in p_ev_summation_list:
-                    p_ev_list.append(summ / event_hand_counts['p'])
-                print(f'p_ev_list: {p_ev_list}')
-            if event_hand_counts['mp'] != 0:
-                mp_ev_list = []
-                for summ in mp_ev_summation_list:
-                    mp_ev_list.append(summ / event_hand_counts['mp'])
-                print(f'mp_ev_list: {mp_ev_list}')
-            if event_hand_counts['pmp'] != 0:
-                pmp_ev_list = []
-                for summ in pmp_ev_summation_list:
-                    pmp_ev_list.append(summ / event_hand_counts['pmp'])
-                print(f'pmp_ev_list: {pmp_ev_list}')
-            if event_hand_counts['mpp'] != 0:
-                mpp_ev_list = []
-                for summ in mpp_ev_summation_list:
-                    mpp_ev_list.append(summ / event_hand_counts['mpp'])
-                print(f'mpp_ev_list: {mpp_ev_list}')         
-            if event_hand_counts['pmmm'] != 0:
-                pmmm_ev_list = []
-                for summ in pmmm_ev_summation_list:
-                    pmmm_ev_list.append(summ / event_hand_counts['pmmm'])
-                print(f'pmmm_ev_list: {pmmm_ev_list}')
-            if event_hand_counts['mpmm'] != 0:
-                mpmm_ev_list = []
-                for summ in mpmm_ev_summation_list:
-                    mpmm_ev_list.append(summ / event_hand_counts['mpmm'])
-                print(f'mpmm_ev_list: {mpmm_ev_list}')
-            if event_hand_counts['pp'] != 0:
-                pp_ev_list = []
-                for summ in pp_ev_summation_list:
-                    pp_ev_list.append(summ / event_hand_counts['pp'])
-                print(f'pp_ev_list: {pp_ev_list}')
-            if event_hand_counts['mpmp'] != 0:
-                mpmp_ev_list = []
-                for summ in mpmp_ev_summation_list:
-                    mpmp_ev_list.append(summ / event_hand_counts['mpmp'])
-                print(f'mpmp_ev_list: {mpmp_ev_list}')
-            if event_hand_counts['pmmp'] != 0:
-                pmmp_ev_list = []
-                for summ in pmmp_ev_summation_list:
-                    pmmp_ev_list.append(summ / event_hand_counts['pmmp'])
-                print(f'pmmp_ev_list: {pmmp_ev_list}')        
-                                       
-            ddc_is_pc_chance = {}
-            for event in event_hand_counts.keys():
-                if event_hand_counts[event] > 0:
-                    ddc_is_pc_chance[event] = ddc_is_pc_count[event] /\
-                        event_hand_counts[event]
-            print(f'ddc_is_pc_chance: {ddc_is_pc_chance}') 
-                  
-def main():
-    root = tk.Tk()
-    root.title('Leon\'s Blackjack Book Maker')
-    root.geometry('1340x400')
-    main = Book(root)
-    root.mainloop()
+            print(f'Number of hand simulations: {hands}')
+            split_stats.print_stats(hands)
 
-if __name__ == '__main__':
-    main()
 
-    
+# Start up timing
+class StartupTimer:
+    """Times the stages of starting the GUI or the job server, for their
+    --startup-timing flag."""
 
+    def __init__(self, start_time):
+        self.start_time = start_time
+        self.last_time = start_time
+        self.stages = []
 
+    def mark(self, stage):
+        """Records the time taken by a stage, since the last one ended."""
+        now = time.perf_counter()
+        self.stages.append((stage, now - self.last_time))
+        self.last_time = now
 
+    def report(self, file=sys.stderr):
+        """Outputs the time taken by each stage, and the total."""
+        for stage, seconds in self.stages:
+            print(f'{stage:<20}{seconds * 1000:8.1f} ms', file=file)
+        print(f'{"total":<20}{(self.last_time - self.start_time) * 1000:8.1f}'
+              f' ms', file=file)
 
 
+def main(argv=None):
+    """Runs the GUI. It is imported here, rather than at the top, so that
+    the book building classes can be used without tkinter."""
+    import bookmaker_gui
+    bookmaker_gui.main(argv, START_TIME)
 
-                                
-        
+if __name__ == '__main__':
+    main()
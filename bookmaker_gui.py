@@ -0,0 +1,1475 @@
+# Title: Leon's blackjack bookmaker GUI
+# (c) 2020 Leon S. Erikson
+# Licensed to others under BSD3
+
+
+import time
+# When the program was started, for --startup-timing.
+START_TIME = time.perf_counter()
+
+import pickle
+import argparse
+import tkinter as tk
+from tkinter import messagebox
+from tkinter import filedialog
+from tkinter import simpledialog
+from math import floor
+
+from blackjack_release_v1 import (BookBuilder, BookTable, CARD_VALUES,
+                                  CHECKPOINT_FILE, COLORS, DEVIATION_COLOR,
+                                  HARD_HAND_COMP, NUM_TO_TEXT, ONE_DECK,
+                                  Rules, SIM_SEED, SIM_TOTAL_HANDS,
+                                  StartupTimer, TotalEVLedger,
+                                  best_hand_from_card_list)
+
+# Number of play labels in the main window: 10 hard totals, 8 soft totals
+# and 10 pairs against 10 dealer up cards.
+PLAY_LABEL_COUNT = 280
+
+# Bind tag shared by the play labels.
+PLAY_LABEL_TAG = 'PlayLabel'
+
+
+# The application class
+class Book(tk.Frame):
+    """GUI application for custom deck play book and EV creation."""
+    button_states = {True:'sunken', False:'raised'}
+
+    
+    def __init__(self, parent):
+        """Initialize the frame."""
+        super(Book, self).__init__(parent)
+        self.parent = parent
+        # self.deck_choice is one of 'infinite', 'finite', or 'custom
+        self.deck_choice = 'infinite'
+        # self.got_book is one of 'waiting', 'building', or 'finished'
+        self.got_book = "waiting"
+        self.num_decks = 1
+        self.deck = ONE_DECK.copy()
+        self.play_deviations = {}
+        self.seed = SIM_SEED
+        self.builder = None
+        # The book shown in the main window, and the ledger of its total
+        # EV with the plays shown, made when it is first needed.
+        self.book = None
+        self.ev_ledger = None
+        self.create_menus()
+        
+        self.show_frame = tk.Frame(self.parent, bd=0)
+        self.show_frame.pack(expand=True, fill='both')
+        
+        # The play labels are made by initialize_show_frame as it places
+        # them. They share one click binding through the PLAY_LABEL_TAG
+        # bind tag.
+        self.playlist_labels = [None] * PLAY_LABEL_COUNT
+        self.playlist_label_indexes = {}
+        self.bind_class(PLAY_LABEL_TAG, "<Button-1>", self.play_label_click)
+
+        self.game_rules_Text = tk.Text(self.show_frame, height=17, width=30)
+        self.game_rules_Text.place(x=0, y=0)
+
+        self.game_stats_Text = tk.Text(self.show_frame, height=3, width=30)
+        self.game_stats_Text.place(x=0, y=240)
+
+        self.game_status_Text = tk.Text(self.show_frame, height=4, width=30)
+        self.game_status_Text.place(x=0, y=290)
+        
+        self.initialize_show_frame()
+        self.show_game_info()
+        self.update_book_build_status()
+    
+    def create_menus(self):
+        """create main window menus."""
+        self.menu = tk.Menu(self.parent)
+        self.parent.config(menu=self.menu)
+
+        self.menu_book = tk.Menu(self.menu, tearoff=0)
+        self.menu_book.add_command(label="Load book", command=self.load)
+        self.menu_book.add_command(label="Save book", command=self.save)
+        self.menu_book.add_command(label="Build book", command=self.build)
+        self.menu_book.add_command(label="Resume build",
+                                   command=self.resume_build)
+        self.menu_book.add_command(label="Build pairs",
+                                   command=self.all_pair_redo)        
+        self.menu_book.add_command(label="Refine pairs",
+                                   command=self.refine_pairs)
+        self.menu_book.entryconfig("Save book", state="disabled")
+        self.menu_book.entryconfig("Build pairs", state="disabled")  
+        self.menu_book.entryconfig("Refine pairs", state="disabled")
+        
+        self.menu.add_cascade(label="Book", menu=self.menu_book)
+
+        self.menu_rules = tk.Menu(self.menu, tearoff=0)
+        
+
+        self.deck_choice_stringvar = tk.StringVar(None, 'infinite')
+                   
+        self.menu_rules.add_radiobutton(
+                label="Infinite Deck",
+                variable=self.deck_choice_stringvar,
+                value='infinite',
+                command=self.set_deck_infinite
+                )
+        self.menu_rules.add_radiobutton(
+                label="Finite Deck",
+                variable=self.deck_choice_stringvar,
+                value='finite',
+                command=self.set_deck_finite
+                )
+        self.menu_rules.add_radiobutton(
+                label="Custom Deck",
+                variable=self.deck_choice_stringvar,
+                value='custom',
+                command=self.set_deck_custom
+                )
+        self.menu_rules.add_separator()
+        
+        self.double_var = tk.StringVar(None, "first two")
+        self.menu_rules.add_radiobutton(
+                label="Double Anytime",
+                variable=self.double_var,
+                value='any hand',
+                command=lambda: self.toggle('any hand')
+                )
+        self.menu_rules.add_radiobutton(
+                label="Double First Two Cards",
+                variable=self.double_var,
+                value='first two',
+                command=lambda: self.toggle('first two')
+                )
+        self.menu_rules.add_radiobutton(
+                label="Double Hard 9, 10, 11 Only",
+                variable=self.double_var,
+                value='9 10 11',
+                command=lambda: self.toggle('9 10 11')
+                )
+        self.menu_rules.add_radiobutton(
+                label="Double Hard 10, 11 Only",
+                variable=self.double_var,
+                value='10 11',
+                command=lambda: self.toggle('10 11')
+                )
+        self.menu_rules.add_separator()
+        
+        self.fullpay_var = tk.BooleanVar(None, True)
+        self.menu_rules.add_radiobutton(
+                label="BJ Pays 3:2",
+                variable=self.fullpay_var,
+                value=True,
+                command=lambda: self.toggle('PAY full')
+                )
+        self.menu_rules.add_radiobutton(
+                label="BJ Pays 6:5",
+                variable=self.fullpay_var,
+                value=False,
+                command=lambda: self.toggle('PAY less')
+                )
+        self.menu_rules.add_separator()
+        
+        self.msh_var = tk.IntVar(None, 4)
+        self.menu_rules.add_radiobutton(
+                label="Max Split Hands = 4",
+                variable=self.msh_var,
+                value=4,
+                command=lambda: self.toggle('msh4')
+                )
+        self.menu_rules.add_radiobutton(
+                label="Max Split Hands = 3",
+                variable=self.msh_var,
+                value=3,
+                command=lambda: self.toggle('msh3')
+                )
+        self.menu_rules.add_radiobutton(
+                label="Max Split Hands = 2",
+                variable=self.msh_var,
+                value=2,
+                command=lambda: self.toggle('msh2')
+                )
+        self.menu_rules.add_separator()
+        self.dhs17_var = tk.BooleanVar(None, True)
+        self.menu_rules.add_checkbutton(
+                label="DHS17",
+                variable=self.dhs17_var,
+                command=lambda: self.toggle('DHS17')
+                )
+        self.das_var = tk.BooleanVar(None, True)
+        self.menu_rules.add_checkbutton(
+                label="DAS",
+                variable=self.das_var,
+                command=lambda: self.toggle('DAS')
+                )
+        self.hsa_var = tk.BooleanVar(None, False)
+        self.menu_rules.add_checkbutton(
+                label="HSA",
+                variable=self.hsa_var,
+                command=lambda: self.toggle('HSA')
+                )
+        self.rsa_var = tk.BooleanVar(None, True)
+        self.menu_rules.add_checkbutton(
+                label="RSA",
+                variable=self.rsa_var,
+                command=lambda: self.toggle('RSA')
+                )
+        self.menu_rules.add_separator()
+        self.surrender_var = tk.StringVar(None, 'none')
+        self.menu_rules.add_radiobutton(
+                label="No Surrender",
+                variable=self.surrender_var,
+                value='none',
+                command=lambda: self.toggle('surrender')
+                )
+        self.menu_rules.add_radiobutton(
+                label="Late Surrender",
+                variable=self.surrender_var,
+                value='late',
+                command=lambda: self.toggle('surrender')
+                )
+        self.menu_rules.add_radiobutton(
+                label="Early Surrender",
+                variable=self.surrender_var,
+                value='early',
+                command=lambda: self.toggle('surrender')
+                )
+        self.menu_rules.add_separator()
+        self.peek_var = tk.StringVar(None, 'peek')
+        self.menu_rules.add_radiobutton(
+                label="Dealer Peeks",
+                variable=self.peek_var,
+                value='peek',
+                command=lambda: self.toggle('peek')
+                )
+        self.menu_rules.add_radiobutton(
+                label="No Hole Card (ENHC)",
+                variable=self.peek_var,
+                value='enhc',
+                command=lambda: self.toggle('peek')
+                )
+        self.menu_rules.add_radiobutton(
+                label="No Hole Card, Original Bets Only",
+                variable=self.peek_var,
+                value='enhc obo',
+                command=lambda: self.toggle('peek')
+                )
+        self.menu.add_cascade(label="Rules", menu=self.menu_rules)
+        self.menu_player = tk.Menu(self.menu, tearoff=0)
+        self.tem_var = tk.BooleanVar(None, False)
+        self.menu_player.add_checkbutton(
+                label="Take Even Money",
+                variable=self.tem_var,
+                command=lambda: self.toggle('TEM')
+                )
+        self.ti_var = tk.BooleanVar(None, False)
+        self.menu_player.add_checkbutton(
+                label="Take Insurance",
+                variable=self.ti_var,
+                command=lambda: self.toggle('TI')
+                )
+        self.menu.add_cascade(label="Player", menu=self.menu_player)
+        self.menu_detail = tk.Menu(self.menu, tearoff=0)
+        self.menu_detail.add_command(
+                label="Show all play EVs", 
+                command=self.print_ev
+                )
+        self.menu_detail.add_command(
+                label="Show hard hand deviations",
+                command=self.show_play_deviations
+                )
+        self.menu_detail.add_command(
+                label="Simulate total EV",
+                command=self.show_sim_total_ev
+                )
+        self.menu_detail.add_command(
+                label="Show outcome distributions",
+                command=self.show_outcomes
+                )
+        self.menu_detail.add_command(
+                label="Show effects of removal",
+                command=self.show_eors
+                )
+        self.menu_detail.add_command(
+                label="Show composition dependent gains",
+                command=self.show_cd_gains
+                )
+        self.menu_detail.add_command(
+                label="Show pair diagnostics",
+                command=self.show_pair_diagnostics
+                )
+        self.menu.add_cascade(label="Details", menu=self.menu_detail)
+        self.menu.entryconfig("Details", state="disabled")
+        self.menu_options = tk.Menu(self.menu, tearoff=0)
+        self.menu_options.add_command(
+                label="Set simulation seed",
+                command=self.set_seed
+                )
+        self.shuffled_shoe_var = tk.BooleanVar(None, False)
+        self.menu_options.add_checkbutton(
+                label="Shuffled Shoe Simulation",
+                variable=self.shuffled_shoe_var
+                )
+        self.crn_var = tk.BooleanVar(None, False)
+        self.menu_options.add_checkbutton(
+                label="Common Random Numbers for Pairs",
+                variable=self.crn_var
+                )
+        self.cd_var = tk.BooleanVar(None, False)
+        self.menu_options.add_checkbutton(
+                label="Composition Dependent Simulation",
+                variable=self.cd_var
+                )
+        self.eor_approx_var = tk.BooleanVar(None, False)
+        self.menu_options.add_checkbutton(
+                label="EOR Approximation for Hard Hands",
+                variable=self.eor_approx_var
+                )
+        self.native_kernel_var = tk.BooleanVar(None, True)
+        self.menu_options.add_checkbutton(
+                label="Native Kernel (with Numba)",
+                variable=self.native_kernel_var
+                )
+        self.checkpoint_var = tk.BooleanVar(None, False)
+        self.menu_options.add_checkbutton(
+                label="Checkpoint Builds",
+                variable=self.checkpoint_var
+                )
+        self.menu.add_cascade(label="Options", menu=self.menu_options)
+        self.menu_help = tk.Menu(self.menu, tearoff=0)
+        self.menu_help.add_command(label="Instructions", command=self.help)
+        self.menu.add_cascade(label="Help", menu=self.menu_help)
+            
+    def help(self):
+        help_message_lines = [
+             'Welcome! To create a play book, first select your desired deck.',
+             'Decks can be infinite, finite with a specified number of decks,',
+             'or custom allowing you to specify deck composition by number of',
+             'cards. Then select your desired game rules: DHS17 for dealer ',
+             'hits soft 17, DAS for double after split, HSA for player may ',
+             'hit split aces, and RSA for player may resplit aces up to the ',
+             'max ace split amount. Once your desired rules are set, click ',
+             'the book menu and select "build book."']
+        messagebox.showinfo('Instructions', " ".join(help_message_lines)) 
+
+    def set_seed(self):
+        """Sets the seed used by the pair hand simulations."""
+        seed = simpledialog.askinteger(
+                'Simulation seed',
+                'Seed for the pair hand simulations:',
+                initialvalue=self.seed,
+                minvalue=0
+                )
+        if seed is None or seed == self.seed:
+            return
+        self.seed = seed
+        self.reset_plays(type='pair')
+        self.show_game_info()
+                        
+    def save(self):
+        """Save a 'book' after one has been built."""
+        book_filename = filedialog.asksaveasfilename(
+                title="Save File",
+                filetypes=(("Book Files", "*.book"),
+                ("All files", "*.*"))
+                )
+        if book_filename is None or book_filename == '':
+            return
+        self.book.save(book_filename)
+
+    def load(self):
+        """Load a book after one has been saved."""
+        book_filename = filedialog.askopenfilename(
+                title="Open File",
+                filetypes=(("Book Files", "*.book"),
+                ("All files", "*.*"))
+                )
+        if book_filename is None or book_filename == '':
+            return
+        
+        self.book = BookTable.load(book_filename)
+
+        self.reset_plays()
+
+        self.deck = self.book.deck
+        loaded_rules = self.book.rules
+        self.seed = self.book.seed
+
+        assert loaded_rules[0] in ['infinite', 'finite', 'custom']
+        self.deck_choice = loaded_rules[0]
+        self.deck_choice_stringvar.set(loaded_rules[0])
+        
+        if self.dhs17_var.get() != loaded_rules[1]:
+            self.toggle('DHS17')
+            self.dhs17_var.set(loaded_rules[1])
+
+        if self.das_var.get() != loaded_rules[2]:
+            self.toggle('DAS')
+            self.das_var.set(loaded_rules[2])
+
+        if self.hsa_var.get() != loaded_rules[3]:
+            self.toggle('HSA')
+            self.hsa_var.set(loaded_rules[3])
+
+        if self.rsa_var.get() != loaded_rules[4]:
+            self.toggle('RSA')
+            self.rsa_var.set(loaded_rules[4])
+
+        if self.fullpay_var.get() != loaded_rules[5]:
+            if loaded_rules[5] == True:
+                self.toggle('PAY full')
+                self.fullpay_var.set(1)
+            else:
+                self.toggle('PAY less')
+                self.fullpay_var.set(0)
+            
+        if self.msh_var.get() != loaded_rules[6]:
+            if loaded_rules[6] == 2:
+                self.toggle('msh2')
+                self.msh_var.set(2)
+            elif loaded_rules[6] == 3:
+                self.toggle('msh3')
+                self.msh_var.set(3)
+            else:
+                self.toggle('msh4')
+                self.msh_var.set(4)
+
+        if self.double_var.get() != loaded_rules[7]:
+            self.toggle(loaded_rules[7])
+            self.double_var.set(loaded_rules[7])
+
+        assert type(loaded_rules[8]) == int
+        self.num_decks = loaded_rules[8]
+
+        if self.surrender_var.get() != loaded_rules[9]:
+            self.toggle('surrender')
+            self.surrender_var.set(loaded_rules[9])
+
+        if self.peek_var.get() != loaded_rules[10]:
+            self.toggle('peek')
+            self.peek_var.set(loaded_rules[10])
+        self.menu.entryconfig("Details", state="normal")
+        self.menu_book.entryconfig("Save book", state="normal")
+        self.menu_book.entryconfig("Build pairs", state="normal")
+        self.menu_book.entryconfig("Refine pairs", state="normal")
+
+        for index in range(0, PLAY_LABEL_COUNT):
+            self.set_label_play(index, '?', 'gray')
+        self.show_frame.update()
+
+        for index in range(0, PLAY_LABEL_COUNT):
+            book_tuple = self.get_book_tuple_from_playlist_index(index)
+            if book_tuple[1] == 'hard':
+                play, _ = self.book.hard_total(
+                        book_tuple[0], book_tuple[2])
+            elif book_tuple[1] == 'soft':
+                play, _ = self.book.lookup(
+                        [1, book_tuple[0] - 11], book_tuple[2])
+            else:
+                play, _ = self.book.lookup(
+                        [book_tuple[0], book_tuple[0]],
+                        book_tuple[2])
+
+            assert play in ['S', 'H', 'D', 'P', 'R']
+            self.set_label_play(index, play, COLORS[play])
+        self.show_frame.update()
+        self.ev_ledger = None
+        self.builder = BookBuilder(self.book.rules, self.book.deck,
+                                   self.book.seed, book=self.book,
+                                   progress=self.show_build_progress,
+                                   **self.builder_options())
+        self.got_book = "finished"
+        self.update_book_build_status()
+        self.show_game_info()
+           
+    def update_book_build_status(self, card_list=None, hand_type=None):
+        """Update the game status info shown in the main window."""
+        self.game_status_text = "BOOK STATUS:\n"
+        if self.got_book == "building":
+            self.game_status_text += 'Book is being built. \nWorking on '
+            self.game_status_text += hand_type + ' hand: \n'
+            self.game_status_text += '(' + NUM_TO_TEXT[card_list[0]] + ', ' + \
+                                        NUM_TO_TEXT[card_list[1]] + ', ' + \
+                                        NUM_TO_TEXT[card_list[2]] + ')'
+        elif self.got_book == "waiting":
+            self.game_status_text += 'Load or build a book under ' + \
+                                     '\nthe book menu to get started.'
+        elif self.got_book == "finished":
+            self.game_status_text += \
+                'Built. Left click a play to\nset a play deviation.'
+
+        self.game_status_Text.delete('1.0', tk.END)
+        self.game_status_Text.insert('1.0', self.game_status_text)
+        self.game_status_Text.update()
+
+    def reset_plays(self, type='all'):
+        """Reset either all plays or just pair plays in the main window."""
+        if type == 'all':
+            start_index = 0
+            self.menu_book.entryconfig("Build pairs", state="disabled")
+            self.menu_book.entryconfig("Refine pairs", state="disabled")
+        elif type == 'pair':
+            start_index = 180
+        end_index = PLAY_LABEL_COUNT
+        self.got_book = "waiting"
+        self.menu.entryconfig("Details", state="disabled")
+        self.menu_book.entryconfig("Save book", state="disabled")
+            
+        for index in range(start_index, end_index):
+            self.set_label_play(index, '?', 'gray')
+        self.update_book_build_status()
+        self.show_frame.update()
+
+    def set_play_deviation(self, label_index):
+        """Sets a play deviation."""
+        hand_total, hand_type, duc = \
+            self.get_book_tuple_from_playlist_index(label_index)
+        assert hand_type in ['hard', 'soft', 'pair']
+        if hand_type == 'hard':
+            book_play, _ = self.book.hard_total(hand_total, duc)
+        elif hand_type == 'soft':
+            book_play, _ = self.book.lookup([1, hand_total - 11], duc)
+        else:
+            book_play, _ = self.book.lookup([int(hand_total / 2),
+                                          int(hand_total / 2)],
+                                         duc)
+        if hand_type == 'pair':
+            plays = ['S', 'H', 'D', 'P']
+        else:
+            plays = ['S', 'H', 'D']
+        if self.book.rules.surrender != 'none':
+            plays.append('R')
+
+        display_play = self.label_play(label_index)
+        play_index = plays.index(display_play)
+        play_index += 1
+        if play_index == len(plays):
+            play_index -= len(plays)
+        new_play = plays[play_index]
+        if new_play == book_play:
+            self.set_label_play(label_index, new_play, COLORS[new_play])
+        else:
+            self.set_label_play(label_index, new_play, DEVIATION_COLOR)
+        if self.ev_ledger is not None:
+            for fpc, spc, duc in self.label_hands(label_index):
+                self.ev_ledger.set_play(fpc, spc, duc, new_play, False)
+            self.ev_ledger.total()
+        self.show_game_info()
+
+    def label_hands(self, label_index):
+        """Returns the (fpc, spc, duc) two card hands whose play is shown in
+        a play label."""
+        total, hand_type, duc = \
+            self.get_book_tuple_from_playlist_index(label_index)
+        if hand_type == 'pair':
+            return [(total, total, duc)]
+        if hand_type == 'soft':
+            return [(1, total - 11, duc), (total - 11, 1, duc)]
+        return [(fpc, total - fpc, duc) for fpc in range(2, 11)
+                if 2 <= total - fpc <= 10 and fpc != total - fpc]
+
+    def play_label_click(self, event):
+        """Sets a play deviation for the play label clicked on."""
+        self.set_play_deviation(self.playlist_label_indexes[event.widget])
+
+    def set_label_play(self, label_index, play, color):
+        """Shows a play in a play label."""
+        self.playlist_labels[label_index].config(text=play, bg=color)
+
+    def label_play(self, label_index):
+        """Returns the play shown in a play label."""
+        return self.playlist_labels[label_index].cget('text')
+                   
+    def builder_options(self):
+        """Returns the build and simulation choices set in the options menu,
+        as keyword arguments for a BookBuilder."""
+        return {'shuffled_shoe': self.shuffled_shoe_var.get(),
+                'crn': self.crn_var.get(),
+                'eor_approx': self.eor_approx_var.get(),
+                'composition_dependent': self.cd_var.get(),
+                'take_even_money': self.tem_var.get(),
+                'take_insurance': self.ti_var.get(),
+                'native_kernel': self.native_kernel_var.get()}
+
+    def show_build_progress(self, event, card_list, hand_type):
+        """Shows the progress of a BookBuilder in the main window. Hands are
+        shown in the status text as they are started, and their plays are
+        shown as they are finished."""
+        if event == 'start':
+            self.update_book_build_status(card_list, hand_type)
+            return
+        self.ev_ledger = None
+        fpc, spc, duc = card_list
+        if hand_type == 'pair':
+            total = fpc
+            play, _ = self.book.lookup([fpc, spc], duc)
+        else:
+            total, _ = best_hand_from_card_list([fpc, spc])
+            if hand_type == 'hard':
+                if total < 8 or total > 17:
+                    return
+                play, _ = self.book.hard_total(total, duc)
+            else:
+                if total < 13 or total > 20:
+                    return
+                play, _ = self.book.lookup([fpc, spc], duc)
+            play = self.builder.double_check(play, [fpc, spc], duc)
+        label_index = self.get_playlist_index_from_book_tuple(
+                total, hand_type, duc)
+        self.set_label_play(label_index, play, COLORS[play])
+        self.show_frame.update()
+
+    def current_rules(self):
+        """Returns the rules set in the rules menu."""
+        return Rules(
+                self.deck_choice, 
+                self.dhs17_var.get(), 
+                self.das_var.get(),
+                self.hsa_var.get(), 
+                self.rsa_var.get(), 
+                self.fullpay_var.get(),
+                self.msh_var.get(), 
+                self.double_var.get(), 
+                self.num_decks,
+                self.surrender_var.get(),
+                self.peek_var.get()
+                )
+
+    def build(self):
+        """Builds the book for the current rule set."""
+        self.reset_plays()
+        self.got_book = "building"
+        self.show_game_info()
+        if self.checkpoint_var.get():
+            checkpoint_file = CHECKPOINT_FILE
+        else:
+            checkpoint_file = None
+        self.builder = BookBuilder(self.current_rules(), self.deck, self.seed,
+                                   progress=self.show_build_progress,
+                                   checkpoint_file=checkpoint_file,
+                                   **self.builder_options())
+        self.run_build()
+
+    def resume_build(self):
+        """Carries on a build from a checkpoint file. The rules and deck set
+        in the main window must be the ones the checkpoint was made with."""
+        checkpoint_filename = filedialog.askopenfilename(
+                title="Resume Build",
+                filetypes=(("Checkpoint Files", "*.checkpoint"),
+                ("All files", "*.*"))
+                )
+        if checkpoint_filename is None or checkpoint_filename == '':
+            return
+        try:
+            builder = BookBuilder.resume(checkpoint_filename,
+                                         self.current_rules(), self.deck,
+                                         progress=self.show_build_progress)
+        except (ValueError, pickle.UnpicklingError) as error:
+            messagebox.showerror('Resume build', str(error))
+            return
+        options = builder.get_options()
+        self.shuffled_shoe_var.set(options['shuffled_shoe'])
+        self.crn_var.set(options['crn'])
+        self.eor_approx_var.set(options['eor_approx'])
+        self.cd_var.set(options['composition_dependent'])
+        self.native_kernel_var.set(options['native_kernel'])
+        self.seed = builder.seed
+        self.reset_plays()
+        self.got_book = "building"
+        self.show_game_info()
+        self.builder = builder
+        self.run_build()
+
+    def run_build(self):
+        """Runs the build of self.builder, showing its progress."""
+        self.book = self.builder.book
+        self.builder.build()
+        
+        self.menu.entryconfig("Details", state="normal")
+        self.menu_book.entryconfig("Save book", state="normal")
+        self.menu_book.entryconfig("Build pairs", state="normal")
+        self.menu_book.entryconfig("Refine pairs", state="normal")
+        self.got_book = "finished"
+        self.update_book_build_status()
+        self.show_game_info()
+        self.builder.show_eor_errors()
+        self.builder.show_engine_metrics()
+
+    def all_pair_redo(self):
+        """Re-builds all pair hands."""
+        self.reset_plays('pair')
+        self.got_book = "building"
+        self.show_game_info()
+        self.builder.seed = self.seed
+        self.builder.set_options(**self.builder_options())
+        if self.checkpoint_var.get():
+            self.builder.checkpoint_file = CHECKPOINT_FILE
+        else:
+            self.builder.checkpoint_file = None
+        self.builder.build_pairs()
+        self.menu.entryconfig("Details", state="normal")
+        self.menu_book.entryconfig("Save book", state="normal")
+        self.got_book = "finished"
+        self.update_book_build_status()
+        self.show_game_info()
+
+    def refine_pairs(self):
+        """Simulates again the pair hands whose split vs non-split margin is
+        within REFINE_Z standard errors, with REFINE_HANDS more hands."""
+        self.got_book = "building"
+        self.show_game_info()
+        self.builder.set_options(**self.builder_options())
+        refined = self.builder.refine_pairs()
+        print(f'Refined {len(refined)} pair hands.')
+        self.got_book = "finished"
+        self.update_book_build_status()
+        self.show_game_info()
+
+    def show_game_info(self):
+        """Creates the game info text for the main window."""
+        self.game_rules_text = "GAME RULES/ PLAYER CHOICES:"
+        if self.fullpay_var.get():
+            self.game_rules_text += "\nBlackjack pays 3:2"
+        else:
+            self.game_rules_text += "\nBlackjack pays 6:5"
+        self.game_rules_text += "\nDeck choice: " + str(self.deck_choice)
+        if self.deck_choice == 'finite':
+            self.game_rules_text += "\nNumber of decks = " + \
+                    str(self.num_decks)
+        elif self.deck_choice == 'custom':
+            self.game_rules_text += "\nDeck composition: \n"
+            for card in CARD_VALUES:
+                card_text = NUM_TO_TEXT[card]
+                self.game_rules_text += card_text + ":" + \
+                    str(self.deck.count(card)) + ", "
+        self.game_rules_text += "\nDouble on: " + self.double_var.get()
+        self.game_rules_text += "\nDHS17: " + str(self.dhs17_var.get())
+        self.game_rules_text += "\nMax Split Hands: " + str(self.msh_var.get())
+        self.game_rules_text += "\nDAS: " + str(self.das_var.get())
+        self.game_rules_text += "\nRSA: " + str(self.rsa_var.get())
+        self.game_rules_text += "\nHSA: " + str(self.hsa_var.get())
+        self.game_rules_text += "\nSurrender: " + self.surrender_var.get()
+        self.game_rules_text += "\nDealer peek: " + self.peek_var.get()
+        self.game_rules_text += "\nTake even money: " + str(self.tem_var.get())
+        self.game_rules_text += "\nTake insurance: " + str(self.ti_var.get())
+        self.game_rules_text += "\nSimulation seed: " + str(self.seed)
+        if self.eor_approx_var.get() and self.deck_choice != 'infinite':
+            self.game_rules_text += "\nHard hands: EOR approximated"
+
+        
+        try:
+            self.game_rules_Text.delete('1.0', tk.END)
+        except:
+            pass
+        
+        self.game_rules_Text.insert('1.0', self.game_rules_text)
+        #self.game_rules_Text['state']='disabled'
+        self.game_rules_Text.update()
+        
+        # Stats
+        self.game_stats_text = "GAME EXPECTED VALUE:"
+        if self.got_book == "finished":
+            ev, cost = self.get_total_ev()
+            self.ev = ev
+            self.game_stats_text += "\nTotal EV: " + format(ev, "^-14.9f")
+            self.game_stats_text += "\nDeviation Cost: " + \
+                format(cost, "^-12.7f")
+            
+        else:
+            self.game_stats_text += "\nPending..."
+        try:
+            self.game_stats_Text.delete('1.0', tk.END)
+        except:
+            pass
+        self.game_stats_Text.insert('1.0', self.game_stats_text)
+        self.game_stats_Text.update()
+        
+              
+    def toggle(self, button):
+        """Handles overhead for some menu selections."""
+        if button == 'any hand' or button == 'first two' or \
+           button == '9 10 11' or button == '10 11':
+            self.double_var.set(button)
+        if button in ['any hand','first two','9 10 11','10 11','DHS17',
+                      'surrender','peek']:
+            self.reset_plays()
+        if button in ['msh2','msh3','msh4','DAS','HSA','RSA']:
+            self.reset_plays(type='pair')
+        self.show_game_info()
+
+    def set_deck_infinite(self):
+        """Sets the deck choice to infinite."""
+        if self.deck_choice != 'infinite':
+            self.got_book = "waiting"
+            self.reset_plays()
+                        
+        try:
+            self.ev_canvas.delete("all")
+        except Exception:
+            pass
+
+        try:
+            self.deck_finite_window.destroy()         
+        except Exception:
+            pass
+
+        try:    
+            self.deck_custom_window.destroy()
+        except Exception:
+            pass
+
+        self.deck = ONE_DECK.copy()
+        self.deck_choice = 'infinite'
+        self.show_game_info()
+       
+
+    def set_deck_finite(self):
+        """Sets the deck choice to finite."""
+        if self.deck_choice != 'finite':
+            self.got_book = "waiting"
+            self.reset_plays()
+
+        try:
+            self.deck_custom_window.destroy()
+        except Exception:
+            pass
+
+        try:
+            self.deck_finite_window.destroy()
+        except Exception:
+            pass
+
+        self.deck_finite_window = tk.Toplevel(self)
+        self.deck_finite_window.title("Finite Deck")
+        self.deck_finite_window.geometry("120x210")
+
+        self.deck_choice = 'finite'
+            
+        self.finite_deck_frame = tk.Frame(
+                self.deck_finite_window, 
+                bd=2, 
+                relief='raised',
+                width=100, 
+                height=190
+                )
+        self.finite_deck_frame.place(x=10, y=10)
+        self.finite_deck_add_deck_button = tk.Button(
+                self.finite_deck_frame,
+                text = "Add Deck",
+                command=self.add_deck
+                )
+        self.finite_deck_add_deck_button.place(x=10, y=10, width=80, height=30)
+        self.finite_deck_label = tk.Label(
+                self.finite_deck_frame, 
+                text = "Deck Count"
+                )
+        self.finite_deck_label.place(x=10, y=45)
+        self.finite_deck_canvas = tk.Canvas(
+                self.finite_deck_frame, 
+                background = 'white',
+                width=60, 
+                height=40
+                )
+        self.finite_deck_canvas.place(x=20,y=70)
+        self.finite_deck_update()
+        self.finite_deck_remove_deck_button = tk.Button(
+                self.finite_deck_frame,
+                text = "Remove Deck",
+                wraplength=80,
+                command=self.remove_deck
+                )
+        self.finite_deck_remove_deck_button.place(
+                x=10, 
+                y=120, 
+                width=80, 
+                height=50
+                )
+        self.show_game_info()
+
+    def set_deck_custom(self):
+        """Sets the deck choice to custom."""
+
+        try:
+            self.deck_finite_window.destroy() 
+        except Exception:
+            pass
+
+        self.got_book = "waiting"
+        self.update_book_build_status()
+        
+        try:
+            self.ev_canvas.delete("all")
+        except Exception:
+            pass
+
+        if self.deck_choice != 'custom':
+            self.deck_choice = 'custom'
+            self.reset_plays()
+
+
+        self.deck_custom_window = tk.Toplevel(self)
+        self.deck_custom_window.title("Custom Deck")
+        self.deck_custom_window.geometry("560x250")
+        
+        self.custom_deck_frame = tk.Frame(
+                self.deck_custom_window, 
+                bd=2, 
+                relief='raised',
+                width=540, 
+                height=230
+                )
+        self.custom_deck_frame.place(x=10, y=10)
+        self.custom_deck_card_values_label = tk.Label(
+                self.custom_deck_frame, 
+                text = "Card values"
+                )
+        self.custom_deck_card_values_label.place(x=230, y=10)
+        self.custom_deck_card_counts_label = tk.Label(
+                self.custom_deck_frame, 
+                text = "Card counts"
+                )
+        self.custom_deck_card_counts_label.place(x=230, y=190)
+
+        self.custom_deck_value_labels = []
+        self.custom_deck_plus_buttons = []
+        self.custom_deck_minus_buttons = []
+        self.custom_deck_canvases = []
+        self.custom_deck_canvas_texts = []
+
+        for index, card in enumerate(CARD_VALUES):
+            value_label = tk.Label(
+                    self.custom_deck_frame, 
+                    text = NUM_TO_TEXT[card]
+                    )
+            value_label.place(x=30 + index*50, y=30)
+            self.custom_deck_value_labels.append(value_label)
+            plus_button = tk.Button(
+                    self.custom_deck_frame,
+                    text = "+",
+                    command=lambda card=card: 
+                    self.custom_deck_add_card(card)
+                    )
+            plus_button.place(x=10 + index*50, y=50, width=35, height=35)
+            self.custom_deck_plus_buttons.append(plus_button)
+            minus_button = tk.Button(
+                    self.custom_deck_frame,
+                    text = "-",
+                    command=lambda card=card: 
+                    self.custom_deck_subtract_card(card)
+                    )
+            minus_button.place(x=10 + index*50, y=90, width=35, height=35)
+            self.custom_deck_minus_buttons.append(minus_button)
+            count_canvas = tk.Canvas(
+                    self.custom_deck_frame, 
+                    background = 'white',
+                    width=35, 
+                    height=35
+                    )
+            count_canvas.place(x=10 + index*50,y=135)
+            self.custom_deck_canvases.append(count_canvas)
+            canvas_text = count_canvas.create_text(
+                    20, 
+                    20,
+                    text=str(self.deck.count(card)),
+                    font=('Helvetica', 18, 'bold'),
+                    justify='center'
+                    )
+            self.custom_deck_canvas_texts.append(canvas_text)
+        reset_button = tk.Button(
+                self.custom_deck_frame,
+                text = "Reset to one deck",
+                command=self.custom_deck_reset
+                )
+        reset_button.place(x=360, y=185, width=135, height=35)
+        self.show_game_info()
+                            
+    def custom_deck_reset(self):
+        """Resets the current deck to be one regular deck."""
+        self.deck = ONE_DECK.copy()
+        self.custom_deck_update_canvas()
+        self.show_game_info()
+
+    def custom_deck_add_card(self, card):
+        """Adds a card to the current deck."""
+        self.deck.append(card)
+        self.custom_deck_update_canvas()
+        self.show_game_info()
+                
+    def custom_deck_subtract_card(self, card):
+        """Subtracts a card from the current deck."""
+        if self.deck.count(card) >= 4:
+            self.deck.remove(card)
+            self.custom_deck_update_canvas()
+        else:
+            messagebox.showinfo(
+                    'Custom deck message', 
+                    "Minimum of three of each card required."
+                    )
+        self.show_game_info()
+
+    def custom_deck_update_canvas(self):
+        """Updates the displayed number of each card in the custom deck 
+        window."""
+        for index, card in enumerate(CARD_VALUES):
+            self.custom_deck_canvases[index].delete("all")
+            canvas_text = self.custom_deck_canvases[index].create_text(
+                    20, 
+                    20,
+                    text=str(self.deck.count(card)),
+                    font=('Helvetica', 18, 'bold'),
+                    justify='center'
+                    )
+            self.custom_deck_canvas_texts[index] = canvas_text
+            self.custom_deck_canvases[index].update()       
+        
+    def add_deck(self):
+        """Adds a deck for the finite deck choice."""
+        self.num_decks += 1
+        self.finite_deck_update()
+
+    def remove_deck(self):
+        """Removes a deck for the finite deck choice."""
+        if self.num_decks > 1:
+            self.num_decks -= 1
+            self.finite_deck_update()
+
+    def finite_deck_update(self):
+        """Updates self.deck to accommodate add and remove deck choices."""
+        self.show_game_info()
+        self.finite_deck_canvas.delete("all")
+        self.finite_deck_canvas.create_text(
+                30, 
+                20,
+                text=str(self.num_decks),
+                font=('Helvetica', 18, 'bold'),
+                justify='center'
+                )
+        self.finite_deck_canvas.update()
+        self.deck = self.num_decks * ONE_DECK
+
+    def make_play_label(self, label_index, x, y):
+        """Makes and places a play label, showing no play yet."""
+        label = tk.Label(self.show_frame, text='?', bg=COLORS['?'],
+                         font=(None, 15))
+        label.bindtags((PLAY_LABEL_TAG,) + label.bindtags())
+        label.place(x=x, y=y)
+        self.playlist_labels[label_index] = label
+        self.playlist_label_indexes[label] = label_index
+
+    def initialize_show_frame(self):
+        """Initializes the plays shown in the main window. Each play label
+        is made where it is placed."""
+        # Hard Hands
+
+        start_row = 0
+        start_col = 280
+        
+        label = tk.Label(
+                self.show_frame, 
+                text='Hard Hands', 
+                background='gold', 
+                font = (None,15)
+                )
+        label.place(x=start_col + 110, y=start_row)
+
+        col = 30
+        for up_card in range(2, 12):
+            duc = NUM_TO_TEXT[up_card]
+            label = tk.Label(self.show_frame, text = duc, font = (None, 15))
+            label.place(x=start_col + col, y=start_row + 30)
+            col += 30
+
+        row = 60
+        for hard_hand in range(8, 18):
+            label = tk.Label(self.show_frame, text = str(hard_hand),
+                  font = (None, 15))
+            label.place(x=start_col, y = start_row + row)
+
+            col = 30
+            for up_card in range(2, 12):
+                if up_card == 11:
+                    duc = 1
+                else:
+                    duc = up_card
+                label_index = self.get_playlist_index_from_book_tuple(
+                        hard_hand, 
+                        'hard', 
+                        duc
+                        )
+                self.make_play_label(label_index, start_col + col,
+                                     start_row + row)
+
+                col += 30
+            row += 30
+
+        # Soft Hands
+
+        start_row = 0
+        start_col = 620
+          
+        label = tk.Label(
+                self.show_frame, 
+                text = 'Soft Hands', 
+                font = (None, 15),
+                background = 'gold'
+                )
+        label.place(x=start_col + 110, y=start_row)
+
+        row = 30
+        col = 30
+
+        for up_card in range(2, 12):
+            duc=NUM_TO_TEXT[up_card]
+            label = tk.Label(self.show_frame, text = duc, font = (None, 15))
+            label.place(x=start_col + col, y=start_row + row)
+            col += 30
+
+        row += 30
+
+        for soft_hand in range(13, 21):
+            label = tk.Label(self.show_frame, text = str(soft_hand),
+                  font = (None, 15))
+            label.place(x=start_col, y = start_row + row)
+
+            col = 30
+        
+            for up_card in range(2, 12):
+                if up_card == 11:
+                    duc = 1
+                else:
+                    duc = up_card
+                label_index = self.get_playlist_index_from_book_tuple(
+                        soft_hand, 'soft', duc)
+                self.make_play_label(label_index, start_col + col,
+                                     start_row + row)
+
+                col += 30
+            row += 30
+
+        # Pairs
+        start_col = 960
+        start_row = 0
+
+        label = tk.Label(self.show_frame, text = 'Pairs', font = (None, 15),
+                  background = 'gold')
+        label.place(x=start_col + 140, y=start_row)
+        
+        row = 30
+        col = 50
+
+        for up_card in range(2, 12):
+            duc=NUM_TO_TEXT[up_card]
+            label = tk.Label(self.show_frame, text = duc, font = (None, 15))
+            label.place(x=start_col + col, y=start_row + row)
+            col += 30
+
+        row += 30
+        col = 0
+
+        for pair in range(2, 12):
+            col = 0
+            pair_txt = NUM_TO_TEXT[pair]
+            label = tk.Label(self.show_frame,
+                             text = pair_txt + ', ' + pair_txt,
+                             font = (None, 15))
+            label.place(x=start_col, y = start_row + row)
+            col += 50
+
+            if pair == 11:
+                pair_of = 1
+            else:
+                pair_of = pair
+            
+            for up_card in range(2, 12):
+                if up_card == 11:
+                    duc = 1
+                else:
+                    duc = up_card
+                label_index = self.get_playlist_index_from_book_tuple(
+                        pair_of, 'pair', duc)
+                self.make_play_label(label_index, start_col + col,
+                                     start_row + row)
+
+                col += 30
+
+            row += 30
+
+        # Legend
+        legend_frame = tk.Frame(
+                self.show_frame, 
+                bd=2, 
+                relief='raised',
+                width=320, 
+                height=95
+                )
+        legend_frame.place(x=620, y=310)
+        legend_stand = tk.Label(
+                legend_frame, 
+                text='S',
+                font=(None, 15), 
+                background=COLORS['S']
+                )
+        legend_stand.place(x=0, y=0)
+        legend_stand_a = tk.Label(
+                legend_frame, 
+                text=': Stand',
+                font=(None, 15)
+                )
+        legend_stand_a.place(x=20, y=0)
+        legend_hit = tk.Label(
+                legend_frame, 
+                text='H',
+                font=(None, 15), 
+                background=COLORS['H']
+                )
+        legend_hit.place(x=115, y=0)
+        legend_hit_a = tk.Label(
+                legend_frame, 
+                text=': Hit',
+                font=(None, 15)
+                )
+        legend_hit_a.place(x=135, y=0)
+        legend_double = tk.Label(
+                legend_frame, 
+                text='D',
+                font=(None, 15), 
+                background=COLORS['D']
+                )
+        legend_double.place(x=200, y=0)
+        legend_double_a = tk.Label(
+                legend_frame, 
+                text=': Double',
+                font=(None, 15)
+                )
+        legend_double_a.place(x=220, y=0)
+        legend_double = tk.Label(
+                legend_frame, 
+                text='P',
+                font=(None, 15), 
+                background=COLORS['P']
+                )
+        legend_double.place(x=0, y=30)
+        legend_double_a = tk.Label(
+                legend_frame, 
+                text=': Split',
+                font=(None, 15)
+                )
+        legend_double_a.place(x=20, y=30)
+        legend_deviation = tk.Label(
+                legend_frame, 
+                text='  ',
+                font=(None, 15), 
+                background=DEVIATION_COLOR
+                )
+        legend_deviation.place(x=115, y=30)
+        legend_deviation_a = tk.Label(
+                legend_frame, 
+                text=': Play Deviation',
+                font=(None, 15)
+                )
+        legend_deviation_a.place(x=135, y=30)
+        legend_surrender = tk.Label(
+                legend_frame, 
+                text='R',
+                font=(None, 15), 
+                background=COLORS['R']
+                )
+        legend_surrender.place(x=0, y=60)
+        legend_surrender_a = tk.Label(
+                legend_frame, 
+                text=': Surrender',
+                font=(None, 15)
+                )
+        legend_surrender_a.place(x=20, y=60)
+        self.show_frame.update()
+        
+    # Helper Functions
+    def get_playlist_index_from_book_tuple(self, total, hand_type, duc):
+        """Returns the index of the play labels shown on the main screen
+        for a passed total, hand_type and duc combination."""
+
+        assert hand_type in ['hard', 'soft', 'pair']
+        type_offset = {'hard':0, 'soft':100, 'pair':180}
+        duc_offset = {2:0, 3:1, 4:2, 5:3, 6:4, 7:5, 8:6, 9:7, 10:8, 1:9}
+        if hand_type == 'hard':
+            assert total >= 8 and total <= 17
+            row_offset = (total - 8) * 10
+            return type_offset[hand_type] + row_offset + duc_offset[duc]
+        elif hand_type == 'soft':
+            assert total >= 13 and total <= 20
+            row_offset = (total - 13) * 10
+            return type_offset[hand_type] + row_offset + duc_offset[duc]
+        else:
+            assert total >= 1 and total <= 10
+            if total != 1:
+                row_offset = (total - 2) * 10
+            else:
+                row_offset = 90
+            return type_offset[hand_type] + row_offset + duc_offset[duc]
+
+    def get_book_tuple_from_playlist_index(self, index):
+        """Returns a book tuple of total, hand_type, and duc for a passed
+        play label index."""
+        
+        assert index >=0 and index < 280
+        duc_offset = {0:2, 1:3, 2:4, 3:5, 4:6, 5:7, 6:8, 7:9, 8:10, 9:1}
+        if index < 100:
+            hand_type = 'hard'
+            total = floor(index / 10) + 8
+            duc = duc_offset[index % 10]
+        elif index >= 100 and index < 180:
+            hand_type = 'soft'
+            total = floor((index - 100) / 10) + 13
+            duc = duc_offset[index % 10]
+        else:
+            hand_type = 'pair'
+            total = floor((index - 180) / 10) + 2
+            if total == 11:
+                total = 1
+            duc = duc_offset[index % 10]
+        return (total, hand_type, duc)
+
+    def show_play_deviations(self):
+        """Outputs hard hand play deviations to standard out."""
+        are_there_deviations = False
+        for pht in range(20, 5, -1):
+            for duc in range(10, 0, -1):
+                if len(HARD_HAND_COMP[pht]) > 1:
+                    book_play, _ = self.book.hard_total(pht, duc)
+                    for cards in HARD_HAND_COMP[pht]:
+                        deviation_play, _ = self.book.no_split_lookup(
+                                [cards[0],
+                                cards[1]],
+                                duc
+                                )
+                        if book_play != deviation_play:
+                            print(f'Book Play for {cards}, duc: {duc} is '
+                                  f'{book_play}. '
+                                  f'Deviation play is: {deviation_play}.')
+                            are_there_deviations = True
+        if not are_there_deviations:
+            print('No hard hand play deviations detected.')
+        else:
+            print('Finished hard hand comp play deviations check.')
+
+    def show_sim_total_ev(self):
+        """Outputs the simulated total EV next to the calculated one."""
+        ev, _ = self.get_total_ev()
+        self.builder.set_options(**self.builder_options())
+        sim_ev, std_error = self.builder.sim_total_ev(self.display_play)
+        print(f'Total EV: {ev:.6f} Simulated: {sim_ev:.6f} '
+              f'+/- {std_error:.6f} ({SIM_TOTAL_HANDS} rounds)')
+
+    def show_outcomes(self):
+        """Outputs the outcome distribution of a round and the spread of
+        every hand."""
+        try:
+            self.builder.print_outcomes(self.display_play, self.tem_var.get(),
+                                        self.ti_var.get())
+        except ValueError as error:
+            print(error)
+
+    def show_eors(self):
+        """Outputs the effects of removal of the total EV and of every
+        hand."""
+        if self.book.rules.deck_choice == 'infinite':
+            print('Taking a card out of an infinite deck has no effect. '
+                  'Effects of removal need a finite or custom deck.')
+            return
+        if self.book.eors is None:
+            self.builder.build_eors()
+        total_eor = self.book.get_total_ev_eor(self.display_play,
+                                               self.tem_var.get(),
+                                               self.ti_var.get())
+        self.book.print_eor(total_eor)
+
+    def display_play(self, fpc, spc, duc):
+        """Returns the play for a two card hand that is displayed in the main
+        frame, including any user-set play deviations. Hands that aren't
+        displayed use the book play."""
+        pht, hard_or_soft = best_hand_from_card_list([fpc, spc])
+        if (pht >= 8 and pht <= 17 and hard_or_soft == 'hard') or \
+           (pht >= 13 and pht <= 20 and hard_or_soft == 'soft') or \
+           fpc == spc:
+            if fpc == spc:
+                hand_type = 'pair'
+                total = fpc
+            else:
+                hand_type = hard_or_soft
+                total = pht
+            label_index = self.get_playlist_index_from_book_tuple(
+                    total,
+                    hand_type,
+                    duc
+                    )
+            return self.label_play(label_index)
+        return self.book.book_play(fpc, spc, duc)
+
+    def get_total_ev(self):
+        """Returns the total EV for the selected rules and deck, including
+        the effect of any play deviations. The cost of play deviations is
+        also returned. They are kept in a TotalEVLedger, which play
+        deviations update a hand at a time."""
+        flags = (self.tem_var.get(), self.ti_var.get())
+        ledger = self.ev_ledger
+        if ledger is None or ledger.book is not self.book or \
+           (ledger.take_even_money, ledger.take_insurance) != flags:
+            self.ev_ledger = TotalEVLedger(self.book, self.display_play,
+                                           *flags)
+        return self.ev_ledger.total_ev, self.ev_ledger.deviation_cost
+
+    def print_ev(self):
+        """Outputs the EV of every play in the book."""
+        self.book.print_ev()
+
+    def show_pair_diagnostics(self):
+        """Outputs how well the simulation of each pair hand converged."""
+        self.book.print_pair_diagnostics()
+
+    def show_cd_gains(self):
+        """Outputs the EV gained by composition dependent play over the book
+        for each two card hand, and for the whole game."""
+        if self.book.rules.deck_choice == 'infinite':
+            print('Composition dependent play is the same as the book for an '
+                  'infinite deck.')
+            return
+        cd_gains = self.builder.build_cd_gains()
+        size = len(self.book.deck)
+        peek_chance = {1: self.book.counts[10] / size,
+                       10: self.book.counts[1] / size}
+        total_gain = 0
+        print('\nComposition dependent play, hitting then playing on the '
+              'exact cards left.')
+        for (fpc, spc, duc), (book_ev, cd_ev) in cd_gains.items():
+            play, _ = self.book.cell(fpc, spc, duc)
+            _, hand_prob = self.book.hand_prob(fpc, spc, duc)
+            if fpc != spc:
+                hand_prob *= 2
+            total_gain += hand_prob * (1 - peek_chance.get(duc, 0)) * \
+                          (cd_ev - book_ev)
+            print(f'{NUM_TO_TEXT[fpc]},{NUM_TO_TEXT[spc]} v '
+                  f'{NUM_TO_TEXT[duc]}: book {play} {book_ev:9.5f}  '
+                  f'composition dependent H {cd_ev:9.5f}  '
+                  f'gain {cd_ev - book_ev:8.5f}')
+        print(f'Total EV gain: {total_gain:.6f} over {len(cd_gains)} hands '
+              f'where composition dependent play does better.\n')
+
+
+def main(argv=None, start_time=START_TIME):
+    parser = argparse.ArgumentParser(
+            description='Leon\'s Blackjack Book Maker')
+    parser.add_argument('--startup-timing', action='store_true',
+                        help='print the time taken by each stage of start up')
+    args = parser.parse_args(argv)
+    timer = StartupTimer(start_time)
+    timer.mark('imports')
+    root = tk.Tk()
+    root.title('Leon\'s Blackjack Book Maker')
+    root.geometry('1340x430')
+    timer.mark('Tk')
+    main = Book(root)
+    timer.mark('main window')
+    if args.startup_timing:
+        root.update()
+        timer.mark('first draw')
+        timer.report()
+    root.mainloop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,486 @@
+# Title: Leon's blackjack bookmaker native kernel
+# (c) 2020 Leon S. Erikson
+# Licensed to others under BSD3
+
+# A compiled kernel for the count vector recursion of a finite deck: the
+# dealer outcome distributions of dealer_dist and the hit EVs of hit_ev.
+# It is compiled with Numba when Numba is installed, and a BookBuilder then
+# uses it in place of its pure Python recursion unless built with
+# native_kernel=False. Without Numba, AVAILABLE is False and books are
+# built in pure Python as before.
+#
+# The kernel follows the same draws in the same order and adds up the same
+# terms as the Python recursion, so the books match to the last bit. It
+# only speeds up the hand cells of a build: the pair simulation takes most
+# of a full build and isn't compiled, and the first build in a fresh
+# Numba cache also pays for compiling the kernel. Check that the books
+# match, and compare the build times, with
+#
+#   python bookmaker_kernel.py --decks 1,2
+#
+# which builds each book both ways and lists any cell that differs.
+#
+# A count vector is held as an array of its card counts and, for the memo
+# tables, as one integer code: the counts in mixed radix, each card's digit
+# running from 0 to its count in the full deck, so drawing a card subtracts
+# the card's radix. Results are keyed by the code and the hand packed into
+# one more integer, 2 * total + soft, with the dealer cards added in for
+# player hands.
+
+
+import argparse
+import sys
+import time
+from itertools import islice
+
+try:
+    import numba
+    import numpy as np
+    from numba import types
+    from numba.typed import Dict
+except ImportError:
+    # Numba is optional. Without it the kernel isn't used.
+    numba = None
+
+AVAILABLE = numba is not None
+
+# Frames of the explicit stacks. A hand can't take more cards than this.
+MAX_DEPTH = 32
+
+# Play codes of the plays array. A hand without a built play is -1.
+STAND = 0
+HIT = 1
+DOUBLE = 2
+KERNEL_PLAYS = {'S': STAND, 'H': HIT, 'D': DOUBLE}
+
+# The player totals and hard or soft of the plays array, as the Python
+# recursion names them.
+HAND_TYPES = ('hard', 'soft')
+
+
+def jit(function):
+    """Compiles a kernel function with Numba when it is installed. The
+    compiled code releases the GIL, so builds in other threads run
+    alongside it."""
+    if numba is None:
+        return function
+    return numba.njit(cache=True, nogil=True)(function)
+
+
+@jit
+def add_card(total, soft, card):
+    """Returns the best total and soft flag of a hand after adding a card."""
+    if soft:
+        total += card
+        if total > 21:
+            return total - 10, 0
+        return total, 1
+    if card == 1 and total <= 10:
+        return total + 11, 1
+    return total + card, 0
+
+
+@jit
+def dealer_outcome(total, soft, dhs17):
+    """Returns the outcome index of a dealer hand that stands, 5 for a
+    bust, or -1 if the dealer draws to it."""
+    if total > 21:
+        return 5
+    if total >= 18 or (total == 17 and (not soft or not dhs17)):
+        return total - 17
+    return -1
+
+
+@jit
+def stand_ev(pht, dist):
+    """Returns the EV of standing on a total against a dealer outcome
+    distribution, summed as stand_ev() of blackjack_release_v1."""
+    ev = dist[5]
+    for outcome in range(5):
+        dht = outcome + 17
+        if pht > dht:
+            ev += dist[outcome]
+        elif pht < dht:
+            ev -= dist[outcome]
+    return ev
+
+
+@jit
+def dealer_dist(total, soft, counts, code, radix, dhs17, dealer_table):
+    """Returns the dealer outcome distribution of a hand drawing from the
+    count vector with the passed code. counts is changed while the tree is
+    walked and put back as it was."""
+    outcome = dealer_outcome(total, soft, dhs17)
+    if outcome >= 0:
+        stand = np.zeros(6)
+        stand[outcome] = 1.0
+        return (stand[0], stand[1], stand[2], stand[3], stand[4], stand[5])
+    key = (code, 2 * total + soft)
+    if key in dealer_table:
+        return dealer_table[key]
+
+    totals = np.empty(MAX_DEPTH, np.int64)
+    softs = np.empty(MAX_DEPTH, np.int64)
+    codes = np.empty(MAX_DEPTH, np.int64)
+    sizes = np.empty(MAX_DEPTH, np.int64)
+    next_cards = np.empty(MAX_DEPTH, np.int64)
+    dists = np.zeros((MAX_DEPTH, 6))
+    totals[0] = total
+    softs[0] = soft
+    codes[0] = code
+    sizes[0] = counts.sum()
+    next_cards[0] = 1
+    depth = 0
+    while True:
+        size = sizes[depth]
+        card = next_cards[depth]
+        pushed = False
+        while card <= 10:
+            count = counts[card]
+            if count == 0:
+                card += 1
+                continue
+            prob = count / size
+            card_total, card_soft = add_card(totals[depth], softs[depth],
+                                             card)
+            outcome = dealer_outcome(card_total, card_soft, dhs17)
+            if outcome >= 0:
+                dists[depth, outcome] += prob
+            else:
+                card_key = (codes[depth] - radix[card],
+                            2 * card_total + card_soft)
+                if card_key not in dealer_table:
+                    next_cards[depth] = card
+                    counts[card] -= 1
+                    depth += 1
+                    totals[depth] = card_total
+                    softs[depth] = card_soft
+                    codes[depth] = card_key[0]
+                    sizes[depth] = size - 1
+                    next_cards[depth] = 1
+                    dists[depth, :] = 0.0
+                    pushed = True
+                    break
+                card_dist = dealer_table[card_key]
+                for index in range(6):
+                    dists[depth, index] += prob * card_dist[index]
+            card += 1
+        if pushed:
+            continue
+
+        dist = (dists[depth, 0], dists[depth, 1], dists[depth, 2],
+                dists[depth, 3], dists[depth, 4], dists[depth, 5])
+        dealer_table[(codes[depth], 2 * totals[depth] + softs[depth])] = dist
+        if depth == 0:
+            return dist
+        depth -= 1
+        card = next_cards[depth]
+        counts[card] += 1
+        prob = counts[card] / sizes[depth]
+        for index in range(6):
+            dists[depth, index] += prob * dist[index]
+        next_cards[depth] = card + 1
+
+
+@jit
+def double_ev(pht, soft, dealer_total, dealer_soft, hand_key, counts, code,
+              radix, dhs17, dealer_table, double_table):
+    """Returns the EV of doubling a hand, as double_ev() of a BookBuilder.
+    hand_key packs the dealer cards beside the player hand."""
+    key = (code, hand_key + 2 * pht + soft)
+    if key in double_table:
+        return double_table[key]
+    size = counts.sum()
+    ev = 0.0
+    for card in range(1, 11):
+        count = counts[card]
+        if count == 0:
+            continue
+        prob = count / size
+        total, _ = add_card(pht, soft, card)
+        if total > 21:
+            ev -= prob
+        else:
+            counts[card] -= 1
+            dist = dealer_dist(dealer_total, dealer_soft, counts,
+                               code - radix[card], radix, dhs17,
+                               dealer_table)
+            counts[card] += 1
+            ev += prob * stand_ev(total, dist)
+    ev *= 2
+    double_table[key] = ev
+    return ev
+
+
+@jit
+def hit_ev(pht, soft, dealer_total, dealer_soft, hand_key, bj_card, enhc,
+           plays, counts, code, radix, dhs17, dealer_table, hit_table,
+           double_table):
+    """Returns the EV of hitting a hand and then playing the plays array,
+    as hit_ev() of a BookBuilder, and whether every play it reached was
+    built. bj_card is the hole card that makes a dealer blackjack, or 0,
+    and enhc charges a double for the bet a dealer blackjack would take."""
+    key = (code, hand_key + 2 * pht + soft)
+    if key in hit_table:
+        return hit_table[key], True
+
+    totals = np.empty(MAX_DEPTH, np.int64)
+    softs = np.empty(MAX_DEPTH, np.int64)
+    codes = np.empty(MAX_DEPTH, np.int64)
+    sizes = np.empty(MAX_DEPTH, np.int64)
+    next_cards = np.empty(MAX_DEPTH, np.int64)
+    evs = np.zeros(MAX_DEPTH)
+    totals[0] = pht
+    softs[0] = soft
+    codes[0] = code
+    sizes[0] = counts.sum()
+    next_cards[0] = 1
+    depth = 0
+    while True:
+        size = sizes[depth]
+        card = next_cards[depth]
+        ev = evs[depth]
+        pushed = False
+        while card <= 10:
+            count = counts[card]
+            if count == 0:
+                card += 1
+                continue
+            prob = count / size
+            total, card_soft = add_card(totals[depth], softs[depth], card)
+            if total > 21:
+                ev -= prob
+                card += 1
+                continue
+            play = plays[card_soft, total]
+            card_code = codes[depth] - radix[card]
+            if play == STAND:
+                counts[card] -= 1
+                dist = dealer_dist(dealer_total, dealer_soft, counts,
+                                   card_code, radix, dhs17, dealer_table)
+                counts[card] += 1
+                continue_ev = stand_ev(total, dist)
+            elif play == DOUBLE:
+                counts[card] -= 1
+                continue_ev = double_ev(total, card_soft, dealer_total,
+                                        dealer_soft, hand_key, counts,
+                                        card_code, radix, dhs17,
+                                        dealer_table, double_table)
+                if enhc and bj_card > 0:
+                    bj_chance = counts[bj_card] / (size - 1)
+                    continue_ev = continue_ev - bj_chance / (1 - bj_chance)
+                counts[card] += 1
+            elif play == HIT:
+                card_key = (card_code, hand_key + 2 * total + card_soft)
+                if card_key not in hit_table:
+                    next_cards[depth] = card
+                    evs[depth] = ev
+                    counts[card] -= 1
+                    depth += 1
+                    totals[depth] = total
+                    softs[depth] = card_soft
+                    codes[depth] = card_code
+                    sizes[depth] = size - 1
+                    next_cards[depth] = 1
+                    evs[depth] = 0.0
+                    pushed = True
+                    break
+                continue_ev = hit_table[card_key]
+            else:
+                # The book has no play for the hand yet. The counts of the
+                # open frames are put back before giving up.
+                while depth > 0:
+                    depth -= 1
+                    counts[next_cards[depth]] += 1
+                return np.nan, False
+            ev += prob * continue_ev
+            card += 1
+        if pushed:
+            continue
+
+        hit_table[(codes[depth], hand_key + 2 * totals[depth] +
+                   softs[depth])] = ev
+        if depth == 0:
+            return ev, True
+        depth -= 1
+        card = next_cards[depth]
+        counts[card] += 1
+        evs[depth] += counts[card] / sizes[depth] * ev
+        next_cards[depth] = card + 1
+
+
+class Kernel:
+    """The memo tables and deck of the kernel for one book build. The count
+    vectors passed must be drawn from the full deck counts it was made
+    with."""
+
+    def __init__(self, full_counts, dhs17, enhc, max_entries):
+        self.full_counts = tuple(full_counts)
+        self.radix = np.zeros(11, np.int64)
+        radix = 1
+        for card in range(1, 11):
+            self.radix[card] = radix
+            radix *= self.full_counts[card] + 1
+        if radix >= 2 ** 63:
+            raise ValueError('The deck is too large for the kernel tables.')
+        self.dhs17 = dhs17
+        self.enhc = enhc
+        # Once the tables hold more results than this, the oldest half of
+        # the largest is dropped.
+        self.max_entries = max_entries
+        self.clear_tables()
+
+    def clear_tables(self):
+        """Forgets the memoized results."""
+        key_type = types.UniTuple(types.int64, 2)
+        self.dealer_table = Dict.empty(key_type,
+                                       types.UniTuple(types.float64, 6))
+        self.hit_table = Dict.empty(key_type, types.float64)
+        self.double_table = Dict.empty(key_type, types.float64)
+
+    def entries(self):
+        """Returns the number of memoized results."""
+        return len(self.dealer_table) + len(self.hit_table) + \
+               len(self.double_table)
+
+    def check_entries(self):
+        """Drops the oldest half of the largest table if the tables hold too
+        many results."""
+        if self.entries() > self.max_entries:
+            largest = max((self.dealer_table, self.hit_table,
+                           self.double_table), key=len)
+            for key in list(islice(largest, (len(largest) + 1) // 2)):
+                del largest[key]
+
+    def play_array(self, play_of):
+        """Returns the plays array of hit_ev(), indexed by soft and total,
+        from a function of (total, hard or soft) that returns 'S', 'H', 'D'
+        or None where no play is built."""
+        plays = np.full((2, 22), -1, np.int64)
+        for soft, hard_or_soft in enumerate(HAND_TYPES):
+            for total in range(12 if soft else 4, 22):
+                play = play_of(total, hard_or_soft)
+                if play in KERNEL_PLAYS:
+                    plays[soft, total] = KERNEL_PLAYS[play]
+        return plays
+
+    def count_array(self, counts):
+        """Returns the count vector as an array and its code, or None if it
+        holds cards the full deck doesn't."""
+        code = 0
+        for card in range(1, 11):
+            if not 0 <= counts[card] <= self.full_counts[card]:
+                return None
+            code += counts[card] * int(self.radix[card])
+        return np.array(counts, np.int64), code
+
+    def dealer_dist(self, dht, hard_or_soft, counts):
+        """Returns the dealer outcome distribution of dealer_dist(), or None
+        if the count vector isn't from the deck."""
+        found = self.count_array(counts)
+        if found is None:
+            return None
+        count_array, code = found
+        dist = dealer_dist(dht, int(hard_or_soft == 'soft'), count_array,
+                           code, self.radix, self.dhs17, self.dealer_table)
+        self.check_entries()
+        return dist
+
+    def hit_ev(self, pht, hard_or_soft, dealer_hand, duc, ddc, counts,
+               plays):
+        """Returns the EV of hit_ev() with the passed plays array, or None if
+        the count vector isn't from the deck or a play isn't built.
+        dealer_hand is the (total, hard or soft) of duc and ddc."""
+        found = self.count_array(counts)
+        if found is None:
+            return None
+        count_array, code = found
+        dealer_total, dealer_hard_or_soft = dealer_hand
+        bj_card = {1: 10, 10: 1}.get(duc, 0)
+        ev, built = hit_ev(pht, int(hard_or_soft == 'soft'), dealer_total,
+                           int(dealer_hard_or_soft == 'soft'),
+                           64 * (11 * duc + ddc), bj_card, self.enhc, plays,
+                           count_array, code, self.radix, self.dhs17,
+                           self.dealer_table, self.hit_table,
+                           self.double_table)
+        self.check_entries()
+        if not built:
+            return None
+        return ev
+
+
+def book_differences(book, other_book):
+    """Returns a list of the (fpc, spc, duc) cells whose plays or EVs differ
+    between two books."""
+    differences = []
+    for fpc in range(1, 11):
+        for spc in range(fpc, 11):
+            for duc in range(1, 11):
+                # repr() compares NaN EVs as equal.
+                if repr(book.cell(fpc, spc, duc)) != \
+                   repr(other_book.cell(fpc, spc, duc)):
+                    differences.append((fpc, spc, duc))
+    return differences
+
+
+def check_parity(rules, deck, **options):
+    """Builds the book of the rules and deck with the pure Python recursion
+    and with the kernel, and returns the cells that differ along with the
+    two build times in seconds."""
+    from blackjack_release_v1 import BookBuilder
+
+    books = []
+    times = []
+    for native_kernel in (False, True):
+        builder = BookBuilder(rules, deck, native_kernel=native_kernel,
+                              **options)
+        start = time.perf_counter()
+        builder.build()
+        times.append(time.perf_counter() - start)
+        if native_kernel and builder.kernel is None:
+            raise ValueError('The kernel was not used for the build.')
+        books.append(builder.book)
+    return book_differences(*books), times
+
+
+def main(argv=None):
+    from blackjack_release_v1 import DEFAULT_RULES, ONE_DECK, PEEK_CHOICES
+
+    parser = argparse.ArgumentParser(
+            description='Checks that books built with the native kernel '
+                        'match those built in pure Python.')
+    parser.add_argument('--decks', default='1', metavar='N,...',
+                        help='numbers of full decks to check')
+    parser.add_argument('--peek', default=','.join(PEEK_CHOICES),
+                        metavar='CHOICE,...',
+                        help='dealer peek rules to check')
+    args = parser.parse_args(argv)
+    if not AVAILABLE:
+        parser.error('Numba is not installed, so there is no kernel to '
+                     'check.')
+    decks = [int(decks) for decks in args.decks.split(',')]
+    peeks = args.peek.split(',')
+    if any(peek not in PEEK_CHOICES for peek in peeks):
+        parser.error(f'--peek must be from {", ".join(PEEK_CHOICES)}')
+
+    failed = False
+    for num_decks in decks:
+        for peek in peeks:
+            rules = DEFAULT_RULES._replace(deck_choice='finite',
+                                           num_decks=num_decks,
+                                           surrender='late', peek=peek)
+            differences, (python_time, kernel_time) = \
+                    check_parity(rules, ONE_DECK * num_decks)
+            print(f'{num_decks} deck {peek}: python {python_time:.1f}s, '
+                  f'kernel {kernel_time:.1f}s, ', end='')
+            if differences:
+                failed = True
+                print(f'{len(differences)} cells differ, first '
+                      f'{differences[0]}')
+            else:
+                print('identical')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,461 @@
+# Title: Leon's blackjack bookmaker job server
+# (c) 2020 Leon S. Erikson
+# Licensed to others under BSD3
+
+# A local HTTP/JSON service that builds books without the Tk application.
+#
+#   POST /jobs                 submit a build, returns the job
+#   GET  /jobs                 list the jobs
+#   GET  /jobs/<id>            status and per-cell progress of a job, and
+#                              the recursion metrics of a finished build
+#   GET  /jobs/<id>/book       every cell of a finished book
+#   GET  /jobs/<id>/ev         total EV of a finished book
+#
+# A job is a JSON object of the form
+#   {"rules": {"deck_choice": "finite", "num_decks": 2, ...},
+#    "deck": [1, 1, 1, 1, 2, ...],
+#    "seed": 2020,
+#    "options": {"crn": true, ...}}
+# where every key is optional. Rules not given take the application's
+# defaults, the deck defaults to num_decks standard decks, and the options
+# are those of BookBuilder.set_options. Rules take the values the
+# application offers, and a custom deck needs at least three cards of each
+# value. A job matching one that is still queued or building isn't built
+# twice; the running job is returned.
+#
+# The total EV takes the take_even_money and take_insurance query
+# parameters, e.g. /jobs/1/ev?take_insurance=1.
+
+
+import time
+# When the server was started, for --startup-timing.
+START_TIME = time.perf_counter()
+
+import json
+import asyncio
+import argparse
+import threading
+from math import isnan
+from urllib.parse import urlsplit, parse_qs
+
+from blackjack_release_v1 import (BookBuilder, DEFAULT_RULES,
+                                  DOUBLE_CHOICES, ONE_DECK, PEEK_CHOICES,
+                                  Rules, REV_EV_INDEX, SIM_SEED,
+                                  StartupTimer, SURRENDER_CHOICES)
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8021
+DEFAULT_WORKERS = 2
+
+# Requests larger than this are refused.
+MAX_BODY = 2 ** 16
+
+# The 'done' progress events of a full build: 18 hard totals, 10 soft
+# totals and 10 pairs, against 10 dealer up cards.
+BUILD_STEPS = 380
+
+BUILD_OPTIONS = ('shuffled_shoe', 'crn', 'eor_approx',
+                 'composition_dependent')
+
+DECK_CHOICES = ('infinite', 'finite', 'custom')
+
+# Rules that are on or off.
+BOOLEAN_RULES = ('dhs17', 'das', 'hsa', 'rsa', 'fullpay')
+
+# A custom deck needs this many cards of each value, as in the
+# application's custom deck window.
+MIN_CUSTOM_CARDS = 3
+
+HTTP_REASONS = {200: 'OK', 201: 'Created', 400: 'Bad Request',
+                404: 'Not Found', 405: 'Method Not Allowed',
+                409: 'Conflict', 413: 'Payload Too Large'}
+
+
+class HTTPError(Exception):
+    """An error returned to the client with an HTTP status."""
+
+    def __init__(self, status, message):
+        super(HTTPError, self).__init__(message)
+        self.status = status
+
+
+def is_int(value):
+    """Returns whether a JSON value is an integer, which true and false
+    are not."""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def job_spec(request):
+    """Returns the canonical form of a submitted job, with every default
+    filled in, so that identical builds have identical specs. Raises
+    ValueError for a job that can't be built."""
+    if not isinstance(request, dict):
+        raise ValueError('A job must be a JSON object.')
+    unknown = set(request) - {'rules', 'deck', 'seed', 'options'}
+    if unknown:
+        raise ValueError(f'Unknown job keys: {sorted(unknown)}')
+
+    rules = DEFAULT_RULES._asdict()
+    given_rules = request.get('rules', {})
+    if not isinstance(given_rules, dict):
+        raise ValueError('rules must be a JSON object.')
+    unknown = set(given_rules) - set(Rules._fields)
+    if unknown:
+        raise ValueError(f'Unknown rules: {sorted(unknown)}')
+    rules.update(given_rules)
+    if rules['deck_choice'] not in DECK_CHOICES:
+        raise ValueError(f'deck_choice must be one of {DECK_CHOICES}')
+    for rule in BOOLEAN_RULES:
+        if not isinstance(rules[rule], bool):
+            raise ValueError(f'{rule} must be true or false')
+    if not is_int(rules['msh']) or rules['msh'] not in (2, 3, 4):
+        raise ValueError('msh must be 2, 3 or 4')
+    if rules['double'] not in DOUBLE_CHOICES:
+        raise ValueError(f'double must be one of {DOUBLE_CHOICES}')
+    if not is_int(rules['num_decks']) or rules['num_decks'] < 1:
+        raise ValueError('num_decks must be a positive integer')
+    if rules['surrender'] not in SURRENDER_CHOICES:
+        raise ValueError(f'surrender must be one of {SURRENDER_CHOICES}')
+    if rules['peek'] not in PEEK_CHOICES:
+        raise ValueError(f'peek must be one of {PEEK_CHOICES}')
+
+    if 'deck' in request:
+        deck = request['deck']
+        if not isinstance(deck, list) or \
+           any(not is_int(card) or card not in range(1, 11)
+               for card in deck):
+            raise ValueError('A deck must be a list of cards from 1 to 10.')
+        if rules['deck_choice'] != 'custom':
+            raise ValueError('Only a custom deck_choice takes a deck.')
+        if any(deck.count(card) < MIN_CUSTOM_CARDS
+               for card in range(1, 11)):
+            raise ValueError(f'A deck needs at least {MIN_CUSTOM_CARDS} '
+                             f'cards of each value.')
+        deck = sorted(deck)
+    elif rules['deck_choice'] == 'custom':
+        raise ValueError('A custom deck_choice needs a deck.')
+    elif rules['deck_choice'] == 'finite':
+        deck = ONE_DECK * rules['num_decks']
+    else:
+        deck = ONE_DECK.copy()
+
+    seed = request.get('seed', SIM_SEED)
+    if not is_int(seed) or seed < 0:
+        raise ValueError('seed must be a non-negative integer')
+
+    options = request.get('options', {})
+    if not isinstance(options, dict):
+        raise ValueError('options must be a JSON object.')
+    unknown = set(options) - set(BUILD_OPTIONS)
+    if unknown:
+        raise ValueError(f'Unknown options: {sorted(unknown)}')
+    if any(not isinstance(value, bool) for value in options.values()):
+        raise ValueError('Options must be true or false.')
+    options = {option: options.get(option, False)
+               for option in BUILD_OPTIONS}
+
+    return {'rules': rules, 'deck': deck, 'seed': seed, 'options': options}
+
+
+def build_book(job_id, spec, progress_queue):
+    """Builds the book of a job spec in a worker and returns it with the
+    engine metrics of the build. Each finished (total, duc) step is put on
+    the progress queue."""
+    def progress(event, card_list, hand_type):
+        progress_queue.put((job_id, event, card_list, hand_type))
+
+    builder = BookBuilder(Rules(**spec['rules']), spec['deck'],
+                          spec['seed'], progress=progress,
+                          **spec['options'])
+    builder.build()
+    return builder.book, builder.engine_metrics()
+
+
+def book_json(book):
+    """Returns a book as a JSON ready dict. Unknown split EVs are None."""
+    cells = []
+    for fpc in range(1, 11):
+        for spc in range(fpc, 11):
+            for duc in range(1, 11):
+                if not book.has_cell(fpc, spc, duc):
+                    continue
+                play, ev_list = book.cell(fpc, spc, duc)
+                evs = {REV_EV_INDEX[index]: (None if isnan(ev) else ev)
+                       for index, ev in enumerate(ev_list)}
+                cells.append({'cards': [fpc, spc, duc], 'play': play,
+                              'evs': evs})
+    return {'rules': book.rules._asdict(), 'deck': book.deck,
+            'seed': book.seed, 'cells': cells}
+
+
+class Job:
+    """A submitted build and what is known about its progress."""
+
+    def __init__(self, job_id, spec):
+        self.job_id = job_id
+        self.spec = spec
+        self.key = json.dumps(spec, sort_keys=True)
+        # self.state is one of 'queued', 'building', 'finished' or 'failed'
+        self.state = 'queued'
+        self.steps_done = 0
+        self.current = None
+        self.book = None
+        self.metrics = None
+        self.error = None
+
+    def in_flight(self):
+        return self.state in ('queued', 'building')
+
+    def status(self):
+        """Returns the JSON ready status of the job."""
+        status = {'id': self.job_id, 'state': self.state,
+                  'spec': self.spec,
+                  'progress': {'done': self.steps_done,
+                               'total': BUILD_STEPS,
+                               'current': self.current}}
+        if self.metrics is not None:
+            status['metrics'] = self.metrics
+        if self.error is not None:
+            status['error'] = self.error
+        return status
+
+
+class JobServer:
+    """Runs book builds on a bounded process pool, or thread pool, and
+    answers HTTP requests about them."""
+
+    def __init__(self, workers=DEFAULT_WORKERS, threads=False):
+        self.workers = workers
+        self.threads = threads
+        self.jobs = {}
+        self.next_id = 1
+        self.pool = None
+        self.manager = None
+        self.progress_queue = None
+        self.loop = None
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        """Starts the HTTP listener and returns the asyncio server. The
+        workers aren't started until the first job is submitted."""
+        self.loop = asyncio.get_running_loop()
+        return await asyncio.start_server(self.handle, host, port)
+
+    def start_workers(self):
+        """Starts the worker pool and the progress reader. Their modules
+        are imported here, as they are only needed once there is work.
+        Every build keeps its state in its own BookBuilder, so builds can
+        share a process as threads."""
+        if self.threads:
+            import queue
+            from concurrent.futures import ThreadPoolExecutor
+            self.pool = ThreadPoolExecutor(max_workers=self.workers)
+            self.progress_queue = queue.SimpleQueue()
+        else:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            self.pool = ProcessPoolExecutor(max_workers=self.workers)
+            self.manager = multiprocessing.Manager()
+            self.progress_queue = self.manager.Queue()
+        threading.Thread(target=self.read_progress, daemon=True).start()
+
+    def close(self):
+        """Stops the progress reader and the worker pool."""
+        if self.progress_queue is not None:
+            self.progress_queue.put(None)
+        if self.pool is not None:
+            self.pool.shutdown(wait=False)
+        if self.manager is not None:
+            self.manager.shutdown()
+
+    def read_progress(self):
+        """Passes the progress events of the workers to the event loop.
+        Runs in its own thread, as reading the queue blocks."""
+        while True:
+            try:
+                item = self.progress_queue.get()
+            except (EOFError, OSError):
+                return
+            if item is None:
+                return
+            self.loop.call_soon_threadsafe(self.record_progress, *item)
+
+    def record_progress(self, job_id, event, card_list, hand_type):
+        """Updates a job with a progress event from its worker. Events reach
+        the event loop apart from the build's result, so any that arrive
+        once the job has finished or failed are ignored."""
+        job = self.jobs[job_id]
+        if not job.in_flight():
+            return
+        job.state = 'building'
+        job.current = {'cards': card_list, 'hand_type': hand_type}
+        if event == 'done':
+            job.steps_done += 1
+
+    def submit(self, request):
+        """Returns the job for a request, either a new one or an identical
+        job already in flight, and whether it is new."""
+        spec = job_spec(request)
+        key = json.dumps(spec, sort_keys=True)
+        for job in self.jobs.values():
+            if job.key == key and job.in_flight():
+                return job, False
+        if self.pool is None:
+            self.start_workers()
+        job = Job(str(self.next_id), spec)
+        self.next_id += 1
+        self.jobs[job.job_id] = job
+        self.loop.create_task(self.run(job))
+        return job, True
+
+    async def run(self, job):
+        """Builds the book of a job on the worker pool."""
+        future = self.loop.run_in_executor(self.pool, build_book, job.job_id,
+                                           job.spec, self.progress_queue)
+        try:
+            job.book, job.metrics = await future
+        except Exception as error:
+            job.state = 'failed'
+            job.error = f'{type(error).__name__}: {error}'
+            return
+        job.steps_done = BUILD_STEPS
+        job.current = None
+        job.state = 'finished'
+
+    def finished_job(self, job_id):
+        """Returns a job whose book is finished."""
+        job = self.jobs.get(job_id)
+        if job is None:
+            raise HTTPError(404, f'No job {job_id}')
+        if job.state != 'finished':
+            raise HTTPError(409, f'Job {job_id} is {job.state}')
+        return job
+
+    def route(self, method, path, query, body):
+        """Returns the status and JSON reply to a request."""
+        parts = [part for part in path.split('/') if part]
+        if not parts or parts[0] != 'jobs' or len(parts) > 3:
+            raise HTTPError(404, f'No such path: {path}')
+        if len(parts) == 1:
+            if method == 'GET':
+                return 200, [job.status() for job in self.jobs.values()]
+            if method != 'POST':
+                raise HTTPError(405, 'Use GET or POST on /jobs')
+            try:
+                request = json.loads(body or b'{}')
+                job, new = self.submit(request)
+            except ValueError as error:
+                raise HTTPError(400, str(error))
+            return (201 if new else 200), job.status()
+
+        if method != 'GET':
+            raise HTTPError(405, 'Use GET on a job')
+        job_id = parts[1]
+        if len(parts) == 2:
+            if job_id not in self.jobs:
+                raise HTTPError(404, f'No job {job_id}')
+            return 200, self.jobs[job_id].status()
+        if parts[2] == 'book':
+            return 200, book_json(self.finished_job(job_id).book)
+        if parts[2] == 'ev':
+            book = self.finished_job(job_id).book
+            flags = {name: query.get(name, ['0'])[0] in ('1', 'true')
+                     for name in ('take_even_money', 'take_insurance')}
+            # The total of the plays the engine makes, each book play one
+            # the rules offer.
+            ev, _ = book.get_total_ev(book.book_play, **flags)
+            return 200, {'id': job_id, 'total_ev': ev, **flags}
+        raise HTTPError(404, f'No such path: {path}')
+
+    async def handle(self, reader, writer):
+        """Answers one HTTP request on a connection."""
+        try:
+            status, reply = await self.answer(reader)
+        except HTTPError as error:
+            status, reply = error.status, {'error': str(error)}
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+        data = json.dumps(reply).encode()
+        writer.write(f'HTTP/1.1 {status} {HTTP_REASONS[status]}\r\n'
+                     f'Content-Type: application/json\r\n'
+                     f'Content-Length: {len(data)}\r\n'
+                     f'Connection: close\r\n\r\n'.encode() + data)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def answer(self, reader):
+        """Reads a request and returns its status and reply."""
+        request_line = await reader.readline()
+        try:
+            method, target, _ = request_line.decode('latin-1').split()
+        except ValueError:
+            raise HTTPError(400, 'Bad request line')
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise HTTPError(400, 'Bad Content-Length')
+        if length > MAX_BODY:
+            raise HTTPError(413, f'Requests are limited to {MAX_BODY} bytes')
+        body = await reader.readexactly(length) if length else b''
+        url = urlsplit(target)
+        return self.route(method.upper(), url.path, parse_qs(url.query),
+                          body)
+
+
+async def serve(host, port, workers, timer=None, threads=False):
+    """Runs the job server until it is interrupted. A StartupTimer is
+    reported once the server is listening."""
+    job_server = JobServer(workers, threads)
+    server = await job_server.start(host, port)
+    kind = 'thread' if threads else 'process'
+    print(f'Book job server listening on http://{host}:{port}/jobs '
+          f'with {workers} {kind} workers')
+    if timer is not None:
+        timer.mark('listening')
+        timer.report()
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        job_server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+            description='Builds blackjack books for local clients over '
+                        'HTTP/JSON.')
+    parser.add_argument('--host', default=DEFAULT_HOST,
+                        help='address to listen on, localhost by default')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help='most books built at once')
+    parser.add_argument('--threads', action='store_true',
+                        help='build in threads of the server process rather '
+                             'than in worker processes')
+    parser.add_argument('--startup-timing', action='store_true',
+                        help='print the time taken by each stage of start up')
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error('--workers must be at least 1')
+    timer = None
+    if args.startup_timing:
+        timer = StartupTimer(START_TIME)
+        timer.mark('imports')
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, timer,
+                          args.threads))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
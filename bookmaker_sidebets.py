@@ -0,0 +1,313 @@
+# Title: Leon's blackjack bookmaker side bets
+# (c) 2020 Leon S. Erikson
+# Licensed to others under BSD3
+
+# Exact EVs of the common side bets for any deck composition:
+#
+#   perfect pairs   the player's first two cards are a pair
+#   21+3            the player's first two cards and the dealer up card
+#                   make a three card poker hand
+#   insurance       the dealer hole card under an ace is a ten
+#
+#   python bookmaker_sidebets.py --decks 6
+#   python bookmaker_sidebets.py --book six_deck.book --remove 10,10,5,1
+#   python bookmaker_sidebets.py --decks 2 --remove-faces KH,QH,5S
+#
+# A SuitedDeck knows the face of every card, and its chances are found
+# exactly from the face counts. A count vector of card values says nothing
+# of suits or of which ten valued face a card is, so the cards of each
+# value are taken as a random pick of the suits and faces of that value in
+# the full decks the deck was dealt from. Its chances are then exact for
+# full decks and, for a depleted count vector, the exact average over the
+# suits the missing cards could have had.
+#
+# For count vectors the draws of a bet are counted once per number of full
+# decks, by the card values they are drawn from. The chances for a count
+# vector are then those counts weighted by the chance that the cards drawn
+# are still in the deck, which is quick enough to sweep thousands of
+# compositions a second.
+
+
+import argparse
+from itertools import product
+from math import ceil
+
+from blackjack_release_v1 import (BookTable, NUM_TO_TEXT, ONE_DECK,
+                                  SuitedDeck, deck_counts, face_index,
+                                  face_value, parse_face)
+
+# Faces by rank 1 to 13, ace to king, and suit 0 to 3, as in a SuitedDeck.
+RANKS = range(1, 14)
+SUITS = range(4)
+SUIT_COLOR = (0, 0, 1, 1)
+
+# Three card straights by rank. An ace plays high or low, but doesn't turn
+# the corner.
+STRAIGHTS = [{rank, rank + 1, rank + 2} for rank in range(1, 12)] + \
+            [{12, 13, 1}]
+
+# Pays to one of each outcome. Anything else loses the bet.
+PERFECT_PAIRS_PAYS = {'perfect pair': 25, 'colored pair': 12,
+                      'mixed pair': 6}
+TWENTY_ONE_PLUS_3_PAYS = {'suited trips': 100, 'straight flush': 40,
+                          'three of a kind': 30, 'straight': 10,
+                          'flush': 5}
+INSURANCE_PAY = 2
+
+# The draw counts of each bet, by bet and number of decks.
+DRAW_TABLES = {}
+
+
+def falling(n, k):
+    """Returns n (n - 1) ... (n - k + 1), the ordered draws of k of n
+    cards."""
+    draws = 1
+    for index in range(k):
+        draws *= n - index
+    return draws
+
+
+def perfect_pairs_outcome(cards):
+    """Returns the perfect pairs outcome of two (rank, suit) cards, or None
+    for a loss."""
+    (rank, suit), (other_rank, other_suit) = cards
+    if rank != other_rank:
+        return None
+    if suit == other_suit:
+        return 'perfect pair'
+    if SUIT_COLOR[suit] == SUIT_COLOR[other_suit]:
+        return 'colored pair'
+    return 'mixed pair'
+
+
+def twenty_one_plus_3_outcome(cards):
+    """Returns the 21+3 outcome of three (rank, suit) cards, or None for a
+    loss."""
+    ranks = {rank for rank, _ in cards}
+    flush = len({suit for _, suit in cards}) == 1
+    straight = ranks in STRAIGHTS
+    if len(ranks) == 1:
+        return 'suited trips' if flush else 'three of a kind'
+    if straight:
+        return 'straight flush' if flush else 'straight'
+    if flush:
+        return 'flush'
+    return None
+
+
+def perfect_pairs_draws(faces):
+    """Returns the ordered draws of two cards from the face counts of a
+    SuitedDeck in each perfect pairs outcome."""
+    draws = dict.fromkeys(PERFECT_PAIRS_PAYS, 0)
+    for rank in RANKS:
+        spades, clubs, hearts, diamonds = \
+                faces[face_index(rank, 0):face_index(rank, 4)]
+        rank_count = spades + clubs + hearts + diamonds
+        perfect = sum(count * (count - 1)
+                      for count in (spades, clubs, hearts, diamonds))
+        colored = 2 * (spades * clubs + hearts * diamonds)
+        draws['perfect pair'] += perfect
+        draws['colored pair'] += colored
+        draws['mixed pair'] += rank_count * (rank_count - 1) - perfect - \
+                               colored
+    return draws
+
+
+def twenty_one_plus_3_draws(faces):
+    """Returns the ordered draws of three cards from the face counts of a
+    SuitedDeck in each 21+3 outcome."""
+    rank_counts = [0] * 14
+    suit_counts = [0] * 4
+    suited_trips = 0
+    for index, count in enumerate(faces):
+        rank_counts[index // 4 + 1] += count
+        suit_counts[index % 4] += count
+        suited_trips += falling(count, 3)
+    straight_flush = 0
+    straight = 0
+    for ranks in STRAIGHTS:
+        low, middle, high = sorted(ranks)
+        straight += 6 * rank_counts[low] * rank_counts[middle] * \
+                    rank_counts[high]
+        for suit in SUITS:
+            straight_flush += 6 * faces[face_index(low, suit)] * \
+                              faces[face_index(middle, suit)] * \
+                              faces[face_index(high, suit)]
+    return {'suited trips': suited_trips,
+            'straight flush': straight_flush,
+            'three of a kind': sum(falling(count, 3)
+                                   for count in rank_counts) - suited_trips,
+            'straight': straight - straight_flush,
+            'flush': sum(falling(count, 3) for count in suit_counts) -
+                     suited_trips - straight_flush}
+
+
+# Side bets by name: the cards they are settled on, the outcome of those
+# cards, the draws of each outcome from a SuitedDeck and the pay table.
+SIDE_BETS = {'perfect pairs': (2, perfect_pairs_outcome, perfect_pairs_draws,
+                               PERFECT_PAIRS_PAYS),
+             '21+3': (3, twenty_one_plus_3_outcome, twenty_one_plus_3_draws,
+                      TWENTY_ONE_PLUS_3_PAYS)}
+
+
+def draw_table(bet, decks):
+    """Returns the ordered draws of the cards of a side bet from the passed
+    number of full decks that win, as a list of (values, draws) where
+    values is the sorted tuple of card values drawn and draws a dict of the
+    number of draws of each outcome."""
+    key = (bet, decks)
+    table = DRAW_TABLES.get(key)
+    if table is not None:
+        return table
+
+    cards, outcome_of, _, _ = SIDE_BETS[bet]
+    faces = list(product(RANKS, SUITS))
+    by_values = {}
+    for drawn in product(faces, repeat=cards):
+        outcome = outcome_of(drawn)
+        if outcome is None:
+            continue
+        # Each face is held decks times over.
+        draws = 1
+        for index, face in enumerate(drawn):
+            draws *= decks - drawn[:index].count(face)
+        if draws == 0:
+            continue
+        values = tuple(sorted(face_value(rank) for rank, _ in drawn))
+        outcomes = by_values.setdefault(values, {})
+        outcomes[outcome] = outcomes.get(outcome, 0) + draws
+    table = list(by_values.items())
+    DRAW_TABLES[key] = table
+    return table
+
+
+def full_decks(counts):
+    """Returns the fewest full decks that hold the cards of a count
+    vector."""
+    return max(1, ceil(counts[10] / 16),
+               *(ceil(counts[card] / 4) for card in range(1, 10)))
+
+
+def side_bet_chances(bet, counts, decks=None):
+    """Returns a dict of the chance of each winning outcome of a side bet,
+    dealt from a SuitedDeck or a count vector. The cards of a count vector
+    are taken as a random pick of the suits and faces of the passed number
+    of full decks, by default the fewest that hold them."""
+    cards, _, face_draws, pays = SIDE_BETS[bet]
+    if isinstance(counts, SuitedDeck):
+        size = len(counts)
+        if size < cards:
+            return dict.fromkeys(pays, 0)
+        all_draws = falling(size, cards)
+        return {outcome: draws / all_draws
+                for outcome, draws in face_draws(counts.faces).items()}
+    if decks is None:
+        decks = full_decks(counts)
+    full_counts = deck_counts(ONE_DECK * decks)
+    size = sum(counts)
+    chances = dict.fromkeys(pays, 0)
+    if size < cards:
+        return chances
+    all_draws = falling(size, cards)
+    for values, draws in draw_table(bet, decks):
+        # The chance that the drawn cards of each value are among those
+        # left.
+        weight = 1
+        for card in set(values):
+            drawn = values.count(card)
+            weight *= falling(counts[card], drawn) / \
+                      falling(full_counts[card], drawn)
+        if weight == 0:
+            continue
+        for outcome, outcome_draws in draws.items():
+            chances[outcome] += weight * outcome_draws / all_draws
+    return chances
+
+
+def side_bet_ev(bet, counts, decks=None, pays=None):
+    """Returns the EV of a unit side bet dealt from a SuitedDeck or a count
+    vector, with the pay table of the bet unless another is passed."""
+    if pays is None:
+        pays = SIDE_BETS[bet][3]
+    chances = side_bet_chances(bet, counts, decks)
+    return sum(pays[outcome] * chance for outcome, chance in chances.items()) \
+           - (1 - sum(chances.values()))
+
+
+def insurance_ev(counts, pay=INSURANCE_PAY):
+    """Returns the EV of a unit insurance bet, with the count vector of the
+    cards the dealer hole card is drawn from."""
+    ten_chance = counts[10] / sum(counts)
+    return (pay + 1) * ten_chance - 1
+
+
+def side_bet_eors(bet, counts, decks=None, pays=None):
+    """Returns the effects of removal of a side bet EV as a list indexed by
+    card, each the change in EV from taking one card of that value out of
+    the count vector."""
+    if decks is None:
+        decks = full_decks(counts)
+    ev = side_bet_ev(bet, counts, decks, pays)
+    eors = [0] * 11
+    for card in range(1, 11):
+        if counts[card] > 0:
+            removed = list(counts)
+            removed[card] -= 1
+            eors[card] = side_bet_ev(bet, removed, decks, pays) - ev
+    return eors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+            description='Shows the EVs of the common side bets for a deck.')
+    parser.add_argument('--decks', type=int, default=1,
+                        help='full decks in the shoe')
+    parser.add_argument('--book', help='use the deck of a saved book')
+    parser.add_argument('--remove', default='', metavar='CARD,...',
+                        help='cards taken out of the deck, 1 for an ace')
+    parser.add_argument('--remove-faces', default='', metavar='FACE,...',
+                        help='faces such as KH or 5S taken out of full '
+                             'decks, for exact suits')
+    args = parser.parse_args(argv)
+    if args.decks < 1:
+        parser.error('--decks must be at least 1')
+    if args.remove_faces and (args.remove or args.book is not None):
+        parser.error('--remove-faces can\'t be used with --remove or --book')
+
+    if args.book is not None:
+        counts = deck_counts(BookTable.load(args.book).deck)
+    else:
+        counts = deck_counts(ONE_DECK * args.decks)
+    decks = full_decks(counts)
+    for card in args.remove.split(',') if args.remove else []:
+        if not card.isdigit() or not 1 <= int(card) <= 10 or \
+           counts[int(card)] == 0:
+            parser.error(f'--remove has no {card} to take out of the deck')
+        counts[int(card)] -= 1
+    # The bets are settled on the exact faces left when they are known.
+    deck = counts
+    if args.remove_faces:
+        deck = SuitedDeck.full(args.decks)
+        for face in args.remove_faces.split(','):
+            try:
+                deck.remove(*parse_face(face))
+            except ValueError as error:
+                parser.error(f'--remove-faces: {error}')
+        counts = list(deck.counts)
+
+    for bet, (_, _, _, pays) in SIDE_BETS.items():
+        chances = side_bet_chances(bet, deck, decks)
+        print(f'\n{bet}: EV {side_bet_ev(bet, deck, decks):+.5f}')
+        for outcome, pay in pays.items():
+            print(f'{outcome:>16} pays {pay:>3}: {chances[outcome]:.6f}')
+        eors = side_bet_eors(bet, counts, decks)
+        print(f'{"EOR":>16}', ' '.join(f'{NUM_TO_TEXT[card]}:{eors[card]:+.5f}'
+                                       for card in range(1, 11)))
+    if counts[1] > 0:
+        # The dealer ace is out of the deck when insurance is offered.
+        counts[1] -= 1
+        print(f'\ninsurance: EV {insurance_ev(counts):+.5f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,437 @@
+# Title: Leon's blackjack bookmaker sweeps
+# (c) 2020 Leon S. Erikson
+# Licensed to others under BSD3
+
+# Builds a sweep of many books on as many hosts as share a directory, with
+# no service running but the shared file system. A coordinator splits the
+# sweep into work units in the queue directory, workers on any host claim
+# and build them, and the coordinator merges their results into books.
+#
+#   python bookmaker_sweep.py coordinate /shared/sweep jobs.json
+#   python bookmaker_sweep.py work /shared/sweep        (on every host)
+#
+# jobs.json holds a list of jobs in the form POSTed to bookmaker_server.py,
+# e.g. [{"rules": {"deck_choice": "finite", "num_decks": 6}}, ...]. Each
+# job is one unit, unless --shard-pairs splits it into a unit for its hard
+# and soft hands and, once that is built, a unit for each of its 100 pair
+# cells. Every pair cell is simulated from its own stream of the seed, so
+# the merged book is the one a single build gives. --workers starts that
+# many local workers along with the coordinator.
+#
+# The queue directory holds
+#
+#   sweep.json            the jobs of the sweep, as given
+#   units/<unit>.json     the units written by the coordinator
+#   claims/<unit>.lock    held by the worker building a unit
+#   results/<unit>.book   the book built by a unit
+#   errors/<unit>.txt     why a unit failed, removed to build it again
+#   books/<job>.book      the merged book of each job
+#   finished              written once every book is merged
+#
+# A claim is made by creating its lock file exclusively, which only one
+# worker can do. Its worker touches it while building and removes it once
+# the result or error is written, so a unit whose error is removed can be
+# claimed again at once. A worker that claims a unit finished in the
+# meantime lets it go unbuilt. The coordinator clears a claim that hasn't
+# been touched for --stale seconds, so the unit of a lost worker is built
+# again. Results and books are written to a
+# temporary file and renamed into place, so they are never read half
+# written. The coordinator can be stopped and started again on the same
+# queue and jobs, and carries on where it was.
+
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+import traceback
+import multiprocessing
+
+from blackjack_release_v1 import (BookBuilder, BookTable, CARD_VALUES,
+                                  EV_INDEX, Rules)
+from bookmaker_server import job_spec
+
+QUEUE_DIRS = ('units', 'claims', 'results', 'errors', 'books')
+
+# Seconds between looks at the queue.
+DEFAULT_POLL = 2
+
+# Seconds between touches of a worker's claim, and the seconds after which
+# an untouched claim is taken to be lost. Hosts' clocks needn't agree to
+# better than the difference.
+HEARTBEAT_SECONDS = 30
+DEFAULT_STALE = 300
+
+# Seconds between progress reports of the coordinator, which also reports
+# each merged book.
+REPORT_SECONDS = 10
+
+
+def queue_path(queue, *parts):
+    """Returns a path in the queue directory."""
+    return os.path.join(queue, *parts)
+
+
+def unit_path(queue, folder, unit_id, extension):
+    """Returns the path of a unit's file in one of the queue folders."""
+    return queue_path(queue, folder, unit_id + extension)
+
+
+def write_atomic(path, data):
+    """Writes bytes to a file through a temporary file renamed into place.
+    The temporary file is named for the host and process, so writers on
+    different hosts don't collide."""
+    temp_path = f'{path}.{socket.gethostname()}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def save_atomic(book, path):
+    """Saves a book through a temporary file renamed into place."""
+    temp_path = f'{path}.{socket.gethostname()}.{os.getpid()}.tmp'
+    book.save(temp_path)
+    os.replace(temp_path, path)
+
+
+def make_queue(queue, jobs):
+    """Makes the queue directory for a sweep of jobs, or checks that an
+    existing one holds the same sweep. Raises ValueError if it doesn't."""
+    for folder in QUEUE_DIRS:
+        os.makedirs(queue_path(queue, folder), exist_ok=True)
+    sweep_path = queue_path(queue, 'sweep.json')
+    if os.path.exists(sweep_path):
+        with open(sweep_path) as f:
+            if json.load(f) != jobs:
+                raise ValueError(f'{queue} holds a different sweep.')
+    else:
+        write_atomic(sweep_path, json.dumps(jobs).encode())
+
+
+def add_unit(queue, unit_id, unit):
+    """Writes a work unit to the queue, unless it is there already."""
+    path = unit_path(queue, 'units', unit_id, '.json')
+    if not os.path.exists(path):
+        write_atomic(path, json.dumps(unit).encode())
+
+
+def unit_state(queue, unit_id):
+    """Returns 'done', 'failed' or 'open' for a unit."""
+    if os.path.exists(unit_path(queue, 'results', unit_id, '.book')):
+        return 'done'
+    if os.path.exists(unit_path(queue, 'errors', unit_id, '.txt')):
+        return 'failed'
+    return 'open'
+
+
+def claim_unit(queue, unit_id):
+    """Claims a unit for this process by creating its lock file, and
+    returns the lock path, or None if another worker holds the claim."""
+    path = unit_path(queue, 'claims', unit_id, '.lock')
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return None
+    with os.fdopen(fd, 'w') as f:
+        f.write(f'{socket.gethostname()} {os.getpid()}\n')
+    return path
+
+
+def release_claim(queue, unit_id):
+    """Removes the lock file of a unit claimed by this process."""
+    try:
+        os.remove(unit_path(queue, 'claims', unit_id, '.lock'))
+    except FileNotFoundError:
+        # The coordinator took it for stale.
+        pass
+
+
+def clear_stale_claims(queue, stale):
+    """Removes the claims of open units that haven't been touched for stale
+    seconds, and returns their unit ids. Only the coordinator clears
+    claims, so a fresh claim can't be made over one it is clearing."""
+    cleared = []
+    now = time.time()
+    for name in os.listdir(queue_path(queue, 'claims')):
+        if not name.endswith('.lock'):
+            continue
+        unit_id = name[:-len('.lock')]
+        path = queue_path(queue, 'claims', name)
+        try:
+            if now - os.path.getmtime(path) < stale or \
+               unit_state(queue, unit_id) != 'open':
+                continue
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        cleared.append(unit_id)
+    return cleared
+
+
+def first_unit(job, spec, shard_pairs):
+    """Returns the (unit id, unit) of the first unit of a job: the whole
+    book, or its hard and soft hands when the pairs are sharded."""
+    kind = 'hands' if shard_pairs else 'book'
+    return f'{job:04d}-{kind}', {'kind': kind, 'spec': spec}
+
+
+def pair_units(job, spec):
+    """Returns the (unit id, unit) of each pair cell of a sharded job."""
+    units = []
+    for pair_of in range(1, 11):
+        for duc in CARD_VALUES:
+            units.append((f'{job:04d}-pair-{pair_of:02d}-{duc:02d}',
+                          {'kind': 'pair', 'spec': spec,
+                           'hands': f'{job:04d}-hands',
+                           'pair': [pair_of, duc]}))
+    return units
+
+
+def run_unit(queue, unit):
+    """Builds a work unit and returns its book."""
+    spec = unit['spec']
+    if unit['kind'] == 'pair':
+        book = BookTable.load(unit_path(queue, 'results', unit['hands'],
+                                        '.book'))
+        builder = BookBuilder(book.rules, book.deck, book.seed, book=book,
+                              **spec['options'])
+        builder.build_step('pair', *unit['pair'])
+        return builder.book
+    builder = BookBuilder(Rules(**spec['rules']), spec['deck'],
+                          spec['seed'], **spec['options'])
+    if unit['kind'] == 'hands':
+        builder.build_hands()
+    else:
+        builder.build()
+    return builder.book
+
+
+def heartbeat(path, stop):
+    """Touches a claim until stop is set."""
+    while not stop.wait(HEARTBEAT_SECONDS):
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return
+
+
+def work_unit(queue, unit_id):
+    """Builds a claimed unit and writes its result, or its error if it
+    fails, then releases the claim."""
+    with open(unit_path(queue, 'units', unit_id, '.json')) as f:
+        unit = json.load(f)
+    stop = threading.Event()
+    beat = threading.Thread(target=heartbeat,
+                            args=(unit_path(queue, 'claims', unit_id,
+                                            '.lock'), stop),
+                            daemon=True)
+    beat.start()
+    try:
+        book = run_unit(queue, unit)
+    except Exception:
+        write_atomic(unit_path(queue, 'errors', unit_id, '.txt'),
+                     traceback.format_exc().encode())
+    else:
+        save_atomic(book, unit_path(queue, 'results', unit_id, '.book'))
+    finally:
+        stop.set()
+        beat.join()
+        release_claim(queue, unit_id)
+
+
+def work(queue, poll=DEFAULT_POLL, quiet=False):
+    """Claims and builds units of the queue until the sweep is finished."""
+    while not os.path.exists(queue_path(queue, 'finished')):
+        claimed = None
+        if os.path.isdir(queue_path(queue, 'units')):
+            for name in sorted(os.listdir(queue_path(queue, 'units'))):
+                if not name.endswith('.json'):
+                    continue
+                unit_id = name[:-len('.json')]
+                if unit_state(queue, unit_id) != 'open':
+                    continue
+                if claim_unit(queue, unit_id) is None:
+                    continue
+                # Another worker may have finished it and released its
+                # claim since the unit was looked at.
+                if unit_state(queue, unit_id) != 'open':
+                    release_claim(queue, unit_id)
+                    continue
+                claimed = unit_id
+                break
+        if claimed is None:
+            time.sleep(poll)
+            continue
+        if not quiet:
+            print(f'{socket.gethostname()} {os.getpid()}: {claimed}',
+                  flush=True)
+        work_unit(queue, claimed)
+
+
+def merge_pair(book, pair_book, pair_of, duc):
+    """Copies a pair cell simulated in another book into a book."""
+    play, ev_list = pair_book.cell(pair_of, pair_of, duc)
+    book.set_play(pair_of, pair_of, duc, play)
+    book.set_split_ev(pair_of, duc, ev_list[EV_INDEX['P']])
+    split_dist = pair_book.split_dist(pair_of, duc)
+    if split_dist is not None:
+        book.set_split_dist(pair_of, duc, *split_dist)
+    diagnostics = pair_book.cell_diagnostics(pair_of, duc)
+    if diagnostics is not None:
+        book.set_cell_diagnostics(pair_of, duc, diagnostics)
+
+
+def merge_job(queue, job, spec, shard_pairs):
+    """Merges the results of a job into its book once they are all built.
+    Returns 'done', 'failed' or 'open' for the job."""
+    book_path = queue_path(queue, 'books', f'{job:04d}.book')
+    if os.path.exists(book_path):
+        return 'done'
+    first_id, _ = first_unit(job, spec, shard_pairs)
+    state = unit_state(queue, first_id)
+    if state != 'done':
+        return state
+    if not shard_pairs:
+        save_atomic(BookTable.load(unit_path(queue, 'results', first_id,
+                                             '.book')),
+                    book_path)
+        return 'done'
+
+    pairs = pair_units(job, spec)
+    for unit_id, unit in pairs:
+        add_unit(queue, unit_id, unit)
+    states = [unit_state(queue, unit_id) for unit_id, _ in pairs]
+    if 'failed' in states:
+        return 'failed'
+    if 'open' in states:
+        return 'open'
+    book = BookTable.load(unit_path(queue, 'results', first_id, '.book'))
+    for unit_id, unit in pairs:
+        merge_pair(book,
+                   BookTable.load(unit_path(queue, 'results', unit_id,
+                                            '.book')),
+                   *unit['pair'])
+    save_atomic(book, book_path)
+    return 'done'
+
+
+def coordinate(queue, jobs, shard_pairs=False, poll=DEFAULT_POLL,
+               stale=DEFAULT_STALE):
+    """Runs a sweep of jobs through the queue until every book is merged or
+    its job has failed, and returns the state of each job. Raises
+    ValueError for a job that can't be built or a queue that holds another
+    sweep."""
+    specs = [job_spec(job) for job in jobs]
+    make_queue(queue, jobs)
+    for job, spec in enumerate(specs):
+        add_unit(queue, *first_unit(job, spec, shard_pairs))
+
+    last_report = None
+    report_time = 0
+    while True:
+        for unit_id in clear_stale_claims(queue, stale):
+            print(f'Cleared the stale claim of {unit_id}', flush=True)
+        states = [merge_job(queue, job, spec, shard_pairs)
+                  for job, spec in enumerate(specs)]
+        units = [name for name in os.listdir(queue_path(queue, 'units'))
+                 if name.endswith('.json')]
+        built = [name for name in os.listdir(queue_path(queue, 'results'))
+                 if name.endswith('.book')]
+        report = (len(built), len(units), states.count('done'))
+        if report != last_report and \
+           (time.monotonic() - report_time >= REPORT_SECONDS or
+            last_report is None or report[2] != last_report[2]):
+            print(f'{len(built)}/{len(units)} units built, '
+                  f'{states.count("done")}/{len(specs)} books merged',
+                  flush=True)
+            last_report = report
+            report_time = time.monotonic()
+        if 'open' not in states:
+            break
+        time.sleep(poll)
+    write_atomic(queue_path(queue, 'finished'), b'')
+    return states
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+            description='Builds a sweep of books with workers sharing a '
+                        'queue directory.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    coordinate_parser = commands.add_parser(
+            'coordinate', help='split a sweep into units and merge the books')
+    coordinate_parser.add_argument('queue', help='the shared queue directory')
+    coordinate_parser.add_argument('jobs', help='a JSON file of a list of '
+                                                'jobs')
+    coordinate_parser.add_argument('--shard-pairs', action='store_true',
+                                   help='simulate each pair cell in its own '
+                                        'unit')
+    coordinate_parser.add_argument('--workers', type=int, default=0,
+                                   help='local workers to start as well')
+    coordinate_parser.add_argument('--stale', type=float,
+                                   default=DEFAULT_STALE,
+                                   help='seconds after which an untouched '
+                                        'claim is cleared')
+    coordinate_parser.add_argument('--poll', type=float, default=DEFAULT_POLL)
+    work_parser = commands.add_parser(
+            'work', help='build units until the sweep is finished')
+    work_parser.add_argument('queue', help='the shared queue directory')
+    work_parser.add_argument('--poll', type=float, default=DEFAULT_POLL)
+    args = parser.parse_args(argv)
+
+    if args.command == 'work':
+        work(args.queue, args.poll)
+        return 0
+
+    if args.workers < 0:
+        parser.error('--workers can\'t be negative')
+    try:
+        with open(args.jobs) as f:
+            jobs = json.load(f)
+    except (OSError, ValueError) as error:
+        parser.error(f'Can\'t read {args.jobs}: {error}')
+    if not isinstance(jobs, list) or not jobs:
+        parser.error(f'{args.jobs} must hold a list of jobs')
+    try:
+        for job in jobs:
+            job_spec(job)
+        make_queue(args.queue, jobs)
+    except ValueError as error:
+        parser.error(str(error))
+
+    workers = [multiprocessing.Process(target=work,
+                                       args=(args.queue, args.poll, True))
+               for _ in range(args.workers)]
+    for worker in workers:
+        worker.start()
+    try:
+        states = coordinate(args.queue, jobs, args.shard_pairs, args.poll,
+                            args.stale)
+    except BaseException:
+        for worker in workers:
+            worker.terminate()
+        raise
+    # The workers leave once the sweep is finished.
+    for worker in workers:
+        worker.join()
+
+    print(f'\n{"Job":>4} {"EV":>10}  Book')
+    for job, state in enumerate(states):
+        book_path = queue_path(args.queue, 'books', f'{job:04d}.book')
+        if state == 'done':
+            # The total of the plays the engine makes, each book play one
+            # the rules offer.
+            book = BookTable.load(book_path)
+            ev, _ = book.get_total_ev(book.book_play)
+            print(f'{job:>4} {ev:>+10.5f}  {book_path}')
+        else:
+            print(f'{job:>4} {"failed":>10}  see '
+                  f'{queue_path(args.queue, "errors")}')
+    return 0 if 'failed' not in states else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
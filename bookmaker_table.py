@@ -0,0 +1,596 @@
+# Title: Leon's blackjack bookmaker table simulator
+# (c) 2020 Leon S. Erikson
+# Licensed to others under BSD3
+
+# Simulates a full table: 1 to 7 seats dealt round after round from one
+# shoe until the cut card, so that every seat plays on the cards the other
+# seats have left in the shoe. Each seat plays a saved book, the table book
+# unless it is given its own.
+#
+#   python bookmaker_table.py table.book --seats 7 --shoes 2000
+#   python bookmaker_table.py table.book --seats 3 --seat-book 2=other.book
+#
+# The table book sets the rules and the deck. Shoes are independent, each
+# shuffled from its own stream of the seed, and are played in chunks on a
+# process pool. The per-seat results so far are printed as each chunk
+# finishes, as JSON lines with --json.
+#
+# With --ramp, seat 1 is a card counter instead. It keeps the Hi-Lo count,
+# bets by the true count at the start of each round, and can play a book
+# made for the count it is at:
+#
+#   python bookmaker_table.py table.book --ramp=-1:1,1:2,2:4,3:8,4:12 \
+#       --count-book 3=plus3.book --bankroll 1000 --shoes 100000
+#
+# It reports the EV and standard deviation per round and per hour, N0 and
+# the risk of ruin of the bankroll, all in betting units.
+
+
+import json
+import argparse
+from math import sqrt, exp, floor, inf
+from itertools import accumulate
+from concurrent.futures import (ProcessPoolExecutor, as_completed, wait,
+                                FIRST_COMPLETED)
+
+from blackjack_release_v1 import (BookBuilder, BookTable, CounterRNG,
+                                  deck_counts)
+
+try:
+    import numpy as np
+except ImportError:
+    # NumPy is optional. Without it, the count and the counter's sums are
+    # kept in pure Python.
+    np = None
+
+MAX_SEATS = 7
+DEFAULT_SHOES = 1000
+DEFAULT_PENETRATION = 0.75
+DEFAULT_WORKERS = 2
+
+# Most shoes played by a worker at once.
+CHUNK_SHOES = 50
+
+# Counting runs are long and only their sums are kept, so they are played
+# in larger chunks.
+COUNT_CHUNK_SHOES = 1000
+
+DEFAULT_BANKROLL = 1000
+DEFAULT_ROUNDS_PER_HOUR = 100
+
+# Hi-Lo count tags, by card.
+HI_LO = (0, -1, 1, 1, 1, 1, 1, 0, 0, 0, -1)
+HI_LO_TAGS = None if np is None else np.array(HI_LO, dtype=np.int64)
+
+# Cards kept back for each hand at the table, the dealer's included. No
+# round is started with fewer cards left in the shoe.
+ROUND_CARDS = 8
+
+
+class TableShoe:
+    """A finite shoe dealt round after round until the cut card.
+
+    Player cards come off the front of the shuffled row and dealer cards
+    off the back, which deals just as one stream of cards would. sim_play
+    plays one seat at a time and draws the dealer's cards itself, so
+    new_seat() deals the dealer the same cards again for each seat, and
+    end_round() discards as many of them as any seat was dealt. The Hi-Lo
+    count of the discards is kept as they are discarded, from the running
+    sums of the tags of the row made once a shuffle."""
+    __slots__ = ('row', 'rng', 'cut', 'position', 'back', 'round_position',
+                 'round_back', 'low_back', 'running_count', 'tag_sums')
+
+    def __init__(self, counts, rng, penetration=DEFAULT_PENETRATION):
+        self.row = [card for card in range(1, 11)
+                    for _ in range(counts[card])]
+        self.rng = rng
+        self.cut = int(len(self.row) * penetration)
+        self.shuffle()
+
+    def shuffle(self):
+        """Shuffles every card back into the shoe."""
+        row = self.row
+        for index in range(len(row) - 1, 0, -1):
+            pick = self.rng.randbelow(index + 1)
+            row[index], row[pick] = row[pick], row[index]
+        self.position = 0
+        self.back = len(row) - 1
+        self.round_position = self.position
+        self.round_back = self.back
+        self.low_back = self.back
+        self.running_count = 0
+        # tag_sums[index] is the count of the cards before index.
+        if np is None:
+            self.tag_sums = [0, *accumulate(HI_LO[card] for card in row)]
+        else:
+            self.tag_sums = [0, *np.cumsum(HI_LO_TAGS[row]).tolist()]
+
+    def cards_left(self):
+        """Returns the number of cards not dealt yet."""
+        return min(self.back, self.low_back) - self.position + 1
+
+    def needs_shuffle(self, hands):
+        """Returns whether the cut card has come out, or there are too few
+        cards left for a round of the passed number of hands."""
+        cards_left = self.cards_left()
+        return len(self.row) - cards_left >= self.cut or \
+               cards_left < ROUND_CARDS * hands
+
+    def true_count(self):
+        """Returns the Hi-Lo running count per deck left, rounded down."""
+        return floor(self.running_count * 52 / self.cards_left())
+
+    def new_round(self):
+        """Starts a round."""
+        self.round_position = self.position
+        self.round_back = self.back
+
+    def new_seat(self):
+        """Deals the dealer the cards of the round again, for the next
+        seat."""
+        self.low_back = min(self.low_back, self.back)
+        self.back = self.round_back
+
+    def end_round(self):
+        """Discards the cards of the round, counting them."""
+        self.low_back = min(self.low_back, self.back)
+        self.back = self.low_back
+        tag_sums = self.tag_sums
+        self.running_count += tag_sums[self.position] - \
+                              tag_sums[self.round_position] + \
+                              tag_sums[self.round_back + 1] - \
+                              tag_sums[self.low_back + 1]
+
+    def draw(self, exclude=None, dealer=False):
+        """Deals the next card. Table rounds allow dealer blackjacks, so
+        exclude isn't supported."""
+        assert exclude is None
+        if self.position > min(self.back, self.low_back):
+            raise RuntimeError('The shoe ran out of cards in a round.')
+        if dealer:
+            card = self.row[self.back]
+            self.back -= 1
+        else:
+            card = self.row[self.position]
+            self.position += 1
+        return card
+
+
+def check_books(table_book, seat_books):
+    """Raises ValueError if the books can't be played at the table: the
+    table needs a finite deck, and every seat book a play for every hand
+    the table deck can deal."""
+    if table_book.rules.deck_choice == 'infinite':
+        raise ValueError('Table simulation needs a finite or custom deck.')
+    for seat, book in enumerate(seat_books, 1):
+        for fpc in range(1, 11):
+            for spc in range(fpc, 11):
+                for duc in range(1, 11):
+                    valid_hand, _ = table_book.hand_prob(fpc, spc, duc)
+                    if valid_hand and (not book.has_cell(fpc, spc, duc) or
+                                       book.cell(fpc, spc, duc)[0] == 'X'):
+                        raise ValueError(f'The book of seat {seat} has no '
+                                         f'play for ({fpc}, {spc}, {duc}).')
+
+
+def seat_builders(table_book, seat_books):
+    """Returns a BookBuilder for each seat, which plays the seat's book
+    under the rules and deck of the table book. Seats with the same book
+    share a builder."""
+    builders = {}
+    seats = []
+    for book in seat_books:
+        if id(book) not in builders:
+            builders[id(book)] = BookBuilder(table_book.rules,
+                                             table_book.deck,
+                                             table_book.seed, book=book)
+        seats.append(builders[id(book)])
+    return seats
+
+
+def play_round(seats, shoe):
+    """Deals a round to the seat builders and plays it in seat order.
+    Returns the result of each seat."""
+    shoe.new_round()
+    first_cards = [shoe.draw() for _ in seats]
+    duc = shoe.draw()
+    second_cards = [shoe.draw() for _ in seats]
+    results = []
+    for builder, fpc, spc in zip(seats, first_cards, second_cards):
+        shoe.new_seat()
+        # A seat book made under other rules can hold a double the table
+        # doesn't offer.
+        play = builder.double_check(builder.book.book_play(fpc, spc, duc),
+                                    [fpc, spc], duc)
+        results.append(builder.sim_play(fpc, spc, duc, play, True,
+                                        shoe=shoe))
+    shoe.end_round()
+    return results
+
+
+def play_shoe(seats, shoe):
+    """Plays rounds from a freshly shuffled shoe until it needs shuffling.
+    Returns [rounds, result sum, squared result sum] for each seat."""
+    sums = [[0, 0, 0] for _ in seats]
+    while True:
+        for seat_sums, result in zip(sums, play_round(seats, shoe)):
+            seat_sums[0] += 1
+            seat_sums[1] += result
+            seat_sums[2] += result * result
+        if shoe.needs_shuffle(len(seats) + 1):
+            return sums
+
+
+def run_shoes(spec, first_shoe, shoe_count):
+    """Plays shoes first_shoe up to first_shoe + shoe_count in a worker
+    process and returns the play_shoe sums of each, by shoe index. The spec
+    holds the book states, the book index of each seat, the seed and the
+    penetration."""
+    books = [BookTable.from_state(state) for state in spec['books']]
+    table_book = books[0]
+    seats = seat_builders(table_book,
+                          [books[index] for index in spec['seat_books']])
+    counts = deck_counts(table_book.deck)
+    rng = CounterRNG(spec['seed'])
+    results = {}
+    for shoe_index in range(first_shoe, first_shoe + shoe_count):
+        shoe = TableShoe(counts, rng.spawn(shoe_index), spec['penetration'])
+        results[shoe_index] = play_shoe(seats, shoe)
+    return results
+
+
+def book_spec(table_book, books, seed, penetration):
+    """Returns a spec of the table book and the passed books for a worker
+    process, holding each book's state once, together with a function
+    from a book to its index in the spec."""
+    known = []
+    for book in [table_book] + list(books):
+        if not any(book is other for other in known):
+            known.append(book)
+    spec = {'books': [book.state() for book in known],
+            'seed': table_book.seed if seed is None else seed,
+            'penetration': penetration}
+    return spec, lambda book: next(index for index, other in enumerate(known)
+                                   if other is book)
+
+
+def run_chunks(worker, spec, shoes, workers, chunk_shoes):
+    """Plays the shoes in chunks of at most chunk_shoes with
+    worker(spec, first_shoe, shoe_count) and yields the result of each
+    chunk as it finishes. At most two chunks a worker are queued at once,
+    so memory doesn't grow with the number of shoes. With one worker the
+    chunks are played in this process."""
+    chunk = max(1, min(chunk_shoes, shoes // (4 * workers)))
+    chunks = ((first_shoe, min(chunk, shoes - first_shoe))
+              for first_shoe in range(0, shoes, chunk))
+
+    if workers == 1:
+        for first_shoe, shoe_count in chunks:
+            yield worker(spec, first_shoe, shoe_count)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for first_shoe, shoe_count in chunks:
+            pending.add(pool.submit(worker, spec, first_shoe, shoe_count))
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in as_completed(pending):
+            yield future.result()
+
+
+def check_table(table_book, seats, penetration):
+    """Raises ValueError if the table can't seat the passed number of
+    seats, or the penetration is out of range."""
+    if not 1 <= seats <= MAX_SEATS:
+        raise ValueError(f'A table has 1 to {MAX_SEATS} seats.')
+    if not 0 < penetration <= 1:
+        raise ValueError('The penetration must be above 0 and at most 1.')
+    if len(table_book.deck) < ROUND_CARDS * (seats + 1):
+        raise ValueError(f'The deck is too small for {seats} seats.')
+
+
+def simulate_table(table_book, seat_books, shoes=DEFAULT_SHOES, seed=None,
+                   penetration=DEFAULT_PENETRATION, workers=DEFAULT_WORKERS):
+    """Plays the passed number of shoes with a seat for each of the seat
+    books, and yields (shoe index, play_shoe sums) for each shoe as the
+    chunk it was played in finishes. The seed defaults to that of the table
+    book. With one worker the shoes are played in this process."""
+    check_table(table_book, len(seat_books), penetration)
+    check_books(table_book, seat_books)
+    spec, book_index = book_spec(table_book, seat_books, seed, penetration)
+    spec['seat_books'] = [book_index(book) for book in seat_books]
+    for results in run_chunks(run_shoes, spec, shoes, workers, CHUNK_SHOES):
+        yield from results.items()
+
+
+def count_index(pairs, true_count):
+    """Returns the value of the last (true count, value) pair at or below
+    the true count, or the first value if the true count is below them
+    all. The pairs are sorted by true count."""
+    value = pairs[0][1]
+    for count, count_value in pairs:
+        if count > true_count:
+            break
+        value = count_value
+    return value
+
+
+def play_count_shoe(count_seats, other_seats, ramp, shoe):
+    """Plays rounds from a freshly shuffled shoe until it needs shuffling,
+    with a counter in the first seat and the other seats after it. At the
+    start of each round the counter bets by the true count off the ramp,
+    and plays the builder it maps to in count_seats; both are sorted
+    (true count, value) pairs. A bet of 0 sits the round out, though the
+    seat is still dealt. Returns [rounds, units bet, result sum, squared
+    result sum] of the counter, in units."""
+    bets = []
+    results = []
+    hands = len(other_seats) + 2
+    while True:
+        true_count = shoe.true_count()
+        bet = count_index(ramp, true_count)
+        seats = [count_index(count_seats, true_count)] + other_seats
+        bets.append(bet)
+        results.append(play_round(seats, shoe)[0])
+        if shoe.needs_shuffle(hands):
+            return count_sums(bets, results)
+
+
+def count_sums(bets, results):
+    """Returns [rounds, units bet, result sum, squared result sum] of the
+    counter's rounds from the bet and the result per unit of each."""
+    if np is None:
+        results = [bet * result for bet, result in zip(bets, results)]
+        return [len(bets), sum(bets), sum(results),
+                sum(result * result for result in results)]
+    bets = np.array(bets, dtype=float)
+    results = bets * np.array(results, dtype=float)
+    return [len(bets), float(bets.sum()), float(results.sum()),
+            float(results @ results)]
+
+
+def run_count_shoes(spec, first_shoe, shoe_count):
+    """Plays shoes first_shoe up to first_shoe + shoe_count in a worker
+    process and returns their summed play_count_shoe sums. Besides the
+    book states, seed and penetration, the spec holds the ramp, the book
+    index of each count book and the number of other seats."""
+    books = [BookTable.from_state(state) for state in spec['books']]
+    table_book = books[0]
+    builders = seat_builders(table_book, books)
+    count_seats = [(count, builders[index])
+                   for count, index in spec['count_books']]
+    other_seats = [builders[0]] * spec['other_seats']
+    ramp = [tuple(pair) for pair in spec['ramp']]
+    counts = deck_counts(table_book.deck)
+    rng = CounterRNG(spec['seed'])
+    sums = [0, 0, 0, 0]
+    for shoe_index in range(first_shoe, first_shoe + shoe_count):
+        shoe = TableShoe(counts, rng.spawn(shoe_index), spec['penetration'])
+        for index, value in enumerate(play_count_shoe(count_seats,
+                                                      other_seats, ramp,
+                                                      shoe)):
+            sums[index] += value
+    return shoe_count, sums
+
+
+def simulate_count(table_book, ramp, count_books=None, seats=1,
+                   shoes=DEFAULT_SHOES, seed=None,
+                   penetration=DEFAULT_PENETRATION, workers=DEFAULT_WORKERS):
+    """Plays the passed number of shoes with a Hi-Lo counter in seat 1 and
+    the table book in the other seats, and yields (shoes, play_count_shoe
+    sums) for each chunk of shoes as it finishes. The ramp maps true counts
+    to bets in units, and count_books true counts to the book the counter
+    plays from that count up; below them all it plays the table book. The
+    seed defaults to that of the table book."""
+    count_books = dict(count_books or {})
+    check_table(table_book, seats, penetration)
+    check_books(table_book, [table_book] + list(count_books.values()))
+    if not ramp:
+        raise ValueError('The bet ramp is empty.')
+    if any(bet < 0 for bet in ramp.values()) or \
+            not any(bet > 0 for bet in ramp.values()):
+        raise ValueError('The ramp bets must be at least 0, and one of '
+                         'them above 0.')
+    spec, book_index = book_spec(table_book, count_books.values(), seed,
+                                 penetration)
+    spec['count_books'] = [(-inf, 0)] + sorted(
+            (count, book_index(book)) for count, book in count_books.items())
+    spec['ramp'] = sorted(ramp.items())
+    spec['other_seats'] = seats - 1
+    yield from run_chunks(run_count_shoes, spec, shoes, workers,
+                          COUNT_CHUNK_SHOES)
+
+
+def seat_stats(sums):
+    """Returns the rounds, EV per round, standard deviation per round and
+    standard error of the EV for a seat's summed results."""
+    rounds, result_sum, square_sum = sums
+    ev = result_sum / rounds
+    variance = max(square_sum / rounds - ev * ev, 0)
+    if rounds > 1:
+        variance *= rounds / (rounds - 1)
+    return rounds, ev, sqrt(variance), sqrt(variance / rounds)
+
+
+def count_stats(sums, rounds_per_hour=DEFAULT_ROUNDS_PER_HOUR,
+                bankroll=DEFAULT_BANKROLL):
+    """Returns a dict of the counter's results from its summed
+    play_count_shoe sums, in units: the average bet, the EV and standard
+    deviation per round and per hour, the standard error of the EV, N0 (the
+    rounds it takes for the EV to equal one standard deviation) and the
+    risk of ruin of the bankroll, as the diffusion estimate
+    exp(-2 EV bankroll / variance)."""
+    rounds, units_bet, result_sum, square_sum = sums
+    _, ev, sd, std_error = seat_stats([rounds, result_sum, square_sum])
+    variance = sd * sd
+    if ev <= 0:
+        risk_of_ruin = 1.0
+    elif variance == 0:
+        risk_of_ruin = 0.0
+    else:
+        risk_of_ruin = exp(-2 * ev * bankroll / variance)
+    return {'rounds': rounds, 'average_bet': units_bet / rounds,
+            'ev': ev, 'sd': sd, 'std_error': std_error,
+            'ev_per_hour': ev * rounds_per_hour,
+            'sd_per_hour': sd * sqrt(rounds_per_hour),
+            'n0': variance / (ev * ev) if ev else inf,
+            'risk_of_ruin': risk_of_ruin}
+
+
+def parse_ramp(text):
+    """Parses a bet ramp written as TC:BET pairs split by commas, such as
+    -1:1,2:4,4:8, into a dict of bets by true count."""
+    ramp = {}
+    for pair in text.split(','):
+        count, _, bet = pair.partition(':')
+        ramp[int(count)] = float(bet)
+    return ramp
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+            description='Simulates a blackjack table of several seats '
+                        'sharing one shoe.')
+    parser.add_argument('book', help='the table book, which sets the rules '
+                                     'and the deck')
+    parser.add_argument('--seats', type=int, default=1,
+                        help=f'seats at the table, 1 to {MAX_SEATS}')
+    parser.add_argument('--seat-book', action='append', default=[],
+                        metavar='SEAT=FILE',
+                        help='a book for one seat, counted from 1, instead '
+                             'of the table book')
+    parser.add_argument('--shoes', type=int, default=DEFAULT_SHOES)
+    parser.add_argument('--penetration', type=float,
+                        default=DEFAULT_PENETRATION,
+                        help='share of the shoe dealt before the shuffle')
+    parser.add_argument('--seed', type=int,
+                        help='the table book seed by default')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--json', action='store_true',
+                        help='print the results as JSON lines')
+    parser.add_argument('--ramp', metavar='TC:BET,...',
+                        help='make seat 1 a Hi-Lo counter betting by this '
+                             'ramp of true counts to units')
+    parser.add_argument('--count-book', action='append', default=[],
+                        metavar='TC=FILE',
+                        help='a book for the counter from this true count '
+                             'up')
+    parser.add_argument('--bankroll', type=float, default=DEFAULT_BANKROLL,
+                        help='the counter bankroll in units')
+    parser.add_argument('--rounds-per-hour', type=float,
+                        default=DEFAULT_ROUNDS_PER_HOUR)
+    args = parser.parse_args(argv)
+    if args.shoes < 1:
+        parser.error('--shoes must be at least 1')
+    if args.workers < 1:
+        parser.error('--workers must be at least 1')
+
+    table_book = BookTable.load(args.book)
+    if args.ramp is not None:
+        return count_main(parser, args, table_book)
+    if args.count_book:
+        parser.error('--count-book needs --ramp')
+    seat_books = [table_book] * args.seats
+    seat_files = [args.book] * args.seats
+    for seat_book in args.seat_book:
+        seat, _, filename = seat_book.partition('=')
+        if not seat.isdigit() or not 1 <= int(seat) <= args.seats:
+            parser.error(f'--seat-book {seat_book} has no seat from 1 to '
+                         f'{args.seats}')
+        seat_books[int(seat) - 1] = BookTable.load(filename)
+        seat_files[int(seat) - 1] = filename
+
+    totals = [[0, 0, 0] for _ in seat_books]
+    shoes_done = 0
+    results = simulate_table(table_book, seat_books, args.shoes, args.seed,
+                             args.penetration, args.workers)
+    try:
+        for _, sums in results:
+            for total, seat_sums in zip(totals, sums):
+                for index in range(3):
+                    total[index] += seat_sums[index]
+            shoes_done += 1
+            if shoes_done % CHUNK_SHOES and shoes_done != args.shoes:
+                continue
+            stats = [seat_stats(total) for total in totals]
+            if args.json:
+                print(json.dumps({
+                        'shoes': shoes_done,
+                        'seats': [{'rounds': rounds, 'ev': ev, 'sd': sd,
+                                   'std_error': std_error}
+                                  for rounds, ev, sd, std_error in stats]}),
+                      flush=True)
+            else:
+                print(f'{shoes_done} shoes: ' +
+                      ' '.join(f'{ev:+.5f}' for _, ev, _, _ in stats),
+                      flush=True)
+    except ValueError as error:
+        parser.error(str(error))
+
+    if not args.json:
+        print(f'\n{"Seat":>4} {"Rounds":>9} {"EV":>10} {"SD":>8} '
+              f'{"+/-":>9}  Book')
+        for seat, (total, filename) in enumerate(zip(totals, seat_files), 1):
+            rounds, ev, sd, std_error = seat_stats(total)
+            print(f'{seat:>4} {rounds:>9} {ev:>+10.5f} {sd:>8.4f} '
+                  f'{std_error:>9.5f}  {filename}')
+
+
+
+def count_main(parser, args, table_book):
+    """Runs the counter simulation of the main() arguments."""
+    if args.seat_book:
+        parser.error('--seat-book can\'t be used with --ramp')
+    try:
+        ramp = parse_ramp(args.ramp)
+    except ValueError:
+        parser.error(f'--ramp {args.ramp} isn\'t a list of TC:BET pairs')
+    count_books = {}
+    for count_book in args.count_book:
+        count, _, filename = count_book.partition('=')
+        try:
+            count_books[int(count)] = BookTable.load(filename)
+        except ValueError:
+            parser.error(f'--count-book {count_book} has no true count')
+
+    totals = [0, 0, 0, 0]
+    shoes_done = 0
+    reports = 0
+    results = simulate_count(table_book, ramp, count_books, args.seats,
+                             args.shoes, args.seed, args.penetration,
+                             args.workers)
+    try:
+        for shoes, sums in results:
+            for index in range(4):
+                totals[index] += sums[index]
+            shoes_done += shoes
+            if shoes_done < (reports + 1) * COUNT_CHUNK_SHOES and \
+                    shoes_done != args.shoes:
+                continue
+            reports = shoes_done // COUNT_CHUNK_SHOES
+            stats = count_stats(totals, args.rounds_per_hour, args.bankroll)
+            if args.json:
+                print(json.dumps({'shoes': shoes_done, **stats}), flush=True)
+            else:
+                print(f'{shoes_done} shoes: {stats["ev"]:+.5f} '
+                      f'+/- {stats["std_error"]:.5f}', flush=True)
+    except ValueError as error:
+        parser.error(str(error))
+
+    if not args.json:
+        print(f'\nRounds: {stats["rounds"]}\n'
+              f'Average bet: {stats["average_bet"]:.3f}\n'
+              f'EV per round: {stats["ev"]:+.5f} '
+              f'+/- {stats["std_error"]:.5f}\n'
+              f'SD per round: {stats["sd"]:.4f}\n'
+              f'EV per hour: {stats["ev_per_hour"]:+.3f}\n'
+              f'SD per hour: {stats["sd_per_hour"]:.3f}\n'
+              f'N0: {stats["n0"]:.0f} rounds\n'
+              f'Risk of ruin of {args.bankroll:g} units: '
+              f'{stats["risk_of_ruin"]:.2%}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+# Tests of the BookTable book storage and its total views.
+
+import os
+import tempfile
+import unittest
+from math import isnan
+
+import blackjack_release_v1 as bj
+
+
+def hard_13_book(deck_choice='finite'):
+    """Returns a book with just the cells of hard 13 against a 10 set, each
+    with its own EVs."""
+    rules = bj.Rules(deck_choice, True, True, False, True, True, 4,
+                     'any hand', 1, 'late')
+    book = bj.BookTable(bj.ONE_DECK, rules)
+    for offset, (fpc, spc) in enumerate(bj.HARD_HAND_COMP[13]):
+        book.set_cell(fpc, spc, 10, 'H',
+                      [-0.5 - offset / 100, -0.45 + offset / 50,
+                       -0.9, bj.nan, -0.5])
+    return book
+
+
+class BookTableTest(unittest.TestCase):
+    """Cells are kept in flat arrays and total plays are averaged from them
+    on demand."""
+
+    def test_cells(self):
+        book = hard_13_book()
+        self.assertTrue(book.has_cell(6, 7, 10))
+        self.assertTrue(book.has_cell(7, 6, 10))
+        self.assertFalse(book.has_cell(6, 7, 9))
+        with self.assertRaises(KeyError):
+            book.cell(6, 7, 9)
+        play, ev_list = book.cell(7, 6, 10)
+        self.assertEqual(play, 'H')
+        self.assertEqual(ev_list[:3], [-0.53, -0.39, -0.9])
+        self.assertTrue(isnan(ev_list[3]))
+        self.assertEqual(len({bj.cell_index(fpc, spc, duc)
+                              for fpc in range(1, 11)
+                              for spc in range(1, 11)
+                              for duc in range(1, 11)}), bj.CELL_COUNT)
+
+    def test_hard_total(self):
+        for deck_choice in ('finite', 'infinite'):
+            book = hard_13_book(deck_choice)
+            weights = []
+            for fpc, spc in bj.HARD_HAND_COMP[13]:
+                _, chance = book.hand_prob(fpc, spc, 10)
+                weights.append(chance * (2 if fpc != spc else 1))
+            hit_ev = sum(weight * book.cell(fpc, spc, 10)[1][1]
+                         for weight, (fpc, spc)
+                         in zip(weights, bj.HARD_HAND_COMP[13])) / \
+                     sum(weights)
+            play, ev_list = book.hard_total(13, 10)
+            self.assertAlmostEqual(ev_list[1], hit_ev, places=12)
+            self.assertEqual(play, 'H')
+            self.assertEqual(book.lookup([2, 5, 6], 10), (play, ev_list))
+
+    def test_views_follow_cells(self):
+        book = hard_13_book()
+        play, _ = book.hard_total(13, 10)
+        self.assertEqual(play, 'H')
+        # Changing one composition changes the total view.
+        book.set_cell(3, 10, 10, 'S', [2, -0.45, -0.9, bj.nan, -0.5])
+        play, ev_list = book.hard_total(13, 10)
+        self.assertEqual(play, 'S')
+        self.assertGreater(ev_list[0], 0)
+        # The view is a copy, so changing it doesn't change the book.
+        ev_list[0] = -5
+        self.assertGreater(book.hard_total(13, 10)[1][0], 0)
+
+    def test_save_and_load(self):
+        book = hard_13_book()
+        book.set_cell(6, 6, 10, 'H', [-0.5, -0.45, -0.9, bj.nan, -0.5])
+        book.set_split_ev(6, 10, -0.4)
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'test.book')
+            book.save(filename)
+            loaded = bj.BookTable.load(filename)
+        self.assertEqual(loaded.rules, book.rules)
+        self.assertEqual(loaded.deck, book.deck)
+        self.assertEqual(loaded.seed, book.seed)
+        self.assertEqual(loaded.plays, book.plays)
+        for fpc, spc in bj.HARD_HAND_COMP[13]:
+            self.assertEqual(loaded.cell(fpc, spc, 10)[1][:3],
+                             book.cell(fpc, spc, 10)[1][:3])
+        self.assertEqual(loaded.cell(6, 6, 10)[1][3], -0.4)
+        play, ev_list = loaded.hard_total(13, 10)
+        self.assertEqual(play, 'H')
+        self.assertEqual(ev_list[:3], book.hard_total(13, 10)[1][:3])
+
+    def test_unknown_format(self):
+        state = hard_13_book().state()
+        state['format'] = 'book table 99'
+        with self.assertRaises(ValueError):
+            bj.BookTable.from_state(state)
+
+
+if __name__ == '__main__':
+    unittest.main()
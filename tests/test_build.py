@@ -0,0 +1,146 @@
+# Tests of the hard and soft total cells made by a build.
+
+import unittest
+from math import isnan
+
+import blackjack_release_v1 as bj
+
+
+def finite_rules():
+    """Returns one deck rules on which the dealer hits soft 17."""
+    return bj.Rules('finite', True, True, False, True, True, 4, 'any hand',
+                    1)
+
+
+def dealer_chances(hard_sum, aces, counts, dhs17):
+    """Returns the chance of each final dealer total, 22 for a bust, by
+    drawing every card in turn from the count vector."""
+    total = hard_sum + 10 if aces and hard_sum + 10 <= 21 else hard_sum
+    soft = total != hard_sum
+    if total > 21:
+        return {22: 1}
+    if total >= 18 or total == 17 and not (soft and dhs17):
+        return {total: 1}
+    chances = {}
+    for card, chance, left in draws(counts):
+        for final, final_chance in dealer_chances(hard_sum + card,
+                                                  aces + (card == 1), left,
+                                                  dhs17).items():
+            chances[final] = chances.get(final, 0) + chance * final_chance
+    return chances
+
+
+def draws(counts, exclude=None):
+    """Yields each card that can be drawn from the count vector, with its
+    chance and the counts left. A draw with exclude is made as if those
+    cards weren't in the deck."""
+    size = sum(counts) - (counts[exclude] if exclude else 0)
+    for card in range(1, 11):
+        if card != exclude and counts[card] > 0:
+            left = list(counts)
+            left[card] -= 1
+            yield card, counts[card] / size, left
+
+
+def add_card(total, card):
+    """Returns the best total of a hard hand after drawing a card."""
+    if card == 1 and total + 11 <= 21:
+        return total + 11
+    return total + card
+
+
+def stand_ev(pht, duc, ddc, counts):
+    """Returns the EV of standing on a total against the dealer cards, by
+    brute force."""
+    ev = 0
+    for final, chance in dealer_chances(duc + ddc, (duc == 1) + (ddc == 1),
+                                        counts, True).items():
+        if final == 22 or pht > final:
+            ev += chance
+        elif pht < final:
+            ev -= chance
+    return ev
+
+
+def counts_left(cards):
+    """Returns the count vector of one deck less the passed cards."""
+    counts = bj.deck_counts(bj.ONE_DECK)
+    for card in cards:
+        counts[card] -= 1
+    return counts
+
+
+class BuildTest(unittest.TestCase):
+    """Cells are built once per hard total under the infinite deck, and
+    exactly through memoized count vectors under a finite one."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.builders = {}
+        for deck_choice in ('infinite', 'finite'):
+            rules = finite_rules()._replace(deck_choice=deck_choice)
+            builder = bj.BookBuilder(rules, bj.ONE_DECK)
+            builder.build_hands()
+            cls.builders[deck_choice] = builder
+
+    def test_infinite_compositions(self):
+        book = self.builders['infinite'].book
+        for pht, compositions in bj.HARD_HAND_COMP.items():
+            if pht in (4, 21):
+                continue
+            for duc in bj.CARD_VALUES:
+                first_play, first_evs = book.cell(*compositions[0], duc)
+                for fpc, spc in compositions[1:]:
+                    play, ev_list = book.cell(fpc, spc, duc)
+                    if fpc == spc:
+                        # The pair cell isn't split yet.
+                        continue
+                    self.assertEqual(play, first_play)
+                    self.assertEqual(ev_list[:3], first_evs[:3])
+
+    def test_finite_stand(self):
+        # The dealer has peeked, so the hole card can't make a blackjack.
+        book = self.builders['finite'].book
+        for fpc, spc, duc in ((10, 6, 10), (10, 6, 6), (9, 8, 1),
+                              (10, 9, 7), (4, 10, 2)):
+            ev = 0
+            for ddc, chance, left in draws(counts_left([fpc, spc, duc]),
+                                           bj.DDC_EXCLUDE.get(duc)):
+                ev += chance * stand_ev(fpc + spc, duc, ddc, left)
+            _, ev_list = book.cell(fpc, spc, duc)
+            self.assertAlmostEqual(ev_list[0], ev, places=12)
+
+    def test_finite_double(self):
+        book = self.builders['finite'].book
+        for fpc, spc, duc in ((5, 6, 6), (2, 9, 10), (4, 6, 1)):
+            ev = 0
+            for ddc, chance, left in draws(counts_left([fpc, spc, duc]),
+                                           bj.DDC_EXCLUDE.get(duc)):
+                for card, card_chance, card_left in draws(left):
+                    ev += chance * card_chance * stand_ev(
+                            add_card(fpc + spc, card), duc, ddc, card_left)
+            _, ev_list = book.cell(fpc, spc, duc)
+            self.assertAlmostEqual(ev_list[2], 2 * ev, places=12)
+
+    def test_eor_approximation(self):
+        builder = bj.BookBuilder(finite_rules(), bj.ONE_DECK)
+        builder.set_options(eor_approx=True)
+        builder.build_hands()
+        exact = self.builders['finite'].book
+        worst = 0
+        for pht in range(5, 21):
+            for fpc, spc in bj.HARD_HAND_COMP[pht]:
+                if fpc == spc:
+                    continue
+                for duc in bj.CARD_VALUES:
+                    _, ev_list = builder.book.cell(fpc, spc, duc)
+                    _, exact_evs = exact.cell(fpc, spc, duc)
+                    for ev, exact_ev in zip(ev_list[:3], exact_evs[:3]):
+                        if not isnan(exact_ev):
+                            worst = max(worst, abs(ev - exact_ev))
+        self.assertGreater(worst, 0)
+        self.assertLess(worst, 0.01)
+
+
+if __name__ == '__main__':
+    unittest.main()
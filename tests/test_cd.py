@@ -0,0 +1,64 @@
+# Tests of composition dependent play.
+
+import unittest
+
+import blackjack_release_v1 as bj
+
+
+class CompositionDependentTest(unittest.TestCase):
+    """Composition dependent play is made on the exact cards left, so it
+    never does worse than the book."""
+
+    @classmethod
+    def setUpClass(cls):
+        rules = bj.Rules('finite', True, True, False, True, True, 4,
+                         'any hand', 1)
+        cls.builder = bj.BookBuilder(rules, bj.ONE_DECK)
+        cls.builder.build_hands()
+
+    def test_multi_card_16(self):
+        # One deck basic strategy hits 16 against a 10, but stands on it
+        # with three or more cards.
+        builder = self.builder
+        for hand in ([10, 2, 4], [7, 2, 7], [4, 4, 4, 4]):
+            play, _ = builder.book.lookup(hand, 10)
+            self.assertEqual(play, 'H')
+            self.assertEqual(builder.cd_play(hand, 10, []), 'S')
+            builder.set_options(composition_dependent=True)
+            self.assertEqual(builder.sim_hand_play(hand, 10, []), 'S')
+            builder.set_options(composition_dependent=False)
+            self.assertEqual(builder.sim_hand_play(hand, 10, []), 'H')
+        # Two card hands are always played by the book.
+        builder.set_options(composition_dependent=True)
+        self.assertEqual(builder.sim_hand_play([10, 6], 10, []), 'H')
+        builder.set_options()
+
+    def test_not_worse_than_book(self):
+        builder = self.builder
+        book = builder.book
+        for fpc in range(2, 11):
+            for spc in range(fpc, 11):
+                pht, hard_or_soft = bj.best_hand_from_card_list([fpc, spc])
+                for duc in (1, 5, 10):
+                    counts = list(book.counts)
+                    for card in (fpc, spc, duc):
+                        counts[card] -= 1
+                    counts = tuple(counts)
+                    _, ev_list = book.cell(fpc, spc, duc)
+                    self.assertAlmostEqual(
+                            builder.cd_stand_ev(pht, duc, counts),
+                            ev_list[0], places=12)
+                    self.assertGreater(
+                            builder.cd_hit_ev(pht, hard_or_soft, duc, counts,
+                                              True),
+                            ev_list[1] - 1e-12)
+
+    def test_gains(self):
+        cd_gains = self.builder.build_cd_gains()
+        self.assertIn((5, 10, 10), cd_gains)
+        for book_ev, cd_ev in cd_gains.values():
+            self.assertGreater(cd_ev, book_ev + bj.CD_GAIN_MIN)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+# Tests of checkpointing a build and resuming it.
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import blackjack_release_v1 as bj
+
+# Pair simulations are cut short so that whole builds are quick, but run
+# past a checkpoint of their partial sums.
+TEST_SIM_MAX = 2500
+
+RULES = bj.Rules('finite', True, True, False, True, True, 4, 'any hand', 1)
+
+
+class Stop(Exception):
+    """Stands for the build being stopped."""
+
+
+def same_books(test, book, other):
+    """Checks that two books hold the same plays and EVs."""
+    test.assertEqual(book.plays, other.plays)
+    for evs, other_evs in zip(book.evs, other.evs):
+        test.assertEqual(evs.tobytes(), other_evs.tobytes())
+
+
+class CheckpointTest(unittest.TestCase):
+    """A stopped build resumed from its checkpoint ends as if it hadn't
+    stopped."""
+
+    @classmethod
+    def setUpClass(cls):
+        with mock.patch.object(bj, 'SIM_MAX', TEST_SIM_MAX):
+            cls.builder = bj.BookBuilder(RULES, bj.ONE_DECK, seed=5,
+                                         crn=True)
+            cls.builder.build()
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.checkpoint_file = os.path.join(directory.name, 'build.checkpoint')
+        patches = [mock.patch.object(bj, 'SIM_MAX', TEST_SIM_MAX),
+                   mock.patch.object(bj, 'CHECKPOINT_SECONDS', 0)]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def stopped_build(self, stop):
+        """Starts a build that checkpoints on every chance, and stops it
+        the first time stop(pair_sim) is true."""
+        builder = bj.BookBuilder(RULES, bj.ONE_DECK, seed=5,
+                                 checkpoint_file=self.checkpoint_file,
+                                 crn=True)
+        checkpoint = builder.checkpoint
+
+        def stopping_checkpoint(pair_sim=None):
+            checkpoint(pair_sim)
+            if stop(pair_sim):
+                raise Stop
+        builder.checkpoint = stopping_checkpoint
+        with self.assertRaises(Stop):
+            builder.build()
+        self.assertTrue(os.path.exists(self.checkpoint_file))
+
+    def resume(self, pair_count=None):
+        """Resumes the stopped build, finishes it and returns its book.
+        pair_count is the number of hands of the pair simulation it should
+        carry on from, if any."""
+        events = []
+        builder = bj.BookBuilder.resume(
+                self.checkpoint_file, RULES, bj.ONE_DECK,
+                progress=lambda *event: events.append(event))
+        self.assertTrue(builder.crn)
+        if pair_count is None:
+            self.assertIsNone(builder.pair_sim)
+        else:
+            self.assertEqual(builder.pair_sim['count'], pair_count)
+        builder.build()
+        self.assertFalse(os.path.exists(self.checkpoint_file))
+        # Every step is reported done, those done before the stop too.
+        self.assertEqual(sum(event[0] == 'done' for event in events), 380)
+        return builder.book
+
+    def test_stop_between_steps(self):
+        steps = []
+
+        def stop(pair_sim):
+            steps.append(pair_sim)
+            return len(steps) == 150
+        self.stopped_build(stop)
+        same_books(self, self.resume(), self.builder.book)
+
+    def test_stop_in_a_pair_simulation(self):
+        def stop(pair_sim):
+            return pair_sim is not None and pair_sim['cell'] == (8, 6) and \
+                   pair_sim['count'] == 2000
+        self.stopped_build(stop)
+        same_books(self, self.resume(2000), self.builder.book)
+
+    def test_other_rules(self):
+        self.stopped_build(lambda pair_sim: True)
+        with self.assertRaises(ValueError):
+            bj.BookBuilder.resume(self.checkpoint_file,
+                                  RULES._replace(das=False), bj.ONE_DECK)
+        with self.assertRaises(ValueError):
+            bj.BookBuilder.resume(self.checkpoint_file, RULES,
+                                  bj.ONE_DECK * 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
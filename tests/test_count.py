@@ -0,0 +1,68 @@
+# Tests of the table simulator's Hi-Lo counter.
+
+import unittest
+from math import exp
+from unittest import mock
+
+import blackjack_release_v1 as bj
+import bookmaker_table as table
+
+SIX_DECKS = bj.ONE_DECK * 6
+
+
+class CountTest(unittest.TestCase):
+    """The running count is that of the discards, and the counter's sums
+    are the same with or without NumPy."""
+
+    def test_running_count(self):
+        for numpy in (table.np, None):
+            with mock.patch.object(table, 'np', numpy):
+                shoe = table.TableShoe(bj.deck_counts(SIX_DECKS),
+                                       bj.CounterRNG(3).spawn(0))
+            count = 0
+            while not shoe.needs_shuffle(3):
+                shoe.new_round()
+                front = [shoe.draw(), shoe.draw()]
+                for _ in range(2):
+                    shoe.new_seat()
+                    # Each seat draws the dealer cards again, and the
+                    # round takes as many as any seat drew.
+                    back = [shoe.draw(dealer=True) for _ in range(3)]
+                front.append(shoe.draw())
+                shoe.end_round()
+                count += sum(table.HI_LO[card] for card in front + back)
+                self.assertEqual(shoe.running_count, count)
+            self.assertEqual(shoe.true_count(),
+                             count * 52 // shoe.cards_left())
+        # A balanced count sums to 0 over the full shoe.
+        self.assertEqual(shoe.tag_sums[-1], 0)
+
+    def test_count_sums(self):
+        bets = [1, 0, 4, 2, 8]
+        results = [-1, 1.5, 2, -2, 0.5]
+        sums = [5, 15, -1 + 0 + 8 - 4 + 4, 1 + 0 + 64 + 16 + 16]
+        self.assertEqual(table.count_sums(bets, results), sums)
+        with mock.patch.object(table, 'np', None):
+            self.assertEqual(table.count_sums(bets, results), sums)
+
+    def test_count_stats(self):
+        stats = table.count_stats([100, 250, 10, 400], 100, 1000)
+        self.assertEqual(stats['average_bet'], 2.5)
+        self.assertAlmostEqual(stats['ev'], 0.1)
+        variance = (4 - 0.01) * 100 / 99
+        self.assertAlmostEqual(stats['sd'] ** 2, variance)
+        self.assertAlmostEqual(stats['n0'], variance / 0.01)
+        self.assertAlmostEqual(stats['risk_of_ruin'],
+                               exp(-2 * 0.1 * 1000 / variance))
+        self.assertEqual(table.count_stats([2, 2, -1, 1])['risk_of_ruin'],
+                         1.0)
+
+    def test_count_index(self):
+        ramp = [(-1, 1), (1, 2), (3, 8)]
+        self.assertEqual([table.count_index(ramp, count)
+                          for count in (-5, -1, 0, 1, 2, 3, 9)],
+                         [1, 1, 1, 2, 2, 8, 8])
+
+
+if __name__ == '__main__':
+    unittest.main()
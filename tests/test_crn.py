@@ -0,0 +1,79 @@
+# Tests of the common random numbers mode of pair simulations.
+
+import unittest
+from math import sqrt
+from unittest import mock
+
+import blackjack_release_v1 as bj
+
+# Pair simulations are cut short so that whole builds are quick.
+TEST_SIM_MAX = 2000
+TEST_SIM_HANDS = 3000
+
+
+class ControlVariateTest(unittest.TestCase):
+    """The simulated non-split play is a control variate only where its
+    expectation is the book EV."""
+
+    @classmethod
+    def setUpClass(cls):
+        rules = bj.Rules('finite', True, True, False, True, True, 4,
+                         'any hand', 1, 'late')
+        cls.builder = bj.BookBuilder(rules, bj.ONE_DECK)
+        with mock.patch.object(bj, 'SIM_MAX', TEST_SIM_MAX):
+            cls.builder.build()
+
+    def split_results(self, pair_of, duc, composition_dependent):
+        """Simulates a pair cell with common random numbers and returns its
+        diagnostics and the result of every split."""
+        builder = self.builder
+        builder.set_options(crn=True,
+                            composition_dependent=composition_dependent)
+        results = []
+        sim_play = bj.BookBuilder.sim_play
+
+        def recording_sim_play(self, fpc, spc, duc, play, *args, **kwargs):
+            result = sim_play(self, fpc, spc, duc, play, *args, **kwargs)
+            if play == 'P':
+                results.append(result)
+            return result
+
+        with mock.patch.object(bj.BookBuilder, 'sim_play',
+                               recording_sim_play):
+            builder.pair_hand_builder(pair_of, duc, builder.deck,
+                                      sim_hands=TEST_SIM_HANDS)
+        return builder.book.cell_diagnostics(pair_of, duc), results
+
+    def test_composition_dependent_hit(self):
+        nonsplit_play, _ = self.builder.book.no_split_lookup([6, 6], 7)
+        self.assertEqual(nonsplit_play, 'H')
+        diagnostics, results = self.split_results(6, 7, True)
+        self.assertEqual(len(results), TEST_SIM_HANDS)
+        mean = sum(results) / len(results)
+        m2 = sum((result - mean) ** 2 for result in results)
+        self.assertAlmostEqual(diagnostics.split_ev, mean, places=12)
+        self.assertAlmostEqual(diagnostics.std_error,
+                               sqrt(m2 / (len(results) - 1) / len(results)),
+                               places=12)
+
+    def test_book_play_hit(self):
+        diagnostics, results = self.split_results(6, 7, False)
+        mean = sum(results) / len(results)
+        self.assertNotAlmostEqual(diagnostics.split_ev, mean, places=6)
+
+
+    def test_variance_reduction(self):
+        # A stand on 10,10 against a 6 goes the same way as the split on
+        # much the same cards, so the control variate must cut the
+        # standard error below that of the split results alone.
+        diagnostics, results = self.split_results(10, 6, False)
+        self.assertEqual(diagnostics.nonsplit_play, 'S')
+        mean = sum(results) / len(results)
+        m2 = sum((result - mean) ** 2 for result in results)
+        plain_error = sqrt(m2 / (len(results) - 1) / len(results))
+        self.assertLess(diagnostics.std_error, 0.95 * plain_error)
+        self.assertLess(abs(diagnostics.split_ev - mean), 3 * plain_error)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+# Tests of the effects of removal of a book.
+
+import unittest
+
+import blackjack_release_v1 as bj
+
+RULES = bj.Rules('finite', True, True, False, True, True, 4, 'any hand', 1)
+
+
+def built_hands(deck, rules=RULES):
+    """Returns a builder whose book has every cell but the pairs built
+    for the passed deck."""
+    builder = bj.BookBuilder(rules, deck)
+    builder.build_hands()
+    return builder
+
+
+class EORTest(unittest.TestCase):
+    """Effects of removal are the change in EV from taking a card out of
+    the deck."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.builder = built_hands(bj.ONE_DECK)
+        cls.builder.build_eors()
+
+    def test_total_ev_eor(self):
+        # The pairs aren't split, so every play has exact effects of
+        # removal. A central difference, one card out against one card in,
+        # leaves only third order terms.
+        total_eor = self.builder.book.get_total_ev_eor()
+        for card in (1, 5, 10):
+            minus = list(bj.ONE_DECK)
+            minus.remove(card)
+            minus_ev, _ = built_hands(minus).book.get_total_ev()
+            plus_ev, _ = built_hands(bj.ONE_DECK + [card]).book.get_total_ev()
+            self.assertAlmostEqual(total_eor[card], (minus_ev - plus_ev) / 2,
+                                   delta=1e-4)
+
+    def test_cell_eor(self):
+        book = self.builder.book
+        deck = list(bj.ONE_DECK)
+        deck.remove(5)
+        minus = built_hands(deck).book
+        plus = built_hands(bj.ONE_DECK + [5]).book
+        for fpc, spc, duc in ((10, 6, 10), (2, 9, 6), (1, 7, 9)):
+            eor_lists = book.cell_eor(fpc, spc, duc)
+            _, minus_evs = minus.cell(fpc, spc, duc)
+            _, plus_evs = plus.cell(fpc, spc, duc)
+            for ev_index in range(3):
+                self.assertAlmostEqual(
+                        eor_lists[ev_index][5],
+                        (minus_evs[ev_index] - plus_evs[ev_index]) / 2,
+                        delta=1e-4)
+
+    def test_infinite_deck(self):
+        rules = RULES._replace(deck_choice='infinite')
+        builder = built_hands(bj.ONE_DECK, rules)
+        with self.assertRaises(ValueError):
+            builder.build_eors()
+        with self.assertRaises(ValueError):
+            builder.book.get_total_ev_eor()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+# Tests of the interned hand states.
+
+import threading
+import unittest
+
+import blackjack_release_v1 as bj
+
+
+def dealt_states():
+    """Returns every hand state that can be dealt, drawing and doubling
+    from the empty hand until a bust."""
+    states = {}
+    todo = [bj.hand_state(), bj.hand_state(doubled=True)]
+    while todo:
+        state = todo.pop()
+        if id(state) in states:
+            continue
+        states[id(state)] = state
+        if state.total <= 21:
+            for card in bj.CARD_VALUES:
+                todo.append(state.add(card))
+                todo.append(state.double(card))
+    return list(states.values())
+
+
+class HandStateTest(unittest.TestCase):
+    """A hand state is one shared object for each hand, and the states are
+    bounded."""
+
+    def test_interned(self):
+        state = bj.hand_state_of([10, 6])
+        self.assertIs(state, bj.hand_state_of([10, 6]))
+        self.assertIs(state, bj.hand_state(16, 0, 2, 10))
+        self.assertIs(bj.hand_state_of([6, 10]).add(5),
+                      bj.hand_state_of([10, 6, 5]))
+        self.assertEqual((state.total, state.hard_or_soft, state.second),
+                         (16, 'hard', 6))
+        soft = bj.hand_state_of([1, 6])
+        self.assertEqual((soft.total, soft.hard_or_soft), (17, 'soft'))
+        self.assertTrue(bj.hand_state_of([8, 8]).pair)
+        self.assertFalse(bj.hand_state_of([8, 8, 8]).pair)
+        doubled = state.double(3)
+        self.assertTrue(doubled.doubled)
+        self.assertIsNot(doubled, state.add(3))
+        with self.assertRaises(AttributeError):
+            state.suit = 0
+
+    def test_bounded(self):
+        states = dealt_states()
+        self.assertLess(len(states), 5000)
+        for state in states:
+            self.assertIs(bj.HAND_STATES[(state.hard_sum, state.aces,
+                                          state.cards, state.first,
+                                          state.doubled)], state)
+        size = len(bj.HAND_STATES)
+        # Drawing on past a bust makes states that aren't interned.
+        hand = bj.hand_state_of([10] * 5)
+        self.assertEqual(hand.total, 50)
+        self.assertNotIn((40, 0, 4, 0, False), bj.HAND_STATES)
+        self.assertEqual(len(bj.HAND_STATES), size)
+
+    def test_threads(self):
+        hands = [[card, other, 2, 2] for card in bj.CARD_VALUES
+                 for other in bj.CARD_VALUES]
+        found = []
+
+        def follow():
+            found.append([bj.hand_state_of(hand) for hand in hands])
+        threads = [threading.Thread(target=follow) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for states in found[1:]:
+            for state, other in zip(states, found[0]):
+                self.assertIs(state, other)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+# Tests of the Numba kernel against the pure Python recursion.
+
+import unittest
+from unittest import mock
+
+import blackjack_release_v1 as bj
+import bookmaker_kernel as kernel
+
+# Pair simulations are cut short so that whole builds are quick.
+TEST_SIM_MAX = 2000
+
+
+@unittest.skipUnless(kernel.AVAILABLE, 'Numba is not installed')
+class KernelParityTest(unittest.TestCase):
+    """Books built with the kernel are identical to those built in pure
+    Python."""
+
+    def test_one_deck(self):
+        rules = bj.Rules('finite', True, True, False, True, True, 4,
+                         'any hand', 1, 'late', 'enhc')
+        with mock.patch.object(bj, 'SIM_MAX', TEST_SIM_MAX):
+            differences, _ = kernel.check_parity(rules, bj.ONE_DECK)
+        self.assertEqual(differences, [])
+
+    def test_hand_cells(self):
+        # The dealer stands on soft 17, under peek.
+        rules = bj.Rules('finite', False, True, False, True, True, 4,
+                         'any hand', 1)
+        books = []
+        for native_kernel in (False, True):
+            builder = bj.BookBuilder(rules, bj.ONE_DECK,
+                                     native_kernel=native_kernel)
+            builder.build_hands()
+            self.assertEqual(builder.kernel is not None, native_kernel)
+            books.append(builder.book)
+        python_book, kernel_book = books
+        self.assertEqual(kernel_book.plays, python_book.plays)
+        for evs, python_evs in zip(kernel_book.evs, python_book.evs):
+            self.assertEqual(evs.tobytes(), python_evs.tobytes())
+
+
+if __name__ == '__main__':
+    unittest.main()
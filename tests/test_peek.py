@@ -0,0 +1,55 @@
+# Tests of the dealer peek and European no hole card rules.
+
+import unittest
+
+import blackjack_release_v1 as bj
+
+
+def peek_builder(peek):
+    """Returns the builder of an infinite deck book of the hands under the
+    passed peek rule."""
+    rules = bj.Rules('infinite', True, True, False, True, True, 4,
+                     'any hand', 1, 'none', peek)
+    builder = bj.BookBuilder(rules, bj.ONE_DECK)
+    builder.build_hands()
+    return builder
+
+
+class PeekTest(unittest.TestCase):
+    """Under ENHC a dealer blackjack takes doubled and split bets too, and
+    under ENHC-OBO only the original bet, as when the dealer peeks."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.books = {peek: peek_builder(peek).book
+                     for peek in bj.PEEK_CHOICES}
+
+    def test_extra_bet_cost(self):
+        peek = self.books['peek']
+        enhc = self.books['enhc']
+        # A blackjack under a 10 or an ace has chance 1/13 or 4/13, and is
+        # charged as that chance given no blackjack.
+        for duc, cost in ((10, 1 / 12), (1, 4 / 9), (6, 0)):
+            _, peek_evs = peek.cell(5, 6, duc)
+            _, enhc_evs = enhc.cell(5, 6, duc)
+            self.assertEqual(enhc_evs[:2], peek_evs[:2])
+            self.assertAlmostEqual(peek_evs[2] - enhc_evs[2], cost,
+                                   places=12)
+        self.assertEqual(peek.cell(5, 6, 10)[0], 'D')
+        self.assertEqual(enhc.cell(5, 6, 10)[0], 'H')
+        self.assertEqual(enhc.cell(5, 6, 6)[0], 'D')
+
+    def test_original_bets_only(self):
+        peek = self.books['peek']
+        obo = self.books['enhc obo']
+        self.assertEqual(obo.plays, peek.plays)
+        self.assertEqual(obo.get_total_ev(), peek.get_total_ev())
+
+    def test_total_ev(self):
+        peek_ev, _ = self.books['peek'].get_total_ev()
+        enhc_ev, _ = self.books['enhc'].get_total_ev()
+        self.assertLess(enhc_ev, peek_ev)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+# Tests of the explicit stack recursion and its memoized tables.
+
+import inspect
+import sys
+import unittest
+from unittest import mock
+
+import blackjack_release_v1 as bj
+
+RULES = bj.Rules('finite', True, True, False, True, True, 4, 'any hand', 1)
+
+# A deck of many small cards, whose hands draw deep.
+SMALL_CARD_DECK = [1] * 24 + [2] * 24 + [10] * 8
+
+
+def python_builder(deck=bj.ONE_DECK):
+    """Returns a builder that recurses in Python, not in the kernel."""
+    return bj.BookBuilder(RULES, deck, native_kernel=False)
+
+
+def dealer_dist(builder, dht, hard_or_soft, counts):
+    """Returns the dealer outcome distribution by plain recursion."""
+    dist = builder.dealer_stand_dist(dht, hard_or_soft)
+    if dist is not None:
+        return dist
+    dist = [0] * 6
+    for card, prob, new_counts in bj.draw_probs(counts):
+        card_dist = dealer_dist(builder, *bj.add_card(dht, hard_or_soft,
+                                                      card), new_counts)
+        dist = [odds + prob * card_odds
+                for odds, card_odds in zip(dist, card_dist)]
+    return dist
+
+
+def hit_ev(builder, pht, hard_or_soft, duc, ddc, counts):
+    """Returns the EV of hitting and then playing the book by plain
+    recursion."""
+    dht, dealer_hard_or_soft = bj.best_hand_from_card_list([duc, ddc])
+    ev = 0
+    for card, prob, new_counts in bj.draw_probs(counts):
+        total, new_hard_or_soft = bj.add_card(pht, hard_or_soft, card)
+        if total > 21:
+            ev -= prob
+            continue
+        play, _ = builder.multi_card_play(total, new_hard_or_soft, duc)
+        if play == 'S':
+            ev += prob * bj.stand_ev(total, dealer_dist(
+                    builder, dht, dealer_hard_or_soft, new_counts))
+        elif play == 'H':
+            ev += prob * hit_ev(builder, total, new_hard_or_soft, duc, ddc,
+                                new_counts)
+        else:
+            ev += prob * builder.double_ev(total, new_hard_or_soft, duc,
+                                           ddc, new_counts)
+    return ev
+
+
+def counts_left(deck, cards):
+    """Returns the count vector of a deck less the passed cards."""
+    counts = bj.deck_counts(deck)
+    for card in cards:
+        counts[card] -= 1
+    return tuple(counts)
+
+
+class ExplicitStackTest(unittest.TestCase):
+    """The explicit stack finds what plain recursion does, and trimming the
+    tables changes nothing but the work done."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.builder = python_builder()
+        cls.builder.build_hands()
+
+    def test_plain_recursion(self):
+        builder = self.builder
+        for fpc, spc, duc, ddc in ((10, 2, 10, 6), (2, 3, 6, 10),
+                                   (1, 6, 9, 7), (4, 4, 5, 2)):
+            counts = counts_left(bj.ONE_DECK, (fpc, spc, duc, ddc))
+            pht, hard_or_soft = bj.best_hand_from_card_list([fpc, spc])
+            dht, dealer_hard_or_soft = bj.best_hand_from_card_list([duc, ddc])
+            builder.reset_tables()
+            for found, expected in zip(
+                    builder.dealer_dist(dht, dealer_hard_or_soft, counts),
+                    dealer_dist(builder, dht, dealer_hard_or_soft, counts)):
+                self.assertAlmostEqual(found, expected, places=12)
+            self.assertAlmostEqual(
+                    builder.hit_ev(pht, hard_or_soft, duc, ddc, counts),
+                    hit_ev(builder, pht, hard_or_soft, duc, ddc, counts),
+                    places=12)
+            self.assertGreater(builder.engine_metrics()['max_depth'], 1)
+
+    def test_trimmed_tables(self):
+        builder = python_builder()
+        with mock.patch.object(bj, 'MAX_TABLE_ENTRIES', 100000):
+            builder.build_hands()
+        metrics = builder.engine_metrics()
+        self.assertGreater(metrics['table_trims'], 0)
+        self.assertLessEqual(metrics['peak_entries'], 100001)
+        self.assertEqual(metrics['entries'],
+                         sum(len(table) for table in builder.memo_tables))
+        self.assertEqual(builder.book.plays, self.builder.book.plays)
+        for evs, other_evs in zip(builder.book.evs, self.builder.book.evs):
+            self.assertEqual(evs.tobytes(), other_evs.tobytes())
+
+
+class RecursionDepthTest(unittest.TestCase):
+    """Hands of many small cards stay inside MAX_RECURSION_LEVELS levels of
+    Python calls."""
+
+    def test_small_cards(self):
+        builder = python_builder(SMALL_CARD_DECK)
+        # Hit everything below 17, as a book of the deck would.
+        builder.multi_card_play = \
+                lambda pht, hard_or_soft, duc: ('H' if pht < 17 else 'S',
+                                                None)
+        counts = counts_left(SMALL_CARD_DECK, (2, 2, 2))
+        visible = bj.remove_card(counts, 2)
+        limit = sys.getrecursionlimit()
+        self.addCleanup(sys.setrecursionlimit, limit)
+        sys.setrecursionlimit(len(inspect.stack()) +
+                              2 * bj.MAX_RECURSION_LEVELS)
+        ev = builder.hit_ev(4, 'hard', 2, 2, counts)
+        dist = builder.hit_dist(4, 'hard', 2, 2, counts)
+        grad_ev, _ = builder.hit_ev_grad(4, 'hard', 2, 2, counts)
+        builder.cd_best_play(4, 'hard', 2, visible, True)
+        builder.dealer_dist_grad(4, 'hard', counts)
+        sys.setrecursionlimit(limit)
+        self.assertGreaterEqual(builder.engine_metrics()['max_depth'], 9)
+        self.assertAlmostEqual(sum(dist.values()), 1, places=12)
+        self.assertAlmostEqual(grad_ev, ev, places=12)
+        self.assertAlmostEqual(ev, hit_ev(builder, 4, 'hard', 2, 2, counts),
+                               places=12)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+# Tests of the seeded random number streams of the simulator.
+
+import unittest
+from unittest import mock
+
+import blackjack_release_v1 as bj
+
+# Pair simulations are cut short so that whole builds are quick.
+TEST_SIM_MAX = 500
+
+
+class CounterRNGTest(unittest.TestCase):
+    """A stream is a pure function of its seed, stream ids and counter."""
+
+    def test_same_seed(self):
+        first = bj.CounterRNG(7)
+        second = bj.CounterRNG(7)
+        self.assertEqual([first.next64() for _ in range(100)],
+                         [second.next64() for _ in range(100)])
+        self.assertNotEqual(bj.CounterRNG(8).next64(),
+                            bj.CounterRNG(7).next64())
+
+    def test_state(self):
+        rng = bj.CounterRNG(7).spawn(8, 6)
+        for _ in range(10):
+            rng.random()
+        state = rng.getstate()
+        numbers = [rng.randbelow(52) for _ in range(50)]
+        rng.setstate(state)
+        self.assertEqual([rng.randbelow(52) for _ in range(50)], numbers)
+
+    def test_spawn(self):
+        rng = bj.CounterRNG(7)
+        streams = [rng.spawn(pair_of, duc) for pair_of in range(1, 11)
+                   for duc in range(1, 11)]
+        firsts = {stream.next64() for stream in streams}
+        self.assertEqual(len(firsts), len(streams))
+        self.assertEqual(rng.spawn(8, 6).next64(),
+                         bj.CounterRNG(7).spawn(8, 6).next64())
+        # Spawning doesn't use the parent stream.
+        self.assertEqual(rng.counter, 0)
+
+    def test_uniform(self):
+        rng = bj.CounterRNG(3)
+        counts = [0] * 13
+        for _ in range(26000):
+            counts[rng.randbelow(13)] += 1
+        for count in counts:
+            self.assertAlmostEqual(count, 2000, delta=200)
+        for _ in range(1000):
+            self.assertTrue(0 <= rng.random() < 1)
+
+
+class PairCellStreamTest(unittest.TestCase):
+    """A pair cell draws from its own stream, so its result doesn't depend
+    on the cells simulated before it."""
+
+    def test_build_order(self):
+        rules = bj.Rules('infinite', True, True, False, True, True, 4,
+                         'any hand', 1)
+        builder = bj.BookBuilder(rules, bj.ONE_DECK, seed=11)
+        with mock.patch.object(bj, 'SIM_MAX', TEST_SIM_MAX):
+            builder.build()
+        builder.pair_hand_builder(8, 6, builder.deck, sim_hands=2000)
+        alone = builder.book.cell_diagnostics(8, 6)
+        for pair_of, duc in ((2, 2), (9, 7), (1, 10)):
+            builder.pair_hand_builder(pair_of, duc, builder.deck,
+                                      sim_hands=2000)
+        builder.pair_hand_builder(8, 6, builder.deck, sim_hands=2000)
+        self.assertEqual(builder.book.cell_diagnostics(8, 6), alone)
+
+        other = bj.BookBuilder(rules, bj.ONE_DECK, seed=12, book=builder.book)
+        other.pair_hand_builder(8, 6, other.deck, sim_hands=2000)
+        self.assertNotEqual(other.book.cell_diagnostics(8, 6).split_ev,
+                            alone.split_ev)
+
+
+if __name__ == '__main__':
+    unittest.main()
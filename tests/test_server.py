@@ -0,0 +1,179 @@
+# Tests of the book job server.
+
+import asyncio
+import json
+import unittest
+from unittest import mock
+
+import blackjack_release_v1 as bj
+import bookmaker_server as server
+
+# Pair simulations are cut short so that whole builds are quick.
+TEST_SIM_MAX = 2000
+
+
+class JobSpecTest(unittest.TestCase):
+    """Jobs that can't be built are refused with a 400 before they reach a
+    worker."""
+
+    BAD_JOBS = [
+        {'rules': 5},
+        {'options': 3},
+        {'rules': {'double': 'bogus'}},
+        {'rules': {'das': 'yes'}},
+        {'rules': {'fullpay': 1}},
+        {'rules': {'msh': True}},
+        {'rules': {'num_decks': True}},
+        {'rules': {'deck_choice': 'custom'}, 'deck': []},
+        {'rules': {'deck_choice': 'custom'}, 'deck': bj.ONE_DECK[:-2]},
+        {'rules': {'deck_choice': 'custom'}, 'deck': [True] * 52},
+        {'options': {'crn': 'no'}},
+        {'seed': False},
+    ]
+
+    def test_bad_jobs(self):
+        job_server = server.JobServer()
+        for request in self.BAD_JOBS:
+            with self.assertRaises(ValueError, msg=request):
+                server.job_spec(request)
+            with self.assertRaises(server.HTTPError, msg=request) as caught:
+                job_server.route('POST', '/jobs', {},
+                                 json.dumps(request).encode())
+            self.assertEqual(caught.exception.status, 400)
+        self.assertEqual(job_server.jobs, {})
+
+    def test_good_jobs(self):
+        spec = server.job_spec({})
+        self.assertEqual(spec['rules'], bj.DEFAULT_RULES._asdict())
+        for double in bj.DOUBLE_CHOICES:
+            spec = server.job_spec({'rules': {'double': double,
+                                              'das': False}})
+            self.assertEqual(spec['rules']['double'], double)
+        spec = server.job_spec({'rules': {'deck_choice': 'custom'},
+                                'deck': [5] + bj.ONE_DECK,
+                                'options': {'crn': True}})
+        self.assertEqual(spec['deck'], sorted([5] + bj.ONE_DECK))
+        self.assertTrue(spec['options']['crn'])
+        self.assertFalse(spec['options']['shuffled_shoe'])
+
+
+class ProgressTest(unittest.TestCase):
+    """Progress events are passed to the event loop apart from the result of
+    a build, so they can arrive after it."""
+
+    def make_job(self, job_server):
+        job = server.Job('1', server.job_spec({}))
+        job_server.jobs[job.job_id] = job
+        return job
+
+    def test_late_progress_after_finish(self):
+        job_server = server.JobServer()
+        job = self.make_job(job_server)
+        job_server.record_progress('1', 'start', [2, 2, 2], 'pair')
+        self.assertEqual(job.state, 'building')
+        # As run() leaves a job whose build has returned.
+        job.steps_done = server.BUILD_STEPS
+        job.current = None
+        job.state = 'finished'
+        job_server.record_progress('1', 'done', [1, 1, 1], 'pair')
+        self.assertEqual(job.state, 'finished')
+        self.assertEqual(job.steps_done, server.BUILD_STEPS)
+        self.assertIsNone(job.current)
+
+    def test_late_progress_after_failure(self):
+        job_server = server.JobServer()
+        job = self.make_job(job_server)
+        job.state = 'failed'
+        job_server.record_progress('1', 'done', [1, 1, 1], 'pair')
+        self.assertEqual(job.state, 'failed')
+        self.assertEqual(job.steps_done, 0)
+
+
+class TotalEVTest(unittest.TestCase):
+    """The total EV of a finished job is that of the plays the engine
+    makes."""
+
+    def test_restricted_doubles(self):
+        rules = bj.Rules('finite', True, True, False, True, True, 4, '10 11',
+                         1, 'late')
+        builder = bj.BookBuilder(rules, bj.ONE_DECK)
+        with mock.patch.object(bj, 'SIM_MAX', TEST_SIM_MAX):
+            builder.build()
+        job_server = server.JobServer()
+        job = server.Job('1', server.job_spec({}))
+        job.book = builder.book
+        job.state = 'finished'
+        job_server.jobs[job.job_id] = job
+
+        def legal_play(fpc, spc, duc):
+            play, _ = builder.book.lookup([fpc, spc], duc, False)
+            return builder.double_check(play, [fpc, spc], duc)
+
+        for flag in ('0', '1'):
+            query = {'take_even_money': [flag], 'take_insurance': [flag]}
+            status, reply = job_server.route('GET', '/jobs/1/ev', query, b'')
+            self.assertEqual(status, 200)
+            ev, _ = builder.book.get_total_ev(legal_play, flag == '1',
+                                              flag == '1')
+            self.assertEqual(reply['total_ev'], ev)
+        job_server.close()
+
+
+async def request(port, method, path, body=None):
+    """Makes an HTTP request of the server and returns the status and the
+    JSON reply."""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    data = json.dumps(body).encode() if body is not None else b''
+    writer.write(f'{method} {path} HTTP/1.1\r\n'
+                 f'Content-Length: {len(data)}\r\n\r\n'.encode() + data)
+    await writer.drain()
+    reply = await reader.read()
+    writer.close()
+    head, _, content = reply.partition(b'\r\n\r\n')
+    return int(head.split()[1]), json.loads(content)
+
+
+class ThreadedServerTest(unittest.TestCase):
+    """Builds several books at once in threads of the server process."""
+
+    async def build_jobs(self):
+        job_server = server.JobServer(workers=2, threads=True)
+        listener = await job_server.start('127.0.0.1', 0)
+        port = listener.sockets[0].getsockname()[1]
+        try:
+            ids = []
+            for seed in (1, 2, 3):
+                status, job = await request(port, 'POST', '/jobs',
+                                            {'seed': seed})
+                self.assertEqual(status, 201)
+                ids.append(job['id'])
+            for _ in range(600):
+                _, jobs = await request(port, 'GET', '/jobs')
+                if not any(job['state'] in ('queued', 'building')
+                           for job in jobs):
+                    break
+                await asyncio.sleep(0.5)
+            # Late progress events must not reopen a finished job.
+            await asyncio.sleep(0.5)
+            for job_id in ids:
+                status, job = await request(port, 'GET', f'/jobs/{job_id}')
+                self.assertEqual(job['state'], 'finished', job.get('error'))
+                self.assertEqual(job['progress']['done'], server.BUILD_STEPS)
+                status, book = await request(port, 'GET',
+                                             f'/jobs/{job_id}/book')
+                self.assertEqual(status, 200)
+                self.assertEqual(len(book['cells']), 550)
+                status, ev = await request(port, 'GET', f'/jobs/{job_id}/ev')
+                self.assertEqual(status, 200)
+                self.assertLess(abs(ev['total_ev']), 0.05)
+        finally:
+            listener.close()
+            job_server.close()
+
+    def test_threaded_builds(self):
+        with mock.patch.object(bj, 'SIM_MAX', TEST_SIM_MAX):
+            asyncio.run(self.build_jobs())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+# Tests of the simulator shoes.
+
+import unittest
+from unittest import mock
+
+import blackjack_release_v1 as bj
+
+
+def next_card_chance(shoe, card, exclude, hands, dealer=True):
+    """Returns how often card is dealt right after a draw that masks out
+    exclude, over the passed number of freshly shuffled hands."""
+    found = 0
+    for _ in range(hands):
+        shoe.new_hand()
+        shoe.draw(exclude=exclude, dealer=dealer)
+        found += shoe.draw(dealer=dealer) == card
+    return found / hands
+
+
+class MaskedDrawTest(unittest.TestCase):
+    """A draw that masks out a value must leave the cards after it dealt as
+    from the shoe less the card drawn."""
+
+    def check_shoe(self, make_shoe):
+        # Two aces and two tens: the masked draw is a ten, leaving two aces
+        # and a ten.
+        counts = bj.deck_counts([1, 1, 10, 10])
+        for dealer in (False, True):
+            shoe = make_shoe(counts, bj.CounterRNG(1))
+            chance = next_card_chance(shoe, 1, 1, 20000, dealer)
+            self.assertAlmostEqual(chance, 2 / 3, delta=0.02)
+
+        # Six decks with a ten up, the hole card masking out aces.
+        counts = bj.deck_counts(bj.ONE_DECK * 6)
+        counts[10] -= 1
+        shoe = make_shoe(counts, bj.CounterRNG(2))
+        chance = next_card_chance(shoe, 1, 1, 40000)
+        self.assertAlmostEqual(chance, 24 / 310, delta=0.006)
+
+    def test_shuffled_shoe(self):
+        self.check_shoe(bj.ShuffledShoe)
+
+    def test_lazy_shuffled_shoe(self):
+        with mock.patch.object(bj, 'np', None):
+            self.check_shoe(bj.ShuffledShoe)
+
+    def test_rank_shoe(self):
+        self.check_shoe(bj.RankShoe)
+
+
+class RankShoeTest(unittest.TestCase):
+    """A RankShoe deals from its count vector without replacement, or with
+    replacement for an infinite deck."""
+
+    def test_deals_the_counts(self):
+        counts = bj.deck_counts(bj.ONE_DECK)
+        shoe = bj.RankShoe(counts, bj.CounterRNG(1))
+        for _ in range(20):
+            shoe.new_hand()
+            cards = [shoe.draw() for _ in range(52)]
+            self.assertEqual(bj.deck_counts(cards), counts)
+            self.assertEqual(shoe.total, 0)
+
+    def test_infinite(self):
+        shoe = bj.RankShoe(bj.deck_counts(bj.ONE_DECK), bj.CounterRNG(1),
+                           infinite=True)
+        cards = [shoe.draw() for _ in range(52000)]
+        self.assertEqual(shoe.counts, bj.deck_counts(bj.ONE_DECK))
+        self.assertAlmostEqual(cards.count(10) / 52000, 4 / 13,
+                               delta=0.01)
+        self.assertAlmostEqual(cards.count(1) / 52000, 1 / 13,
+                               delta=0.005)
+
+    def test_rewind(self):
+        shoe = bj.RankShoe(bj.deck_counts(bj.ONE_DECK * 2),
+                           bj.CounterRNG(1))
+        shoe.new_hand()
+        cards = [shoe.draw() for _ in range(5)] + \
+                [shoe.draw(dealer=True) for _ in range(3)]
+        shoe.rewind()
+        # The dealer's cards come from their own stream, so they are dealt
+        # again whatever the player drew.
+        self.assertEqual([shoe.draw() for _ in range(5)], cards[:5])
+        self.assertEqual([shoe.draw(dealer=True) for _ in range(3)],
+                         cards[5:])
+
+    def test_state(self):
+        shoe = bj.RankShoe(bj.deck_counts(bj.ONE_DECK), bj.CounterRNG(1))
+        for _ in range(3):
+            shoe.new_hand()
+            shoe.draw()
+            shoe.rewind()
+            shoe.draw()
+        state = shoe.getstate()
+        shoe.new_hand()
+        cards = [shoe.draw() for _ in range(10)]
+        resumed = bj.RankShoe(bj.deck_counts(bj.ONE_DECK), bj.CounterRNG(9))
+        resumed.setstate(state)
+        resumed.new_hand()
+        self.assertEqual([resumed.draw() for _ in range(10)], cards)
+
+
+class ShuffledShoeTest(unittest.TestCase):
+    """A ShuffledShoe deals each hand from a fresh shuffle of the whole
+    shoe."""
+
+    def check_hands(self):
+        counts = bj.deck_counts(bj.ONE_DECK)
+        shoe = bj.ShuffledShoe(counts, bj.CounterRNG(1), block_cards=520)
+        firsts = []
+        for _ in range(30):
+            shoe.new_hand()
+            cards = [shoe.draw() for _ in range(40)] + \
+                    [shoe.draw(dealer=True) for _ in range(12)]
+            self.assertEqual(bj.deck_counts(cards), counts)
+            shoe.rewind()
+            self.assertEqual([shoe.draw() for _ in range(40)], cards[:40])
+            self.assertEqual([shoe.draw(dealer=True) for _ in range(12)],
+                             cards[40:])
+            firsts.append(tuple(cards[:5]))
+        self.assertGreater(len(set(firsts)), 25)
+
+        state = shoe.getstate()
+        shoe.new_hand()
+        cards = [shoe.draw() for _ in range(10)]
+        resumed = bj.ShuffledShoe(counts, bj.CounterRNG(9), block_cards=520)
+        resumed.setstate(state)
+        resumed.new_hand()
+        self.assertEqual([resumed.draw() for _ in range(10)], cards)
+
+    def test_blocks(self):
+        self.check_hands()
+
+    def test_lazy(self):
+        with mock.patch.object(bj, 'np', None):
+            self.check_hands()
+
+    def test_total_ev(self):
+        rules = bj.Rules('finite', True, True, False, True, True, 4,
+                         'any hand', 1)
+        builder = bj.BookBuilder(rules, bj.ONE_DECK)
+        with mock.patch.object(bj, 'SIM_MAX', 2000):
+            builder.build()
+        builder.set_options(shuffled_shoe=True)
+        ev, _ = builder.book.get_total_ev()
+        sim_ev, std_error = builder.sim_total_ev(hands=20000)
+        self.assertLess(abs(sim_ev - ev), 4 * std_error)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+# Tests of the side bet chances against dealing out every draw.
+
+import unittest
+from itertools import combinations, permutations
+
+import blackjack_release_v1 as bj
+import bookmaker_sidebets as sidebets
+
+
+def dealt_chances(bet, deck):
+    """Returns the chance of each winning outcome of a side bet by dealing
+    every ordered draw of its cards from the faces of a SuitedDeck."""
+    cards, outcome_of, _, pays = sidebets.SIDE_BETS[bet]
+    faces = [(rank, suit) for rank in sidebets.RANKS
+             for suit in sidebets.SUITS
+             for _ in range(deck.face_count(rank, suit))]
+    chances = dict.fromkeys(pays, 0)
+    draws = 0
+    for drawn in permutations(faces, cards):
+        draws += 1
+        outcome = outcome_of(drawn)
+        if outcome is not None:
+            chances[outcome] += 1
+    return {outcome: count / draws for outcome, count in chances.items()}
+
+
+def depleted_deck():
+    """Returns one deck less the king of hearts, the five of spades and
+    both red sevens."""
+    deck = bj.SuitedDeck.full()
+    for rank, suit in ((13, 2), (5, 0), (7, 2), (7, 3)):
+        deck.remove(rank, suit)
+    return deck
+
+
+class SideBetTest(unittest.TestCase):
+    """The side bet chances are those of dealing every draw, and those of a
+    count vector the average over the suits of the missing cards."""
+
+    def assertSameChances(self, chances, other):
+        self.assertEqual(set(chances), set(other))
+        for outcome, chance in chances.items():
+            self.assertAlmostEqual(chance, other[outcome], places=12)
+
+    def test_suited_deck(self):
+        for deck in (bj.SuitedDeck.full(), depleted_deck()):
+            for bet in sidebets.SIDE_BETS:
+                self.assertSameChances(sidebets.side_bet_chances(bet, deck),
+                                       dealt_chances(bet, deck))
+
+    def test_full_count_vector(self):
+        for decks in (1, 2):
+            counts = bj.deck_counts(bj.ONE_DECK * decks)
+            for bet in sidebets.SIDE_BETS:
+                self.assertSameChances(
+                        sidebets.side_bet_chances(bet, counts),
+                        sidebets.side_bet_chances(
+                                bet, bj.SuitedDeck.full(decks)))
+
+    def test_depleted_count_vector(self):
+        # Two tens are missing, which could be any two of the 16 ten
+        # faces.
+        tens = [(rank, suit) for rank in (10, 11, 12, 13)
+                for suit in sidebets.SUITS]
+        counts = bj.deck_counts(bj.ONE_DECK)
+        counts[10] -= 2
+        for bet in sidebets.SIDE_BETS:
+            average = dict.fromkeys(sidebets.SIDE_BETS[bet][3], 0)
+            picks = list(combinations(tens, 2))
+            for pick in picks:
+                deck = bj.SuitedDeck.full()
+                for rank, suit in pick:
+                    deck.remove(rank, suit)
+                for outcome, chance in \
+                        sidebets.side_bet_chances(bet, deck).items():
+                    average[outcome] += chance / len(picks)
+            self.assertSameChances(sidebets.side_bet_chances(bet, counts),
+                                   average)
+
+    def test_ev(self):
+        deck = bj.SuitedDeck.full(6)
+        chances = sidebets.side_bet_chances('perfect pairs', deck)
+        ev = sum(sidebets.PERFECT_PAIRS_PAYS[outcome] * chance
+                 for outcome, chance in chances.items()) - \
+             (1 - sum(chances.values()))
+        self.assertAlmostEqual(sidebets.side_bet_ev('perfect pairs', deck),
+                               ev, places=12)
+        self.assertLess(ev, 0)
+        self.assertAlmostEqual(
+                sidebets.insurance_ev(bj.deck_counts(bj.ONE_DECK)), -1 / 13,
+                places=12)
+
+
+if __name__ == '__main__':
+    unittest.main()
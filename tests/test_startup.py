@@ -0,0 +1,48 @@
+# Tests of what the headless modules load at start up.
+
+import io
+import os
+import subprocess
+import sys
+import unittest
+
+import bookmaker_server as server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEADLESS_MODULES = ('blackjack_release_v1', 'bookmaker_server',
+                    'bookmaker_table', 'bookmaker_sweep', 'bookmaker_sidebets')
+
+
+class StartupTest(unittest.TestCase):
+    """The book building code and the tools on it don't need tkinter."""
+
+    def test_no_tkinter(self):
+        code = ('import sys\n'
+                f'import {", ".join(HEADLESS_MODULES)}\n'
+                'print(sorted(name for name in sys.modules\n'
+                '             if name.split(".")[0] in ("tkinter", '
+                '"bookmaker_gui")))\n')
+        result = subprocess.run([sys.executable, '-c', code], cwd=ROOT,
+                                capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip(), '[]')
+
+    def test_server_starts_workers_on_first_job(self):
+        job_server = server.JobServer()
+        self.assertIsNone(job_server.pool)
+        self.assertIsNone(job_server.manager)
+
+    def test_timer(self):
+        timer = server.StartupTimer(0)
+        timer.mark('imports')
+        timer.mark('listening')
+        self.assertEqual([stage for stage, _ in timer.stages],
+                         ['imports', 'listening'])
+        report = io.StringIO()
+        timer.report(report)
+        self.assertEqual(len(report.getvalue().splitlines()), 3)
+        self.assertIn('total', report.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
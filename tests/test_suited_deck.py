@@ -0,0 +1,47 @@
+# Tests of the suit aware deck.
+
+import unittest
+
+import blackjack_release_v1 as bj
+
+
+class SuitedDeckTest(unittest.TestCase):
+    """A SuitedDeck keeps its faces and reads like the deck list of its
+    card values."""
+
+    def test_deck_list(self):
+        deck = bj.SuitedDeck.full(2)
+        deck.remove(*bj.parse_face('KH'))
+        deck.remove(*bj.parse_face('TS'))
+        deck.remove(*bj.parse_face('5C'))
+        cards = bj.ONE_DECK * 2
+        for card in (10, 10, 5):
+            cards.remove(card)
+        self.assertEqual(len(deck), len(cards))
+        self.assertEqual(sorted(deck), sorted(cards))
+        for card in range(1, 11):
+            self.assertEqual(deck.count(card), cards.count(card))
+        self.assertEqual(bj.get_card_dist(deck), bj.get_card_dist(cards))
+        self.assertEqual(bj.deck_counts(deck), deck.counts)
+        rules = bj.Rules('finite', True, True, False, True, True, 4,
+                         'any hand', 2)
+        self.assertEqual(bj.BookBuilder(rules, deck).deck, sorted(cards))
+
+    def test_faces(self):
+        deck = bj.SuitedDeck.full()
+        self.assertEqual(bj.parse_face('qd'), (12, 3))
+        deck.remove(12, 3)
+        self.assertEqual(deck.face_count(12, 3), 0)
+        self.assertEqual(deck.count(10), 15)
+        copy = deck.copy()
+        copy.add(12, 3)
+        self.assertEqual(deck.count(10), 15)
+        self.assertEqual(copy.count(10), 16)
+        with self.assertRaises(ValueError):
+            deck.remove(12, 3)
+        with self.assertRaises(ValueError):
+            bj.parse_face('1S')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+# Tests of late and early surrender.
+
+import unittest
+from math import isnan
+
+import blackjack_release_v1 as bj
+
+
+def surrender_book(surrender):
+    """Returns the builder of an infinite deck book of the hands under the
+    passed surrender rule."""
+    rules = bj.Rules('infinite', True, True, False, True, True, 4,
+                     'any hand', 1, surrender)
+    builder = bj.BookBuilder(rules, bj.ONE_DECK)
+    builder.build_hands()
+    return builder
+
+
+class SurrenderTest(unittest.TestCase):
+    """A surrender loses half the bet, before the dealer peeks under early
+    surrender, and is only offered on the first two cards."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.builders = {surrender: surrender_book(surrender)
+                        for surrender in bj.SURRENDER_CHOICES}
+
+    def test_no_surrender(self):
+        book = self.builders['none'].book
+        play, ev_list = book.cell(10, 6, 10)
+        self.assertEqual(play, 'H')
+        self.assertTrue(isnan(ev_list[bj.EV_INDEX['R']]))
+        self.assertNotIn(bj.PLAY_CODES['R'], book.plays)
+
+    def test_late(self):
+        book = self.builders['late'].book
+        for fpc, spc, duc in ((10, 6, 10), (10, 5, 1), (9, 7, 1)):
+            play, ev_list = book.cell(fpc, spc, duc)
+            self.assertEqual(play, 'R')
+            self.assertEqual(ev_list[bj.EV_INDEX['R']], -0.5)
+        # A dealer blackjack takes the whole bet before the surrender.
+        ev, cost = book.hand_ev(10, 6, 10, 'R')
+        self.assertAlmostEqual(ev, (-1 + 12 * -0.5) / 13, places=12)
+        self.assertIsNone(cost)
+        self.assertEqual(book.cell(10, 7, 10)[0], 'S')
+
+    def test_early(self):
+        late = self.builders['late'].book
+        early = self.builders['early'].book
+        ev, _ = early.hand_ev(10, 6, 10, 'R')
+        self.assertEqual(ev, -0.5)
+        for fpc in range(2, 11):
+            for spc in range(fpc, 11):
+                for duc in bj.CARD_VALUES:
+                    if fpc + spc == 21 or fpc == spc:
+                        continue
+                    r = bj.EV_INDEX['R']
+                    self.assertGreaterEqual(early.cell(fpc, spc, duc)[1][r],
+                                            late.cell(fpc, spc, duc)[1][r])
+                    if late.cell(fpc, spc, duc)[0] == 'R':
+                        self.assertEqual(early.cell(fpc, spc, duc)[0], 'R')
+
+    def test_only_first_two_cards(self):
+        for surrender in ('late', 'early'):
+            builder = self.builders[surrender]
+            self.assertEqual(builder.double_check('R', [10, 6], 10), 'R')
+            for hand, split in (([10, 2, 4], False), ([10, 6], True)):
+                play = builder.double_check('R', hand, 10, split)
+                self.assertIn(play, 'SHD')
+
+    def test_total_ev(self):
+        none, late, early = (self.builders[surrender].book.get_total_ev()[0]
+                             for surrender in bj.SURRENDER_CHOICES)
+        self.assertLess(none, late)
+        self.assertLess(late, early)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+# Tests of sweeps built by workers sharing a queue directory.
+
+import multiprocessing
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import blackjack_release_v1 as bj
+import bookmaker_sweep as sweep
+from bookmaker_server import job_spec
+
+# Pair simulations are cut short so that whole builds are quick.
+TEST_SIM_MAX = 2000
+
+JOBS = [{'rules': {'deck_choice': 'finite', 'num_decks': 1},
+         'options': {'crn': True}},
+        {'rules': {'deck_choice': 'infinite', 'surrender': 'late'}}]
+
+# Fork, so the workers start with the test's patches.
+CONTEXT = multiprocessing.get_context('fork')
+
+
+def direct_book(job):
+    """Returns the book of a job built in one go."""
+    spec = job_spec(job)
+    builder = bj.BookBuilder(bj.Rules(**spec['rules']), spec['deck'],
+                             spec['seed'], **spec['options'])
+    builder.build()
+    return builder.book
+
+
+class SweepTest(unittest.TestCase):
+    """Each unit of a sweep is built once by one of the workers, and the
+    merged books are those of single builds."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.queue = directory.name
+        self.claims_log = os.path.join(directory.name, 'claims.log')
+        patches = [mock.patch.object(bj, 'SIM_MAX', TEST_SIM_MAX),
+                   mock.patch.object(sweep, 'claim_unit',
+                                     self.logged_claim_unit)]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def logged_claim_unit(self, queue, unit_id, claim_unit=sweep.claim_unit):
+        """Claims a unit, logging each unit built under a claim."""
+        path = claim_unit(queue, unit_id)
+        if path is not None and sweep.unit_state(queue, unit_id) == 'open':
+            with open(self.claims_log, 'a') as f:
+                f.write(unit_id + '\n')
+        return path
+
+    def test_workers(self):
+        workers = [CONTEXT.Process(target=sweep.work,
+                                   args=(self.queue, 0.05, True))
+                   for _ in range(3)]
+        for worker in workers:
+            worker.start()
+        try:
+            with mock.patch('builtins.print'):
+                states = sweep.coordinate(self.queue, JOBS, True, 0.05)
+        finally:
+            for worker in workers:
+                worker.join(60)
+                if worker.is_alive():
+                    worker.terminate()
+        self.assertEqual(states, ['done', 'done'])
+        self.assertEqual([worker.exitcode for worker in workers], [0] * 3)
+
+        units = sorted(name[:-len('.json')] for name in
+                       os.listdir(sweep.queue_path(self.queue, 'units')))
+        self.assertEqual(len(units), 2 * 101)
+        with open(self.claims_log) as f:
+            self.assertEqual(sorted(f.read().split()), units)
+        self.assertEqual(os.listdir(sweep.queue_path(self.queue, 'claims')),
+                         [])
+
+        for job_index, job in enumerate(JOBS):
+            book = bj.BookTable.load(sweep.queue_path(
+                    self.queue, 'books', f'{job_index:04d}.book'))
+            expected = direct_book(job)
+            self.assertEqual(book.plays, expected.plays)
+            for evs, expected_evs in zip(book.evs, expected.evs):
+                self.assertEqual(evs.tobytes(), expected_evs.tobytes())
+
+    def test_released_claim(self):
+        unit_id, unit = sweep.first_unit(0, job_spec(JOBS[1]), False)
+        sweep.make_queue(self.queue, JOBS)
+        sweep.add_unit(self.queue, unit_id, unit)
+        self.assertIsNotNone(sweep.claim_unit(self.queue, unit_id))
+        self.assertIsNone(sweep.claim_unit(self.queue, unit_id))
+        sweep.work_unit(self.queue, unit_id)
+        self.assertEqual(sweep.unit_state(self.queue, unit_id), 'done')
+        self.assertEqual(os.listdir(sweep.queue_path(self.queue, 'claims')),
+                         [])
+        # With its result removed, the unit can be claimed again at once.
+        os.remove(sweep.unit_path(self.queue, 'results', unit_id, '.book'))
+        self.assertIsNotNone(sweep.claim_unit(self.queue, unit_id))
+
+
+if __name__ == '__main__':
+    unittest.main()
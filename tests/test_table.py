@@ -0,0 +1,105 @@
+# Tests of the table simulator's seat plays.
+
+import unittest
+from unittest import mock
+
+import blackjack_release_v1 as bj
+import bookmaker_table as table
+
+# Pair simulations are cut short so that whole builds are quick.
+TEST_SIM_MAX = 2000
+
+
+def built_book(double):
+    """Returns a finite deck book built under the passed double rule."""
+    rules = bj.Rules('finite', True, True, False, True, True, 4, double, 1,
+                     'late')
+    builder = bj.BookBuilder(rules, bj.ONE_DECK)
+    with mock.patch.object(bj, 'SIM_MAX', TEST_SIM_MAX):
+        builder.build()
+    return builder.book
+
+
+class SeatPlayTest(unittest.TestCase):
+    """A seat plays only doubles the table offers, whatever the rules of
+    its book."""
+
+    def test_seat_book_doubles(self):
+        table_book = built_book('10 11')
+        seats = table.seat_builders(table_book,
+                                    [table_book, built_book('any hand')])
+        plays = []
+        sim_play = bj.BookBuilder.sim_play
+
+        def recording_sim_play(builder, fpc, spc, duc, play, *args,
+                               **kwargs):
+            plays.append((fpc, spc, play))
+            return sim_play(builder, fpc, spc, duc, play, *args, **kwargs)
+
+        shoe = table.TableShoe(bj.deck_counts(table_book.deck),
+                               bj.CounterRNG(1).spawn(0))
+        with mock.patch.object(bj.BookBuilder, 'sim_play',
+                               recording_sim_play):
+            for _ in range(50):
+                table.play_shoe(seats, shoe)
+                shoe.shuffle()
+        self.assertTrue(plays)
+        for fpc, spc, play in plays:
+            if play == 'D':
+                pht, hard_or_soft = bj.best_hand_from_card_list([fpc, spc])
+                self.assertEqual(hard_or_soft, 'hard')
+                self.assertIn(pht, (10, 11))
+
+
+class TableShoeTest(unittest.TestCase):
+    """Every seat of a round is dealt the same dealer cards, and a round
+    takes as many of them off the shoe as any seat drew."""
+
+    def test_dealer_cards(self):
+        shoe = table.TableShoe(bj.deck_counts(bj.ONE_DECK * 2),
+                               bj.CounterRNG(2).spawn(0))
+        row = list(shoe.row)
+        shoe.new_round()
+        player_cards = [shoe.draw() for _ in range(5)]
+        self.assertEqual(player_cards, row[:5])
+        dealer_cards = []
+        for draws in (2, 4, 1):
+            shoe.new_seat()
+            dealer_cards.append([shoe.draw(dealer=True)
+                                 for _ in range(draws)])
+        self.assertEqual(dealer_cards, [row[:-5:-1][:2], row[:-5:-1],
+                                        row[-1:]])
+        shoe.end_round()
+        self.assertEqual(shoe.cards_left(), len(row) - 9)
+        shoe.new_round()
+        self.assertEqual(shoe.draw(dealer=True), row[-5])
+        self.assertEqual(shoe.draw(), row[5])
+
+    def test_shuffle_point(self):
+        shoe = table.TableShoe(bj.deck_counts(bj.ONE_DECK),
+                               bj.CounterRNG(2).spawn(0), penetration=0.5)
+        self.assertFalse(shoe.needs_shuffle(2))
+        for _ in range(25):
+            shoe.draw()
+        self.assertFalse(shoe.needs_shuffle(2))
+        shoe.draw()
+        self.assertTrue(shoe.needs_shuffle(2))
+        shoe.shuffle()
+        self.assertEqual(shoe.cards_left(), 52)
+        # Too few cards for a round of 7 hands and the dealer's.
+        self.assertTrue(shoe.needs_shuffle(8))
+
+    def test_check_table(self):
+        book = bj.BookTable(bj.ONE_DECK, bj.Rules(
+                'finite', True, True, False, True, True, 4, 'any hand', 1))
+        for seats, penetration in ((0, 0.75), (8, 0.75), (1, 0), (1, 1.5),
+                                   (6, 0.75)):
+            with self.assertRaises(ValueError):
+                table.check_table(book, seats, penetration)
+        table.check_table(book, 5, 1)
+        with self.assertRaises(ValueError):
+            table.check_books(book, [book])
+
+
+if __name__ == '__main__':
+    unittest.main()
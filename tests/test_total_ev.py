@@ -0,0 +1,134 @@
+# Tests of the total EV of a book under the rules' play restrictions.
+
+import unittest
+from math import sqrt
+from unittest import mock
+
+import blackjack_release_v1 as bj
+
+# Pair simulations are cut short so that whole builds are quick.
+TEST_SIM_MAX = 2000
+
+# Builders of books whose rules only allow doubling hard 10 and 11, by deck
+# choice, made once for every test.
+BUILDERS = {}
+
+
+def restricted_builder(deck_choice='infinite'):
+    """Returns a builder of a book built under restricted double rules."""
+    builder = BUILDERS.get(deck_choice)
+    if builder is None:
+        rules = bj.Rules(deck_choice, True, True, False, True, True, 4,
+                         '10 11', 1, 'late')
+        builder = bj.BookBuilder(rules, bj.ONE_DECK)
+        with mock.patch.object(bj, 'SIM_MAX', TEST_SIM_MAX):
+            builder.build()
+        BUILDERS[deck_choice] = builder
+    return builder
+
+
+def legal_play(builder):
+    """Returns a display_play that makes the book play of each hand, with a
+    double the rules don't offer replaced as the simulator replaces it."""
+    def display_play(fpc, spc, duc):
+        play, _ = builder.book.lookup([fpc, spc], duc, False)
+        return builder.double_check(play, [fpc, spc], duc)
+    return display_play
+
+
+class RestrictedDoubleTest(unittest.TestCase):
+    """The book play of a hand is one the rules offer."""
+
+    def test_book_plays(self):
+        for deck_choice in ('infinite', 'finite'):
+            book = restricted_builder(deck_choice).book
+            for fpc in range(1, 11):
+                for spc in range(1, 11):
+                    pht, hard_or_soft = \
+                            bj.best_hand_from_card_list([fpc, spc])
+                    if pht == 21:
+                        continue
+                    for duc in range(1, 11):
+                        play = book.book_play(fpc, spc, duc)
+                        if play == 'D':
+                            self.assertEqual(hard_or_soft, 'hard')
+                            self.assertIn(pht, (10, 11))
+
+    def test_total_ev(self):
+        for deck_choice in ('infinite', 'finite'):
+            builder = restricted_builder(deck_choice)
+            for flags in ((False, False), (True, True)):
+                ev, cost = builder.book.get_total_ev(None, *flags)
+                legal_ev, legal_cost = builder.book.get_total_ev(
+                        legal_play(builder), *flags)
+                self.assertEqual(ev, legal_ev)
+                self.assertEqual(cost, 0)
+                self.assertEqual(legal_cost, 0)
+
+    def test_sim_total_ev_plays(self):
+        builder = restricted_builder('finite')
+        plays = []
+        sim_play = builder.sim_play
+
+        def recording_sim_play(fpc, spc, duc, play, *args, **kwargs):
+            plays.append((fpc, spc, duc, play))
+            return sim_play(fpc, spc, duc, play, *args, **kwargs)
+
+        with mock.patch.object(builder, 'sim_play', recording_sim_play):
+            builder.sim_total_ev(hands=2000)
+        self.assertEqual(len(plays), 2000)
+        for fpc, spc, duc, play in plays:
+            self.assertEqual(play, builder.book.book_play(fpc, spc, duc))
+            self.assertEqual(play, builder.double_check(play, [fpc, spc], duc))
+
+    def test_round_dist_mean(self):
+        for deck_choice in ('infinite', 'finite'):
+            builder = restricted_builder(deck_choice)
+            for flags in ((False, False), (True, True)):
+                round_dist = builder.round_dist(None, *flags)
+                mean = sum(result * chance
+                           for result, chance in round_dist.items())
+                ev, _ = builder.book.get_total_ev(None, *flags)
+                self.assertAlmostEqual(mean, ev, places=12)
+
+    def test_round_dist_spread(self):
+        builder = restricted_builder('finite')
+        round_dist = builder.round_dist()
+        self.assertAlmostEqual(sum(round_dist.values()), 1, places=12)
+        _, variance, _ = bj.dist_moments(round_dist)
+        hands = 100000
+        _, std_error = builder.sim_total_ev(hands=hands)
+        self.assertAlmostEqual(std_error * sqrt(hands), sqrt(variance),
+                               delta=0.02)
+
+    def test_cell_dists(self):
+        builder = restricted_builder('finite')
+        for fpc, spc, duc in ((10, 6, 10), (5, 6, 6), (1, 7, 9), (8, 8, 1)):
+            _, ev_list = builder.book.cell(fpc, spc, duc)
+            dists = builder.cell_dists(fpc, spc, duc)
+            self.assertEqual(set(dists),
+                             set('SHDPR' if fpc == spc else 'SHDR'))
+            for play in dists:
+                mean, _, _ = bj.dist_moments(dists[play])
+                self.assertAlmostEqual(sum(dists[play].values()), 1,
+                                       places=12)
+                self.assertAlmostEqual(mean, ev_list[bj.EV_INDEX[play]],
+                                       places=12)
+
+    def test_dist_moments(self):
+        self.assertEqual(bj.dist_moments({-1: 0.5, 1: 0.5}), (0, 1, 0))
+        mean, variance, skewness = bj.dist_moments({0: 0.75, 4: 0.25})
+        self.assertEqual((mean, variance), (1, 3))
+        self.assertAlmostEqual(skewness, 2 / sqrt(3), places=12)
+        self.assertEqual(bj.dist_moments({2: 1}), (2, 0, 0))
+
+    def test_unknown_play(self):
+        book = restricted_builder('infinite').book
+        with self.assertRaises(ValueError):
+            book.hand_ev(10, 6, 10, 'X')
+        with self.assertRaises(ValueError):
+            book.get_total_ev(lambda fpc, spc, duc: 'Q')
+
+
+if __name__ == '__main__':
+    unittest.main()